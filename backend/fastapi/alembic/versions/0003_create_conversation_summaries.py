@@ -0,0 +1,40 @@
+"""create conversation_summaries table for rolling history summaries
+
+Revision ID: 0003_create_conversation_summaries
+Revises: 0002_change_erole_bot_to_model
+Create Date: 2026-10-18 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+import logging
+
+# revision identifiers, used by Alembic.
+revision = '0003_create_conversation_summaries'
+down_revision = '0002_change_erole_bot_to_model'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    try:
+        op.create_table(
+            'conversation_summaries',
+            sa.Column('conversation_id', sa.String(length=64), primary_key=True),
+            sa.Column('content', sa.Text(), nullable=False),
+            sa.Column('last_message_id', sa.String(length=64), nullable=False),
+            sa.Column('last_message_created_at', sa.BigInteger(), nullable=False),
+            sa.Column('covered_messages', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('covered_bytes', sa.BigInteger(), nullable=False, server_default='0'),
+            sa.Column('version', sa.Integer(), nullable=False, server_default='1'),
+            sa.Column('updated_at', sa.BigInteger(), nullable=True),
+            sa.ForeignKeyConstraint(['conversation_id'], ['conversations.id'], ondelete='CASCADE'),
+        )
+    except Exception:
+        logging.getLogger(__name__).warning("conversation_summaries table may already exist; skipping creation")
+
+
+def downgrade() -> None:
+    try:
+        op.drop_table('conversation_summaries')
+    except Exception:
+        logging.getLogger(__name__).warning("conversation_summaries table not present or could not be dropped")
@@ -0,0 +1,32 @@
+"""add status and updated_at to messages for streaming checkpoints
+
+Revision ID: 0004_add_message_stream_status
+Revises: 0003_create_conversation_summaries
+Create Date: 2026-10-18 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+import logging
+
+# revision identifiers, used by Alembic.
+revision = '0004_add_message_stream_status'
+down_revision = '0003_create_conversation_summaries'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    try:
+        # existing rows are finished messages
+        op.add_column('messages', sa.Column('status', sa.String(length=16), nullable=False, server_default='complete'))
+        op.add_column('messages', sa.Column('updated_at', sa.Integer(), nullable=True))
+    except Exception:
+        logging.getLogger(__name__).warning("messages.status/updated_at may already exist; skipping")
+
+
+def downgrade() -> None:
+    try:
+        op.drop_column('messages', 'updated_at')
+        op.drop_column('messages', 'status')
+    except Exception:
+        logging.getLogger(__name__).warning("messages.status/updated_at not present or could not be dropped")
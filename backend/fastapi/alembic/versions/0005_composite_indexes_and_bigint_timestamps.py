@@ -0,0 +1,110 @@
+"""composite indexes for the hot message/conversation queries; BIGINT timestamps everywhere
+
+History loads, list pages and counts filter on conversation_id and order by
+(created_at, id); with only single-column indexes the database sorted every
+page. The composite indexes serve them straight from the index, and make the
+single-column ones they start with redundant.
+
+Timestamps were BIGINT in the migrations but Integer in the entities (so
+tables made by `create_all`, and messages.updated_at from 0004, are INT); all
+of them become BIGINT. SQLite stores both the same way and is left as is.
+
+Revision ID: 0005_composite_indexes_and_bigint_timestamps
+Revises: 0004_add_message_stream_status
+Create Date: 2026-10-18 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+import logging
+
+# revision identifiers, used by Alembic.
+revision = '0005_composite_indexes_and_bigint_timestamps'
+down_revision = '0004_add_message_stream_status'
+branch_labels = None
+depends_on = None
+
+# name -> (table, columns)
+INDEXES = {
+    'idx_messages_conversation_created_at_id': ('messages', ['conversation_id', 'created_at', 'id']),
+    'idx_messages_conversation_role_created_at': ('messages', ['conversation_id', 'role', 'created_at', 'id']),
+    'idx_conversations_created_at_id': ('conversations', ['created_at', 'id']),
+}
+# prefixes of the indexes above
+REDUNDANT_INDEXES = {
+    'idx_messages_conversation_id': ('messages', ['conversation_id']),
+    'idx_conversations_created_at': ('conversations', ['created_at']),
+}
+# (table, column, nullable)
+TIMESTAMPS = [
+    ('conversations', 'created_at', False),
+    ('conversations', 'updated_at', True),
+    ('messages', 'created_at', False),
+    ('messages', 'updated_at', True),
+    ('conversation_summaries', 'last_message_created_at', False),
+    ('conversation_summaries', 'covered_bytes', False),
+    ('conversation_summaries', 'updated_at', True),
+]
+
+
+def _index_names(table: str) -> set:
+    try:
+        return {ix['name'] for ix in sa.inspect(op.get_bind()).get_indexes(table)}
+    except Exception:
+        return set()
+
+
+def _create_indexes(indexes: dict) -> None:
+    for name, (table, columns) in indexes.items():
+        if name in _index_names(table):
+            continue
+        try:
+            op.create_index(name, table, columns)
+        except Exception:
+            logging.getLogger(__name__).warning("Could not create index %s on %s", name, table)
+
+
+def _drop_indexes(indexes: dict) -> None:
+    for name, (table, _) in indexes.items():
+        if name not in _index_names(table):
+            continue
+        try:
+            op.drop_index(name, table_name=table)
+        except Exception:
+            logging.getLogger(__name__).warning("Could not drop index %s on %s", name, table)
+
+
+def _alter_timestamps(to_type, from_type) -> None:
+    bind = op.get_bind()
+    if bind.dialect.name == 'sqlite':
+        return
+    inspector = sa.inspect(bind)
+    for table, column, nullable in TIMESTAMPS:
+        try:
+            current = {c['name']: c['type'] for c in inspector.get_columns(table)}.get(column)
+        except Exception:
+            current = None
+        if current is None or isinstance(current, to_type):
+            continue
+        try:
+            op.alter_column(table, column, existing_type=from_type(), type_=to_type(), existing_nullable=nullable)
+        except Exception:
+            logging.getLogger(__name__).warning("Could not change %s.%s to %s", table, column, to_type.__name__)
+
+
+def upgrade() -> None:
+    _create_indexes(INDEXES)
+    # after the composite ones, so the messages foreign key always has an index
+    _drop_indexes(REDUNDANT_INDEXES)
+    _alter_timestamps(sa.BigInteger, sa.Integer)
+
+
+def downgrade() -> None:
+    # only messages.updated_at was INT in the migrations
+    bind = op.get_bind()
+    if bind.dialect.name != 'sqlite':
+        try:
+            op.alter_column('messages', 'updated_at', existing_type=sa.BigInteger(), type_=sa.Integer(), existing_nullable=True)
+        except Exception:
+            logging.getLogger(__name__).warning("Could not change messages.updated_at back to INT")
+    _create_indexes(REDUNDANT_INDEXES)
+    _drop_indexes(INDEXES)
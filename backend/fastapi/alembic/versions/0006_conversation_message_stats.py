@@ -0,0 +1,81 @@
+"""messages_count, last_message_at and last_message_preview on conversations
+
+Kept by the message write paths, so conversation lists and details no longer
+count messages. last_message_at is the newest message's created_at, or the
+conversation's own while it has none; idx_conversations_last_message_at_id
+serves the "recently active" ordering.
+
+Existing rows are filled in by one UPDATE here. To repair them later, or to
+refill in batches, run `python -m src.adapter.worker.backfill_conversation_stats`.
+
+Revision ID: 0006_conversation_message_stats
+Revises: 0005_composite_indexes_and_bigint_timestamps
+Create Date: 2026-10-18 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+import logging
+
+# revision identifiers, used by Alembic.
+revision = '0006_conversation_message_stats'
+down_revision = '0005_composite_indexes_and_bigint_timestamps'
+branch_labels = None
+depends_on = None
+
+PREVIEW_CHARS = 200
+
+
+def upgrade() -> None:
+    try:
+        op.add_column('conversations', sa.Column('messages_count', sa.Integer(), nullable=False, server_default='0'))
+        op.add_column('conversations', sa.Column('last_message_at', sa.BigInteger(), nullable=False, server_default='0'))
+        op.add_column('conversations', sa.Column('last_message_preview', sa.String(length=255), nullable=True))
+    except Exception:
+        logging.getLogger(__name__).warning("conversations stats columns may already exist; skipping")
+
+    conversations = sa.table(
+        'conversations',
+        sa.column('id'), sa.column('created_at'),
+        sa.column('messages_count'), sa.column('last_message_at'), sa.column('last_message_preview'),
+    )
+    messages = sa.table('messages', sa.column('id'), sa.column('conversation_id'), sa.column('content'), sa.column('created_at'))
+
+    def newest(column):
+        return (
+            sa.select(column)
+            .where(messages.c.conversation_id == conversations.c.id)
+            .order_by(messages.c.created_at.desc(), messages.c.id.desc())
+            .limit(1)
+            .scalar_subquery()
+        )
+
+    total = sa.select(sa.func.count()).where(messages.c.conversation_id == conversations.c.id).scalar_subquery()
+    try:
+        op.execute(
+            sa.update(conversations).values(
+                last_message_preview=newest(sa.func.substr(messages.c.content, 1, PREVIEW_CHARS)),
+                last_message_at=sa.func.coalesce(newest(messages.c.created_at), conversations.c.created_at),
+                messages_count=total,
+            )
+        )
+    except Exception:
+        logging.getLogger(__name__).warning("Could not fill conversation stats; run the backfill command")
+
+    try:
+        op.create_index('idx_conversations_last_message_at_id', 'conversations', ['last_message_at', 'id'])
+    except Exception:
+        logging.getLogger(__name__).warning("Could not create index idx_conversations_last_message_at_id")
+
+
+def downgrade() -> None:
+    try:
+        op.drop_index('idx_conversations_last_message_at_id', table_name='conversations')
+    except Exception:
+        logging.getLogger(__name__).warning("idx_conversations_last_message_at_id not present or could not be dropped")
+    try:
+        with op.batch_alter_table('conversations') as batch:
+            batch.drop_column('last_message_preview')
+            batch.drop_column('last_message_at')
+            batch.drop_column('messages_count')
+    except Exception:
+        logging.getLogger(__name__).warning("conversations stats columns not present or could not be dropped")
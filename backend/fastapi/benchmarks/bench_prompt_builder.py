@@ -0,0 +1,106 @@
+"""Benchmark: per-turn CPU to turn chat history into a Gemini request body.
+
+Run from backend/fastapi:
+
+    python benchmarks/bench_prompt_builder.py [--messages 100] [--chars 600] [--turns 200] [--attempts 2]
+
+Each turn takes the newest `--messages` of a growing conversation (two new
+messages per turn, as in a chat) and produces what is sent upstream:
+
+- before: history -> list of dicts -> canonical json.dumps for the cache key ->
+          httpx `json=` encoding on every attempt
+- after:  cached per-message fragments joined into bytes -> SHA-256 cache key
+          over those bytes -> one body reused by every attempt
+
+`--attempts 2` models one retry (or one hedge) per turn. Reported: CPU per
+turn (process time, best of N) and the fragment cache hit rate.
+"""
+import argparse
+import os
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.adapter.output.gemini.helper.prompt_builder import PromptFragmentCache  # noqa: E402
+from src.adapter.output.gemini.helper.response_cache import cache_key  # noqa: E402
+from src.domain.enums.enums import ERole  # noqa: E402
+from src.domain.models.message_domain import MessageDomain  # noqa: E402
+
+URL = "https://bench.test/v1beta/models/gemini-2.5-flash:generateContent"
+MODEL = "gemini-2.5-flash"
+
+
+def build_conversation(total: int, chars: int):
+    words = "Lorem ipsum \"dolor\" sit amet, tiếng Việt có dấu, {json} <b>markup</b>\n"
+    text = (words * (chars // len(words) + 1))[:chars]
+    return [
+        MessageDomain(
+            id=f"msg_{i:06d}", conversation_id="c1", role=ERole.USER if i % 2 == 0 else ERole.MODEL,
+            content=f"{i}: {text}", created_at=1_700_000_000 + i,
+        )
+        for i in range(total)
+    ]
+
+
+def before_turn(history, attempts: int) -> int:
+    contents = []
+    history.sort(key=lambda x: x.created_at)
+    for m in history:
+        role = m.role.value if hasattr(m.role, "value") else str(m.role)
+        contents.append({"role": role, "parts": [{"text": m.content}]})
+    cache_key(MODEL, contents)
+    size = 0
+    for _ in range(attempts):
+        request = httpx.Request("POST", URL, json={"contents": contents, "model": MODEL})
+        size = len(request.content)
+    return size
+
+
+def after_turn(cache: PromptFragmentCache, history, attempts: int) -> int:
+    prepared = cache.prepare(history)
+    prepared.cache_key(MODEL)
+    size = 0
+    for _ in range(attempts):
+        request = httpx.Request("POST", URL, content=prepared.body(MODEL), headers={"Content-Type": "application/json"})
+        size = len(request.content)
+    return size
+
+
+def run(turn, conversation, window: int, turns: int, repeat: int):
+    best = float("inf")
+    size = 0
+    for _ in range(repeat):
+        started = time.process_time()
+        for t in range(turns):
+            end = window + 2 * t
+            size = turn(conversation[end - window:end])
+        best = min(best, time.process_time() - started)
+    return best / turns, size
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--messages", type=int, default=100, help="history messages per turn")
+    ap.add_argument("--chars", type=int, default=600, help="characters per message")
+    ap.add_argument("--turns", type=int, default=200)
+    ap.add_argument("--attempts", type=int, default=2, help="upstream attempts per turn (retries/hedges)")
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    conversation = build_conversation(args.messages + 2 * args.turns, args.chars)
+    print(f"history {args.messages} messages x ~{args.chars} chars, {args.turns} turns, {args.attempts} attempt(s)/turn")
+
+    before, before_size = run(lambda h: before_turn(h, args.attempts), conversation, args.messages, args.turns, args.repeat)
+    cache = PromptFragmentCache()
+    after, after_size = run(lambda h: after_turn(cache, h, args.attempts), conversation, args.messages, args.turns, args.repeat)
+
+    print(f"before  {before * 1e6:9.1f} us/turn  body {before_size / 1024:7.1f} KiB")
+    print(f"after   {after * 1e6:9.1f} us/turn  body {after_size / 1024:7.1f} KiB  ({before / after:.1f}x)")
+    print(f"fragment cache hit rate {cache.stats()['hit_rate']:.3f}")
+
+
+if __name__ == "__main__":
+    main()
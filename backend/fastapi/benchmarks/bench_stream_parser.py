@@ -0,0 +1,135 @@
+"""Microbenchmark: incremental stream parser vs. the previous rolling-regex path.
+
+Run from backend/fastapi:
+
+    python benchmarks/bench_stream_parser.py [--mb 4] [--chunk 1024]
+
+Both paths consume the same synthetic SSE stream (one GenerateContentResponse
+per event, delivered in fixed-size network reads) and must extract the same text.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.adapter.output.gemini.dto.response.stream_chunk import TextDelta  # noqa: E402
+from src.adapter.output.gemini.helper.stream_parser import GeminiStreamParser, iter_chunks  # noqa: E402
+
+
+def build_stream(total_bytes: int) -> bytes:
+    words = "Lorem ipsum \"dolor\" sit amet, {consectetur} adipiscing elit.\n"
+    events = []
+    size = 0
+    i = 0
+    while size < total_bytes:
+        event = {
+            "candidates": [{"content": {"role": "model", "parts": [{"text": f"{i}: {words * 4}"}]}, "index": 0}],
+            "usageMetadata": {"promptTokenCount": 10, "candidatesTokenCount": i, "totalTokenCount": 10 + i},
+            "modelVersion": "gemini-2.5-flash",
+        }
+        frame = f"data: {json.dumps(event)}\r\n\r\n"
+        events.append(frame)
+        size += len(frame)
+        i += 1
+    return "".join(events).encode("utf-8")
+
+
+def split_lines(body: bytes, chunk: int):
+    """Emulate httpx.aiter_lines over fixed-size reads."""
+    pending = ""
+    for i in range(0, len(body), chunk):
+        pending += body[i:i + chunk].decode("utf-8", errors="ignore")
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line
+    if pending:
+        yield pending
+
+
+def legacy_regex_parse(body: bytes, chunk: int) -> str:
+    """The pre-parser algorithm from GeminiClient.stream_generate (SSE branch)."""
+    out = []
+    json_buf = ""
+    processed_idx = 0
+    text_pattern = re.compile(r'"text"\s*:\s*"((?:\\.|[^"\\])*)"')
+    for line in split_lines(body, chunk):
+        raw = line.rstrip("\n")
+        if raw.startswith(":") or not raw.startswith("data:"):
+            continue
+        sse_payload = raw[len("data:"):].lstrip()
+        if sse_payload == "[DONE]":
+            break
+        json_buf += (sse_payload + "\n")
+        for m in text_pattern.finditer(json_buf, processed_idx):
+            raw_text = m.group(1)
+            try:
+                decoded = json.loads(f'"{raw_text}"')
+            except Exception:
+                decoded = raw_text
+            if decoded:
+                out.append(decoded)
+            processed_idx = m.end()
+        if processed_idx > 0 and processed_idx > len(json_buf) // 2:
+            json_buf = json_buf[processed_idx:]
+            processed_idx = 0
+    return "".join(out)
+
+
+def incremental_parse(body: bytes, chunk: int) -> str:
+    out = []
+    parser = GeminiStreamParser()
+    view = memoryview(body)
+    for i in range(0, len(body), chunk):
+        for event in parser.feed(view[i:i + chunk]):
+            for c in iter_chunks(event):
+                if isinstance(c, TextDelta) and not c.thought:
+                    out.append(c.text)
+    for event in parser.close():
+        for c in iter_chunks(event):
+            if isinstance(c, TextDelta) and not c.thought:
+                out.append(c.text)
+    return "".join(out)
+
+
+def measure(fn, body: bytes, chunk: int, repeat: int):
+    best = float("inf")
+    result = ""
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(body, chunk)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    fn(body, chunk)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak, result
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--mb", type=float, default=4.0, help="stream size in MB")
+    ap.add_argument("--chunk", type=int, default=1024, help="network read size in bytes")
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    body = build_stream(int(args.mb * 1024 * 1024))
+    mb = len(body) / (1024 * 1024)
+    print(f"stream: {mb:.2f} MB, read size {args.chunk} B")
+
+    results = {}
+    for name, fn in (("regex (legacy)", legacy_regex_parse), ("incremental", incremental_parse)):
+        secs, peak, text = measure(fn, body, args.chunk, args.repeat)
+        results[name] = text
+        print(f"{name:16s} {secs * 1000:9.1f} ms  {mb / secs:7.1f} MB/s  peak alloc {peak / 1024:8.1f} KiB")
+
+    texts = list(results.values())
+    print("outputs identical:", texts[0] == texts[1])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""Benchmark: re-encoding SSE path vs. pass-through for /gemini/stream.
+
+Run from backend/fastapi:
+
+    python benchmarks/bench_stream_passthrough.py [--mb 4] [--chunk 4096]
+
+Both paths go through a real GeminiClient (httpx with an in-process mock
+transport) and end where StreamingResponse would hand bytes to the server:
+
+- reencode:    stream_generate -> StringIO copy -> json.dumps `data:` frame -> .encode()
+- passthrough: stream_raw memoryviews relayed as-is; text decoded once at the end
+- transport:   bare httpx aiter_raw with no proxy work (the floor both paths share)
+
+Reported: CPU time per streamed MB (process time, best of N) and time to the
+first output byte.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from io import StringIO
+
+import httpx
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.adapter.output.gemini.helper.gemini_client import GeminiClient  # noqa: E402
+from src.adapter.output.gemini.helper.stream_parser import RawStreamCapture  # noqa: E402
+
+URL = "https://bench.test/v1beta/models/gemini-2.5-flash:generateContent"
+
+
+def build_stream(total_bytes: int) -> bytes:
+    words = "Lorem ipsum \"dolor\" sit amet, {consectetur} adipiscing elit, tiếng Việt.\n"
+    frames = []
+    size = 0
+    i = 0
+    while size < total_bytes:
+        event = {
+            "candidates": [{"content": {"role": "model", "parts": [{"text": f"{i}: {words * 4}"}]}, "index": 0}],
+            "usageMetadata": {"promptTokenCount": 10, "candidatesTokenCount": i, "totalTokenCount": 10 + i},
+            "modelVersion": "gemini-2.5-flash",
+        }
+        frame = f"data: {json.dumps(event, ensure_ascii=False)}\r\n\r\n"
+        frames.append(frame)
+        size += len(frame)
+        i += 1
+    return "".join(frames).encode("utf-8")
+
+
+class ChunkedBody(httpx.AsyncByteStream):
+    def __init__(self, body: bytes, chunk: int):
+        self.body = body
+        self.chunk = chunk
+
+    async def __aiter__(self):
+        view = memoryview(self.body)
+        for i in range(0, len(self.body), self.chunk):
+            # bytes like a socket read would produce
+            yield bytes(view[i:i + self.chunk])
+
+
+def make_client(body: bytes, chunk: int) -> GeminiClient:
+    client = GeminiClient(url=URL, api_key="bench-key", timeout=30)
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, stream=ChunkedBody(body, chunk))
+
+    client.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return client
+
+
+async def reencode_path(client: GeminiClient):
+    buffer = StringIO()
+    out = 0
+    first = None
+    started = time.perf_counter()
+    async for part in client.stream_generate("hi"):
+        buffer.write(part)
+        frame = f"data: {json.dumps(part, ensure_ascii=False)}\n\n".encode("utf-8")
+        if first is None:
+            first = time.perf_counter() - started
+        out += len(frame)
+    return buffer.getvalue(), out, first
+
+
+async def passthrough_path(client: GeminiClient):
+    capture = RawStreamCapture()
+    out = 0
+    first = None
+    started = time.perf_counter()
+    async for view in client.stream_raw("hi", capture):
+        if first is None:
+            first = time.perf_counter() - started
+        out += len(view)
+    # persistence-side decode, after the last byte
+    return capture.text(), out, first
+
+
+async def transport_path(client: GeminiClient):
+    out = 0
+    first = None
+    started = time.perf_counter()
+    async with client.client.stream("POST", URL, json={}) as resp:
+        async for data in resp.aiter_raw():
+            if first is None:
+                first = time.perf_counter() - started
+            out += len(data)
+    return None, out, first
+
+
+def run(path, body: bytes, chunk: int, repeat: int):
+    best_cpu = float("inf")
+    ttfbs = []
+    text = ""
+    out = 0
+    for _ in range(repeat):
+        client = make_client(body, chunk)
+        cpu_start = time.process_time()
+        text, out, first = asyncio.run(path(client))
+        best_cpu = min(best_cpu, time.process_time() - cpu_start)
+        ttfbs.append(first)
+        asyncio.run(client.stop())
+    ttfbs.sort()
+    return best_cpu, ttfbs[len(ttfbs) // 2], text, out
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--mb", type=float, default=4.0, help="upstream stream size in MB")
+    ap.add_argument("--chunk", type=int, default=4096, help="upstream read size in bytes")
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    body = build_stream(int(args.mb * 1024 * 1024))
+    mb = len(body) / (1024 * 1024)
+    print(f"upstream: {mb:.2f} MB, read size {args.chunk} B")
+
+    texts = []
+    for name, path in (("transport", transport_path), ("reencode", reencode_path), ("passthrough", passthrough_path)):
+        cpu, ttfb, text, out = run(path, body, args.chunk, args.repeat)
+        if text is not None:
+            texts.append(text)
+        print(
+            f"{name:12s} cpu {cpu * 1000:8.1f} ms  {cpu * 1000 / mb:7.1f} ms/MB  "
+            f"ttfb {ttfb * 1000:6.2f} ms  out {out / (1024 * 1024):6.2f} MB"
+        )
+    print("persisted text identical:", texts[0] == texts[1])
+
+
+if __name__ == "__main__":
+    main()
@@ -1,37 +1,107 @@
 
 
-from typing import Optional
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
 from fastapi import Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 from src.application.ports.input.health_input_port import HealthInputPort
 from src.application.usecases.health_usecase import HealthUsecase
-from src.adapter.output.mysql.db.base import get_async_session_dependency
+from src.adapter.output.mysql.db.base import get_async_session, get_async_session_dependency
 from src.adapter.output.mysql.repositories.conversation_repository import ConversationRepository
 from src.adapter.output.mysql.repositories.message_repository import MessageRepository
+from src.adapter.output.mysql.repositories.cached_message_repository import CachedMessageRepository, history_cache
 from src.application.ports.input.conversation_input_port import ConversationInputPort
 from src.application.ports.output.conversation_output_port import ConversationOutputPort
 from src.application.ports.output.message_output_port import MessageOutputPort
 from src.application.usecases.conversation_usecase import ConversationUseCase
 from src.application.ports.input.gemini_input_port import GeminiInputPort
-from src.adapter.output.gemini.helper.gemini_client import GeminiClient
+from src.application.ports.input.transfer_input_port import TransferInputPort
+from src.adapter.output.gemini.helper.circuit_breaker import circuit_breakers
+from src.adapter.output.gemini.helper.concurrency_limiter import concurrency_limiter
+from src.adapter.output.gemini.helper.gemini_client_registry import gemini_client_registry
+from src.adapter.output.gemini.helper.hedging import hedger
+from src.adapter.output.gemini.helper.prompt_builder import prompt_fragments
+from src.adapter.output.gemini.helper.response_cache import response_cache
+from src.adapter.output.gemini.helper.single_flight import single_flight
 from src.adapter.output.gemini.service.gemini_service import GeminiService
-from src.application.usecases.gemini_usecase import GeminiUseCase
+from src.adapter.output.mysql.repositories.summary_repository import SummaryRepository
+from src.adapter.output.mysql.repositories.write_behind_message_repository import WriteBehindMessageRepository
+from src.adapter.worker.compaction_worker import compaction_worker
+from src.adapter.worker.message_persister import message_persister
+from src.application.config.config import settings
+from src.application.usecases.compaction_usecase import compaction_metrics
+from src.application.usecases.deadline import deadline_metrics
+from src.application.usecases.gemini_usecase import GeminiUseCase, stream_metrics, turn_metrics
+from src.application.usecases.stream_registry import stream_registry
+from src.application.usecases.transfer_usecase import ConversationTransferUseCase
 
 
 def _make_repos_and_ports(db: AsyncSession) -> tuple[ConversationOutputPort, MessageOutputPort, ConversationInputPort, HealthInputPort]:
     """Create DB-backed repositories and usecases using provided session."""
     conv_repo: ConversationOutputPort = ConversationRepository(db)
-    msg_repo: MessageOutputPort = MessageRepository(db)
+    db_repo = MessageRepository(db)
+    msg_repo: MessageOutputPort = db_repo
+    if history_cache.enabled:
+        # recent history is served from memory and written through on every save
+        msg_repo = CachedMessageRepository(db_repo, history_cache)
+    if message_persister.enabled:
+        # new messages are committed in background batches instead of on this session
+        msg_repo = WriteBehindMessageRepository(
+            msg_repo,
+            message_persister,
+            history_cache if history_cache.enabled else None,
+            durable=settings.MESSAGE_WRITE_BEHIND_AWAIT_DURABLE,
+            durable_timeout=settings.MESSAGE_WRITE_BEHIND_DURABLE_TIMEOUT_SECONDS,
+        )
     conv_input: ConversationInputPort = ConversationUseCase(conv_repo, msg_repo)
     health_input: HealthInputPort = HealthUsecase([conv_repo, msg_repo])
     return conv_repo, msg_repo, conv_input, health_input
 
 
-def _make_gemini_input_port(msg_repo: MessageOutputPort, conv_repo: ConversationOutputPort) -> GeminiInputPort:
-    """Create Gemini input port with provided repositories."""
-    client = GeminiClient()
+def _make_gemini_input_port(msg_repo: MessageOutputPort, conv_repo: ConversationOutputPort, db: Optional[AsyncSession] = None) -> GeminiInputPort:
+    """Create Gemini input port with provided repositories.
+
+    The upstream client is the app-wide shared instance, so connections are reused across requests.
+    Rolling summaries are wired in only when compaction is enabled and a session is given.
+    """
+    client = gemini_client_registry.get()
     svc = GeminiService(client)
-    return GeminiUseCase(svc, msg_repo, conv_repo)
+    # shared streams outlive the request, so their checkpoints go through a session of their own
+    shared = {"stream_registry": stream_registry, "open_stream_port": _open_stream_port}
+    if settings.GEMINI_COMPACTION_ENABLED and db is not None:
+        return GeminiUseCase(svc, msg_repo, conv_repo, SummaryRepository(db), compaction_worker.schedule, **shared)
+    return GeminiUseCase(svc, msg_repo, conv_repo, **shared)
+
+
+def _gemini_stats() -> Dict[str, Any]:
+    """Live counters of the shared upstream client and the app-wide helpers around it."""
+    return {
+        **gemini_client_registry.stats(),
+        "breakers": circuit_breakers.stats(),
+        "limiter": concurrency_limiter.stats(),
+        "cache": response_cache.stats(),
+        "single_flight": single_flight.stats(),
+        "hedging": hedger.stats(),
+        "compaction": compaction_metrics.stats(),
+        "history_cache": history_cache.stats(),
+        "prompt_fragments": prompt_fragments.stats(),
+        "turns": turn_metrics.stats(),
+        "streams": stream_metrics.stats(),
+        "persister": message_persister.stats(),
+        "stream_registry": stream_registry.stats(),
+        "deadlines": deadline_metrics.stats(),
+    }
+
+
+@asynccontextmanager
+async def _open_stream_port() -> AsyncIterator[MessageOutputPort]:
+    """Message port on a new session, for a generation running in its own task."""
+    db = get_async_session()
+    try:
+        _, msg_repo, _, _ = _make_repos_and_ports(db)
+        yield msg_repo
+    finally:
+        await db.close()
 
 class ServiceFactory:
     """Factory for creating services with proper dependency injection."""
@@ -69,4 +139,15 @@ class ServiceFactory:
         db: AsyncSession = Depends(get_async_session_dependency)
     ) -> GeminiInputPort:
         conv_repo, msg_repo, _, _ = _make_repos_and_ports(db)
-        return _make_gemini_input_port(msg_repo, conv_repo)
\ No newline at end of file
+        return _make_gemini_input_port(msg_repo, conv_repo, db)
+
+    @staticmethod
+    def get_transfer_input_port(
+        db: AsyncSession = Depends(get_async_session_dependency)
+    ) -> TransferInputPort:
+        conv_repo, msg_repo, _, _ = _make_repos_and_ports(db)
+        return ConversationTransferUseCase(conv_repo, msg_repo)
+
+    @staticmethod
+    def get_gemini_stats() -> Dict[str, Any]:
+        return _gemini_stats()
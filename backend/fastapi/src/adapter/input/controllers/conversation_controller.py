@@ -1,7 +1,10 @@
-from fastapi import APIRouter, Query, Depends
+from fastapi import APIRouter, Query, Depends, Request
+from fastapi.responses import StreamingResponse
 from typing import Optional, List
 from src.domain.vo.message_response import MessageResponse
 from src.application.ports.input.conversation_input_port import ConversationInputPort
+from src.application.ports.input.transfer_input_port import TransferInputPort
+from src.application.usecases.deadline import clear_request_deadline
 from src.domain.vo.conversation_response import ConversationResponse
 from src.domain.vo.conversation_update_request import ConversationUpdateRequest
 from src.domain.vo.list_response import ListResponse
@@ -18,13 +21,46 @@ async def list_conversations(
     after: Optional[str] = Query(None),
     limit: int = Query(10, gt=0),
     order: str = Query("desc", regex="^(asc|desc)$"),
+    sort: str = Query("created_at", regex="^(created_at|last_message_at)$"),
     conversation_service: ConversationInputPort = Depends(ServiceFactory.get_conversation_input_port)
 ):
-    """Cursor pagination: `after` is the id of the anchor element; return `limit` items after that anchor, skipping `offset` items, ordered by `created_at`."""
-    data = await conversation_service.get_conversation_list(limit=limit, after=after, order=order)
+    """Cursor pagination ordered by `sort` (`last_message_at`: recently active): `after` is the `next_cursor` / `prev_cursor` of a previous page (or, legacy, the id of the anchor element); return `limit` items past it."""
+    data = await conversation_service.get_conversation_list(limit=limit, after=after, order=order, sort=sort)
     return success_response(data=data, message="ok", status_code=200)
 
 
+@router.get("/export")
+async def export_conversations(
+    conversation_id: Optional[List[str]] = Query(None, description="only these conversations (repeatable)"),
+    transfer_service: TransferInputPort = Depends(ServiceFactory.get_transfer_input_port)
+):
+    """NDJSON dump: each conversation header followed by its messages, streamed from server-side cursors."""
+    async def body():
+        async for chunk in transfer_service.export_ndjson(conversation_id):
+            yield chunk
+            # the deadline covers the start of the export, not the whole dump
+            clear_request_deadline()
+
+    return StreamingResponse(
+        body(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="conversations.ndjson"'},
+    )
+
+
+@router.post("/import")
+async def import_conversations(
+    request: Request,
+    ignore_duplicates: bool = Query(True, description="skip conversations/messages whose id already exists"),
+    transfer_service: TransferInputPort = Depends(ServiceFactory.get_transfer_input_port)
+):
+    """Load an NDJSON body (as produced by /export), parsed as it arrives and written in batches."""
+    # a bulk load is not bound by the request deadline
+    clear_request_deadline()
+    stats = await transfer_service.import_ndjson(request.stream(), ignore_duplicates=ignore_duplicates)
+    return success_response(data=stats, message="imported", status_code=200)
+
+
 @router.get("/{conversation_id}", response_model=ConversationResponse)
 async def get_conversation(
     conversation_id: str,
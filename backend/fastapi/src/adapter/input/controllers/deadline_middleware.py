@@ -0,0 +1,60 @@
+"""ASGI middleware that gives every HTTP request its deadline.
+
+The timeout comes from the client's header (`REQUEST_DEADLINE_HEADER`), else
+from the route's default (`REQUEST_DEADLINE_ROUTE_SECONDS`, matched by path
+prefix below `API_PREFIX`), else `REQUEST_DEADLINE_DEFAULT_SECONDS`; it is
+capped at `REQUEST_DEADLINE_MAX_SECONDS`. A pure ASGI middleware (not
+BaseHTTPMiddleware), so the context variable is seen by the endpoint and by
+the body of a streaming response alike.
+"""
+from __future__ import annotations
+
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from src.application.config.config import settings
+from src.application.usecases.deadline import (
+    deadline_metrics,
+    parse_route_timeouts,
+    parse_timeout,
+    request_deadline,
+    route_timeout,
+)
+
+Scope = Dict[str, Any]
+Receive = Callable[[], Awaitable[Dict[str, Any]]]
+Send = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class DeadlineMiddleware:
+    def __init__(self, app: Callable[[Scope, Receive, Send], Awaitable[None]]):
+        self.app = app
+        self.enabled = settings.REQUEST_DEADLINE_ENABLED
+        self.header = settings.REQUEST_DEADLINE_HEADER.lower().encode("latin-1")
+        self.route_timeouts = parse_route_timeouts(settings.REQUEST_DEADLINE_ROUTE_SECONDS)
+        self.default_timeout = settings.REQUEST_DEADLINE_DEFAULT_SECONDS
+        self.max_timeout = settings.REQUEST_DEADLINE_MAX_SECONDS
+
+    def _timeout(self, scope: Scope) -> Optional[float]:
+        for name, value in scope.get("headers") or ():
+            if name == self.header:
+                timeout = parse_timeout(value.decode("latin-1"))
+                if timeout is not None:
+                    return min(timeout, self.max_timeout)
+        path = scope.get("path", "")
+        if path.startswith(settings.API_PREFIX):
+            path = path[len(settings.API_PREFIX):]
+        timeout = route_timeout(path, self.route_timeouts, self.default_timeout)
+        return min(timeout, self.max_timeout) if timeout is not None else None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        timeout = self._timeout(scope) if self.enabled and scope["type"] == "http" else None
+        if timeout is None:
+            await self.app(scope, receive, send)
+            return
+        deadline_metrics.record_request()
+        token = request_deadline.set(time.monotonic() + timeout)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            request_deadline.reset(token)
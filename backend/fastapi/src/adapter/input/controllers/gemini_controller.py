@@ -1,56 +1,194 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Header, Query, Request
 from fastapi.responses import StreamingResponse
-from typing import AsyncIterator
+from typing import Any, AsyncIterator, Dict, Optional
 from src.application.ports.input.gemini_input_port import GeminiInputPort
 from src.domain.vo.message_request import MessageRequest
 from src.adapter.factory.service_factory import ServiceFactory
 from src.adapter.input.controllers.response_utils import success_response
+from src.application.config.config import settings
+from src.adapter.output.gemini.helper.response_cache import cache_mode, parse_cache_control
+from src.application.usecases.deadline import clear_request_deadline
+from src.application.usecases.stream_registry import format_event_id, parse_event_id
 import json
+from contextlib import aclosing
 
 
 router = APIRouter(prefix="/gemini", tags=["gemini"])
 
+_STREAM_HEADERS = {
+    # Prevent proxies from buffering the response
+    "Cache-Control": "no-cache, no-transform",
+    # For nginx / proxy buffering bypass
+    "X-Accel-Buffering": "no",
+}
+
+
+def _data_frame(text: str, message_id: Optional[str], offset: int) -> bytes:
+    """SSE data frame; with `id: <message id>:<offset>` so EventSource reconnects send Last-Event-ID."""
+    frame = f"data: {json.dumps(text, ensure_ascii=False)}\n"
+    if message_id:
+        frame += f"id: {format_event_id(message_id, offset)}\n"
+    return (frame + "\n").encode("utf-8")
+
+
+def _replay(parts: AsyncIterator[str], gemini_service: GeminiInputPort, offset: int = 0) -> AsyncIterator[bytes]:
+    """Frames of a resumed or followed stream, ending with `event: status`."""
+
+    async def generator() -> AsyncIterator[bytes]:
+        sent = offset
+        async with aclosing(parts) as chunks:
+            async for chunk in chunks:
+                text = str(chunk)
+                sent += len(text)
+                yield _data_frame(text, gemini_service.get_stream_message_id(), sent)
+                # the deadline covers the wait for the first chunk, not the whole answer
+                clear_request_deadline()
+        status = gemini_service.get_stream_status()
+        if status:
+            yield f"event: status\ndata: {json.dumps(status)}\n\n".encode("utf-8")
+
+    return generator()
+
 
 @router.post("/query", response_model=str)
 async def query(
     message_request: MessageRequest = Depends(MessageRequest.as_body),
     gemini_service: GeminiInputPort = Depends(ServiceFactory.get_gemini_input_port),
+    cache_control: Optional[str] = Header(None),
 ):
-    """Synchronous (non-streaming) Gemini query returning the full assistant text."""
+    """Synchronous (non-streaming) Gemini query returning the full assistant text.
+
+    `Cache-Control: no-cache` skips the response cache lookup, `no-store` bypasses it entirely.
+    """
+    cache_mode.set(parse_cache_control(cache_control))
     resp = await gemini_service.query(message_request)
-    return success_response(data=resp, message="ok", status_code=200)
+    headers = {}
+    answered_model = gemini_service.get_answered_model()
+    if answered_model:
+        headers["X-Gemini-Model"] = answered_model
+    context = gemini_service.get_context_report()
+    if context:
+        headers["X-Context-Tokens"] = str(context["kept_tokens"])
+        headers["X-Context-Dropped-Messages"] = str(context["dropped_messages"])
+        headers["X-Context-Dropped-Tokens"] = str(context["dropped_tokens"])
+    turn = gemini_service.get_turn_report()
+    if turn:
+        if turn["db_round_trips"] is not None:
+            headers["X-DB-Round-Trips"] = str(turn["db_round_trips"])
+        headers["Server-Timing"] = f"pre-upstream;dur={turn['pre_upstream_ms']}"
+    return success_response(data=resp, message="ok", status_code=200, headers=headers)
 
 
 @router.post("/stream")
 async def query_stream(
+    request: Request,
     message_request: MessageRequest = Depends(MessageRequest.as_body),
     gemini_service: GeminiInputPort = Depends(ServiceFactory.get_gemini_input_port),
+    cache_control: Optional[str] = Header(None),
+    last_event_id: Optional[str] = Header(None),
+    passthrough: bool = Query(False, description="Relay Gemini's own SSE events (GenerateContentResponse JSON) untouched"),
 ):
     """Streaming endpoint: returns a streaming response of partial text chunks.
 
     The streaming generator yields plain text fragments. Clients can treat this as
     a simple text stream. For richer SSE behavior a transformation is possible.
+
+    With `?passthrough=true` the upstream SSE body is relayed byte for byte instead
+    (no re-framing, no `event: model` frame, no response cache).
+
+    Data frames carry `id: <message id>:<offset>`. A reconnect sending that id back as
+    `Last-Event-ID` resumes the same answer after `offset` characters instead of asking
+    again.
     """
+    resume_from = parse_event_id(last_event_id)
+    if resume_from is not None:
+        message_id, offset = resume_from
+        parts = await gemini_service.resume_stream(message_id, message_request.model, request.is_disconnected, offset)
+        return StreamingResponse(_replay(parts, gemini_service, offset), media_type="text/event-stream", headers=_STREAM_HEADERS)
+
+    # set before the stream is opened so the upstream call sees the same context
+    cache_mode.set(parse_cache_control(cache_control))
+    passthrough = passthrough and settings.GEMINI_STREAM_PASSTHROUGH_ENABLED
+    # the turn is admitted and stored before the response starts: a shed request still gets its 504
+    stream = await gemini_service.open_stream(message_request, request.is_disconnected, passthrough)
+    if passthrough:
+        return StreamingResponse(stream, media_type="text/event-stream", headers=_STREAM_HEADERS)
 
     async def generator() -> AsyncIterator[bytes]:
         # Yield Server-Sent Events (SSE) style 'data:' frames so clients such as
         # EventSource or curl can process parts immediately. Each event is
         # terminated by a blank line. This also tends to reduce buffering in
         # intermediate proxies.
-        async for chunk in gemini_service.query_stream(message_request):
-            if chunk is None:
-                continue
-            # Ensure chunk is a str and strip accidental newlines
-            text = str(chunk)
-            # SSE data frame
-            data = f"data: {json.dumps(text, ensure_ascii=False)}\n\n"
-            yield data.encode("utf-8")
-
-    headers = {
-        # Prevent proxies from buffering the response
-        "Cache-Control": "no-cache, no-transform",
-        # For nginx / proxy buffering bypass
-        "X-Accel-Buffering": "no",
-    }
-
-    return StreamingResponse(generator(), media_type="text/event-stream", headers=headers)
+        model_sent = False
+        sent = 0
+        # the upstream stream is closed as soon as the client disconnects
+        async with aclosing(stream) as chunks:
+            async for chunk in chunks:
+                if chunk is None:
+                    continue
+                # Ensure chunk is a str and strip accidental newlines
+                text = str(chunk)
+                sent += len(text)
+                # SSE data frame
+                yield _data_frame(text, gemini_service.get_stream_message_id(), sent)
+                if not model_sent:
+                    # the deadline covers the wait for the first chunk, not the whole answer
+                    clear_request_deadline()
+                    # named event so plain `data:` consumers ignore it; tells which fallback model answered
+                    model_sent = True
+                    answered_model = gemini_service.get_answered_model()
+                    if answered_model:
+                        yield f"event: model\ndata: {json.dumps(answered_model)}\n\n".encode("utf-8")
+                    # id of the checkpointed answer, for GET /gemini/stream/{id}/resume
+                    message_id = gemini_service.get_stream_message_id()
+                    if message_id:
+                        yield f"event: message\ndata: {json.dumps(message_id)}\n\n".encode("utf-8")
+
+    return StreamingResponse(generator(), media_type="text/event-stream", headers=_STREAM_HEADERS)
+
+
+@router.get("/stream/{message_id}/resume")
+async def resume_stream(
+    message_id: str,
+    request: Request,
+    gemini_service: GeminiInputPort = Depends(ServiceFactory.get_gemini_input_port),
+    model: Optional[str] = Query(None, description="Model used if the rest of an orphaned answer must be generated"),
+    last_event_id: Optional[str] = Header(None),
+):
+    """Resume a streamed answer by the id sent in its `event: message` frame.
+
+    A generation still running in this process is joined live. Otherwise the stored text
+    is replayed as one `data:` frame and, if the answer is still in progress, new text
+    follows as it is checkpointed (or is generated here when the original stream died).
+    With `Last-Event-ID: <message id>:<offset>` only the text after `offset` is sent.
+    The last frame is `event: status` with complete, aborted or in_progress.
+    """
+    offset = 0
+    resume_from = parse_event_id(last_event_id)
+    if resume_from is not None and resume_from[0] == message_id:
+        offset = resume_from[1]
+    parts = await gemini_service.resume_stream(message_id, model, request.is_disconnected, offset)
+    return StreamingResponse(_replay(parts, gemini_service, offset), media_type="text/event-stream", headers=_STREAM_HEADERS)
+
+
+@router.get("/conversations/{conversation_id}/stream")
+async def follow_conversation(
+    conversation_id: str,
+    request: Request,
+    gemini_service: GeminiInputPort = Depends(ServiceFactory.get_gemini_input_port),
+):
+    """Follow the answer being streamed in a conversation (e.g. from a second tab), from its start.
+
+    404 when no answer of the conversation is streaming or was streamed within the
+    registry's TTL. The last frame is `event: status`.
+    """
+    parts = await gemini_service.follow_conversation(conversation_id, request.is_disconnected)
+    return StreamingResponse(_replay(parts, gemini_service), media_type="text/event-stream", headers=_STREAM_HEADERS)
+
+
+@router.get("/stats")
+async def stats(
+    payload: Dict[str, Any] = Depends(ServiceFactory.get_gemini_stats),
+):
+    """Live counters of the shared upstream client and its helpers."""
+    return success_response(data=payload, message="ok", status_code=200)
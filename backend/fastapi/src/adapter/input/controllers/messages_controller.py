@@ -8,6 +8,7 @@ from src.domain.vo.list_response import ListResponse
 from src.domain.vo.message_update_request import MessageUpdateRequest
 from src.domain.models.message_domain import MessageDomain
 from src.adapter.input.controllers.response_utils import success_response
+from src.application.usecases.pagination import messages_scope, page_response, parse_after
 
 
 router = APIRouter(prefix="/messages", tags=["messages"])
@@ -21,13 +22,17 @@ async def list_messages(
     order: str = Query("desc", regex="^(asc|desc)$"),
     message_repo: MessageOutputPort = Depends(ServiceFactory.get_message_output_port),
 ):
-    """List messages. If `conversation_id` is provided, returns messages for that conversation (cursor pagination)."""
+    """List messages. If `conversation_id` is provided, returns messages for that conversation (cursor pagination).
+
+    `after` is a `next_cursor` / `prev_cursor` from a previous page, or (legacy) a message id.
+    """
     if conversation_id:
-        messages, has_more = await message_repo.get_list_by_conversation(conversation_id, after, limit, order)
+        scope = messages_scope(conversation_id)
+        after_id, cursor = parse_after(after, scope)
+        order = cursor.order if cursor is not None else order
+        messages, has_more = await message_repo.get_list_by_conversation(conversation_id, after_id, limit, order, cursor)
         data: List[MessageResponse] = [MessageResponse.from_domain(m) for m in messages]
-        first_id = data[0].id if data else None
-        last_id = data[-1].id if data else None
-        payload = ListResponse[MessageResponse](data=data, first_id=first_id, last_id=last_id, has_more=has_more)
+        payload = page_response(data, has_more, order, scope, cursor, paged=after_id is not None)
         return success_response(data=payload, message="ok", status_code=200)
     # If no conversation_id provided, return empty list
     payload = ListResponse[MessageResponse](data=[], first_id=None, last_id=None, has_more=False)
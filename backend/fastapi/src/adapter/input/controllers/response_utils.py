@@ -1,5 +1,5 @@
 from fastapi.responses import JSONResponse
-from typing import Any
+from typing import Any, Dict, Optional
 
 from pydantic import BaseModel
 
@@ -13,11 +13,11 @@ def to_serializable(obj: Any):
     return obj
 
 
-def success_response(data: Any = None, message: str = "OK", status_code: int = 200) -> JSONResponse:
+def success_response(data: Any = None, message: str = "OK", status_code: int = 200, headers: Optional[Dict[str, str]] = None) -> JSONResponse:
     payload = {"status_code": status_code, "message": message, "data": to_serializable(data)}
-    return JSONResponse(content=payload, status_code=status_code)
+    return JSONResponse(content=payload, status_code=status_code, headers=headers)
 
 
-def error_response(message: str = "Error", status_code: int = 500, data: Any = None) -> JSONResponse:
+def error_response(message: str = "Error", status_code: int = 500, data: Any = None, headers: Optional[Dict[str, str]] = None) -> JSONResponse:
     payload = {"status_code": status_code, "message": message, "data": to_serializable(data)}
-    return JSONResponse(content=payload, status_code=status_code)
+    return JSONResponse(content=payload, status_code=status_code, headers=headers)
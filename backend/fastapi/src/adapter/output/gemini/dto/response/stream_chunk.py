@@ -0,0 +1,30 @@
+from typing import Any, Dict, Optional
+from pydantic import BaseModel, Field
+
+from src.adapter.output.gemini.dto.response.response import UsageMetadata
+
+
+class StreamChunk(BaseModel):
+    """Base type for items yielded while parsing a streamGenerateContent response."""
+    candidate_index: int = 0
+
+
+class TextDelta(StreamChunk):
+    text: str
+    # True for thought-summary parts (only sent when thinking output is requested)
+    thought: bool = False
+
+
+class FunctionCallDelta(StreamChunk):
+    name: str
+    args: Dict[str, Any] = Field(default_factory=dict)
+
+
+class FinishReasonChunk(StreamChunk):
+    reason: str
+
+
+class UsageChunk(StreamChunk):
+    usage: UsageMetadata
+    model_version: Optional[str] = None
+    response_id: Optional[str] = None
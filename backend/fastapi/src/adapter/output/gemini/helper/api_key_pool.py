@@ -0,0 +1,226 @@
+"""Pool of Gemini API keys with per-key rate tracking.
+
+Each key has RPM/TPM token buckets (optional, from settings), an in-flight
+counter and a quarantine deadline. Selection is weighted least-loaded: the
+usable key with the lowest `in_flight / weight` wins, ties broken round-robin.
+Keys that receive HTTP 429 are quarantined for `Retry-After` (or the
+configured default) so traffic shifts to the remaining keys.
+"""
+from __future__ import annotations
+
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+from src.application.config.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class GeminiKeyPoolExhaustedError(RuntimeError):
+    """Raised when every configured key is quarantined or out of request budget."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Classic token bucket; `capacity <= 0` disables the limit."""
+
+    def __init__(self, capacity: float, refill_per_second: float):
+        self.capacity = float(capacity)
+        self.refill_per_second = float(refill_per_second)
+        self.tokens = float(capacity)
+        self._updated = time.monotonic()
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.refill_per_second)
+        self._updated = now
+
+    def available(self) -> float:
+        if not self.enabled:
+            return float("inf")
+        self._refill()
+        return self.tokens
+
+    def consume(self, amount: float) -> None:
+        """Take tokens unconditionally; the balance may go negative (debt from observed usage)."""
+        if not self.enabled:
+            return
+        self._refill()
+        self.tokens -= amount
+
+    def drain(self) -> None:
+        if self.enabled:
+            self._refill()
+            self.tokens = min(self.tokens, 0.0)
+
+    def seconds_until(self, amount: float) -> float:
+        if not self.enabled or self.refill_per_second <= 0:
+            return 0.0
+        missing = amount - self.available()
+        return max(0.0, missing / self.refill_per_second)
+
+
+class ApiKeyState:
+    def __init__(self, key: str, weight: float = 1.0, rpm: int = 0, tpm: int = 0):
+        self.key = key
+        self.weight = weight if weight > 0 else 1.0
+        self.rpm = TokenBucket(rpm, rpm / 60.0)
+        self.tpm = TokenBucket(tpm, tpm / 60.0)
+        self.in_flight = 0
+        self.requests = 0
+        self.tokens = 0
+        self.rate_limited = 0
+        self.errors = 0
+        self.quarantined_until = 0.0
+
+    @property
+    def label(self) -> str:
+        # never expose full keys in metrics or logs
+        return f"...{self.key[-4:]}" if len(self.key) > 4 else "****"
+
+    def is_quarantined(self, now: float) -> bool:
+        return now < self.quarantined_until
+
+    def is_usable(self, now: float) -> bool:
+        return not self.is_quarantined(now) and self.rpm.available() >= 1 and self.tpm.available() > 0
+
+    def wait_time(self, now: float) -> float:
+        return max(self.quarantined_until - now, self.rpm.seconds_until(1), self.tpm.seconds_until(1))
+
+    def stats(self, now: float) -> Dict[str, Any]:
+        return {
+            "key": self.label,
+            "weight": self.weight,
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "tokens": self.tokens,
+            "rate_limited": self.rate_limited,
+            "errors": self.errors,
+            "quarantined": self.is_quarantined(now),
+            "quarantine_remaining_seconds": round(max(0.0, self.quarantined_until - now), 3),
+            "rpm_available": None if not self.rpm.enabled else round(self.rpm.available(), 2),
+            "tpm_available": None if not self.tpm.enabled else round(self.tpm.available(), 2),
+        }
+
+
+class ApiKeyLease:
+    """One request's hold on a key. Report the outcome, then release (or use as a context manager)."""
+
+    def __init__(self, pool: "ApiKeyPool", state: ApiKeyState):
+        self._pool = pool
+        self._state = state
+        self._released = False
+
+    @property
+    def key(self) -> str:
+        return self._state.key
+
+    def record_usage(self, total_tokens: Optional[int]) -> None:
+        if total_tokens:
+            self._state.tokens += int(total_tokens)
+            self._state.tpm.consume(int(total_tokens))
+
+    def record_status(self, status_code: int, retry_after: Optional[float] = None) -> None:
+        if status_code == 429:
+            self._pool.quarantine(self._state, retry_after)
+        elif status_code >= 400:
+            self._state.errors += 1
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self._state.in_flight -= 1
+
+    def __enter__(self) -> "ApiKeyLease":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.release()
+
+
+class ApiKeyPool:
+    def __init__(self, keys: List[ApiKeyState], quarantine_seconds: float = 60.0):
+        self.keys = keys
+        self.quarantine_seconds = quarantine_seconds
+        self._rr = 0
+
+    @classmethod
+    def parse_keys(cls, raw: Optional[str]) -> List[tuple[str, float]]:
+        """Parse "key1,key2:3" into [(key1, 1.0), (key2, 3.0)]; `:weight` is optional."""
+        parsed: List[tuple[str, float]] = []
+        for item in (raw or "").split(","):
+            item = item.strip()
+            if not item:
+                continue
+            key, _, weight = item.partition(":")
+            try:
+                parsed.append((key.strip(), float(weight) if weight else 1.0))
+            except ValueError:
+                parsed.append((item, 1.0))
+        return parsed
+
+    @classmethod
+    def from_settings(cls, api_key: Optional[str] = None) -> "ApiKeyPool":
+        entries = cls.parse_keys(api_key) if api_key else cls.parse_keys(settings.GEMINI_API_KEYS)
+        if not entries and settings.GEMINI_API_KEY:
+            entries = [(settings.GEMINI_API_KEY, 1.0)]
+        if not entries:
+            # keep the previous behaviour of sending an empty key header
+            entries = [("", 1.0)]
+        states = [
+            ApiKeyState(key, weight, settings.GEMINI_API_KEY_RPM_LIMIT, settings.GEMINI_API_KEY_TPM_LIMIT)
+            for key, weight in entries
+        ]
+        return cls(states, settings.GEMINI_API_KEY_QUARANTINE_SECONDS)
+
+    @property
+    def primary_key(self) -> str:
+        return self.keys[0].key
+
+    def acquire(self) -> ApiKeyLease:
+        now = time.monotonic()
+        count = len(self.keys)
+        best: Optional[ApiKeyState] = None
+        best_load = 0.0
+        for offset in range(count):
+            state = self.keys[(self._rr + offset) % count]
+            if not state.is_usable(now):
+                continue
+            load = state.in_flight / state.weight
+            if best is None or load < best_load:
+                best, best_load = state, load
+        if best is None:
+            retry_after = min(s.wait_time(now) for s in self.keys)
+            raise GeminiKeyPoolExhaustedError(
+                f"All {count} Gemini API key(s) are rate limited; retry in {retry_after:.1f}s",
+                retry_after=retry_after,
+            )
+        self._rr = (self._rr + 1) % count
+        best.in_flight += 1
+        best.requests += 1
+        best.rpm.consume(1)
+        return ApiKeyLease(self, best)
+
+    def has_usable_key(self) -> bool:
+        """Whether `acquire` would succeed right now."""
+        now = time.monotonic()
+        return any(s.is_usable(now) for s in self.keys)
+
+    def quarantine(self, state: ApiKeyState, retry_after: Optional[float] = None) -> None:
+        seconds = retry_after if retry_after is not None else self.quarantine_seconds
+        state.rate_limited += 1
+        state.quarantined_until = max(state.quarantined_until, time.monotonic() + seconds)
+        state.rpm.drain()
+        logger.warning("Gemini API key %s rate limited; quarantined for %.1fs", state.label, seconds)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        now = time.monotonic()
+        return [s.stats(now) for s in self.keys]
@@ -0,0 +1,151 @@
+"""Per-model circuit breakers for the Gemini upstream.
+
+A breaker tracks the last `window_size` calls to one model. It opens when,
+after at least `min_calls`, either the failure rate or the slow-call rate
+crosses its threshold. While open, calls are rejected immediately; after
+`open_seconds` a single probe is let through (half-open) and its outcome
+closes or re-opens the breaker.
+"""
+from __future__ import annotations
+
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from src.application.config.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitState:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        window_size: int = 20,
+        min_calls: int = 5,
+        failure_rate: float = 0.5,
+        slow_call_seconds: float = 30.0,
+        slow_call_rate: float = 0.8,
+        open_seconds: float = 30.0,
+    ):
+        self.name = name
+        self.window_size = window_size
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.state = CircuitState.CLOSED
+        # (failed, slow) per call
+        self._window: Deque[Tuple[bool, bool]] = deque(maxlen=window_size)
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self.rejected = 0
+        self.opened = 0
+
+    @classmethod
+    def from_settings(cls, name: str) -> "CircuitBreaker":
+        return cls(
+            name,
+            window_size=settings.GEMINI_BREAKER_WINDOW_SIZE,
+            min_calls=settings.GEMINI_BREAKER_MIN_CALLS,
+            failure_rate=settings.GEMINI_BREAKER_FAILURE_RATE,
+            slow_call_seconds=settings.GEMINI_BREAKER_SLOW_CALL_SECONDS,
+            slow_call_rate=settings.GEMINI_BREAKER_SLOW_CALL_RATE,
+            open_seconds=settings.GEMINI_BREAKER_OPEN_SECONDS,
+        )
+
+    def retry_after(self) -> float:
+        if self.state != CircuitState.OPEN:
+            return 0.0
+        return max(0.0, self._opened_at + self.open_seconds - time.monotonic())
+
+    def allow(self) -> bool:
+        """Return True if a call may proceed; every allowed call must be followed by record() or release()."""
+        if self.state == CircuitState.OPEN:
+            if time.monotonic() - self._opened_at < self.open_seconds:
+                self.rejected += 1
+                return False
+            self.state = CircuitState.HALF_OPEN
+            self._probe_in_flight = False
+        if self.state == CircuitState.HALF_OPEN:
+            if self._probe_in_flight:
+                self.rejected += 1
+                return False
+            self._probe_in_flight = True
+        return True
+
+    def release(self) -> None:
+        """End an allowed call that never reached the model; nothing is recorded."""
+        if self.state == CircuitState.HALF_OPEN:
+            self._probe_in_flight = False
+
+    def record(self, success: bool, latency: float = 0.0) -> None:
+        slow = latency >= self.slow_call_seconds
+        if self.state == CircuitState.HALF_OPEN:
+            self._probe_in_flight = False
+            if success and not slow:
+                logger.info("Circuit for %s closed after successful probe", self.name)
+                self.state = CircuitState.CLOSED
+                self._window.clear()
+            else:
+                self._open()
+            return
+        self._window.append((not success, slow))
+        if len(self._window) < self.min_calls:
+            return
+        total = len(self._window)
+        failures = sum(1 for failed, _ in self._window if failed)
+        slows = sum(1 for _, s in self._window if s)
+        if failures / total >= self.failure_rate or slows / total >= self.slow_call_rate:
+            self._open()
+
+    def _open(self) -> None:
+        if self.state != CircuitState.OPEN:
+            self.opened += 1
+            logger.warning("Circuit for %s opened for %.0fs", self.name, self.open_seconds)
+        self.state = CircuitState.OPEN
+        self._opened_at = time.monotonic()
+        self._window.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        total = len(self._window)
+        return {
+            "state": self.state,
+            "calls_in_window": total,
+            "failure_rate": round(sum(1 for f, _ in self._window if f) / total, 3) if total else 0.0,
+            "slow_call_rate": round(sum(1 for _, s in self._window if s) / total, 3) if total else 0.0,
+            "opened": self.opened,
+            "rejected": self.rejected,
+            "retry_after_seconds": round(self.retry_after(), 3),
+        }
+
+
+class CircuitBreakerRegistry:
+    """One breaker per model name, created on first use."""
+
+    def __init__(self) -> None:
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def get(self, name: str) -> CircuitBreaker:
+        breaker = self._breakers.get(name)
+        if breaker is None:
+            breaker = self._breakers[name] = CircuitBreaker.from_settings(name)
+        return breaker
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {name: b.stats() for name, b in self._breakers.items()}
+
+
+def parse_fallback_chain(raw: Optional[str]) -> list[str]:
+    return [m.strip() for m in (raw or "").split(",") if m.strip()]
+
+
+circuit_breakers = CircuitBreakerRegistry()
@@ -0,0 +1,231 @@
+"""Adaptive concurrency limit for upstream Gemini calls.
+
+The limit follows AIMD: every healthy sample grows the limit by `1 / limit`
+(about +1 per round of calls), and an overloaded one multiplies it by
+`backoff_ratio`. A sample is overloaded on a 429/5xx from upstream, or when
+the recent time-to-first-byte average rises above `latency_tolerance` x its
+long-term average (a latency gradient). Only time to first byte is compared:
+total call time mostly measures how long the answer is, not how loaded the
+upstream is, and a single slow sample moves the recent average only a little.
+
+Calls beyond the limit wait FIFO in a bounded queue for at most
+`queue_timeout` seconds. A full queue or an expired wait raises
+`ConcurrencyLimitExceededError` with a Retry-After estimate; the wait is also
+cut to the time left for the request, and running out of that raises
+`DeadlineExceededError` instead.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+from src.application.config.config import settings
+from src.application.exceptions.exceptions import DeadlineExceededError
+from src.application.usecases.deadline import bounded_timeout, deadline_expired, deadline_metrics
+
+logger = logging.getLogger(__name__)
+
+# smoothing of the recent (~10 samples) and long-term (~100 samples) time-to-first-byte averages
+_RECENT_ALPHA = 0.1
+_LONG_ALPHA = 0.01
+# time-to-first-byte samples needed before latency may signal overload
+_WARMUP_SAMPLES = 20
+# smoothing factor for the latency / wait time averages reported in stats
+_EWMA_ALPHA = 0.2
+
+
+class ConcurrencyLimitExceededError(RuntimeError):
+    """Raised when the wait queue is full or a queued call waited past its deadline."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class LimiterPermit:
+    """One slot of the limit. Release exactly once with the call's latency and outcome."""
+
+    def __init__(self, limiter: "AdaptiveConcurrencyLimiter", started: float):
+        self._limiter = limiter
+        self.started = started
+        self._released = False
+
+    def release(self, latency: Optional[float] = None, overloaded: bool = False, first_byte: Optional[float] = None) -> None:
+        """Return the slot.
+
+        `latency` is how long the slot was held; `None` (e.g. the caller went away)
+        gives no sample. `first_byte` is the time to the first upstream byte, the
+        only latency compared for overload; unary calls have none, since their
+        response arrives only once the whole answer is generated.
+        """
+        if self._released:
+            return
+        self._released = True
+        self._limiter._on_release(self, latency, overloaded, first_byte)
+
+
+class AdaptiveConcurrencyLimiter:
+    def __init__(
+        self,
+        initial_limit: int = 20,
+        min_limit: int = 2,
+        max_limit: int = 200,
+        backoff_ratio: float = 0.9,
+        latency_tolerance: float = 2.0,
+        max_queue: int = 100,
+        queue_timeout: float = 10.0,
+        enabled: bool = True,
+    ):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = float(min(self.max_limit, max(self.min_limit, initial_limit)))
+        self.backoff_ratio = backoff_ratio
+        self.latency_tolerance = latency_tolerance
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.enabled = enabled
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._first_byte_samples = 0
+        self._first_byte_recent = 0.0
+        self._first_byte_long = 0.0
+        self._last_decrease = 0.0
+        self.latency_ewma = 0.0
+        self.wait_ewma = 0.0
+        self.max_wait = 0.0
+        self.acquired = 0
+        self.queued = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.decreases = 0
+
+    @classmethod
+    def from_settings(cls) -> "AdaptiveConcurrencyLimiter":
+        return cls(
+            initial_limit=settings.GEMINI_LIMITER_INITIAL_LIMIT,
+            min_limit=settings.GEMINI_LIMITER_MIN_LIMIT,
+            max_limit=settings.GEMINI_LIMITER_MAX_LIMIT,
+            backoff_ratio=settings.GEMINI_LIMITER_BACKOFF_RATIO,
+            latency_tolerance=settings.GEMINI_LIMITER_LATENCY_TOLERANCE,
+            max_queue=settings.GEMINI_LIMITER_MAX_QUEUE,
+            queue_timeout=settings.GEMINI_LIMITER_QUEUE_TIMEOUT_SECONDS,
+            enabled=settings.GEMINI_LIMITER_ENABLED,
+        )
+
+    def _has_capacity(self) -> bool:
+        return not self.enabled or self.in_flight < int(self.limit)
+
+    def _retry_after(self) -> float:
+        # time for the calls ahead of us to drain at the current limit
+        per_call = self.latency_ewma or 1.0
+        return max(1.0, per_call * (len(self._waiters) + 1) / max(1, int(self.limit)))
+
+    def _grant(self, waited: float) -> LimiterPermit:
+        self.in_flight += 1
+        self.acquired += 1
+        self.wait_ewma += _EWMA_ALPHA * (waited - self.wait_ewma)
+        self.max_wait = max(self.max_wait, waited)
+        return LimiterPermit(self, time.monotonic())
+
+    async def acquire(self) -> LimiterPermit:
+        if self._has_capacity() and not self._waiters:
+            return self._grant(0.0)
+        if len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            raise ConcurrencyLimitExceededError(
+                f"Gemini upstream is at its concurrency limit ({int(self.limit)}) and the wait queue is full",
+                retry_after=self._retry_after(),
+            )
+        self.queued += 1
+        enqueued = time.monotonic()
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout=bounded_timeout(self.queue_timeout))
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            if deadline_expired():
+                deadline_metrics.record_shed("limiter")
+                raise DeadlineExceededError("Request deadline exceeded waiting for a Gemini upstream slot") from None
+            raise ConcurrencyLimitExceededError(
+                f"Timed out after {self.queue_timeout:.1f}s waiting for a Gemini upstream slot",
+                retry_after=self._retry_after(),
+            ) from None
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # the slot was handed over just as we were cancelled; give it back
+                self.in_flight -= 1
+                self._wake()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+        # _wake() already counted the slot in in_flight
+        self.in_flight -= 1
+        return self._grant(time.monotonic() - enqueued)
+
+    def _wake(self) -> None:
+        while self._waiters and self._has_capacity():
+            waiter = self._waiters.popleft()
+            if waiter.done():
+                continue
+            self.in_flight += 1
+            waiter.set_result(None)
+
+    def _on_release(self, permit: LimiterPermit, latency: Optional[float], overloaded: bool, first_byte: Optional[float]) -> None:
+        self.in_flight -= 1
+        if latency is not None:
+            self._observe(permit, latency, overloaded, first_byte)
+        self._wake()
+
+    def _first_byte_rising(self, first_byte: float) -> bool:
+        if not self._first_byte_samples:
+            self._first_byte_recent = self._first_byte_long = first_byte
+        else:
+            self._first_byte_recent += _RECENT_ALPHA * (first_byte - self._first_byte_recent)
+            self._first_byte_long += _LONG_ALPHA * (first_byte - self._first_byte_long)
+        self._first_byte_samples += 1
+        return (
+            self._first_byte_samples >= _WARMUP_SAMPLES
+            and self._first_byte_recent > self._first_byte_long * self.latency_tolerance
+        )
+
+    def _observe(self, permit: LimiterPermit, latency: float, overloaded: bool, first_byte: Optional[float]) -> None:
+        self.latency_ewma = latency if not self.latency_ewma else self.latency_ewma + _EWMA_ALPHA * (latency - self.latency_ewma)
+        if first_byte is not None and self._first_byte_rising(first_byte):
+            overloaded = True
+        if overloaded:
+            # calls started before the last decrease reflect the old limit; decrease once per round
+            if permit.started >= self._last_decrease:
+                self.limit = max(float(self.min_limit), self.limit * self.backoff_ratio)
+                self._last_decrease = time.monotonic()
+                self.decreases += 1
+                logger.info("Gemini concurrency limit decreased to %d", int(self.limit))
+        elif self.in_flight + 1 >= int(self.limit) * 0.5:
+            # only grow while the limit is actually being used
+            self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "queue_depth": len(self._waiters),
+            "max_queue": self.max_queue,
+            "acquired": self.acquired,
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "decreases": self.decreases,
+            "first_byte_recent_seconds": round(self._first_byte_recent, 4),
+            "first_byte_baseline_seconds": round(self._first_byte_long, 4),
+            "latency_ewma_seconds": round(self.latency_ewma, 4),
+            "wait_ewma_seconds": round(self.wait_ewma, 4),
+            "max_wait_seconds": round(self.max_wait, 4),
+        }
+
+
+concurrency_limiter = AdaptiveConcurrencyLimiter.from_settings()
@@ -1,50 +1,151 @@
 from typing import Any, Dict, Optional, AsyncIterator
-from httpx import AsyncClient, HTTPStatusError, RequestError, Timeout, Limits
+import json
+import time
+from httpx import AsyncClient, HTTPStatusError, RequestError, Timeout, TimeoutException, Limits
 import logging
-from urllib.parse import urlparse, urlunparse
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
 from src.application.config.config import settings
 from src.domain.enums.enums import ERole
+from src.adapter.output.gemini.dto.response.stream_chunk import StreamChunk, TextDelta, UsageChunk
+from src.adapter.output.gemini.helper.stream_parser import GeminiStreamParser, RawStreamCapture, iter_chunks
+from src.adapter.output.gemini.helper.prompt_builder import PreparedPrompt
+from src.adapter.output.gemini.helper.api_key_pool import ApiKeyPool, ApiKeyLease, GeminiKeyPoolExhaustedError
+from src.adapter.output.gemini.helper.retry_policy import RetryPolicy, retry_after_seconds
+from src.application.exceptions.exceptions import DeadlineExceededError, ServiceUnavailableError
+from src.application.usecases.deadline import bounded_timeout, deadline_expired, deadline_metrics, ensure_time_left
 import asyncio
-import json
-import re
+from contextlib import aclosing
 
 
 class GeminiClientError(RuntimeError):
-    pass
+    def __init__(self, message: str = "", status_code: Optional[int] = None):
+        super().__init__(message)
+        # upstream HTTP status when the failure came from a response, None for transport/config errors
+        self.status_code = status_code
+
+
+def _record_status(lease: ApiKeyLease, exc: HTTPStatusError) -> None:
+    if exc.response is not None:
+        lease.record_status(exc.response.status_code, retry_after_seconds(exc.response))
+
+
+_AUTH_HINT = (
+    "Request had invalid authentication credentials.\n"
+    "Set GEMINI_API_KEY to a valid API key and ensure the endpoint accepts API-key-based authentication.\n"
+    "If you previously relied on OAuth/bearer tokens, that flow has been removed — switch to an API key or re-enable OAuth support."
+)
+
+
+def _to_client_error(exc: Exception, action: str) -> Exception:
+    if isinstance(exc, TimeoutException) and deadline_expired():
+        # cut short by the request's deadline: not a sign of an unhealthy upstream
+        deadline_metrics.record_shed("upstream")
+        return DeadlineExceededError(f"Request deadline exceeded while {action} Gemini API")
+    if isinstance(exc, HTTPStatusError):
+        body = exc.response.text if exc.response is not None else ""
+        status = exc.response.status_code if exc.response is not None else "?"
+        if status == 401:
+            # More actionable error message for auth failures when using API keys
+            return GeminiClientError(f"Gemini API returned HTTP 401: {body}\n{_AUTH_HINT}", status_code=401)
+        return GeminiClientError(
+            f"Gemini API returned HTTP {status}: {body}",
+            status_code=status if isinstance(status, int) else None,
+        )
+    return GeminiClientError(f"Request error while {action} Gemini API: {exc}")
+
+
+def _total_tokens(raw: Any) -> Optional[int]:
+    if isinstance(raw, dict):
+        usage = raw.get("usageMetadata") or {}
+        return usage.get("totalTokenCount")
+    return None
 
 
 class GeminiClient:
     """Async HTTP client for calling Gemini-like LLM endpoints.
 
-    Uses AsyncClient under the hood and retries transient network errors.
+    Uses AsyncClient under the hood; transient failures (transport errors, 429/5xx)
+    are retried by a RetryPolicy shared by unary and streaming calls.
     """
     def __init__(
         self,
         url: Optional[str] = None,
         api_key: Optional[str] = None,
         timeout: Optional[int] = None,
+        retry_policy: Optional[RetryPolicy] = None,
     ):
         self.url = url or settings.GEMINI_URL
-        self.api_key = api_key or settings.GEMINI_API_KEY or ""
+        # An explicit api_key (comma-separated keys allowed) overrides GEMINI_API_KEYS / GEMINI_API_KEY.
+        self.key_pool: ApiKeyPool = ApiKeyPool.from_settings(api_key)
+        self.api_key = self.key_pool.primary_key
         self.timeout = timeout or settings.GEMINI_TIMEOUT_SECONDS
-        # Enable HTTP/2 when available and set modest connection limits for better throughput.
-        # Keep a single shared client to reuse connections.
+        self.retry_policy: RetryPolicy = retry_policy or RetryPolicy()
+        # Enable HTTP/2 when available and set connection limits from settings.
+        # A single instance is shared app-wide (see GeminiClientRegistry) to reuse connections.
         self.client: AsyncClient = AsyncClient(
             timeout=self.timeout,
-            http2=True,
-            limits=Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=60.0),
+            http2=settings.GEMINI_HTTP2,
+            limits=Limits(
+                max_connections=settings.GEMINI_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.GEMINI_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.GEMINI_KEEPALIVE_EXPIRY_SECONDS,
+            ),
         )
+        # live counters reported by stats()
+        self.active_requests: int = 0
+        self.active_streams: int = 0
+        self.warmups: int = 0
+        # monotonic time of the last upstream response; the pool is cold once it is older
+        # than the keepalive expiry and nothing is in flight
+        self.keepalive_expiry = settings.GEMINI_KEEPALIVE_EXPIRY_SECONDS
+        self._last_used: Optional[float] = None
+        self._warm_up_task: Optional[asyncio.Future] = None
         self.headers: Dict[str, str] = {
             "Content-Type": "application/json",
             # Prefer JSON streaming as returned by Google for streamGenerateContent
             "Accept": "application/json",
             "x-goog-api-key": self.api_key,
         }
+
+    def _headers_for(self, key: str) -> Dict[str, str]:
+        headers = self.headers.copy()
+        headers["x-goog-api-key"] = key
+        return headers
     
     async def stop(self) -> None:
         if self.client is not None:
             await self.client.aclose()
+
+    @property
+    def is_closed(self) -> bool:
+        return self.client.is_closed
+
+    def _pool_connections(self) -> list:
+        # httpx does not expose pool state publicly; read the httpcore pool defensively.
+        pool = getattr(getattr(self.client, "_transport", None), "_pool", None)
+        return list(getattr(pool, "connections", None) or [])
+
+    def stats(self) -> Dict[str, Any]:
+        """Return live connection and stream counts for the shared connection pool."""
+        connections = self._pool_connections()
+        idle = 0
+        for conn in connections:
+            try:
+                if conn.is_idle():
+                    idle += 1
+            except Exception:
+                continue
+        return {
+            "connections": len(connections),
+            "idle_connections": idle,
+            "active_requests": self.active_requests,
+            "active_streams": self.active_streams,
+            "warmups": self.warmups,
+            "closed": self.is_closed,
+        }
+
+    def retry_stats(self) -> Dict[str, Any]:
+        return self.retry_policy.stats()
             
     async def health_check(self) -> bool:
         """Perform a simple health check by sending a request to the base URL."""
@@ -58,10 +159,48 @@ class GeminiClient:
             logging.error(f"GeminiClient health check failed: {exc}")
             return False
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=1, max=10),
-           retry=retry_if_exception_type(RequestError))
-    async def _post(self, url: str, json: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
-        resp = await self.client.post(url, json=json, headers=headers)
+    def _pool_cold(self) -> bool:
+        """No pooled connection is likely left: nothing in flight and none used within the keepalive expiry."""
+        if self.active_requests or self.active_streams:
+            return False
+        return self._last_used is None or time.monotonic() - self._last_used >= self.keepalive_expiry
+
+    async def ensure_connection(self) -> bool:
+        """Open an upstream connection if the pool is cold.
+
+        Meant to run concurrently with request preparation (DB work) so TCP/TLS setup
+        overlaps it. Concurrent callers share one warm-up, and a warm pool gets none, so
+        a burst of turns sends at most one extra request. Returns True if a connection
+        was opened.
+        """
+        if not self.url or self.is_closed:
+            return False
+        task = self._warm_up_task
+        if task is None or task.done():
+            if not self._pool_cold():
+                return False
+            self.warmups += 1
+            task = self._warm_up_task = asyncio.ensure_future(self._open_connection())
+        # a caller going away does not cancel the warm-up shared with the others
+        return await asyncio.shield(task)
+
+    async def _open_connection(self) -> bool:
+        try:
+            # any response will do: the point is the connection left in the pool
+            await self.client.get(self.url, headers=self.headers)
+        except Exception as exc:
+            logging.debug("Gemini connection warmup failed: %s", exc)
+            return False
+        self._last_used = time.monotonic()
+        return True
+
+    async def _post(self, url: str, body: bytes, headers: Dict[str, str]) -> Dict[str, Any]:
+        self.active_requests += 1
+        try:
+            resp = await self.client.post(url, content=body, headers=headers, timeout=bounded_timeout(self.timeout))
+        finally:
+            self.active_requests -= 1
+            self._last_used = time.monotonic()
         resp.raise_for_status()
         return resp.json()
 
@@ -81,6 +220,15 @@ class GeminiClient:
             payload.update(extra)
         return payload
 
+    def _encode_body(self,
+                     prompt: Any,
+                     model: Optional[str] = None,
+                     extra: Optional[Dict[str, Any]] = None) -> bytes:
+        """Request body as bytes, encoded once per call and reused by every attempt."""
+        if isinstance(prompt, PreparedPrompt):
+            return prompt.body(model, extra)
+        return json.dumps(self._get_payload(prompt, model, extra), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
     def _apply_model_to_url(self, base_url: str, model: Optional[str]) -> str:
         """Replace the model segment in `.../models/<model>:<method>` with the provided model.
 
@@ -119,129 +267,198 @@ class GeminiClient:
         # If method not present, assume caller already set a streaming-capable URL
         return base_url
 
+    def _to_sse_url(self, stream_url: str) -> str:
+        """Force `alt=sse` so the upstream body is already valid SSE for pass-through."""
+        parsed = urlparse(stream_url)
+        query = [(k, v) for k, v in parse_qsl(parsed.query, keep_blank_values=True) if k != "alt"]
+        query.append(("alt", "sse"))
+        return urlunparse(parsed._replace(query=urlencode(query)))
+
     async def generate(self, 
                        prompt: Any, 
                        model: Optional[str] = None, 
                        extra: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         if not self.url:
             raise GeminiClientError("GEMINI_URL is not configured")
-        payload: Dict[str, Any] = self._get_payload(prompt, model, extra)
+        body = self._encode_body(prompt, model, extra)
         url_to_use = self._apply_model_to_url(self.url, model)
-        
+
+        async def attempt(_: int) -> Dict[str, Any]:
+            ensure_time_left("upstream")
+            # lease per attempt so a retry after 429 moves to another key
+            lease = self._acquire_key()
+            try:
+                raw = await self._post(url_to_use, body, self._headers_for(lease.key))
+                lease.record_usage(_total_tokens(raw))
+                return raw
+            except HTTPStatusError as exc:
+                _record_status(lease, exc)
+                raise
+            finally:
+                lease.release()
+
+        try:
+            return await self.retry_policy.call(attempt, self.key_pool.has_usable_key)
+        except (RequestError, HTTPStatusError) as exc:
+            raise _to_client_error(exc, "calling") from exc
+
+    def _acquire_key(self) -> ApiKeyLease:
         try:
-            return await self._post(url_to_use, payload, self.headers)
-        except RequestError as exc:
-            raise GeminiClientError(f"Request error while calling Gemini API: {exc}") from exc
+            return self.key_pool.acquire()
+        except GeminiKeyPoolExhaustedError as exc:
+            # a local quota state, not an upstream failure: no breaker or limiter sample
+            raise ServiceUnavailableError(str(exc), retry_after=exc.retry_after) from exc
+
+    def _stream_timeout(self) -> Timeout:
+        # For long-lived streams, disable read timeout to avoid premature disconnects; opening
+        # the stream only gets the time left for the request.
+        ensure_time_left("upstream")
+        opening = bounded_timeout(self.timeout)
+        return Timeout(connect=opening, read=None, write=opening, pool=opening)
+
+    async def _stream_once(self, stream_url: str, body: bytes) -> AsyncIterator[StreamChunk]:
+        """One streaming attempt with its own key lease."""
+        stream_timeout = self._stream_timeout()
+        lease = self._acquire_key()
+        # usageMetadata is cumulative across chunks; only the last one is recorded
+        total_tokens: Optional[int] = None
+        try:
+            async with self.client.stream("POST", stream_url, content=body, headers=self._headers_for(lease.key), timeout=stream_timeout) as resp:
+                if resp.is_error:
+                    # load the error body so callers can report it
+                    await resp.aread()
+                resp.raise_for_status()
+
+                # JSON array, SSE and NDJSON framings are all handled by the incremental parser;
+                # each response object is decoded exactly once.
+                parser = GeminiStreamParser()
+                async for data in resp.aiter_bytes():
+                    for event in parser.feed(data):
+                        for chunk in iter_chunks(event):
+                            if isinstance(chunk, UsageChunk):
+                                total_tokens = chunk.usage.totalTokenCount
+                            yield chunk
+                    if parser.done:
+                        return
+                for event in parser.close():
+                    for chunk in iter_chunks(event):
+                        if isinstance(chunk, UsageChunk):
+                            total_tokens = chunk.usage.totalTokenCount
+                        yield chunk
         except HTTPStatusError as exc:
-            body = exc.response.text if exc.response is not None else ""
-            status = exc.response.status_code if exc.response is not None else "?"
-            if status == 401:
-                # More actionable error message for auth failures when using API keys
-                hint = (
-                    "Request had invalid authentication credentials.\n"
-                    "Set GEMINI_API_KEY to a valid API key and ensure the endpoint accepts API-key-based authentication.\n"
-                    "If you previously relied on OAuth/bearer tokens, that flow has been removed — switch to an API key or re-enable OAuth support."
-                )
-                raise GeminiClientError(f"Gemini API returned HTTP 401: {body}\n{hint}") from exc
-            raise GeminiClientError(f"Gemini API returned HTTP {status}: {body}") from exc
+            _record_status(lease, exc)
+            raise
+        finally:
+            lease.record_usage(total_tokens)
+            lease.release()
+
+    async def stream_chunks(self,
+                            prompt: Any,
+                            model: Optional[str] = None,
+                            extra: Optional[Dict[str, Any]] = None) -> AsyncIterator[StreamChunk]:
+        """Stream typed chunks (text deltas, function calls, finish reason, usage) from Gemini.
+
+        A failed attempt is retried only while nothing has been yielded yet; once a chunk
+        has reached the caller, a failure is surfaced instead of replaying the answer.
+        """
+        if not self.url:
+            raise GeminiClientError("GEMINI_URL is not configured")
+
+        body = self._encode_body(prompt, model, extra)
+        # Apply model override into URL first, then convert to streaming method
+        stream_url = self._to_stream_url(self._apply_model_to_url(self.url, model))
+
+        self.active_streams += 1
+        self.retry_policy.start()
+        try:
+            attempt = 0
+            while True:
+                started = False
+                try:
+                    # aclosing: an abandoned consumer must close the upstream response right away
+                    async with aclosing(self._stream_once(stream_url, body)) as chunks:
+                        async for chunk in chunks:
+                            started = True
+                            yield chunk
+                    return
+                except (RequestError, HTTPStatusError) as exc:
+                    delay = None if started else self.retry_policy.next_delay(exc, attempt, self.key_pool.has_usable_key())
+                    if delay is None:
+                        raise _to_client_error(exc, "streaming from") from exc
+                    logging.info("Retrying Gemini stream in %.2fs after attempt %d failed: %s", delay, attempt + 1, exc)
+                    await asyncio.sleep(delay)
+                    attempt += 1
+        finally:
+            self.active_streams -= 1
+            self._last_used = time.monotonic()
 
     async def stream_generate(self, 
                               prompt: Any, 
                               model: Optional[str] = None, 
                               extra: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
-        if not self.url:
-            raise GeminiClientError("GEMINI_URL is not configured")
-
-        payload: Dict[str, Any] = self._get_payload(prompt, model, extra)
-        headers = self.headers.copy()
+        """Stream only the answer text (thought summaries and non-text parts are skipped)."""
+        async with aclosing(self.stream_chunks(prompt, model=model, extra=extra)) as chunks:
+            async for chunk in chunks:
+                if isinstance(chunk, TextDelta) and not chunk.thought:
+                    yield chunk.text
 
+    async def _stream_raw_once(self, stream_url: str, body: bytes, capture: RawStreamCapture) -> AsyncIterator[memoryview]:
+        stream_timeout = self._stream_timeout()
+        lease = self._acquire_key()
+        # identity encoding: aiter_raw() then yields exactly the bytes the client must see
+        headers = {**self._headers_for(lease.key), "Accept-Encoding": "identity"}
         try:
-            # For long-lived streams, disable read timeout to avoid premature disconnects.
-            stream_timeout = Timeout(connect=self.timeout, read=None, write=self.timeout, pool=self.timeout)
-            # Apply model override into URL first, then convert to streaming method
-            stream_url = self._to_stream_url(self._apply_model_to_url(self.url, model))
-            async with self.client.stream("POST", stream_url, json=payload, headers=headers, timeout=stream_timeout) as resp:
+            async with self.client.stream("POST", stream_url, content=body, headers=headers, timeout=stream_timeout) as resp:
+                if resp.is_error:
+                    await resp.aread()
                 resp.raise_for_status()
+                async for data in resp.aiter_raw():
+                    view = memoryview(data)
+                    capture.append(view)
+                    yield view
+        except HTTPStatusError as exc:
+            _record_status(lease, exc)
+            raise
+        finally:
+            # decoding happens here, after the last byte went out
+            if capture.chunks:
+                lease.record_usage(capture.total_tokens())
+            lease.release()
 
-                # Google streamGenerateContent may return NDJSON or SSE. Some providers split a single
-                # JSON object/array across multiple SSE events. We therefore accumulate SSE payloads
-                # and greedily extract any completed "text": "..." fields without echoing raw JSON.
-                sse_mode = False
-                json_buf: str = ""
-                processed_idx: int = 0
-                text_pattern = re.compile(r'"text"\s*:\s*"((?:\\.|[^"\\])*)"')
-
-                async for line in resp.aiter_lines():
-                    if line is None:
-                        continue
-                    raw = line.rstrip("\n")
-
-                    # Detect SSE markers
-                    if raw.startswith(":"):
-                        # SSE comment/keepalive
-                        continue
-                    if raw.startswith("data:"):
-                        sse_mode = True
-                        sse_payload = raw[len("data:"):].lstrip()
-                        if sse_payload == "[DONE]":
-                            return
-                        # Accumulate payload fragments; many providers split JSON across events
-                        json_buf += (sse_payload + "\n")
-
-                        # Greedily extract any complete text fields from the rolling buffer
-                        for m in text_pattern.finditer(json_buf, processed_idx):
-                            raw_text = m.group(1)
-                            try:
-                                # Use json.loads on a quoted string to unescape sequences
-                                decoded = json.loads(f'"{raw_text}"')
-                            except Exception:
-                                decoded = raw_text
-                            if decoded:
-                                yield decoded
-                            processed_idx = m.end()
-                        # Optionally trim buffer to keep memory bounded
-                        if processed_idx > 0 and processed_idx > len(json_buf) // 2:
-                            json_buf = json_buf[processed_idx:]
-                            processed_idx = 0
-                        continue
-
-                    # Blank line between SSE events — ignore; we accumulate across events
-                    if raw.strip() == "" and sse_mode:
-                        continue
-
-                    # NDJSON or multi-line JSON fallback:
-                    # Accumulate raw lines into the rolling buffer and extract text fields with regex
-                    data = raw.strip()
-                    if not data:
-                        continue
-                    if data == "[DONE]":
-                        return
+    async def stream_raw(self,
+                         prompt: Any,
+                         capture: RawStreamCapture,
+                         model: Optional[str] = None,
+                         extra: Optional[Dict[str, Any]] = None) -> AsyncIterator[memoryview]:
+        """Relay the upstream SSE body as-is (memoryviews over the received buffers).
 
-                    json_buf += (data + "\n")
-                    for m in text_pattern.finditer(json_buf, processed_idx):
-                        raw_text = m.group(1)
-                        try:
-                            decoded = json.loads(f'"{raw_text}"')
-                        except Exception:
-                            decoded = raw_text
-                        if decoded:
-                            yield decoded
-                        processed_idx = m.end()
-                    if processed_idx > 0 and processed_idx > len(json_buf) // 2:
-                        json_buf = json_buf[processed_idx:]
-                        processed_idx = 0
-
-        except RequestError as exc:
-            raise GeminiClientError(f"Request error while streaming from Gemini API: {exc}") from exc
-        except HTTPStatusError as exc:
-            body = exc.response.text if exc.response is not None else ""
-            status = exc.response.status_code if exc.response is not None else "?"
-            if status == 401:
-                hint = (
-                    "Request had invalid authentication credentials.\n"
-                    "Set GEMINI_API_KEY to a valid API key and ensure the endpoint accepts API-key-based authentication.\n"
-                    "If you previously relied on OAuth/bearer tokens, that flow has been removed — switch to an API key or re-enable OAuth support."
-                )
-                raise GeminiClientError(f"Gemini API returned HTTP 401: {body}\n{hint}") 
-            raise GeminiClientError(f"Gemini API returned HTTP {status}: {body}")
+        Nothing is decoded on the way through; `capture` keeps the chunks so text and
+        usage can be extracted after the stream. Retries follow `stream_chunks`: only
+        before the first byte has been yielded.
+        """
+        if not self.url:
+            raise GeminiClientError("GEMINI_URL is not configured")
+
+        body = self._encode_body(prompt, model, extra)
+        stream_url = self._to_sse_url(self._to_stream_url(self._apply_model_to_url(self.url, model)))
 
+        self.active_streams += 1
+        self.retry_policy.start()
+        try:
+            attempt = 0
+            while True:
+                try:
+                    async with aclosing(self._stream_raw_once(stream_url, body, capture)) as chunks:
+                        async for chunk in chunks:
+                            yield chunk
+                    return
+                except (RequestError, HTTPStatusError) as exc:
+                    delay = None if capture.chunks else self.retry_policy.next_delay(exc, attempt, self.key_pool.has_usable_key())
+                    if delay is None:
+                        raise _to_client_error(exc, "streaming from") from exc
+                    logging.info("Retrying Gemini stream in %.2fs after attempt %d failed: %s", delay, attempt + 1, exc)
+                    await asyncio.sleep(delay)
+                    attempt += 1
+        finally:
+            self.active_streams -= 1
+            self._last_used = time.monotonic()
@@ -0,0 +1,60 @@
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+
+from src.adapter.output.gemini.helper.gemini_client import GeminiClient
+from src.application.config.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class GeminiClientRegistry:
+    """App-lifetime holder of the shared upstream GeminiClient.
+
+    The FastAPI lifespan calls `start()` on startup and `stop()` on shutdown.
+    Request handlers call `get()`, which lazily creates the client if the app
+    was started without a lifespan (for example a bare TestClient).
+    """
+
+    def __init__(self) -> None:
+        self._client: Optional[GeminiClient] = None
+        self._lock = asyncio.Lock()
+
+    def get(self) -> GeminiClient:
+        if self._client is None or self._client.is_closed:
+            self._client = GeminiClient()
+        return self._client
+
+    async def start(self) -> GeminiClient:
+        async with self._lock:
+            client = self.get()
+            if settings.GEMINI_WARMUP_ON_STARTUP and client.url:
+                # Best-effort: open the first connection so TLS/HTTP2 setup is paid once at boot.
+                try:
+                    await client.health_check()
+                except Exception as exc:
+                    logger.warning("Gemini client warmup failed: %s", exc)
+            return client
+
+    async def stop(self) -> None:
+        async with self._lock:
+            if self._client is not None:
+                await self._client.stop()
+                self._client = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Connection pool, per-API-key usage and retries of the shared client."""
+        if self._client is None:
+            return {
+                "pool": {"connections": 0, "idle_connections": 0, "active_requests": 0, "active_streams": 0, "closed": True},
+                "keys": [],
+                "retry": {},
+            }
+        return {
+            "pool": self._client.stats(),
+            "keys": self._client.key_pool.stats(),
+            "retry": self._client.retry_stats(),
+        }
+
+
+gemini_client_registry = GeminiClientRegistry()
@@ -0,0 +1,209 @@
+"""Hedged Gemini requests to cut tail latency.
+
+If a call has not answered (or, for streams, produced its first chunk)
+within the configured percentile of recent latency for that model, an
+identical second call is started. The first to succeed wins and the other
+is cancelled; the key pool's least-loaded selection normally routes the
+hedge to a different API key. A `RetryBudget` caps hedges to a fraction of
+recent requests so hedging cannot double the load during an outage.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Optional, TypeVar
+
+from src.adapter.output.gemini.helper.retry_policy import RetryBudget
+from src.application.config.config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class LatencyTracker:
+    """Most recent latency samples for one model and call kind."""
+
+    def __init__(self, window_size: int = 200):
+        self._samples: Deque[float] = deque(maxlen=window_size)
+
+    def record(self, latency: float) -> None:
+        self._samples.append(latency)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))
+        return ordered[index]
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+
+async def _next(iterator: AsyncIterator[T]) -> T:
+    return await iterator.__anext__()
+
+
+async def _cancel(task: "asyncio.Task[Any]") -> None:
+    if not task.done():
+        task.cancel()
+    try:
+        await task
+    except BaseException:
+        pass
+
+
+class Hedger:
+    def __init__(
+        self,
+        enabled: bool = False,
+        percentile: float = 0.95,
+        min_delay: float = 0.5,
+        min_samples: int = 20,
+        window_size: int = 200,
+        budget: Optional[RetryBudget] = None,
+    ):
+        self.enabled = enabled
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.window_size = window_size
+        self.budget = budget or RetryBudget(ratio=0.05, min_retries=1)
+        self._trackers: Dict[str, LatencyTracker] = {}
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.primary_wins = 0
+
+    @classmethod
+    def from_settings(cls) -> "Hedger":
+        return cls(
+            enabled=settings.GEMINI_HEDGE_ENABLED,
+            percentile=settings.GEMINI_HEDGE_PERCENTILE,
+            min_delay=settings.GEMINI_HEDGE_MIN_DELAY_SECONDS,
+            min_samples=settings.GEMINI_HEDGE_MIN_SAMPLES,
+            window_size=settings.GEMINI_HEDGE_WINDOW_SIZE,
+            budget=RetryBudget(
+                ratio=settings.GEMINI_HEDGE_BUDGET_RATIO,
+                min_retries=settings.GEMINI_HEDGE_BUDGET_MIN_HEDGES,
+                window_seconds=settings.GEMINI_RETRY_BUDGET_WINDOW_SECONDS,
+            ),
+        )
+
+    def _tracker(self, name: str) -> LatencyTracker:
+        tracker = self._trackers.get(name)
+        if tracker is None:
+            tracker = self._trackers[name] = LatencyTracker(self.window_size)
+        return tracker
+
+    def hedge_delay(self, name: str) -> Optional[float]:
+        """Seconds to wait before hedging, or None while there are too few samples."""
+        tracker = self._tracker(name)
+        if len(tracker) < self.min_samples:
+            return None
+        return max(self.min_delay, tracker.percentile(self.percentile) or 0.0)
+
+    def _start(self, name: str) -> Optional[float]:
+        self.calls += 1
+        self.budget.record_request()
+        return self.hedge_delay(name) if self.enabled else None
+
+    def _may_hedge(self) -> bool:
+        if not self.budget.try_withdraw():
+            return False
+        self.hedged += 1
+        return True
+
+    def _won(self, name: str, started: float, hedge: bool) -> None:
+        self._tracker(name).record(time.monotonic() - started)
+        if hedge:
+            self.hedge_wins += 1
+        else:
+            self.primary_wins += 1
+
+    async def run(self, name: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """Await `fn()`, starting a second `fn()` if the first is slower than the hedge delay."""
+        delay = self._start(name)
+        started = time.monotonic()
+        tasks = [asyncio.ensure_future(fn())]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done and self._may_hedge():
+                logger.info("Hedging Gemini call for %s after %.2fs", name, delay)
+                tasks.append(asyncio.ensure_future(fn()))
+            pending = set(tasks)
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    # a failure only counts once the other call has failed too
+                    if task.exception() is None or not pending:
+                        result = task.result()
+                        self._won(name, started, hedge=task is not tasks[0])
+                        return result
+        finally:
+            for task in tasks:
+                await _cancel(task)
+
+    async def run_stream(self, name: str, factory: Callable[[], AsyncIterator[T]]) -> AsyncIterator[T]:
+        """Yield from `factory()`, racing a second stream if the first chunk is late."""
+        delay = self._start(name)
+        started = time.monotonic()
+        streams = [factory()]
+        firsts = [asyncio.ensure_future(_next(streams[0]))]
+        winner: Optional[int] = None
+        try:
+            done, _ = await asyncio.wait(firsts, timeout=delay)
+            if not done and self._may_hedge():
+                logger.info("Hedging Gemini stream for %s after %.2fs without a first chunk", name, delay)
+                streams.append(factory())
+                firsts.append(asyncio.ensure_future(_next(streams[1])))
+            pending = set(firsts)
+            while winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    exc = task.exception()
+                    if exc is None or isinstance(exc, StopAsyncIteration) or not pending:
+                        winner = firsts.index(task)
+                        break
+        finally:
+            # the loser (or, if we were cancelled mid-race, every stream) is closed
+            for index, task in enumerate(firsts):
+                if index != winner:
+                    await _cancel(task)
+                    await streams[index].aclose()
+
+        stream = streams[winner]
+        try:
+            if isinstance(firsts[winner].exception(), StopAsyncIteration):
+                self._won(name, started, hedge=winner == 1)
+                return
+            first_chunk = firsts[winner].result()
+            self._won(name, started, hedge=winner == 1)
+            yield first_chunk
+            async for chunk in stream:
+                yield chunk
+        finally:
+            await stream.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "calls": self.calls,
+            "hedged": self.hedged,
+            "hedge_rate": round(self.hedged / self.calls, 3) if self.calls else 0.0,
+            "hedge_wins": self.hedge_wins,
+            "primary_wins": self.primary_wins,
+            "budget_exhausted": self.budget.exhausted,
+            "delays_seconds": {
+                name: round(delay, 3)
+                for name in self._trackers
+                if (delay := self.hedge_delay(name)) is not None
+            },
+        }
+
+
+hedger = Hedger.from_settings()
@@ -0,0 +1,144 @@
+"""Request bodies assembled from pre-serialized history fragments.
+
+Every chat turn used to rebuild `contents` as a list of dicts from the whole
+history, canonical-dump it for the response-cache key, and let httpx encode it
+again on each attempt. Instead each message is encoded once into its JSON
+fragment (`{"role":..,"parts":[{"text":..}]}`), cached by message id and
+checked against the message's current text, so an edited message is simply
+re-encoded. A turn then only joins cached bytes; the body is built once per
+call and reused by every retry and fallback attempt.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.application.config.config import settings
+from src.domain.models.message_domain import MessageDomain
+
+
+def _dumps(value: Any) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def encode_message(message: MessageDomain) -> bytes:
+    role = message.role.value if hasattr(message.role, "value") else str(message.role)
+    return _dumps({"role": role, "parts": [{"text": message.content}]})
+
+
+class PreparedPrompt:
+    """The `contents` array of a request, already encoded as JSON bytes."""
+
+    __slots__ = ("contents", "messages", "_bodies")
+
+    def __init__(self, contents: bytes, messages: int):
+        self.contents = contents
+        self.messages = messages
+        self._bodies: Dict[Optional[str], bytes] = {}
+
+    @classmethod
+    def from_contents(cls, contents: List[Dict[str, Any]]) -> "PreparedPrompt":
+        return cls(_dumps(contents), len(contents))
+
+    def body(self, model: Optional[str] = None, extra: Optional[Dict[str, Any]] = None) -> bytes:
+        """Full request body; `extra` holds top-level fields such as generationConfig.
+
+        Bodies without `extra` are kept per model, so hedges and retries of the same
+        model reuse the same bytes.
+        """
+        if not extra and model in self._bodies:
+            return self._bodies[model]
+        parts = [b'{"contents":', self.contents]
+        if model:
+            parts += [b',"model":', _dumps(model)]
+        for name, value in (extra or {}).items():
+            if name in ("contents", "model"):
+                continue
+            parts += [b",", _dumps(name), b":", _dumps(value)]
+        parts.append(b"}")
+        body = b"".join(parts)
+        if not extra:
+            self._bodies[model] = body
+        return body
+
+    def cache_key(self, model: str, config: Optional[Dict[str, Any]] = None) -> str:
+        """Response-cache key: SHA-256 over model, the encoded contents and canonical config."""
+        digest = hashlib.sha256()
+        digest.update(model.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(self.contents)
+        digest.update(b"\0")
+        digest.update(json.dumps(config or {}, sort_keys=True, separators=(",", ":")).encode("utf-8"))
+        return digest.hexdigest()
+
+    def __len__(self) -> int:
+        return len(self.contents)
+
+
+class PromptFragmentCache:
+    """LRU of encoded message fragments, bounded by entries and bytes."""
+
+    def __init__(self, max_entries: int = 50000, max_bytes: int = 64 * 1024 * 1024, enabled: bool = True):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        # (message id, role) -> (text the fragment was encoded from, fragment)
+        self._fragments: "OrderedDict[Tuple[str, str], Tuple[str, bytes]]" = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_settings(cls) -> "PromptFragmentCache":
+        return cls(
+            max_entries=settings.GEMINI_PROMPT_FRAGMENT_CACHE_MAX_ENTRIES,
+            max_bytes=settings.GEMINI_PROMPT_FRAGMENT_CACHE_MAX_BYTES,
+            enabled=settings.GEMINI_PROMPT_FRAGMENT_CACHE_ENABLED,
+        )
+
+    def fragment(self, message: MessageDomain) -> bytes:
+        if not self.enabled:
+            return encode_message(message)
+        role = message.role.value if hasattr(message.role, "value") else str(message.role)
+        key = (message.id, role)
+        cached = self._fragments.get(key)
+        # the text is the version: an edited message no longer matches and is re-encoded
+        if cached is not None and cached[0] == message.content:
+            self._fragments.move_to_end(key)
+            self.hits += 1
+            return cached[1]
+        self.misses += 1
+        encoded = encode_message(message)
+        if cached is not None:
+            self.bytes -= len(cached[1])
+        self._fragments[key] = (message.content, encoded)
+        self._fragments.move_to_end(key)
+        self.bytes += len(encoded)
+        while self._fragments and (len(self._fragments) > self.max_entries or self.bytes > self.max_bytes):
+            _, (_, dropped) = self._fragments.popitem(last=False)
+            self.bytes -= len(dropped)
+            self.evictions += 1
+        return encoded
+
+    def prepare(self, history: List[MessageDomain]) -> PreparedPrompt:
+        """Encode `history` (sorted in place by creation time) into a PreparedPrompt."""
+        history.sort(key=lambda x: x.created_at)
+        return PreparedPrompt(b"[" + b",".join([self.fragment(m) for m in history]) + b"]", len(history))
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._fragments),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+
+prompt_fragments = PromptFragmentCache.from_settings()
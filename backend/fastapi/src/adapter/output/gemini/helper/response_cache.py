@@ -0,0 +1,264 @@
+"""Opt-in cache of Gemini answers for identical requests.
+
+The key is a SHA-256 over the canonical JSON of model + contents + generation
+config, so dict ordering and whitespace never cause a miss. Lookups go to an
+in-process LRU tier (TTL, entry and byte bounds) first, then to an optional
+SQLite file shared by the workers on one host; disk hits are promoted to
+memory.
+
+Callers control caching per request through the `cache_mode` context
+variable, set by the controller from the `Cache-Control` request header:
+`no-cache` skips the lookup but stores the fresh answer, `no-store` does
+neither.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Any, Dict, Optional, Tuple
+
+from src.application.config.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class CacheMode:
+    DEFAULT = "default"
+    NO_CACHE = "no-cache"
+    NO_STORE = "no-store"
+
+
+cache_mode: ContextVar[str] = ContextVar("gemini_cache_mode", default=CacheMode.DEFAULT)
+
+
+def parse_cache_control(header: Optional[str]) -> str:
+    directives = {d.strip().lower() for d in (header or "").split(",")}
+    if CacheMode.NO_STORE in directives:
+        return CacheMode.NO_STORE
+    if CacheMode.NO_CACHE in directives:
+        return CacheMode.NO_CACHE
+    return CacheMode.DEFAULT
+
+
+def cache_key(model: str, contents: Any, config: Optional[Dict[str, Any]] = None) -> str:
+    canonical = json.dumps(
+        {"model": model, "contents": contents, "config": config or {}},
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class CachedAnswer:
+    __slots__ = ("text", "model")
+
+    def __init__(self, text: str, model: Optional[str] = None):
+        self.text = text
+        self.model = model
+
+    def dumps(self) -> str:
+        return json.dumps({"text": self.text, "model": self.model}, ensure_ascii=False)
+
+    @classmethod
+    def loads(cls, raw: str) -> "CachedAnswer":
+        data = json.loads(raw)
+        return cls(data.get("text", ""), data.get("model"))
+
+    @property
+    def size(self) -> int:
+        return len(self.text.encode("utf-8")) + len(self.model or "")
+
+
+class MemoryCacheTier:
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 16 * 1024 * 1024, ttl: float = 3600.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[CachedAnswer, float]]" = OrderedDict()
+        self.bytes = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Optional[CachedAnswer]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        answer, expires_at = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return answer
+
+    def set(self, key: str, answer: CachedAnswer) -> None:
+        if answer.size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (answer, time.monotonic() + self.ttl)
+        self.bytes += answer.size
+        while self._entries and (len(self._entries) > self.max_entries or self.bytes > self.max_bytes):
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key: str) -> None:
+        answer, _ = self._entries.pop(key)
+        self.bytes -= answer.size
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SqliteCacheTier:
+    """Host-local tier; WAL mode lets several worker processes share one file."""
+
+    _PRUNE_EVERY = 100
+
+    def __init__(self, path: str, ttl: float = 3600.0):
+        self.path = path
+        self.ttl = ttl
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS response_cache ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._conn = conn
+        return self._conn
+
+    def _get(self, key: str) -> Optional[CachedAnswer]:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT value FROM response_cache WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        return CachedAnswer.loads(row[0]) if row else None
+
+    def _set(self, key: str, answer: CachedAnswer) -> None:
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO response_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, answer.dumps(), time.time() + self.ttl),
+            )
+            self._writes += 1
+            if self._writes % self._PRUNE_EVERY == 0:
+                conn.execute("DELETE FROM response_cache WHERE expires_at <= ?", (time.time(),))
+
+    async def get(self, key: str) -> Optional[CachedAnswer]:
+        return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, answer: CachedAnswer) -> None:
+        await asyncio.to_thread(self._set, key, answer)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class ResponseCache:
+    def __init__(self, memory: MemoryCacheTier, disk: Optional[SqliteCacheTier] = None, enabled: bool = True):
+        self.memory = memory
+        self.disk = disk
+        self.enabled = enabled
+        self.hits = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.stores = 0
+        self.errors = 0
+
+    @classmethod
+    def from_settings(cls) -> "ResponseCache":
+        ttl = settings.GEMINI_CACHE_TTL_SECONDS
+        memory = MemoryCacheTier(settings.GEMINI_CACHE_MAX_ENTRIES, settings.GEMINI_CACHE_MAX_BYTES, ttl)
+        disk = SqliteCacheTier(settings.GEMINI_CACHE_SQLITE_PATH, ttl) if settings.GEMINI_CACHE_SQLITE_PATH else None
+        return cls(memory, disk, enabled=settings.GEMINI_CACHE_ENABLED)
+
+    def readable(self) -> bool:
+        return self.enabled and cache_mode.get() == CacheMode.DEFAULT
+
+    def writable(self) -> bool:
+        return self.enabled and cache_mode.get() != CacheMode.NO_STORE
+
+    async def get(self, key: str) -> Optional[CachedAnswer]:
+        if not self.readable():
+            if self.enabled:
+                self.bypassed += 1
+            return None
+        answer = self.memory.get(key)
+        if answer is not None:
+            self.hits += 1
+            self.memory_hits += 1
+            return answer
+        if self.disk is not None:
+            try:
+                answer = await self.disk.get(key)
+            except sqlite3.Error as exc:
+                self.errors += 1
+                logger.warning("Response cache disk lookup failed: %s", exc)
+                answer = None
+            if answer is not None:
+                self.hits += 1
+                self.disk_hits += 1
+                self.memory.set(key, answer)
+                return answer
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, answer: CachedAnswer) -> None:
+        if not self.writable():
+            return
+        self.stores += 1
+        self.memory.set(key, answer)
+        if self.disk is not None:
+            try:
+                await self.disk.set(key, answer)
+            except sqlite3.Error as exc:
+                self.errors += 1
+                logger.warning("Response cache disk write failed: %s", exc)
+
+    def close(self) -> None:
+        """Close the disk tier's connection (app shutdown); it reopens on next use."""
+        if self.disk is not None:
+            self.disk.close()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "bypassed": self.bypassed,
+            "stores": self.stores,
+            "errors": self.errors,
+            "entries": len(self.memory),
+            "bytes": self.memory.bytes,
+            "evictions": self.memory.evictions,
+            "expirations": self.memory.expirations,
+            "disk": self.disk.path if self.disk is not None else None,
+        }
+
+
+response_cache = ResponseCache.from_settings()
@@ -0,0 +1,196 @@
+"""Retry engine shared by unary and streaming Gemini calls.
+
+- Classifies failures: transport errors (connect/read/reset) and HTTP
+  408/429/500/502/503/504 are retryable, everything else fails fast.
+- Delay is exponential backoff with full jitter; a `Retry-After` header is
+  honoured as the minimum delay, and a Retry-After longer than the max delay
+  gives up immediately instead of parking the request. A 429 only rate-limits
+  the key that received it: while the pool has another usable key, its
+  Retry-After is ignored and the retry goes to that key after normal backoff.
+- A process-wide `RetryBudget` caps retries to a fraction of recent requests
+  so a partial outage is not amplified into a retry storm.
+- No retry is made whose delay would outlast the request's deadline.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple, TypeVar
+
+from httpx import HTTPStatusError, RequestError
+
+from src.application.config.config import settings
+from src.application.usecases.deadline import remaining_time
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+RETRYABLE_STATUS_CODES = frozenset({408, 429, 500, 502, 503, 504})
+
+
+def retry_after_seconds(response: Any) -> Optional[float]:
+    """Parse a Retry-After header given in seconds (HTTP-date values are ignored)."""
+    if response is None:
+        return None
+    value = response.headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+
+class RetryBudget:
+    """Sliding-window budget: retries may not exceed `ratio` of requests (plus a small floor)."""
+
+    def __init__(self, ratio: float = 0.1, min_retries: int = 10, window_seconds: float = 10.0):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window_seconds = window_seconds
+        self._requests: Deque[float] = deque()
+        self._retries: Deque[float] = deque()
+        self.exhausted = 0
+
+    @classmethod
+    def from_settings(cls) -> "RetryBudget":
+        return cls(
+            ratio=settings.GEMINI_RETRY_BUDGET_RATIO,
+            min_retries=settings.GEMINI_RETRY_BUDGET_MIN_RETRIES,
+            window_seconds=settings.GEMINI_RETRY_BUDGET_WINDOW_SECONDS,
+        )
+
+    def _trim(self, now: float) -> None:
+        cutoff = now - self.window_seconds
+        while self._requests and self._requests[0] < cutoff:
+            self._requests.popleft()
+        while self._retries and self._retries[0] < cutoff:
+            self._retries.popleft()
+
+    def record_request(self) -> None:
+        now = time.monotonic()
+        self._trim(now)
+        self._requests.append(now)
+
+    def try_withdraw(self) -> bool:
+        now = time.monotonic()
+        self._trim(now)
+        allowed = max(self.min_retries, int(len(self._requests) * self.ratio))
+        if len(self._retries) >= allowed:
+            self.exhausted += 1
+            return False
+        self._retries.append(now)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        self._trim(time.monotonic())
+        return {
+            "window_seconds": self.window_seconds,
+            "requests_in_window": len(self._requests),
+            "retries_in_window": len(self._retries),
+            "budget_exhausted": self.exhausted,
+        }
+
+
+# one budget for the whole process, shared by every client/policy by default
+retry_budget = RetryBudget.from_settings()
+
+
+class RetryPolicy:
+    def __init__(
+        self,
+        max_attempts: Optional[int] = None,
+        base_delay: Optional[float] = None,
+        max_delay: Optional[float] = None,
+        budget: Optional[RetryBudget] = None,
+    ):
+        self.max_attempts = max(1, max_attempts if max_attempts is not None else settings.GEMINI_RETRY_MAX_ATTEMPTS)
+        self.base_delay = base_delay if base_delay is not None else settings.GEMINI_RETRY_BASE_DELAY_SECONDS
+        self.max_delay = max_delay if max_delay is not None else settings.GEMINI_RETRY_MAX_DELAY_SECONDS
+        self.budget = budget or retry_budget
+        self.retries = 0
+        self.gave_up = 0
+        self.deadline_gave_up = 0
+
+    def classify(self, exc: BaseException) -> Tuple[bool, Optional[float]]:
+        """Return (retryable, retry_after_seconds) for a failed attempt."""
+        if isinstance(exc, HTTPStatusError):
+            response = exc.response
+            if response is None or response.status_code not in RETRYABLE_STATUS_CODES:
+                return False, None
+            return True, retry_after_seconds(response)
+        if isinstance(exc, RequestError):
+            return True, None
+        return False, None
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        ceiling = min(self.max_delay, self.base_delay * (2 ** attempt))
+        delay = random.uniform(0, ceiling)
+        if retry_after is not None:
+            # never earlier than the server asked; a little jitter avoids synchronized retries
+            delay = retry_after + random.uniform(0, min(1.0, self.base_delay))
+        return delay
+
+    def start(self) -> None:
+        """Account one logical request against the retry budget."""
+        self.budget.record_request()
+
+    def next_delay(self, exc: BaseException, attempt: int, spare_key: bool = False) -> Optional[float]:
+        """Delay before the next attempt, or None when the failure must be surfaced.
+
+        `attempt` is the zero-based index of the attempt that just failed;
+        `spare_key` tells whether another API key could serve the retry right away.
+        """
+        retryable, retry_after = self.classify(exc)
+        if not retryable:
+            return None
+        if spare_key and isinstance(exc, HTTPStatusError) and exc.response.status_code == 429:
+            # the Retry-After belongs to the key that was just quarantined
+            retry_after = None
+        if attempt + 1 >= self.max_attempts:
+            self.gave_up += 1
+            return None
+        if retry_after is not None and retry_after > self.max_delay:
+            self.gave_up += 1
+            return None
+        delay = self.backoff(attempt, retry_after)
+        left = remaining_time()
+        if left is not None and delay >= left:
+            # the caller would be gone before the retry even starts
+            self.gave_up += 1
+            self.deadline_gave_up += 1
+            return None
+        if not self.budget.try_withdraw():
+            logger.warning("Gemini retry budget exhausted; not retrying: %s", exc)
+            self.gave_up += 1
+            return None
+        self.retries += 1
+        return delay
+
+    async def call(self, fn: Callable[[int], Awaitable[T]], spare_key: Optional[Callable[[], bool]] = None) -> T:
+        """Run `fn(attempt)` until it succeeds or the failure is not retryable."""
+        self.start()
+        attempt = 0
+        while True:
+            try:
+                return await fn(attempt)
+            except (HTTPStatusError, RequestError) as exc:
+                delay = self.next_delay(exc, attempt, spare_key is not None and spare_key())
+                if delay is None:
+                    raise
+                logger.info("Retrying Gemini call in %.2fs after attempt %d failed: %s", delay, attempt + 1, exc)
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_attempts": self.max_attempts,
+            "retries": self.retries,
+            "gave_up": self.gave_up,
+            "deadline_gave_up": self.deadline_gave_up,
+            **self.budget.stats(),
+        }
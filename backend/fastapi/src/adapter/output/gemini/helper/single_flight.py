@@ -0,0 +1,167 @@
+"""Single-flight coalescing of identical in-flight Gemini calls.
+
+Concurrent callers with the same key share one upstream call. The call runs
+in its own task, so one caller being cancelled (timeout, client gone) does
+not cancel it for the others; it is cancelled only when the last caller
+leaves. Streams fan out through a replay buffer: every subscriber gets the
+full chunk sequence, including a subscriber that joins mid-stream.
+
+Shared work runs without any caller's deadline; each caller bounds its own
+wait (for a stream, the wait for its first chunk) by what is left of its own.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Generic, List, Optional, TypeVar
+
+from src.application.config.config import settings
+from src.application.exceptions.exceptions import DeadlineExceededError
+from src.application.usecases.deadline import bounded_timeout, deadline_metrics, detached_context
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class _Call:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SharedStream(Generic[T]):
+    """Runs one source iterator in a task and replays its items to every subscriber."""
+
+    def __init__(self, source: Callable[[], AsyncIterator[T]], on_done: Callable[["SharedStream[T]"], None]):
+        self.items: List[T] = []
+        self.error: Optional[BaseException] = None
+        self.done = False
+        self.subscribers = 0
+        self._on_done = on_done
+        self._changed = asyncio.Event()
+        # shared by subscribers with different deadlines, like SingleFlight.do
+        self._task = asyncio.get_running_loop().create_task(self._run(source), context=detached_context())
+
+    async def _run(self, source: Callable[[], AsyncIterator[T]]) -> None:
+        iterator = source()
+        try:
+            async for item in iterator:
+                self.items.append(item)
+                self._notify()
+        except asyncio.CancelledError:
+            self.error = asyncio.CancelledError()
+        except BaseException as exc:
+            self.error = exc
+        finally:
+            close = getattr(iterator, "aclose", None)
+            if close is not None:
+                await close()
+            self.done = True
+            self._notify()
+            self._on_done(self)
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def subscribe(self) -> AsyncIterator[T]:
+        self.subscribers += 1
+        index = 0
+        try:
+            while True:
+                while index < len(self.items):
+                    item = self.items[index]
+                    index += 1
+                    yield item
+                if self.done:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                if index > 0:
+                    await self._changed.wait()
+                    continue
+                try:
+                    await asyncio.wait_for(self._changed.wait(), timeout=bounded_timeout(None))
+                except asyncio.TimeoutError:
+                    deadline_metrics.record_shed("upstream")
+                    raise DeadlineExceededError("Request deadline exceeded waiting for the shared Gemini stream") from None
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0 and not self.done:
+                # nobody is listening any more; stop the upstream call
+                self._task.cancel()
+
+
+class SingleFlight:
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._calls: Dict[str, _Call] = {}
+        self._streams: Dict[str, SharedStream[Any]] = {}
+        self.started = 0
+        self.coalesced = 0
+        self.abandoned = 0
+
+    @classmethod
+    def from_settings(cls) -> "SingleFlight":
+        return cls(enabled=settings.GEMINI_SINGLE_FLIGHT_ENABLED)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """Await `fn()`, sharing the result with concurrent callers of the same key."""
+        if not self.enabled:
+            return await fn()
+        call = self._calls.get(key)
+        if call is None:
+            # shared by callers with different deadlines: each bounds its own wait instead
+            call = _Call(asyncio.get_running_loop().create_task(fn(), context=detached_context()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._forget_call(key, call))
+            self.started += 1
+        else:
+            self.coalesced += 1
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                self.abandoned += 1
+                call.task.cancel()
+
+    def _forget_call(self, key: str, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def stream(self, key: str, source: Callable[[], AsyncIterator[T]]) -> AsyncIterator[T]:
+        """Subscribe to the shared stream for `key`, starting it with `source()` if needed."""
+        if not self.enabled:
+            return source()
+        shared = self._streams.get(key)
+        if shared is None:
+            shared = SharedStream(source, lambda s: self._forget_stream(key, s))
+            self._streams[key] = shared
+            self.started += 1
+        else:
+            self.coalesced += 1
+        return shared.subscribe()
+
+    def _forget_stream(self, key: str, shared: SharedStream[Any]) -> None:
+        if self._streams.get(key) is shared:
+            del self._streams[key]
+        if isinstance(shared.error, asyncio.CancelledError):
+            self.abandoned += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "in_flight_calls": len(self._calls),
+            "in_flight_streams": len(self._streams),
+            "started": self.started,
+            "coalesced": self.coalesced,
+            "abandoned": self.abandoned,
+        }
+
+
+single_flight = SingleFlight.from_settings()
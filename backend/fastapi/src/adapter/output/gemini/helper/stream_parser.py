@@ -0,0 +1,257 @@
+"""Incremental parser for Gemini `streamGenerateContent` responses.
+
+Google may send the stream in one of three framings:
+ - a JSON array whose elements arrive one by one (the default),
+ - Server-Sent Events (`?alt=sse`), where each `data:` payload is a JSON object
+   (some proxies split one object across several events),
+ - NDJSON, one object per line.
+
+All three reduce to "a sequence of top-level JSON objects separated by noise".
+The parser strips the SSE framing, then scans for balanced top-level objects
+with C-level regex skips (string bodies are never walked char by char) and
+decodes each `GenerateContentResponse` exactly once. Only the object currently
+in flight is kept in memory.
+"""
+from __future__ import annotations
+
+import codecs
+import json
+import logging
+import re
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+from src.adapter.output.gemini.dto.response.response import UsageMetadata
+from src.adapter.output.gemini.dto.response.stream_chunk import (
+    FinishReasonChunk,
+    FunctionCallDelta,
+    StreamChunk,
+    TextDelta,
+    UsageChunk,
+)
+
+logger = logging.getLogger(__name__)
+
+# Plain quantifiers only: possessive ones need Python 3.11. The alternatives differ
+# on their first character, so the only failing attempt is a string that runs past
+# the end of the buffer, and it backtracks linearly over that string's tail.
+# skip everything up to the next brace outside of a string (whole strings are consumed);
+# stops at the opening quote of a string that is not terminated yet
+_SKIP_RE = re.compile(r'(?:[^{}"]+|"[^"\\]*(?:\\.[^"\\]*)*")*', re.DOTALL)
+# longest safe prefix of a string body: stops at the closing quote, or before a
+# trailing backslash whose escaped character has not arrived yet
+_STRING_BODY_RE = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*', re.DOTALL)
+
+_DONE = "[DONE]"
+
+
+class GeminiStreamParser:
+    """Push parser: feed raw bytes/str, get decoded response objects back."""
+
+    def __init__(self) -> None:
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._sse: Optional[bool] = None
+        self._line_buf: str = ""
+        # JSON object scanner state
+        self._buf: str = ""
+        self._pos: int = 0
+        self._depth: int = 0
+        self._start: int = -1
+        self._in_string: bool = False
+        self.done: bool = False
+
+    def feed(self, data: Union[bytes, bytearray, memoryview, str]) -> List[Dict[str, Any]]:
+        """Consume the next piece of the body and return every object completed by it."""
+        if self.done:
+            return []
+        text = data if isinstance(data, str) else self._decoder.decode(data)
+        if not text:
+            return []
+        if self._sse is None:
+            stripped = text.lstrip()
+            if not stripped:
+                return []
+            self._sse = stripped[0] not in "[{"
+        if not self._sse:
+            return self._feed_json(text)
+        return self._feed_sse(text)
+
+    def close(self) -> List[Dict[str, Any]]:
+        """Flush any trailing data once the upstream body is exhausted."""
+        tail = self._decoder.decode(b"", final=True)
+        events = self.feed(tail) if tail else []
+        if self._sse and self._line_buf and not self.done:
+            line, self._line_buf = self._line_buf, ""
+            events.extend(self._handle_sse_line(line))
+        if self._depth > 0:
+            logger.warning("Gemini stream ended inside an unterminated JSON object (%d bytes dropped)", len(self._buf) - self._start)
+        return events
+
+    def _feed_sse(self, text: str) -> List[Dict[str, Any]]:
+        self._line_buf += text
+        if "\n" not in self._line_buf:
+            return []
+        lines = self._line_buf.split("\n")
+        self._line_buf = lines.pop()
+        events: List[Dict[str, Any]] = []
+        for line in lines:
+            events.extend(self._handle_sse_line(line))
+            if self.done:
+                break
+        return events
+
+    def _handle_sse_line(self, line: str) -> List[Dict[str, Any]]:
+        line = line.rstrip("\r")
+        if not line.startswith("data:"):
+            # comments/keepalives (":"), blank separators and event:/id:/retry: fields
+            return []
+        payload = line[5:]
+        if payload.startswith(" "):
+            payload = payload[1:]
+        if payload.strip() == _DONE:
+            self.done = True
+            return []
+        if self._depth == 0 and not self._in_string:
+            # fast path: the usual one-object-per-event payload is decoded directly
+            try:
+                obj = json.loads(payload)
+            except ValueError:
+                pass
+            else:
+                return [obj] if isinstance(obj, dict) else []
+        # payloads are concatenated verbatim: an object split across events must re-join exactly
+        return self._feed_json(payload)
+
+    @staticmethod
+    def _decode(raw: str) -> Optional[Dict[str, Any]]:
+        try:
+            obj = json.loads(raw)
+        except ValueError as exc:
+            logger.warning("Skipping undecodable Gemini stream event: %s", exc)
+            return None
+        return obj if isinstance(obj, dict) else None
+
+    def _feed_json(self, text: str) -> List[Dict[str, Any]]:
+        if self._depth == 0 and not self._in_string:
+            # nothing in flight: separators from the previous feed can be dropped
+            self._buf, self._pos = text, 0
+        else:
+            self._buf += text
+        events: List[Dict[str, Any]] = []
+        buf = self._buf
+        pos = self._pos
+        end = len(buf)
+        while pos < end:
+            if self._in_string:
+                pos = _STRING_BODY_RE.match(buf, pos).end()  # type: ignore[union-attr]
+                if pos >= end or buf[pos] != '"':
+                    break
+                pos += 1
+                self._in_string = False
+                continue
+            pos = _SKIP_RE.match(buf, pos).end()  # type: ignore[union-attr]
+            if pos >= end:
+                break
+            ch = buf[pos]
+            pos += 1
+            if ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                if self._depth == 0:
+                    self._start = pos - 1
+                self._depth += 1
+            elif self._depth > 0:
+                self._depth -= 1
+                if self._depth == 0:
+                    obj = self._decode(buf[self._start:pos])
+                    self._start = -1
+                    if obj is not None:
+                        events.append(obj)
+
+        # keep only the object in flight
+        if self._depth > 0 and self._start > 0:
+            self._buf = buf[self._start:]
+            pos -= self._start
+            self._start = 0
+        elif self._depth == 0 and not self._in_string:
+            self._buf = ""
+            pos = 0
+        self._pos = pos
+        return events
+
+
+def iter_chunks(event: Dict[str, Any]) -> Iterator[StreamChunk]:
+    """Convert one decoded GenerateContentResponse into typed chunks.
+
+    Order within an event: content parts, then finish reason, then usage.
+    """
+    for cand in event.get("candidates") or ():
+        index = cand.get("index") or 0
+        content = cand.get("content") or {}
+        for part in content.get("parts") or ():
+            if "text" in part:
+                text = part.get("text") or ""
+                if text:
+                    yield TextDelta(text=text, thought=bool(part.get("thought")), candidate_index=index)
+            elif "functionCall" in part:
+                call = part.get("functionCall") or {}
+                yield FunctionCallDelta(name=call.get("name") or "", args=call.get("args") or {}, candidate_index=index)
+        reason = cand.get("finishReason")
+        if reason:
+            yield FinishReasonChunk(reason=reason, candidate_index=index)
+    usage = event.get("usageMetadata")
+    if usage:
+        yield UsageChunk(
+            usage=UsageMetadata.model_validate(usage),
+            model_version=event.get("modelVersion"),
+            response_id=event.get("responseId"),
+        )
+
+
+class RawStreamCapture:
+    """Keeps references to relayed upstream chunks and decodes them once, after the stream.
+
+    Used by the pass-through mode: bytes go to the client untouched, and text/usage
+    are extracted lazily when persistence or key accounting first asks for them.
+    """
+
+    def __init__(self) -> None:
+        self.chunks: List[Union[bytes, memoryview]] = []
+        self.bytes = 0
+        self._text: Optional[str] = None
+        self._total_tokens: Optional[int] = None
+
+    def append(self, chunk: Union[bytes, memoryview]) -> None:
+        self.chunks.append(chunk)
+        self.bytes += len(chunk)
+        self._text = None
+
+    def _decode(self) -> None:
+        # plain dict walk: typed chunks (pydantic) would cost more than the JSON decode itself
+        parser = GeminiStreamParser()
+        parts: List[str] = []
+        total_tokens: Optional[int] = None
+        events: List[Dict[str, Any]] = []
+        for chunk in self.chunks:
+            events.extend(parser.feed(chunk))
+        events.extend(parser.close())
+        for event in events:
+            for cand in event.get("candidates") or ():
+                for part in (cand.get("content") or {}).get("parts") or ():
+                    text = part.get("text")
+                    if text and not part.get("thought"):
+                        parts.append(text)
+            usage = event.get("usageMetadata")
+            if usage and usage.get("totalTokenCount") is not None:
+                total_tokens = usage["totalTokenCount"]
+        self._text = "".join(parts)
+        self._total_tokens = total_tokens
+
+    def text(self) -> str:
+        if self._text is None:
+            self._decode()
+        return self._text or ""
+
+    def total_tokens(self) -> Optional[int]:
+        if self._text is None:
+            self._decode()
+        return self._total_tokens
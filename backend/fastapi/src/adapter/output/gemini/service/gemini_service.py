@@ -1,31 +1,178 @@
 
 
-from typing import AsyncIterator, List, Optional
+import logging
+import time
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Optional, Tuple, TypeVar
 
 from src.adapter.output.gemini.helper.gemini_client import GeminiClient, GeminiClientError
+from src.adapter.output.gemini.helper.circuit_breaker import CircuitBreakerRegistry, circuit_breakers, parse_fallback_chain
+from src.adapter.output.gemini.helper.concurrency_limiter import (
+    AdaptiveConcurrencyLimiter,
+    ConcurrencyLimitExceededError,
+    LimiterPermit,
+    concurrency_limiter,
+)
+from src.adapter.output.gemini.helper.hedging import Hedger, hedger as default_hedger
+from src.adapter.output.gemini.helper.prompt_builder import PreparedPrompt, PromptFragmentCache, prompt_fragments
+from src.adapter.output.gemini.helper.response_cache import CachedAnswer, ResponseCache, response_cache
+from src.adapter.output.gemini.helper.single_flight import SingleFlight, single_flight
+from src.adapter.output.gemini.helper.stream_parser import RawStreamCapture
 from src.application.ports.output.gemini_output_port import GeminiOutputPort
+from src.application.exceptions.exceptions import ServiceUnavailableError
+from src.application.config.config import settings
 from src.adapter.output.gemini.dto.response.response import GeminiResponse
 from src.domain.models.message_domain import MessageDomain
 
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# cached answers are replayed to streaming callers in pieces of this many characters
+_REPLAY_CHUNK_CHARS = 512
+
+
+def _is_upstream_failure(exc: GeminiClientError) -> bool:
+    """Failures that say the model/endpoint is unhealthy (as opposed to a bad request)."""
+    status = exc.status_code
+    return status is None or status == 429 or status >= 500
+
 
 class GeminiService(GeminiOutputPort):
-    def __init__(self, gemini_client: GeminiClient):
+    def __init__(
+        self,
+        gemini_client: GeminiClient,
+        breakers: Optional[CircuitBreakerRegistry] = None,
+        fallback_chain: Optional[List[str]] = None,
+        limiter: Optional[AdaptiveConcurrencyLimiter] = None,
+        cache: Optional[ResponseCache] = None,
+        flights: Optional[SingleFlight] = None,
+        hedger: Optional[Hedger] = None,
+        prompts: Optional[PromptFragmentCache] = None,
+    ):
         self.gemini_client = gemini_client
+        self.breakers = breakers or circuit_breakers
+        self.limiter = limiter or concurrency_limiter
+        self.cache = cache or response_cache
+        self.flights = flights or single_flight
+        self.hedger = hedger or default_hedger
+        self.prompts = prompts or prompt_fragments
+        self.fallback_chain = fallback_chain if fallback_chain is not None else parse_fallback_chain(settings.GEMINI_FALLBACK_CHAIN)
+        # model that produced the last answer (this service is created per request)
+        self.answered_model: Optional[str] = None
+        # chunks of the last pass-through stream, decoded on demand
+        self.raw_capture: Optional[RawStreamCapture] = None
+        # limiter slot taken by reserve_stream() for the next stream of this request
+        self.reserved: Optional[LimiterPermit] = None
+
+    def _candidates(self, model: str) -> List[str]:
+        """Requested model first, then the models after it in the fallback chain."""
+        if model in self.fallback_chain:
+            return self.fallback_chain[self.fallback_chain.index(model):]
+        return [model]
+
+    def _unavailable(self, model: str, last_exc: Optional[Exception]) -> Exception:
+        if last_exc is not None:
+            return last_exc
+        retry_after = min(self.breakers.get(m).retry_after() for m in self._candidates(model))
+        return ServiceUnavailableError(
+            f"Gemini model {model} and its fallbacks are temporarily unavailable",
+            retry_after=retry_after,
+        )
+
+    async def _acquire_slot(self) -> LimiterPermit:
+        try:
+            return await self.limiter.acquire()
+        except ConcurrencyLimitExceededError as exc:
+            raise ServiceUnavailableError(str(exc), retry_after=exc.retry_after)
+
+    async def reserve_stream(self) -> None:
+        """Take the limiter slot of the next stream now, so an overflow is a 503 before the response starts."""
+        if self.reserved is None:
+            self.reserved = await self._acquire_slot()
+
+    def release_stream(self) -> None:
+        """Give back a reserved slot no upstream stream used (cache hit, joined flight, failed turn)."""
+        permit, self.reserved = self.reserved, None
+        if permit is not None:
+            permit.release()
+
+    async def _call_with_fallback(self, model: str, call: Callable[[str], Awaitable[Any]]) -> Any:
+        last_exc: Optional[Exception] = None
+        for candidate in self._candidates(model):
+            breaker = self.breakers.get(candidate)
+            if not breaker.allow():
+                continue
+            started = time.monotonic()
+            try:
+                result = await call(candidate)
+            except GeminiClientError as exc:
+                upstream_failure = _is_upstream_failure(exc)
+                breaker.record(not upstream_failure, time.monotonic() - started)
+                if not upstream_failure:
+                    raise
+                logger.warning("Gemini model %s failed, trying fallback: %s", candidate, exc)
+                last_exc = exc
+                continue
+            except ServiceUnavailableError:
+                # every API key is quarantined: says nothing about this model, and the
+                # fallbacks share the same keys
+                breaker.release()
+                raise
+            except BaseException:
+                breaker.record(True, time.monotonic() - started)
+                raise
+            breaker.record(True, time.monotonic() - started)
+            self.answered_model = candidate
+            return result
+        raise self._unavailable(model, last_exc)
+
+    def _prepare(self, history: List[MessageDomain]) -> PreparedPrompt:
+        """Encoded `contents` for the history, built from cached per-message fragments."""
+        return self.prompts.prepare(history)
+
+    def get_answered_model(self) -> Optional[str]:
+        return self.answered_model
 
     async def generate(self, model: str, history: List[MessageDomain]) -> str:
         """Call the Gemini client and return the assistant text as a single string."""
-        # Prepare prompt: convert history into contents list expected by the client
-        contents = []
-        history.sort(key=lambda x: x.created_at)
-        for m in history:
-            role = m.role.value if hasattr(m.role, "value") else str(m.role)
-            contents.append({"role": role, "parts": [{"text": m.content}]})
+        # Prepare prompt once: the same encoded body serves the cache key, retries and fallbacks
+        contents = self._prepare(history)
+        key = contents.cache_key(model)
+        cached = await self.cache.get(key)
+        if cached is not None:
+            self.answered_model = cached.model or model
+            return cached.text
+
+        # identical concurrent requests share one upstream call
+        text, self.answered_model = await self.flights.do(key, lambda: self._generate_upstream(key, contents, model))
+        return text
 
+    async def _generate_upstream(self, key: str, contents: PreparedPrompt, model: str) -> Tuple[str, Optional[str]]:
+        permit = await self._acquire_slot()
+        started = time.monotonic()
+        latency: Optional[float] = None
+        overloaded = False
         try:
-            raw = await self.gemini_client.generate(contents, model=model)
+            raw = await self._call_with_fallback(
+                model,
+                lambda m: self.hedger.run(f"generate:{m}", lambda: self.gemini_client.generate(contents, model=m)),
+            )
+            latency = time.monotonic() - started
         except GeminiClientError as exc:
+            latency = time.monotonic() - started
+            overloaded = _is_upstream_failure(exc)
             raise
+        finally:
+            permit.release(latency, overloaded)
 
+        text = self._extract_text(raw)
+        if text:
+            await self.cache.set(key, CachedAnswer(text, self.answered_model))
+        return text, self.answered_model
+
+    @staticmethod
+    def _extract_text(raw: Any) -> str:
         # Parse known response shapes
         try:
             resp = GeminiResponse.parse_obj(raw)
@@ -49,14 +196,143 @@ class GeminiService(GeminiOutputPort):
             return str(raw)
 
     async def stream_generate(self, model: str, history: List[MessageDomain]) -> AsyncIterator[str]:
-        contents = []
-        history.sort(key=lambda x: x.created_at) 
-        for m in history:
-            role = m.role.value if hasattr(m.role, "value") else str(m.role)
-            contents.append({"role": role, "parts": [{"text": m.content}]})
-
-        async for part in self.gemini_client.stream_generate(contents, model=model):
-            yield part
+        try:
+            contents = self._prepare(history)
+            key = contents.cache_key(model)
+            cached = await self.cache.get(key)
+            if cached is not None:
+                self.release_stream()
+                self.answered_model = cached.model or model
+                for i in range(0, len(cached.text), _REPLAY_CHUNK_CHARS):
+                    yield cached.text[i:i + _REPLAY_CHUNK_CHARS]
+                return
+
+            # identical concurrent streams subscribe to one upstream stream and its replay buffer
+            shared = self.flights.stream(key, lambda: self._stream_upstream(key, contents, model))
+            async with aclosing(shared) as parts:
+                async for answered_model, part in parts:
+                    # the upstream stream holds its own slot by now; a subscriber of another
+                    # request's stream never uses the reservation
+                    self.release_stream()
+                    self.answered_model = answered_model
+                    yield part
+        finally:
+            self.release_stream()
+
+    async def _stream_upstream(self, key: str, contents: PreparedPrompt, model: str) -> AsyncIterator[Tuple[Optional[str], str]]:
+        buffer: Optional[List[str]] = [] if self.cache.writable() else None
+        upstream = self._stream_with_fallback(
+            model,
+            lambda m: self.hedger.run_stream(f"stream:{m}", lambda: self.gemini_client.stream_generate(contents, model=m)),
+        )
+        async with aclosing(self._limited_stream(upstream)) as parts:
+            async for part in parts:
+                if buffer is not None:
+                    buffer.append(part)
+                yield self.answered_model, part
+        # only a stream that ran to completion is cached
+        if buffer:
+            await self.cache.set(key, CachedAnswer("".join(buffer), self.answered_model))
+
+    async def stream_raw(self, model: str, history: List[MessageDomain]) -> AsyncIterator[memoryview]:
+        """Pass-through: relay upstream SSE bytes untouched; text is decoded only after the stream.
+
+        Goes through the limiter and the fallback chain, but not the cache, single-flight or
+        hedging, which all work on decoded text.
+        """
+        try:
+            contents = self._prepare(history)
+            self.raw_capture = RawStreamCapture()
+            capture = self.raw_capture
+            upstream = self._stream_with_fallback(
+                model,
+                lambda m: self.gemini_client.stream_raw(contents, capture, model=m),
+            )
+            async with aclosing(self._limited_stream(upstream)) as chunks:
+                async for chunk in chunks:
+                    yield chunk
+        finally:
+            self.release_stream()
+
+    def get_streamed_text(self) -> str:
+        return self.raw_capture.text() if self.raw_capture is not None else ""
+
+    async def _limited_stream(self, stream: AsyncIterator[T]) -> AsyncIterator[T]:
+        """Hold one limiter slot (the reserved one, if any) for the whole stream; time to first
+        chunk is the load signal."""
+        permit, self.reserved = self.reserved, None
+        if permit is None:
+            permit = await self._acquire_slot()
+        started = time.monotonic()
+        first_chunk: Optional[float] = None
+        overloaded = False
+        try:
+            async with aclosing(stream) as parts:
+                async for part in parts:
+                    if first_chunk is None:
+                        first_chunk = time.monotonic() - started
+                    yield part
+            if first_chunk is None:
+                first_chunk = time.monotonic() - started
+        except GeminiClientError as exc:
+            overloaded = _is_upstream_failure(exc)
+            if first_chunk is None:
+                first_chunk = time.monotonic() - started
+            raise
+        finally:
+            held = time.monotonic() - started if first_chunk is not None else None
+            permit.release(held, overloaded, first_byte=first_chunk)
+
+    async def _stream_with_fallback(self, model: str, open_stream: Callable[[str], AsyncIterator[T]]) -> AsyncIterator[T]:
+        """Stream from the first healthy model in the chain.
+
+        Fallback happens only before the first chunk; the breaker latency is time-to-first-chunk.
+        """
+        last_exc: Optional[Exception] = None
+        for candidate in self._candidates(model):
+            breaker = self.breakers.get(candidate)
+            if not breaker.allow():
+                continue
+            started = time.monotonic()
+            first = True
+            try:
+                async with aclosing(open_stream(candidate)) as parts:
+                    async for part in parts:
+                        if first:
+                            first = False
+                            breaker.record(True, time.monotonic() - started)
+                            self.answered_model = candidate
+                        yield part
+            except GeminiClientError as exc:
+                upstream_failure = _is_upstream_failure(exc)
+                if first:
+                    breaker.record(not upstream_failure, time.monotonic() - started)
+                elif upstream_failure:
+                    # broke mid-stream: counts against the model, but the answer cannot switch models now
+                    breaker.record(False)
+                if not first or not upstream_failure:
+                    raise
+                logger.warning("Gemini model %s failed before streaming, trying fallback: %s", candidate, exc)
+                last_exc = exc
+                continue
+            except ServiceUnavailableError:
+                # every API key is quarantined (see _call_with_fallback)
+                if first:
+                    breaker.release()
+                raise
+            except BaseException:
+                if first:
+                    breaker.record(True, time.monotonic() - started)
+                raise
+            if first:
+                # upstream finished without text
+                breaker.record(True, time.monotonic() - started)
+                self.answered_model = candidate
+            return
+        raise self._unavailable(model, last_exc)
+
+    async def warm_up(self) -> None:
+        await self.gemini_client.ensure_connection()
 
     async def stop(self) -> None:
         await self.gemini_client.stop()
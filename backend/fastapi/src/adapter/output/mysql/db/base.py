@@ -1,16 +1,95 @@
 import os
 import sys
 import asyncio
+from sqlalchemy import event, exc as sa_exc
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession, async_sessionmaker
-from sqlalchemy.orm import declarative_base
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.orm import Session, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool, StaticPool
 from src.application.config.config import settings
+from src.application.exceptions.exceptions import DeadlineExceededError
+from src.application.usecases.deadline import bounded_timeout, deadline_expired, deadline_metrics, ensure_time_left
 
 
 # SQLAlchemy async base
 Base = declarative_base()
 
 
+# Round-trip accounting: every statement, COMMIT and ROLLBACK sent on a connection is
+# counted on the session whose transaction currently holds it (session.info), so
+# repositories can report how many DB round trips a request made.
+_ROUND_TRIPS = "db_round_trips"
+_OWNER = "db_round_trips_owner"
+
+
+@event.listens_for(Session, "after_begin")
+def _track_connection(session, transaction, connection) -> None:
+    session.info.setdefault(_ROUND_TRIPS, 0)
+    connection.info[_OWNER] = session.info
+
+
+def _count_round_trip(conn) -> None:
+    owner = conn.info.get(_OWNER)
+    if owner is not None:
+        owner[_ROUND_TRIPS] = owner.get(_ROUND_TRIPS, 0) + 1
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _on_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    # no new statement for a request whose deadline passed (one already running is not interrupted)
+    ensure_time_left("db_query")
+    _count_round_trip(conn)
+
+
+@event.listens_for(Engine, "commit")
+def _on_commit(conn) -> None:
+    _count_round_trip(conn)
+
+
+@event.listens_for(Engine, "rollback")
+def _on_rollback(conn) -> None:
+    _count_round_trip(conn)
+
+
+@event.listens_for(Pool, "checkin")
+def _untrack_connection(dbapi_connection, connection_record) -> None:
+    connection_record.info.pop(_OWNER, None)
+
+
+def db_round_trips(session: AsyncSession) -> int:
+    """Statements, commits and rollbacks sent through `session` so far."""
+    return int(session.info.get(_ROUND_TRIPS, 0))
+
+
+class DeadlineQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool whose checkout wait is cut to the time left for the current request."""
+
+    @property
+    def _timeout(self) -> float:
+        # read once per checkout, synchronously, so concurrent checkouts each see their own deadline
+        timeout = bounded_timeout(self._configured_timeout)
+        return self._configured_timeout if timeout is None else timeout
+
+    @_timeout.setter
+    def _timeout(self, value: float) -> None:
+        self._configured_timeout = value
+
+    def recreate(self) -> "DeadlineQueuePool":
+        recreated = super().recreate()
+        recreated._timeout = self._configured_timeout
+        return recreated
+
+    def _do_get(self):
+        ensure_time_left("db_pool")
+        try:
+            return super()._do_get()
+        except sa_exc.TimeoutError as exc:
+            if deadline_expired():
+                deadline_metrics.record_shed("db_pool")
+                raise DeadlineExceededError("Request deadline exceeded waiting for a DB connection") from exc
+            raise
+
+
 def _mysql_async_url() -> str:
     # using asyncmy driver for MySQL async support
     # Use aiomysql as the async DBAPI (preferred for better Windows wheel support).
@@ -53,9 +132,10 @@ def _create_engine_and_session() -> None:
                 _mysql_async_url(),
                 echo=False,
                 future=True,
+                poolclass=DeadlineQueuePool,
                 pool_size=20,           # Increase pool size from default 5
                 max_overflow=40,        # Increase overflow from default 10
-                pool_timeout=30,        # Connection timeout in seconds
+                pool_timeout=30,        # Connection timeout in seconds (cut to the request's deadline)
                 pool_recycle=3600,      # Recycle connections after 1 hour
                 pool_pre_ping=True,     # Verify connections before using
             )
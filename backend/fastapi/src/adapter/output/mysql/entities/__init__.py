@@ -1,5 +1,6 @@
 from .conversation_entity import ConversationEntity
 from .message_entity import MessageEntity
+from .summary_entity import ConversationSummaryEntity
 from .abstract_entity import AbstractEntity
 
-__all__ = ["ConversationEntity", "MessageEntity", "AbstractEntity"]
+__all__ = ["ConversationEntity", "MessageEntity", "ConversationSummaryEntity", "AbstractEntity"]
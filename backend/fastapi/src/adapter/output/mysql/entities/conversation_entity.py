@@ -1,6 +1,6 @@
 from datetime import datetime
 from typing import cast
-from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy import BigInteger, Column, Integer, String, DateTime, Index
 from sqlalchemy.orm import relationship
 from src.adapter.output.mysql.db.base import Base
 from src.domain.models.conversation_domain import ConversationDomain
@@ -9,11 +9,25 @@ from .abstract_entity import AbstractEntity
 
 class ConversationEntity(Base, AbstractEntity[ConversationDomain]):
     __tablename__ = "conversations"
+    __table_args__ = (
+        # conversation list pages: ORDER BY (created_at, id)
+        Index("idx_conversations_created_at_id", "created_at", "id"),
+        # "recently active" pages: ORDER BY (last_message_at, id)
+        Index("idx_conversations_last_message_at_id", "last_message_at", "id"),
+    )
 
     id = Column(String(64), primary_key=True)
     name = Column(String(255), nullable=False)
-    created_at = Column(Integer, nullable=False)
-    updated_at = Column(Integer, nullable=True)
+    created_at = Column(BigInteger, nullable=False)
+    updated_at = Column(BigInteger, nullable=True)
+    # kept by the message write paths (see repositories/conversation_stats.py)
+    messages_count = Column(Integer, nullable=False, default=0, server_default="0")
+    # newest message's created_at, or created_at while there is none
+    last_message_at = Column(
+        BigInteger, nullable=False, server_default="0",
+        default=lambda context: context.get_current_parameters()["created_at"],
+    )
+    last_message_preview = Column(String(255), nullable=True)
 
     messages = relationship("MessageEntity", back_populates="conversation", cascade="all, delete-orphan")
 
@@ -23,7 +37,9 @@ class ConversationEntity(Base, AbstractEntity[ConversationDomain]):
             id=domain_obj.id, 
             name=domain_obj.name,
             created_at=domain_obj.created_at,
-            updated_at=domain_obj.updated_at
+            updated_at=domain_obj.updated_at,
+            messages_count=0,
+            last_message_at=domain_obj.created_at,
         )
         return ent
 
@@ -64,4 +80,7 @@ class ConversationEntity(Base, AbstractEntity[ConversationDomain]):
             created_at=cast(int, created),
             updated_at=cast(int, updated) if updated is not None else None,
             messages=msgs,
+            messages_count=self.messages_count,
+            last_message_at=_normalize_ts(self.last_message_at),
+            last_message_preview=self.last_message_preview,
         )
@@ -1,9 +1,9 @@
 from datetime import datetime
-from typing import cast
+from typing import Optional, cast
 import uuid
-from sqlalchemy import Column, Integer, String, ForeignKey, Text, Enum
+from sqlalchemy import BigInteger, Column, String, ForeignKey, Text, Enum, Index
 from sqlalchemy.orm import relationship
-from src.domain.enums.enums import ERole
+from src.domain.enums.enums import EMessageStatus, ERole
 from src.adapter.output.mysql.db.base import Base
 from src.domain.models.message_domain import MessageDomain
 from src.adapter.output.mysql.entities.abstract_entity import AbstractEntity
@@ -11,6 +11,12 @@ from src.adapter.output.mysql.entities.abstract_entity import AbstractEntity
 
 class MessageEntity(Base, AbstractEntity[MessageDomain]):
     __tablename__ = "messages"
+    __table_args__ = (
+        # history loads, list pages and counts: WHERE conversation_id ORDER BY (created_at, id)
+        Index("idx_messages_conversation_created_at_id", "conversation_id", "created_at", "id"),
+        Index("idx_messages_conversation_role_created_at", "conversation_id", "role", "created_at", "id"),
+        Index("idx_messages_created_at", "created_at"),
+    )
     id = Column(String(64), primary_key=True, default=lambda: str(uuid.uuid4()))
     conversation_id = Column(String(64), ForeignKey("conversations.id"), nullable=False)
     # Store the enum by its value (e.g. 'user', 'model') and allow SQLAlchemy
@@ -21,7 +27,10 @@ class MessageEntity(Base, AbstractEntity[MessageDomain]):
         nullable=False,
     )
     content = Column(Text, nullable=False)
-    created_at = Column(Integer, nullable=False)
+    created_at = Column(BigInteger, nullable=False)
+    # in_progress while a streamed answer is being checkpointed, then complete or aborted
+    status = Column(String(16), nullable=False, default=EMessageStatus.COMPLETE.value, server_default=EMessageStatus.COMPLETE.value)
+    updated_at = Column(BigInteger, nullable=True)
 
     conversation = relationship("ConversationEntity", back_populates="messages")
 
@@ -32,7 +41,9 @@ class MessageEntity(Base, AbstractEntity[MessageDomain]):
             conversation_id=domain_obj.conversation_id, 
             role=domain_obj.role, 
             content=domain_obj.content,
-            created_at=domain_obj.created_at
+            created_at=domain_obj.created_at,
+            status=domain_obj.status.value,
+            updated_at=domain_obj.updated_at,
         )
         return ent
     
@@ -49,4 +60,6 @@ class MessageEntity(Base, AbstractEntity[MessageDomain]):
             role=role_enum,
             content=cast(str, self.content),
             created_at=cast(int, created),
+            status=EMessageStatus(self.status or EMessageStatus.COMPLETE.value),
+            updated_at=cast(Optional[int], self.updated_at),
         )
@@ -0,0 +1,43 @@
+from typing import cast
+from sqlalchemy import BigInteger, Column, Integer, String, ForeignKey, Text
+from src.adapter.output.mysql.db.base import Base
+from src.domain.models.summary_domain import ConversationSummaryDomain
+from src.adapter.output.mysql.entities.abstract_entity import AbstractEntity
+
+
+class ConversationSummaryEntity(Base, AbstractEntity[ConversationSummaryDomain]):
+    __tablename__ = "conversation_summaries"
+
+    conversation_id = Column(String(64), ForeignKey("conversations.id", ondelete="CASCADE"), primary_key=True)
+    content = Column(Text, nullable=False)
+    last_message_id = Column(String(64), nullable=False)
+    last_message_created_at = Column(BigInteger, nullable=False)
+    covered_messages = Column(Integer, nullable=False, default=0)
+    covered_bytes = Column(BigInteger, nullable=False, default=0)
+    version = Column(Integer, nullable=False, default=1)
+    updated_at = Column(BigInteger, nullable=True)
+
+    @classmethod
+    def from_domain(cls, domain_obj: ConversationSummaryDomain) -> "ConversationSummaryEntity":
+        return cls(
+            conversation_id=domain_obj.conversation_id,
+            content=domain_obj.content,
+            last_message_id=domain_obj.last_message_id,
+            last_message_created_at=domain_obj.last_message_created_at,
+            covered_messages=domain_obj.covered_messages,
+            covered_bytes=domain_obj.covered_bytes,
+            version=domain_obj.version,
+            updated_at=domain_obj.updated_at,
+        )
+
+    def to_domain(self) -> ConversationSummaryDomain:
+        return ConversationSummaryDomain(
+            conversation_id=cast(str, self.conversation_id),
+            content=cast(str, self.content),
+            last_message_id=cast(str, self.last_message_id),
+            last_message_created_at=cast(int, self.last_message_created_at),
+            covered_messages=cast(int, self.covered_messages or 0),
+            covered_bytes=cast(int, self.covered_bytes or 0),
+            version=cast(int, self.version or 1),
+            updated_at=cast(int, self.updated_at) if self.updated_at is not None else None,
+        )
@@ -0,0 +1,24 @@
+"""Multi-row INSERT statements that may skip rows whose primary key already exists."""
+from __future__ import annotations
+
+from sqlalchemy import Insert, Table, insert
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+def insert_stmt(db: AsyncSession, table: Table, ignore_duplicates: bool = False) -> Insert:
+    """INSERT on the table (not the ORM entity): executed with a list of rows, SQLAlchemy
+    sends them as multi-row VALUES batches from one cached compiled statement.
+
+    With `ignore_duplicates` the conflict clause skips existing ids and the result's
+    rowcount is the number of rows actually added. MySQL uses INSERT IGNORE rather than
+    ON DUPLICATE KEY UPDATE: the connection reports found rows, so the latter would count
+    every skipped row as written.
+    """
+    dialect = db.get_bind().dialect.name
+    if ignore_duplicates and dialect == "mysql":
+        return mysql_insert(table).prefix_with("IGNORE")
+    if ignore_duplicates and dialect == "sqlite":
+        return sqlite_insert(table).on_conflict_do_nothing(index_elements=["id"])
+    return insert(table)
@@ -0,0 +1,397 @@
+"""Per-conversation cache of recent history in front of MessageRepository.
+
+Each cached conversation holds its newest messages, newest first, as one
+contiguous run: either the whole conversation (`complete`) or its most recent
+`max_messages`. Newest-first history pages are served from that run when it
+covers them; saves are written through after the commit, while updates and
+deletes drop the conversation so it is reloaded on the next read.
+
+A DB read that raced with a write on the same conversation is not stored: the
+write cancels the in-flight fill. A chat turn served from the cache checks it
+is still current: the insert reads back the conversation's messages_count and
+last_message_at, and if they differ from what the cached run implies, another
+worker wrote to (or deleted from) the conversation and the run is reloaded.
+Other reads rely on the TTL to pick up writes made by other processes.
+"""
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from src.adapter.output.mysql.repositories.message_repository import MessageRepository
+from src.application.config.config import settings
+from src.application.ports.output.health_check_output_port import HealthCheckOutputPort
+from src.application.ports.output.message_output_port import MessageOutputPort
+from src.domain.models.message_domain import MessageDomain
+from src.domain.vo.page_cursor import PageCursor
+
+# rough per-message cost of the pydantic object on top of its text
+_ROW_OVERHEAD_BYTES = 256
+
+
+def _key(message: MessageDomain) -> Tuple[int, str]:
+    return (message.created_at, message.id)
+
+
+def _size(message: MessageDomain) -> int:
+    return len(message.content.encode("utf-8")) + _ROW_OVERHEAD_BYTES
+
+
+def _after_insert(stats: Tuple[int, int], message: MessageDomain) -> Tuple[int, int]:
+    """(messages_count, last_message_at) once `message` is added, as the stats UPDATE computes them."""
+    count, last_at = stats
+    return count + 1, message.created_at if count == 0 or message.created_at >= last_at else last_at
+
+
+class _Entry:
+    __slots__ = ("rows", "complete", "total", "stats", "bytes", "expires_at")
+
+    def __init__(self, expires_at: float):
+        self.rows: List[MessageDomain] = []
+        self.complete = False
+        self.total: Optional[int] = None
+        # the conversation's (messages_count, last_message_at) the rows are consistent with
+        self.stats: Optional[Tuple[int, int]] = None
+        self.bytes = 0
+        self.expires_at = expires_at
+
+
+class HistoryCache:
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024, max_messages: int = 200, ttl: float = 300.0, enabled: bool = True):
+        self.max_bytes = max_bytes
+        self.max_messages = max_messages
+        self.ttl = ttl
+        self.enabled = enabled
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._fills: Dict[str, int] = {}
+        self._fill_seq = 0
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.write_throughs = 0
+        self.invalidations = 0
+        self.evictions = 0
+        self.stale_fills = 0
+        self.stale_entries = 0
+
+    @classmethod
+    def from_settings(cls) -> "HistoryCache":
+        return cls(
+            max_bytes=settings.HISTORY_CACHE_MAX_BYTES,
+            max_messages=settings.HISTORY_CACHE_MAX_MESSAGES,
+            ttl=settings.HISTORY_CACHE_TTL_SECONDS,
+            enabled=settings.HISTORY_CACHE_ENABLED,
+        )
+
+    def _get(self, conversation_id: str) -> Optional[_Entry]:
+        entry = self._entries.get(conversation_id)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            self._drop(conversation_id)
+            return None
+        self._entries.move_to_end(conversation_id)
+        return entry
+
+    def _drop(self, conversation_id: str) -> None:
+        entry = self._entries.pop(conversation_id, None)
+        if entry is not None:
+            self.bytes -= entry.bytes
+
+    def _store(self, conversation_id: str, entry: _Entry, added: int) -> None:
+        """Make `entry` the most recently used one; `added` is its growth in bytes since last stored."""
+        if self._entries.get(conversation_id) is entry:
+            self.bytes -= entry.bytes
+            del self._entries[conversation_id]
+        else:
+            self._drop(conversation_id)
+        entry.bytes += added
+        while len(entry.rows) > self.max_messages:
+            entry.bytes -= _size(entry.rows.pop())
+            entry.complete = False
+        if entry.bytes > self.max_bytes:
+            return
+        self._entries[conversation_id] = entry
+        self.bytes += entry.bytes
+        while self.bytes > self.max_bytes:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    # -- reads -------------------------------------------------------------
+
+    def latest(self, conversation_id: str, count: int, before: Optional[MessageDomain] = None) -> Optional[List[MessageDomain]]:
+        """The page `get_latest_by_conversation` would return, or None if the cache cannot tell."""
+        entry = self._get(conversation_id) if self.enabled else None
+        if entry is not None:
+            start = 0
+            if before is not None:
+                anchor = _key(before)
+                while start < len(entry.rows) and _key(entry.rows[start]) >= anchor:
+                    start += 1
+            page = entry.rows[start:start + count]
+            if len(page) == count or entry.complete:
+                self.hits += 1
+                return page
+        self.misses += 1
+        return None
+
+    def conversation_stats(self, conversation_id: str) -> Optional[Tuple[int, int]]:
+        """The (messages_count, last_message_at) the cached run was checked against, if any."""
+        entry = self._get(conversation_id) if self.enabled else None
+        return entry.stats if entry is not None else None
+
+    def count(self, conversation_id: str) -> Optional[int]:
+        entry = self._get(conversation_id) if self.enabled else None
+        if entry is None:
+            return None
+        if entry.complete:
+            return len(entry.rows)
+        return entry.total
+
+    # -- fills from the database -------------------------------------------
+
+    def begin_fill(self, conversation_id: str) -> int:
+        self._fill_seq += 1
+        self._fills[conversation_id] = self._fill_seq
+        return self._fill_seq
+
+    def _claim(self, conversation_id: str, token: int) -> bool:
+        if self._fills.get(conversation_id) != token:
+            self.stale_fills += 1
+            return False
+        del self._fills[conversation_id]
+        return True
+
+    def fill_latest(
+        self, conversation_id: str, token: int, page: List[MessageDomain], count: int, before: Optional[MessageDomain],
+        stats: Optional[Tuple[int, int]] = None,
+    ) -> None:
+        """Store a newest-first page read from the DB, if no write happened meanwhile.
+
+        `stats` are the conversation's (messages_count, last_message_at) read with the page.
+        """
+        if not self.enabled or not self._claim(conversation_id, token):
+            return
+        entry = self._get(conversation_id)
+        if before is None:
+            total = entry.total if entry is not None else None
+            entry = _Entry(time.monotonic() + self.ttl)
+            entry.total = total
+            entry.stats = stats
+            entry.rows = list(page)
+        elif entry is not None and entry.rows and entry.rows[-1].id == before.id and not entry.complete:
+            # the next older page, contiguous with what is cached
+            entry.rows.extend(page)
+        else:
+            return
+        if len(page) < count:
+            entry.complete = True
+        self._store(conversation_id, entry, sum(_size(m) for m in page))
+
+    def fill_count(self, conversation_id: str, token: int, total: int) -> None:
+        if not self.enabled or not self._claim(conversation_id, token):
+            return
+        entry = self._get(conversation_id)
+        if entry is not None:
+            entry.total = total
+
+    # -- writes ------------------------------------------------------------
+
+    def write(self, message: MessageDomain) -> None:
+        """Write-through of a saved message."""
+        conversation_id = message.conversation_id
+        self._fills.pop(conversation_id, None)
+        entry = self._get(conversation_id) if self.enabled else None
+        if entry is None:
+            return
+        rows = entry.rows
+        for i, row in enumerate(rows):
+            if row.id == message.id:
+                rows[i] = message
+                self.write_throughs += 1
+                self._store(conversation_id, entry, _size(message) - _size(row))
+                return
+        if rows and _key(message) < _key(rows[-1]) and not entry.complete:
+            # older than the cached run and maybe an update of an uncached row: reload later
+            self.invalidate(conversation_id)
+            return
+        index = 0
+        while index < len(rows) and _key(rows[index]) > _key(message):
+            index += 1
+        rows.insert(index, message)
+        if entry.total is not None:
+            entry.total += 1
+        if entry.stats is not None:
+            entry.stats = _after_insert(entry.stats, message)
+        self.write_throughs += 1
+        self._store(conversation_id, entry, _size(message))
+
+    def invalidate(self, conversation_id: str) -> None:
+        self._fills.pop(conversation_id, None)
+        if conversation_id in self._entries:
+            self._drop(conversation_id)
+            self.invalidations += 1
+
+    def discard_stale(self, conversation_id: str) -> None:
+        """Drop an entry found out of date with the database (written by another process)."""
+        self.stale_entries += 1
+        self.invalidate(conversation_id)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "conversations": len(self._entries),
+            "messages": sum(len(e.rows) for e in self._entries.values()),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "write_throughs": self.write_throughs,
+            "invalidations": self.invalidations,
+            "evictions": self.evictions,
+            "stale_fills": self.stale_fills,
+            "stale_entries": self.stale_entries,
+        }
+
+
+history_cache = HistoryCache.from_settings()
+
+
+class CachedMessageRepository(MessageOutputPort, HealthCheckOutputPort):
+    """MessageOutputPort that serves chat history from `HistoryCache` and keeps it current."""
+
+    def __init__(self, inner: MessageRepository, cache: Optional[HistoryCache] = None):
+        self.inner = inner
+        self.cache = cache or history_cache
+
+    async def get_latest_by_conversation(self, conversation_id: str, count: int, before: Optional[MessageDomain] = None) -> List[MessageDomain]:
+        cached = self.cache.latest(conversation_id, count, before)
+        if cached is not None:
+            return cached
+        token = self.cache.begin_fill(conversation_id)
+        page = await self.inner.get_latest_by_conversation(conversation_id, count, before)
+        self.cache.fill_latest(conversation_id, token, page, count, before)
+        return page
+
+    async def count_by_conversation(self, conversation_id: str) -> int:
+        cached = self.cache.count(conversation_id)
+        if cached is not None:
+            return cached
+        token = self.cache.begin_fill(conversation_id)
+        total = await self.inner.count_by_conversation(conversation_id)
+        self.cache.fill_count(conversation_id, token, total)
+        return total
+
+    async def save(self, message: MessageDomain) -> MessageDomain:
+        try:
+            saved = await self.inner.save(message)
+        except Exception:
+            self.cache.invalidate(message.conversation_id)
+            raise
+        self.cache.write(saved)
+        return saved
+
+    async def insert_and_get_latest(self, message: MessageDomain, count: int) -> List[MessageDomain]:
+        conversation_id = message.conversation_id
+        if self.cache.conversation_stats(conversation_id) is not None and self.cache.latest(conversation_id, count) is not None:
+            # history is cached: the INSERT, stats UPDATE, a one-row stats read and COMMIT go to the database
+            try:
+                _, current = await self.inner.insert_and_get_latest_with_stats(message, 0)
+            except Exception:
+                self.cache.invalidate(conversation_id)
+                raise
+            known = self.cache.conversation_stats(conversation_id)
+            if known is not None and current == _after_insert(known, message):
+                self.cache.write(message)
+                cached = self.cache.latest(conversation_id, count)
+                if cached is not None:
+                    return cached
+            else:
+                # another worker wrote to or deleted from this conversation since it was cached
+                self.cache.discard_stale(conversation_id)
+            token = self.cache.begin_fill(conversation_id)
+            page = await self.inner.get_latest_by_conversation(conversation_id, count)
+            self.cache.fill_latest(conversation_id, token, page, count, None, current)
+            return page
+        token = self.cache.begin_fill(conversation_id)
+        try:
+            page, current = await self.inner.insert_and_get_latest_with_stats(message, count)
+        except Exception:
+            self.cache.invalidate(conversation_id)
+            raise
+        self.cache.fill_latest(conversation_id, token, page, count, None, current)
+        return page
+
+    async def insert_many(self, messages: List[MessageDomain], ignore_duplicates: bool = False) -> int:
+        conversation_ids = {m.conversation_id for m in messages}
+        try:
+            added = await self.inner.insert_many(messages, ignore_duplicates)
+        finally:
+            # bulk writes (imports) are rarely read right away: reload on the next read
+            for conversation_id in conversation_ids:
+                self.cache.invalidate(conversation_id)
+        return added
+
+    async def checkpoint(self, message: MessageDomain, expected_updated_at: Optional[int] = None) -> bool:
+        try:
+            written = await self.inner.checkpoint(message, expected_updated_at)
+        except Exception:
+            self.cache.invalidate(message.conversation_id)
+            raise
+        if written:
+            self.cache.write(message)
+        return written
+
+    async def get_checkpoint(self, message_id: str) -> Optional[MessageDomain]:
+        return await self.inner.get_checkpoint(message_id)
+
+    def round_trips(self) -> Optional[int]:
+        return self.inner.round_trips()
+
+    async def update(self, message: MessageDomain) -> MessageDomain:
+        try:
+            return await self.inner.update(message)
+        finally:
+            self.cache.invalidate(message.conversation_id)
+
+    async def delete(self, message: MessageDomain) -> bool:
+        try:
+            return await self.inner.delete(message)
+        finally:
+            self.cache.invalidate(message.conversation_id)
+
+    async def delete_by_conversation(self, conversation_id: str) -> bool:
+        try:
+            return await self.inner.delete_by_conversation(conversation_id)
+        finally:
+            self.cache.invalidate(conversation_id)
+
+    async def get_list_by_conversation(
+        self, conversation_id: str, after: Optional[str], limit: int, order: str, cursor: Optional[PageCursor] = None
+    ) -> Tuple[List[MessageDomain], bool]:
+        return await self.inner.get_list_by_conversation(conversation_id, after, limit, order, cursor)
+
+    async def stream_by_conversation(self, conversation_id: str, batch_size: int = 1000) -> AsyncIterator[MessageDomain]:
+        async for message in self.inner.stream_by_conversation(conversation_id, batch_size):
+            yield message
+
+    async def get_all_by_conversation(self, conversation_id: str) -> List[MessageDomain]:
+        return await self.inner.get_all_by_conversation(conversation_id)
+
+    async def get_oldest_by_conversation(self, conversation_id: str, count: int, after: Optional[MessageDomain] = None) -> List[MessageDomain]:
+        return await self.inner.get_oldest_by_conversation(conversation_id, count, after)
+
+    async def get_by_id(self, message_id: str) -> MessageDomain:
+        return await self.inner.get_by_id(message_id)
+
+    async def get_by_conversation_and_role(self, conversation_id: str, role: str) -> List[MessageDomain]:
+        return await self.inner.get_by_conversation_and_role(conversation_id, role)
+
+    async def is_healthy(self) -> bool:
+        return await self.inner.is_healthy()
+
+    async def is_ready(self) -> bool:
+        return await self.inner.is_ready()
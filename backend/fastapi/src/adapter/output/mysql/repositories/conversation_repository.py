@@ -1,10 +1,12 @@
-from typing import Optional, Tuple, List
+from typing import AsyncIterator, Optional, Tuple, List
 from sqlalchemy import and_, or_, asc, desc, select, func
 from sqlalchemy.ext.asyncio import AsyncSession
 from src.application.ports.output.health_check_output_port import HealthCheckOutputPort
 from src.adapter.output.mysql.entities import ConversationEntity
-from src.adapter.output.mysql.entities.message_entity import MessageEntity
+from src.adapter.output.mysql.repositories.bulk_insert import insert_stmt
+from src.adapter.output.mysql.repositories.keyset import seek
 from src.domain.models.conversation_domain import ConversationDomain
+from src.domain.vo.page_cursor import PageCursor
 from src.application.ports.output.conversation_output_port import ConversationOutputPort
 
 class ConversationRepository(ConversationOutputPort, HealthCheckOutputPort):
@@ -16,68 +18,79 @@ class ConversationRepository(ConversationOutputPort, HealthCheckOutputPort):
         ent = await self.db.get(ConversationEntity, conversation_id)
         return ent.to_domain() if ent is not None else None
 
-    async def get_all(self, limit: int, after: Optional[str], order: str) -> Tuple[List[ConversationDomain], bool]:
-        """Cursor pagination (async).
+    async def get_all(
+        self, limit: int, after: Optional[str], order: str, cursor: Optional[PageCursor] = None, sort: str = "created_at"
+    ) -> Tuple[List[ConversationDomain], bool]:
+        """Keyset pagination (async).
 
-        Returns (items, has_more).
+        Returns (items, has_more). A cursor carries the sort key to continue from, so no
+        anchor row is loaded; a (legacy) `after` id is looked up first. `sort` is
+        `created_at` or `last_message_at` (recently active first with order desc).
         """
         # determine order
         order = (order or "desc").lower()
         if order not in ("asc", "desc"):
             order = "desc"
 
-        order_col = ConversationEntity.created_at.asc() if order == "asc" else ConversationEntity.created_at.desc()
-        tie_order = ConversationEntity.id.asc() if order == "asc" else ConversationEntity.id.desc()
+        sort_col = ConversationEntity.last_message_at if sort == "last_message_at" else ConversationEntity.created_at
 
-        stmt = select(ConversationEntity)
-
-        if after:
+        key = cursor.key if cursor is not None else None
+        if cursor is None and after:
             # find anchor
             anchor = await self.db.get(ConversationEntity, after)
             if anchor:
-                if order == "desc":
-                    stmt = stmt.where(
-                        or_(
-                            ConversationEntity.created_at < anchor.created_at,
-                            and_(ConversationEntity.created_at == anchor.created_at, ConversationEntity.id < anchor.id),
-                        )
-                    )
-                else:
-                    stmt = stmt.where(
-                        or_(
-                            ConversationEntity.created_at > anchor.created_at,
-                            and_(ConversationEntity.created_at == anchor.created_at, ConversationEntity.id > anchor.id),
-                        )
-                    )
+                key = (getattr(anchor, sort_col.key), anchor.id)
+        backward = cursor is not None and cursor.backward
 
-        stmt = stmt.order_by(order_col, tie_order)
+        stmt = seek(select(ConversationEntity), sort_col, ConversationEntity.id, order, key, backward)
 
         # fetch one extra
         result = await self.db.execute(stmt.limit(limit + 1))
         rows = result.scalars().all()
         has_more = len(rows) > limit
         items = rows[:limit]
-        # map to domain
-        domains = [r.to_domain() for r in items]
+        if backward:
+            items.reverse()
+        # messages_count / last message come with the rows (kept by the message writes)
+        return [r.to_domain() for r in items], has_more
+
+    async def stream_all(self, conversation_ids: Optional[List[str]] = None, batch_size: int = 500) -> AsyncIterator[ConversationDomain]:
+        """Keyset pages of `batch_size` by (created_at, id), each fully read before it is yielded."""
+        key = None
+        while True:
+            stmt = select(ConversationEntity)
+            if conversation_ids is not None:
+                stmt = stmt.where(ConversationEntity.id.in_(conversation_ids))
+            stmt = seek(stmt, ConversationEntity.created_at, ConversationEntity.id, "asc", key)
+            rows = (await self.db.execute(stmt.limit(batch_size))).scalars().all()
+            for row in rows:
+                yield row.to_domain()
+            if len(rows) < batch_size:
+                return
+            key = (rows[-1].created_at, rows[-1].id)
 
-        # Fetch message counts for all returned conversations in one query to
-        # avoid N+1 queries. If there are no conversations, skip the query.
-        if domains:
-            convo_ids = [d.id for d in domains]
-            count_stmt = (
-                select(MessageEntity.conversation_id, func.count())
-                .where(MessageEntity.conversation_id.in_(convo_ids))
-                .group_by(MessageEntity.conversation_id)
-            )
-            res = await self.db.execute(count_stmt)
-            rows = res.all()
-            # rows are tuples (conversation_id, count)
-            counts = {r[0]: int(r[1]) for r in rows}
-            # attach counts to domains (use 0 as default)
-            for d in domains:
-                d.messages_count = counts.get(d.id, 0)
+    async def insert_many(self, conversations: List[ConversationDomain], ignore_duplicates: bool = False) -> int:
+        """One multi-row INSERT and one COMMIT; with `ignore_duplicates` existing ids are skipped
+        by the conflict clause and the rows added are counted from its rowcount.
 
-        return domains, has_more
+        Stats start empty: inserting the messages afterwards counts them.
+        """
+        if not conversations:
+            return 0
+        rows = [
+            {
+                "id": c.id, "name": c.name, "created_at": c.created_at, "updated_at": c.updated_at,
+                "messages_count": 0, "last_message_at": c.created_at, "last_message_preview": None,
+            }
+            for c in conversations
+        ]
+        try:
+            result = await self.db.execute(insert_stmt(self.db, ConversationEntity.__table__, ignore_duplicates), rows)
+            await self.db.commit()
+        except Exception:
+            await self.db.rollback()
+            raise
+        return result.rowcount if ignore_duplicates else len(rows)
 
     async def save(self, conversation: ConversationDomain) -> ConversationDomain:
         existing = await self.db.get(ConversationEntity, conversation.id)
@@ -0,0 +1,146 @@
+"""Denormalized per-conversation message stats.
+
+`conversations.messages_count`, `last_message_at` and `last_message_preview`
+are kept current by the message write paths, inside the transaction that
+writes the messages, so listing and detail pages read them instead of
+counting. `last_message_at` is the newest message's `created_at`, or the
+conversation's own while it has no messages, which makes it the "recently
+active" sort key.
+
+The statements run on the `conversations` table (not the ORM entity) so an
+executemany updates one row per parameter set. Their SET clauses are
+ordered: MySQL evaluates each assignment with the columns already assigned
+before it, so the columns read by a later assignment are written last.
+"""
+from __future__ import annotations
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import Update, bindparam, case, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.adapter.output.mysql.entities import ConversationEntity, MessageEntity
+from src.domain.models.message_domain import MessageDomain
+
+PREVIEW_CHARS = 200
+
+conversations = ConversationEntity.__table__
+messages = MessageEntity.__table__
+
+
+def preview(text: Optional[str]) -> str:
+    """Same as the SQL `substr(content, 1, PREVIEW_CHARS)` used when recomputing."""
+    return (text or "")[:PREVIEW_CHARS]
+
+
+def _newest(column):
+    """Correlated subquery: `column` of the conversation's newest message."""
+    return (
+        select(column)
+        .where(messages.c.conversation_id == conversations.c.id)
+        .order_by(messages.c.created_at.desc(), messages.c.id.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+
+
+def _last_values() -> List[Tuple]:
+    return [
+        (conversations.c.last_message_preview, _newest(func.substr(messages.c.content, 1, PREVIEW_CHARS))),
+        (conversations.c.last_message_at, func.coalesce(_newest(messages.c.created_at), conversations.c.created_at)),
+    ]
+
+
+def added_stmt() -> Update:
+    """Count `b_count` more messages; `b_at` / `b_preview` become the last message unless a newer one is known.
+
+    Parameters: b_conversation_id, b_count, b_at, b_preview (one set per conversation).
+    """
+    newer = or_(conversations.c.messages_count == 0, conversations.c.last_message_at <= bindparam("b_at"))
+    return (
+        update(conversations)
+        .where(conversations.c.id == bindparam("b_conversation_id"))
+        .ordered_values(
+            (conversations.c.last_message_preview, case((newer, bindparam("b_preview")), else_=conversations.c.last_message_preview)),
+            (conversations.c.last_message_at, case((newer, bindparam("b_at")), else_=conversations.c.last_message_at)),
+            (conversations.c.messages_count, conversations.c.messages_count + bindparam("b_count")),
+        )
+    )
+
+
+def added_params(written: Iterable[MessageDomain]) -> List[Dict]:
+    """`added_stmt` parameters for newly inserted messages, one set per conversation."""
+    by_conversation: Dict[str, Tuple[int, MessageDomain]] = {}
+    for message in written:
+        count, newest = by_conversation.get(message.conversation_id, (0, message))
+        if (message.created_at, message.id) > (newest.created_at, newest.id):
+            newest = message
+        by_conversation[message.conversation_id] = (count + 1, newest)
+    return [
+        {"b_conversation_id": cid, "b_count": count, "b_at": newest.created_at, "b_preview": preview(newest.content)}
+        for cid, (count, newest) in by_conversation.items()
+    ]
+
+
+def removed_stmt(conversation_id: str, count: int) -> Update:
+    """`count` fewer messages; the last message is looked up again (one index seek)."""
+    remaining = conversations.c.messages_count - count
+    return (
+        update(conversations)
+        .where(conversations.c.id == conversation_id)
+        .ordered_values(*_last_values(), (conversations.c.messages_count, case((remaining > 0, remaining), else_=0)))
+    )
+
+
+def relast_stmt(conversation_id: str) -> Update:
+    """Look the last message up again, e.g. after its text changed."""
+    return update(conversations).where(conversations.c.id == conversation_id).ordered_values(*_last_values())
+
+
+def cleared_stmt(conversation_id: str) -> Update:
+    return (
+        update(conversations)
+        .where(conversations.c.id == conversation_id)
+        .ordered_values(
+            (conversations.c.last_message_preview, None),
+            (conversations.c.last_message_at, conversations.c.created_at),
+            (conversations.c.messages_count, 0),
+        )
+    )
+
+
+def recount_stmt(conversation_ids: List[str]) -> Update:
+    """Recompute all three columns from `messages` (repair / backfill)."""
+    total = select(func.count()).where(messages.c.conversation_id == conversations.c.id).scalar_subquery()
+    return (
+        update(conversations)
+        .where(conversations.c.id.in_(conversation_ids))
+        .ordered_values(*_last_values(), (conversations.c.messages_count, total))
+    )
+
+
+async def backfill(db: AsyncSession, batch_size: int = 500, conversation_ids: Optional[List[str]] = None) -> int:
+    """Recompute the stats of every conversation (or of `conversation_ids`), a committed batch at a time.
+
+    Returns how many conversations were processed.
+    """
+    done = 0
+    if conversation_ids is not None:
+        for start in range(0, len(conversation_ids), batch_size):
+            batch = conversation_ids[start:start + batch_size]
+            await db.execute(recount_stmt(batch))
+            await db.commit()
+            done += len(batch)
+        return done
+    after: Optional[str] = None
+    while True:
+        stmt = select(conversations.c.id).order_by(conversations.c.id).limit(batch_size)
+        if after is not None:
+            stmt = stmt.where(conversations.c.id > after)
+        batch = list((await db.execute(stmt)).scalars().all())
+        if not batch:
+            return done
+        await db.execute(recount_stmt(batch))
+        await db.commit()
+        done += len(batch)
+        after = batch[-1]
@@ -0,0 +1,24 @@
+"""Keyset (seek) pagination on `(created_at, id)`."""
+from __future__ import annotations
+
+from typing import Optional, Tuple
+
+from sqlalchemy import Select, and_, or_
+
+
+def seek(stmt: Select, created_at_col, id_col, order: str, key: Optional[Tuple[int, str]] = None, backward: bool = False) -> Select:
+    """Order `stmt` by `(created_at, id)` and keep only rows strictly past `key`.
+
+    `backward` reads towards the start of the list (the page before `key`): the scan runs
+    in the opposite order, so the caller reverses the rows it gets back.
+    """
+    descending = (order == "desc") != backward
+    if key is not None:
+        created_at, element_id = key
+        if descending:
+            stmt = stmt.where(or_(created_at_col < created_at, and_(created_at_col == created_at, id_col < element_id)))
+        else:
+            stmt = stmt.where(or_(created_at_col > created_at, and_(created_at_col == created_at, id_col > element_id)))
+    if descending:
+        return stmt.order_by(created_at_col.desc(), id_col.desc())
+    return stmt.order_by(created_at_col.asc(), id_col.asc())
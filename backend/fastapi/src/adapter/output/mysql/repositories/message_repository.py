@@ -1,66 +1,92 @@
-from typing import List, Optional, Tuple
-from sqlalchemy import select, asc, desc, and_, or_, func, delete
+from typing import AsyncIterator, Iterator, List, Optional, Set, Tuple
+from sqlalchemy import select, asc, desc, and_, or_, func, delete, insert, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from src.application.ports.output.health_check_output_port import HealthCheckOutputPort
-from src.adapter.output.mysql.entities import MessageEntity
+from src.adapter.output.mysql.db.base import db_round_trips
+from src.adapter.output.mysql.repositories.bulk_insert import insert_stmt
+from src.adapter.output.mysql.entities import ConversationEntity, MessageEntity
+from src.adapter.output.mysql.repositories.conversation_stats import (
+    added_params, added_stmt, cleared_stmt, recount_stmt, relast_stmt, removed_stmt,
+)
+from src.adapter.output.mysql.repositories.keyset import seek
+from src.domain.enums.enums import EMessageStatus
 from src.domain.models.message_domain import MessageDomain
+from src.domain.vo.page_cursor import PageCursor
 from src.application.ports.output.message_output_port import MessageOutputPort
 
 
+def _row(message: MessageDomain) -> dict:
+    return {
+        "id": message.id,
+        "conversation_id": message.conversation_id,
+        "role": message.role,
+        "content": message.content,
+        "created_at": message.created_at,
+        "status": message.status.value,
+        "updated_at": message.updated_at,
+    }
+
+
+# one multi-row INSERT stays under SQLite's bound-parameter limit and MySQL's max_allowed_packet
+INSERT_CHUNK_ROWS = 1000
+INSERT_CHUNK_BYTES = 4 * 1024 * 1024
+
+
+def _chunks(messages: List[MessageDomain]) -> Iterator[List[MessageDomain]]:
+    chunk: List[MessageDomain] = []
+    size = 0
+    for message in messages:
+        length = len(message.content.encode("utf-8"))
+        if chunk and (len(chunk) >= INSERT_CHUNK_ROWS or size + length > INSERT_CHUNK_BYTES):
+            yield chunk
+            chunk, size = [], 0
+        chunk.append(message)
+        size += length
+    if chunk:
+        yield chunk
+
+
 class MessageRepository(MessageOutputPort, HealthCheckOutputPort):
 
     def __init__(self, db: AsyncSession):
         self.db = db
 
-    async def get_list_by_conversation(self, conversation_id: str, after: Optional[str], limit: int, order: str) -> Tuple[List[MessageDomain], bool]:
-        """Cursor-pagination: returns (items, has_more).
+    async def _count_added(self, messages: List[MessageDomain]) -> None:
+        """Bump the conversations' stats for newly inserted `messages` (same transaction)."""
+        params = added_params(messages)
+        if params:
+            await self.db.execute(added_stmt(), params)
 
-        - after: optional anchor id (primary key) as string. If provided, results are fetched after/before this anchor depending on order.
+    async def get_list_by_conversation(
+        self, conversation_id: str, after: Optional[str], limit: int, order: str, cursor: Optional[PageCursor] = None
+    ) -> Tuple[List[MessageDomain], bool]:
+        """Keyset pagination: returns (items, has_more).
+
+        - cursor: sort key to continue from (one range query); its order and direction win
+        - after: (legacy) anchor message id, loaded first to get its sort key
         - order: 'asc' or 'desc' (by created_at then id)
         """
         order = (order or "desc").lower()
         if order not in ("asc", "desc"):
             order = "desc"
 
-        order_col = MessageEntity.created_at.asc() if order == "asc" else MessageEntity.created_at.desc()
-        tie_order = MessageEntity.id.asc() if order == "asc" else MessageEntity.id.desc()
+        key = cursor.key if cursor is not None else None
+        if cursor is None and after:
+            anchor = await self.db.get(MessageEntity, after)
+            if anchor is not None:
+                key = (anchor.created_at, anchor.id)
+        backward = cursor is not None and cursor.backward
 
         stmt = select(MessageEntity).where(MessageEntity.conversation_id == conversation_id)
-
-        if after:
-            # try to load anchor by PK; be permissive with types
-            anchor = None
-            try:
-                anchor = await self.db.get(MessageEntity, int(after))
-            except Exception:
-                try:
-                    anchor = await self.db.get(MessageEntity, after)
-                except Exception:
-                    anchor = None
-
-            if anchor:
-                if order == "desc":
-                    stmt = stmt.where(
-                        or_(
-                            MessageEntity.created_at < anchor.created_at,
-                            and_(MessageEntity.created_at == anchor.created_at, MessageEntity.id < anchor.id),
-                        )
-                    )
-                else:
-                    stmt = stmt.where(
-                        or_(
-                            MessageEntity.created_at > anchor.created_at,
-                            and_(MessageEntity.created_at == anchor.created_at, MessageEntity.id > anchor.id),
-                        )
-                    )
-
-        stmt = stmt.order_by(order_col, tie_order)
+        stmt = seek(stmt, MessageEntity.created_at, MessageEntity.id, order, key, backward)
 
         # fetch one extra to determine has_more
         result = await self.db.execute(stmt.limit(limit + 1))
         rows = result.scalars().all()
         has_more = len(rows) > limit
         items = rows[:limit]
+        if backward:
+            items.reverse()
         return [r.to_domain() for r in items], has_more
 
     async def get_all_by_conversation(self, conversation_id: str) -> List[MessageDomain]:
@@ -69,6 +95,21 @@ class MessageRepository(MessageOutputPort, HealthCheckOutputPort):
         rows = res.scalars().all()
         return [r.to_domain() for r in rows]
 
+    async def stream_by_conversation(self, conversation_id: str, batch_size: int = 1000) -> AsyncIterator[MessageDomain]:
+        """Oldest first through a server-side cursor, fetching `batch_size` rows at a time."""
+        stmt = (
+            select(MessageEntity)
+            .where(MessageEntity.conversation_id == conversation_id)
+            .order_by(MessageEntity.created_at.asc(), MessageEntity.id.asc())
+            .execution_options(yield_per=batch_size)
+        )
+        result = await self.db.stream_scalars(stmt)
+        try:
+            async for ent in result:
+                yield ent.to_domain()
+        finally:
+            await result.close()
+
     async def save(self, message: MessageDomain) -> MessageDomain:
         # Try to detect existing entity by PK if provided and numeric
         ent = None
@@ -81,6 +122,7 @@ class MessageRepository(MessageOutputPort, HealthCheckOutputPort):
         if not ent:
             ent = MessageEntity.from_domain(message)
             self.db.add(ent)
+            await self._count_added([message])
             await self.db.commit()
             await self.db.refresh(ent)
             return ent.to_domain()
@@ -88,10 +130,130 @@ class MessageRepository(MessageOutputPort, HealthCheckOutputPort):
         # update existing
         setattr(ent, "role", message.role)
         setattr(ent, "content", message.content)
+        await self.db.flush()
+        await self.db.execute(relast_stmt(message.conversation_id))
         await self.db.commit()
         await self.db.refresh(ent)
         return ent.to_domain()
 
+    async def insert_and_get_latest(self, message: MessageDomain, count: int) -> List[MessageDomain]:
+        """INSERT + conversation stats UPDATE + newest-first SELECT + COMMIT: one transaction, no pre-read, no refresh.
+
+        With count == 0 only the insert is committed.
+        """
+        page, _ = await self._insert_and_read(message, count, with_stats=False)
+        return page
+
+    async def insert_and_get_latest_with_stats(self, message: MessageDomain, count: int) -> Tuple[List[MessageDomain], Tuple[int, int]]:
+        """`insert_and_get_latest`, plus the conversation's (messages_count, last_message_at) after the insert.
+
+        The stats come with the page (joined), or from a one-row read when count == 0;
+        the history cache compares them with what it holds to detect writes made elsewhere.
+        """
+        page, stats = await self._insert_and_read(message, count, with_stats=True)
+        assert stats is not None
+        return page, stats
+
+    async def _insert_and_read(
+        self, message: MessageDomain, count: int, with_stats: bool
+    ) -> Tuple[List[MessageDomain], Optional[Tuple[int, int]]]:
+        stats: Optional[Tuple[int, int]] = None
+        try:
+            await self.db.execute(insert(MessageEntity).values(_row(message)))
+            await self._count_added([message])
+            rows = []
+            if count > 0:
+                columns = [MessageEntity]
+                if with_stats:
+                    columns += [ConversationEntity.messages_count, ConversationEntity.last_message_at]
+                stmt = select(*columns).where(MessageEntity.conversation_id == message.conversation_id)
+                if with_stats:
+                    stmt = stmt.join(ConversationEntity, ConversationEntity.id == MessageEntity.conversation_id)
+                stmt = stmt.order_by(MessageEntity.created_at.desc(), MessageEntity.id.desc()).limit(count)
+                result = (await self.db.execute(stmt)).all()
+                rows = [r[0] for r in result]
+                if with_stats and result:
+                    stats = (result[0][1], result[0][2])
+            if with_stats and stats is None:
+                stmt = select(ConversationEntity.messages_count, ConversationEntity.last_message_at).where(
+                    ConversationEntity.id == message.conversation_id
+                )
+                found = (await self.db.execute(stmt)).one()
+                stats = (found[0], found[1])
+            await self.db.commit()
+        except Exception:
+            await self.db.rollback()
+            raise
+        return [r.to_domain() for r in rows], stats
+
+    async def insert_many(self, messages: List[MessageDomain], ignore_duplicates: bool = False) -> int:
+        """Multi-row INSERTs, one conversation stats UPDATE and one COMMIT; nothing is read back.
+
+        Ids are the messages' own (generated by the caller). Large inputs are split into
+        statements of at most INSERT_CHUNK_ROWS rows / INSERT_CHUNK_BYTES of text, all in
+        the one transaction. With `ignore_duplicates`, rows whose id already exists are
+        skipped by the conflict clause, so a batch replayed after a crash can be inserted
+        again safely; the rows added are counted from the statements' rowcount, and the
+        conversations of a chunk that skipped some are recounted. Returns that count.
+        """
+        if not messages:
+            return 0
+        added = 0
+        counted: List[MessageDomain] = []
+        recount: Set[str] = set()
+        try:
+            for chunk in _chunks(messages):
+                result = await self.db.execute(insert_stmt(self.db, MessageEntity.__table__, ignore_duplicates), [_row(m) for m in chunk])
+                written = result.rowcount if ignore_duplicates else len(chunk)
+                added += written
+                if written == len(chunk):
+                    counted.extend(chunk)
+                else:
+                    # which rows were skipped is unknown: recompute their conversations' stats
+                    recount.update(m.conversation_id for m in chunk)
+            await self._count_added([m for m in counted if m.conversation_id not in recount])
+            if recount:
+                await self.db.execute(recount_stmt(sorted(recount)))
+            await self.db.commit()
+        except Exception:
+            await self.db.rollback()
+            raise
+        return added
+
+    async def checkpoint(self, message: MessageDomain, expected_updated_at: Optional[int] = None) -> bool:
+        """UPDATE content/status/updated_at by id (INSERT when the row does not exist yet) + COMMIT.
+
+        The conversation's stats follow the insert and the final checkpoint; the preview of
+        an answer still streaming keeps the text it was first inserted with.
+        """
+        stmt = update(MessageEntity).where(MessageEntity.id == message.id)
+        if expected_updated_at is not None:
+            stmt = stmt.where(MessageEntity.updated_at == expected_updated_at)
+        stmt = stmt.values(content=message.content, status=message.status.value, updated_at=message.updated_at)
+        try:
+            written = (await self.db.execute(stmt)).rowcount > 0
+            if written and message.status != EMessageStatus.IN_PROGRESS:
+                await self.db.execute(relast_stmt(message.conversation_id))
+            elif not written and expected_updated_at is None:
+                await self.db.execute(insert(MessageEntity).values(_row(message)))
+                await self._count_added([message])
+                written = True
+            await self.db.commit()
+        except Exception:
+            await self.db.rollback()
+            raise
+        return written
+
+    async def get_checkpoint(self, message_id: str) -> Optional[MessageDomain]:
+        ent = await self.db.get(MessageEntity, message_id, populate_existing=True)
+        message = ent.to_domain() if ent is not None else None
+        # end the read transaction so the next poll sees rows committed since
+        await self.db.commit()
+        return message
+
+    def round_trips(self) -> Optional[int]:
+        return db_round_trips(self.db)
+
     async def delete(self, message: MessageDomain) -> bool:
         # find by PK
         ent = None
@@ -105,6 +267,8 @@ class MessageRepository(MessageOutputPort, HealthCheckOutputPort):
 
         if ent:
             await self.db.delete(ent)
+            await self.db.flush()
+            await self.db.execute(removed_stmt(ent.conversation_id, 1))
             await self.db.commit()
             return True
         return False
@@ -112,6 +276,7 @@ class MessageRepository(MessageOutputPort, HealthCheckOutputPort):
     async def delete_by_conversation(self, conversation_id: str) -> bool:
         stmt = delete(MessageEntity).where(MessageEntity.conversation_id == conversation_id)
         await self.db.execute(stmt)
+        await self.db.execute(cleared_stmt(conversation_id))
         await self.db.commit()
         return True
 
@@ -120,8 +285,31 @@ class MessageRepository(MessageOutputPort, HealthCheckOutputPort):
         res = await self.db.execute(stmt)
         return int(res.scalar_one() or 0)
 
-    async def get_latest_by_conversation(self, conversation_id: str, count: int) -> List[MessageDomain]:
-        stmt = select(MessageEntity).where(MessageEntity.conversation_id == conversation_id).order_by(MessageEntity.created_at.desc(), MessageEntity.id.desc()).limit(count)
+    async def get_latest_by_conversation(self, conversation_id: str, count: int, before: Optional[MessageDomain] = None) -> List[MessageDomain]:
+        stmt = select(MessageEntity).where(MessageEntity.conversation_id == conversation_id)
+        if before is not None:
+            # keyset on (created_at, id) straight from the previous page, no anchor lookup
+            stmt = stmt.where(
+                or_(
+                    MessageEntity.created_at < before.created_at,
+                    and_(MessageEntity.created_at == before.created_at, MessageEntity.id < before.id),
+                )
+            )
+        stmt = stmt.order_by(MessageEntity.created_at.desc(), MessageEntity.id.desc()).limit(count)
+        res = await self.db.execute(stmt)
+        rows = res.scalars().all()
+        return [r.to_domain() for r in rows]
+
+    async def get_oldest_by_conversation(self, conversation_id: str, count: int, after: Optional[MessageDomain] = None) -> List[MessageDomain]:
+        stmt = select(MessageEntity).where(MessageEntity.conversation_id == conversation_id)
+        if after is not None:
+            stmt = stmt.where(
+                or_(
+                    MessageEntity.created_at > after.created_at,
+                    and_(MessageEntity.created_at == after.created_at, MessageEntity.id > after.id),
+                )
+            )
+        stmt = stmt.order_by(MessageEntity.created_at.asc(), MessageEntity.id.asc()).limit(count)
         res = await self.db.execute(stmt)
         rows = res.scalars().all()
         return [r.to_domain() for r in rows]
@@ -149,6 +337,8 @@ class MessageRepository(MessageOutputPort, HealthCheckOutputPort):
 
         setattr(ent, "role", message.role)
         setattr(ent, "content", message.content)
+        await self.db.flush()
+        await self.db.execute(relast_stmt(ent.conversation_id))
         await self.db.commit()
         await self.db.refresh(ent)
         return ent.to_domain()
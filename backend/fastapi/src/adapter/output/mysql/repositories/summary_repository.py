@@ -0,0 +1,28 @@
+from typing import Optional
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.adapter.output.mysql.entities import ConversationSummaryEntity
+from src.domain.models.summary_domain import ConversationSummaryDomain
+from src.application.ports.output.summary_output_port import SummaryOutputPort
+
+
+class SummaryRepository(SummaryOutputPort):
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_by_conversation(self, conversation_id: str) -> Optional[ConversationSummaryDomain]:
+        ent = await self.db.get(ConversationSummaryEntity, conversation_id)
+        return ent.to_domain() if ent is not None else None
+
+    async def save(self, summary: ConversationSummaryDomain) -> ConversationSummaryDomain:
+        # merge() turns this into an UPDATE when the conversation already has a summary
+        ent = await self.db.merge(ConversationSummaryEntity.from_domain(summary))
+        await self.db.commit()
+        return ent.to_domain()
+
+    async def delete_by_conversation(self, conversation_id: str) -> bool:
+        stmt = delete(ConversationSummaryEntity).where(ConversationSummaryEntity.conversation_id == conversation_id)
+        await self.db.execute(stmt)
+        await self.db.commit()
+        return True
@@ -0,0 +1,124 @@
+"""MessageOutputPort whose new messages are written behind by `MessagePersister`.
+
+`save` and the chat-turn insert hand the message to the persister instead of
+committing it on the request's session; the history cache is updated right
+away so the same process reads its own writes. Updates and deletes first wait
+for the queued messages, so they never race with a batch still in flight.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import AsyncIterator, List, Optional, Tuple
+
+from src.adapter.output.mysql.repositories.cached_message_repository import HistoryCache
+from src.adapter.worker.message_persister import MessagePersister
+from src.application.ports.output.health_check_output_port import HealthCheckOutputPort
+from src.application.ports.output.message_output_port import MessageOutputPort
+from src.domain.models.message_domain import MessageDomain
+from src.domain.vo.page_cursor import PageCursor
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindMessageRepository(MessageOutputPort, HealthCheckOutputPort):
+    def __init__(
+        self,
+        inner: MessageOutputPort,
+        persister: MessagePersister,
+        cache: Optional[HistoryCache] = None,
+        durable: bool = False,
+        durable_timeout: float = 5.0,
+    ):
+        self.inner = inner
+        self.persister = persister
+        self.cache = cache
+        self.durable = durable
+        self.durable_timeout = durable_timeout
+
+    async def save(self, message: MessageDomain) -> MessageDomain:
+        written = await self.persister.submit(message)
+        if self.cache is not None:
+            self.cache.write(message)
+        if self.durable:
+            try:
+                # shielded: giving up waiting must not cancel the write
+                await asyncio.wait_for(asyncio.shield(written), self.durable_timeout)
+            except asyncio.TimeoutError:
+                logger.warning("Message %s not committed after %.1fs; it stays queued", message.id, self.durable_timeout)
+        return message
+
+    async def insert_and_get_latest(self, message: MessageDomain, count: int) -> List[MessageDomain]:
+        await self.save(message)
+        if count <= 0:
+            return []
+        # a page read before the batch lands may lack `message`; the caller pins it anyway
+        return await self.inner.get_latest_by_conversation(message.conversation_id, count)
+
+    async def insert_many(self, messages: List[MessageDomain], ignore_duplicates: bool = False) -> int:
+        # already one batch: written directly rather than through the queue
+        added = await self.inner.insert_many(messages, ignore_duplicates)
+        if self.cache is not None:
+            for conversation_id in {m.conversation_id for m in messages}:
+                self.cache.invalidate(conversation_id)
+        return added
+
+    async def checkpoint(self, message: MessageDomain, expected_updated_at: Optional[int] = None) -> bool:
+        # checkpoints update their row in place, so they are written directly, not queued
+        return await self.inner.checkpoint(message, expected_updated_at)
+
+    async def get_checkpoint(self, message_id: str) -> Optional[MessageDomain]:
+        return await self.inner.get_checkpoint(message_id)
+
+    def round_trips(self) -> Optional[int]:
+        return self.inner.round_trips()
+
+    async def get_by_id(self, message_id: str) -> MessageDomain:
+        queued = self.persister.pending(message_id)
+        if queued is not None:
+            return queued
+        return await self.inner.get_by_id(message_id)
+
+    async def update(self, message: MessageDomain) -> MessageDomain:
+        await self.persister.flush()
+        return await self.inner.update(message)
+
+    async def delete(self, message: MessageDomain) -> bool:
+        await self.persister.flush()
+        return await self.inner.delete(message)
+
+    async def delete_by_conversation(self, conversation_id: str) -> bool:
+        await self.persister.flush()
+        return await self.inner.delete_by_conversation(conversation_id)
+
+    async def get_latest_by_conversation(self, conversation_id: str, count: int, before: Optional[MessageDomain] = None) -> List[MessageDomain]:
+        return await self.inner.get_latest_by_conversation(conversation_id, count, before)
+
+    async def count_by_conversation(self, conversation_id: str) -> int:
+        return await self.inner.count_by_conversation(conversation_id)
+
+    async def get_list_by_conversation(
+        self, conversation_id: str, after: Optional[str], limit: int, order: str, cursor: Optional[PageCursor] = None
+    ) -> Tuple[List[MessageDomain], bool]:
+        return await self.inner.get_list_by_conversation(conversation_id, after, limit, order, cursor)
+
+    async def stream_by_conversation(self, conversation_id: str, batch_size: int = 1000) -> AsyncIterator[MessageDomain]:
+        # queued messages are part of the conversation too
+        await self.persister.flush()
+        async for message in self.inner.stream_by_conversation(conversation_id, batch_size):
+            yield message
+
+    async def get_all_by_conversation(self, conversation_id: str) -> List[MessageDomain]:
+        return await self.inner.get_all_by_conversation(conversation_id)
+
+    async def get_oldest_by_conversation(self, conversation_id: str, count: int, after: Optional[MessageDomain] = None) -> List[MessageDomain]:
+        return await self.inner.get_oldest_by_conversation(conversation_id, count, after)
+
+    async def get_by_conversation_and_role(self, conversation_id: str, role: str) -> List[MessageDomain]:
+        return await self.inner.get_by_conversation_and_role(conversation_id, role)
+
+    async def is_healthy(self) -> bool:
+        return await self.inner.is_healthy()
+
+    async def is_ready(self) -> bool:
+        return await self.inner.is_ready()
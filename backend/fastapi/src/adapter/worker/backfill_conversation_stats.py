@@ -0,0 +1,44 @@
+"""Recompute conversations.messages_count / last_message_at / last_message_preview.
+
+The message write paths keep these columns current; this repairs them after
+writes that bypassed the repositories (manual SQL, an interrupted migration)
+or fills them on a large table in committed batches. Run from backend/fastapi:
+
+    python -m src.adapter.worker.backfill_conversation_stats [--batch-size 500] [--conversation ID ...]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import time
+from typing import List, Optional
+
+from src.adapter.output.mysql.db.base import get_async_session
+from src.adapter.output.mysql.repositories.conversation_stats import backfill
+
+logger = logging.getLogger(__name__)
+
+
+async def run(batch_size: int = 500, conversation_ids: Optional[List[str]] = None) -> int:
+    db = get_async_session()
+    try:
+        started = time.perf_counter()
+        done = await backfill(db, batch_size, conversation_ids)
+        logger.info("Recomputed stats of %d conversations in %.1fs", done, time.perf_counter() - started)
+        return done
+    finally:
+        await db.close()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--batch-size", type=int, default=500, help="conversations per committed batch")
+    ap.add_argument("--conversation", action="append", dest="conversations", help="only this conversation (repeatable)")
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run(args.batch_size, args.conversations))
+
+
+if __name__ == "__main__":
+    main()
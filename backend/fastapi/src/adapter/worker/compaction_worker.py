@@ -0,0 +1,121 @@
+"""Background worker that folds old conversation turns into rolling summaries.
+
+Chat requests only call `schedule(conversation_id)`, which never blocks: a
+conversation already waiting in the queue is not queued twice, and a full queue
+drops the request (the next turn schedules it again). A single task drains the
+queue, opening its own DB session per conversation so compaction never holds
+on to, or outlives, a request's session.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional, Set
+
+from src.adapter.output.gemini.helper.gemini_client_registry import gemini_client_registry
+from src.adapter.output.gemini.service.gemini_service import GeminiService
+from src.adapter.output.mysql.db.base import get_async_session
+from src.adapter.output.mysql.repositories.message_repository import MessageRepository
+from src.adapter.output.mysql.repositories.summary_repository import SummaryRepository
+from src.application.config.config import settings
+from src.application.usecases.deadline import detached_context
+from src.application.usecases.compaction_usecase import CompactionMetrics, CompactionUseCase, compaction_metrics
+
+logger = logging.getLogger(__name__)
+
+
+async def compact_conversation(conversation_id: str) -> None:
+    db = get_async_session()
+    try:
+        usecase = CompactionUseCase(
+            GeminiService(gemini_client_registry.get()),
+            MessageRepository(db),
+            SummaryRepository(db),
+        )
+        await usecase.compact(conversation_id)
+    finally:
+        await db.close()
+
+
+class CompactionWorker:
+    def __init__(
+        self,
+        run: Callable[[str], Awaitable[None]],
+        enabled: bool = True,
+        max_pending: int = 1000,
+        metrics: Optional[CompactionMetrics] = None,
+    ):
+        self.run = run
+        self.enabled = enabled
+        self.max_pending = max_pending
+        self.metrics = metrics or compaction_metrics
+        self._queue: Optional[asyncio.Queue] = None
+        self._pending: Set[str] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_settings(cls) -> "CompactionWorker":
+        return cls(
+            compact_conversation,
+            enabled=settings.GEMINI_COMPACTION_ENABLED,
+            max_pending=settings.GEMINI_COMPACTION_MAX_PENDING,
+        )
+
+    def schedule(self, conversation_id: str) -> bool:
+        """Queue `conversation_id` for compaction; returns False if it was not queued."""
+        if not self.enabled:
+            return False
+        if conversation_id in self._pending:
+            self.metrics.coalesced += 1
+            return False
+        if len(self._pending) >= self.max_pending:
+            self.metrics.queue_full += 1
+            return False
+        self._ensure_started()
+        assert self._queue is not None
+        self._pending.add(conversation_id)
+        self._queue.put_nowait(conversation_id)
+        self.metrics.scheduled += 1
+        return True
+
+    def _ensure_started(self) -> None:
+        if self._task is None or self._task.done():
+            # the queue is bound to the running loop, so both are (re)created together
+            self._queue = asyncio.Queue()
+            self._pending.clear()
+            # started from a request, but must not inherit its deadline
+            self._task = asyncio.get_running_loop().create_task(self._drain(), context=detached_context())
+
+    async def _drain(self) -> None:
+        assert self._queue is not None
+        queue = self._queue
+        while True:
+            conversation_id = await queue.get()
+            try:
+                await self.run(conversation_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                self.metrics.failures += 1
+                logger.warning("Compaction of conversation %s failed: %s", conversation_id, exc)
+            finally:
+                self._pending.discard(conversation_id)
+                queue.task_done()
+
+    async def join(self) -> None:
+        """Wait until every queued conversation has been processed."""
+        if self._queue is not None and self._task is not None and not self._task.done():
+            await self._queue.join()
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except BaseException:
+                pass
+            self._task = None
+        self._pending.clear()
+
+
+compaction_worker = CompactionWorker.from_settings()
@@ -0,0 +1,87 @@
+"""Export conversations to NDJSON, or load an NDJSON dump back.
+
+Same format and code path as GET /conversations/export and POST
+/conversations/import, without the HTTP hop. Throughput and peak RSS go to
+stderr. Run from backend/fastapi:
+
+    python -m src.adapter.worker.conversation_transfer export [-o FILE] [--conversation ID ...]
+    python -m src.adapter.worker.conversation_transfer import FILE|- [--batch-size 1000] [--no-ignore-duplicates]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import sys
+from typing import Any, AsyncIterator, BinaryIO, Dict, List, Optional
+
+from src.adapter.output.mysql.db.base import get_async_session
+from src.adapter.output.mysql.repositories.conversation_repository import ConversationRepository
+from src.adapter.output.mysql.repositories.message_repository import MessageRepository
+from src.application.usecases.transfer_usecase import ConversationTransferUseCase
+
+_READ_CHUNK_BYTES = 1024 * 1024
+
+
+async def _read_chunks(source: BinaryIO) -> AsyncIterator[bytes]:
+    while True:
+        chunk = await asyncio.to_thread(source.read, _READ_CHUNK_BYTES)
+        if not chunk:
+            return
+        yield chunk
+
+
+async def export(target: BinaryIO, conversation_ids: Optional[List[str]] = None, batch_size: Optional[int] = None) -> Dict[str, Any]:
+    db = get_async_session()
+    try:
+        usecase = ConversationTransferUseCase(ConversationRepository(db), MessageRepository(db), batch_size)
+        async for chunk in usecase.export_ndjson(conversation_ids):
+            target.write(chunk)
+        target.flush()
+        return usecase.last_export or {}
+    finally:
+        await db.close()
+
+
+async def load(source: BinaryIO, batch_size: Optional[int] = None, ignore_duplicates: bool = True) -> Dict[str, Any]:
+    db = get_async_session()
+    try:
+        usecase = ConversationTransferUseCase(ConversationRepository(db), MessageRepository(db), batch_size)
+        return await usecase.import_ndjson(_read_chunks(source), ignore_duplicates=ignore_duplicates)
+    finally:
+        await db.close()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = ap.add_subparsers(dest="command", required=True)
+    out = commands.add_parser("export", help="write conversations as NDJSON")
+    out.add_argument("-o", "--output", default="-", help="file to write (default: stdout)")
+    out.add_argument("--conversation", action="append", dest="conversations", help="only this conversation (repeatable)")
+    out.add_argument("--batch-size", type=int, default=None, help="rows fetched per round trip (default: TRANSFER_BATCH_SIZE)")
+    inp = commands.add_parser("import", help="load an NDJSON dump")
+    inp.add_argument("input", help="file to read, or - for stdin")
+    inp.add_argument("--batch-size", type=int, default=None, help="rows per bulk insert (default: TRANSFER_BATCH_SIZE)")
+    inp.add_argument("--no-ignore-duplicates", dest="ignore_duplicates", action="store_false",
+                     help="fail on ids that already exist instead of skipping them")
+    args = ap.parse_args()
+    # stdout may carry the dump: logs go to stderr
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+
+    if args.command == "export":
+        if args.output == "-":
+            stats = asyncio.run(export(sys.stdout.buffer, args.conversations, args.batch_size))
+        else:
+            with open(args.output, "wb") as target:
+                stats = asyncio.run(export(target, args.conversations, args.batch_size))
+    elif args.input == "-":
+        stats = asyncio.run(load(sys.stdin.buffer, args.batch_size, args.ignore_duplicates))
+    else:
+        with open(args.input, "rb") as source:
+            stats = asyncio.run(load(source, args.batch_size, args.ignore_duplicates))
+    print(json.dumps(stats), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
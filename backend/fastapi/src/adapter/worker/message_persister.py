@@ -0,0 +1,337 @@
+"""Write-behind group commit for chat messages.
+
+`submit(message)` appends the message to a local journal and puts it on a
+bounded queue (waiting when the queue is full). A single task takes up to
+`batch_size` messages, or whatever arrived within `flush_interval`, and
+writes them with one multi-row INSERT and one COMMIT. Each submission gets a
+future that resolves once its batch is committed, so a caller that needs
+durability can await it while concurrent requests still share one commit.
+
+The journal is an append-only JSON-lines file: a line per queued message and
+a line per committed batch. At startup the messages without a commit line are
+queued again, so nothing is lost when the process dies or the DB is down;
+inserts skip ids that already exist, which makes a replay safe. Rows the DB
+rejects (e.g. their conversation was deleted) are dropped one by one, while
+any other error retries the whole batch with backoff.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy.exc import DataError, IntegrityError
+
+from src.adapter.output.mysql.db.base import get_async_session
+from src.adapter.output.mysql.repositories.cached_message_repository import history_cache
+from src.adapter.output.mysql.repositories.message_repository import MessageRepository
+from src.application.config.config import settings
+from src.application.usecases.deadline import detached_context
+from src.domain.models.message_domain import MessageDomain
+
+logger = logging.getLogger(__name__)
+
+# errors that reject the rows themselves; retrying the same rows cannot succeed
+_REJECTED_ERRORS = (IntegrityError, DataError)
+# once everything is written, a journal larger than this is started afresh
+_JOURNAL_COMPACT_BYTES = 1024 * 1024
+
+
+async def insert_messages(messages: List[MessageDomain]) -> None:
+    db = get_async_session()
+    try:
+        await MessageRepository(db).insert_many(messages, ignore_duplicates=True)
+    finally:
+        await db.close()
+    # the history cache may have been filled while these rows were still queued
+    for message in messages:
+        history_cache.write(message)
+
+
+class MessageJournal:
+    """Append-only JSON-lines log of queued messages and the batches committed since."""
+
+    def __init__(self, path: str, fsync: bool = False):
+        self.path = path
+        self.fsync = fsync
+        self._file = None
+        self.bytes = 0
+
+    def _open(self):
+        if self._file is None:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            self._file = open(self.path, "ab")
+            self.bytes = self._file.tell()
+        return self._file
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+        f = self._open()
+        f.write(line)
+        # reaches the OS right away, so a process crash does not lose it
+        f.flush()
+        self.bytes += len(line)
+
+    def append(self, message: MessageDomain) -> None:
+        self._write({"m": message.model_dump(mode="json")})
+
+    def commit(self, ids: List[str]) -> None:
+        self._write({"ok": ids})
+
+    def sync(self) -> None:
+        if self.fsync and self._file is not None:
+            os.fsync(self._file.fileno())
+
+    def replay(self) -> List[MessageDomain]:
+        """Messages appended but never committed, in journal order (a torn last line is ignored)."""
+        if not os.path.exists(self.path):
+            return []
+        queued: Dict[str, MessageDomain] = {}
+        with open(self.path, "rb") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    if "m" in record:
+                        message = MessageDomain(**record["m"])
+                        queued[message.id] = message
+                    for message_id in record.get("ok", ()):
+                        queued.pop(message_id, None)
+                except (ValueError, TypeError):
+                    logger.warning("Skipping unreadable line in message journal %s", self.path)
+        return list(queued.values())
+
+    def reset(self, pending: List[MessageDomain]) -> None:
+        """Start a fresh journal holding only `pending` (atomic rename)."""
+        self.close()
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "wb") as f:
+            for message in pending:
+                line = json.dumps({"m": message.model_dump(mode="json")}, ensure_ascii=False, separators=(",", ":"))
+                f.write(line.encode("utf-8") + b"\n")
+            f.flush()
+            if pending or self.fsync:
+                os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self.bytes = os.path.getsize(self.path)
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class MessagePersister:
+    def __init__(
+        self,
+        write: Callable[[List[MessageDomain]], Awaitable[None]],
+        journal: Optional[MessageJournal] = None,
+        enabled: bool = True,
+        max_queue: int = 10000,
+        batch_size: int = 200,
+        flush_interval: float = 0.02,
+        retry_delay: float = 0.5,
+        max_retry_delay: float = 30.0,
+    ):
+        self.write = write
+        self.journal = journal
+        self.enabled = enabled
+        self.max_queue = max(1, max_queue)
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self._queue: Optional[asyncio.Queue] = None
+        self._batch_ready: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        # queued or being written, by id; readers of the port look here before the DB
+        self._pending: Dict[str, MessageDomain] = {}
+        self.submitted = 0
+        self.replayed = 0
+        self.flushes = 0
+        self.rows_written = 0
+        self.max_batch = 0
+        self.flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+        self.max_queue_depth = 0
+        self.failures = 0
+        self.dropped = 0
+
+    @classmethod
+    def from_settings(cls) -> "MessagePersister":
+        journal = None
+        if settings.MESSAGE_JOURNAL_PATH:
+            journal = MessageJournal(settings.MESSAGE_JOURNAL_PATH, fsync=settings.MESSAGE_JOURNAL_FSYNC)
+        return cls(
+            insert_messages,
+            journal=journal,
+            enabled=settings.MESSAGE_WRITE_BEHIND_ENABLED,
+            max_queue=settings.MESSAGE_WRITE_BEHIND_MAX_QUEUE,
+            batch_size=settings.MESSAGE_WRITE_BEHIND_BATCH_SIZE,
+            flush_interval=settings.MESSAGE_WRITE_BEHIND_FLUSH_MS / 1000.0,
+        )
+
+    def _ensure_started(self) -> None:
+        if self._task is None or self._task.done():
+            # the queue is bound to the running loop, so both are (re)created together
+            self._queue = asyncio.Queue(self.max_queue)
+            self._batch_ready = asyncio.Event()
+            # started from a request, but must not inherit its deadline
+            self._task = asyncio.get_running_loop().create_task(self._drain(), context=detached_context())
+
+    async def start(self) -> int:
+        """Queue again what the journal holds from a previous run; returns how many messages."""
+        if not self.enabled or self.journal is None:
+            return 0
+        pending = self.journal.replay()
+        # compact the journal to just what is still owed to the DB
+        self.journal.reset(pending)
+        for message in pending:
+            await self._enqueue(message)
+        self.replayed += len(pending)
+        if pending:
+            logger.info("Replaying %d journaled messages", len(pending))
+        return len(pending)
+
+    async def submit(self, message: MessageDomain) -> asyncio.Future:
+        """Queue `message` for the next batch; the returned future resolves once it is committed."""
+        if self.journal is not None:
+            self.journal.append(message)
+        self.submitted += 1
+        return await self._enqueue(message)
+
+    async def _enqueue(self, message: MessageDomain) -> asyncio.Future:
+        self._ensure_started()
+        assert self._queue is not None and self._batch_ready is not None
+        future = asyncio.get_running_loop().create_future()
+        self._pending[message.id] = message
+        # waits when the queue is full: callers are slowed down instead of memory growing
+        await self._queue.put((message, future))
+        depth = self._queue.qsize()
+        self.max_queue_depth = max(self.max_queue_depth, depth)
+        if depth >= self.batch_size:
+            self._batch_ready.set()
+        return future
+
+    def pending(self, message_id: str) -> Optional[MessageDomain]:
+        return self._pending.get(message_id)
+
+    async def _drain(self) -> None:
+        assert self._queue is not None and self._batch_ready is not None
+        queue, batch_ready = self._queue, self._batch_ready
+        while True:
+            batch = [await queue.get()]
+            if queue.qsize() + 1 < self.batch_size:
+                try:
+                    await asyncio.wait_for(batch_ready.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            batch_ready.clear()
+            while len(batch) < self.batch_size and not queue.empty():
+                batch.append(queue.get_nowait())
+            try:
+                await self._flush(batch)
+            finally:
+                for _ in batch:
+                    queue.task_done()
+
+    async def _flush(self, batch: List[Tuple[MessageDomain, asyncio.Future]]) -> None:
+        messages = [m for m, _ in batch]
+        if self.journal is not None:
+            self.journal.sync()
+        started = time.perf_counter()
+        rejected = await self._write_with_retry(messages)
+        elapsed = time.perf_counter() - started
+
+        written = [m.id for m in messages if m.id not in rejected]
+        self.flushes += 1
+        self.rows_written += len(written)
+        self.max_batch = max(self.max_batch, len(batch))
+        self.flush_seconds += elapsed
+        self.max_flush_seconds = max(self.max_flush_seconds, elapsed)
+        for message, future in batch:
+            self._pending.pop(message.id, None)
+            if future.done():
+                continue
+            if message.id in rejected:
+                future.set_exception(rejected[message.id])
+                # nobody may be waiting; mark the exception as retrieved
+                future.exception()
+            else:
+                future.set_result(message)
+        if self.journal is not None:
+            self.journal.commit([m.id for m in messages])
+            if not self._pending and self.journal.bytes > _JOURNAL_COMPACT_BYTES:
+                self.journal.reset([])
+
+    async def _write_with_retry(self, messages: List[MessageDomain]) -> Dict[str, Exception]:
+        """Write `messages`, retrying outages forever; returns the rows the DB rejected."""
+        delay = self.retry_delay
+        while True:
+            try:
+                await self.write(messages)
+                return {}
+            except _REJECTED_ERRORS as exc:
+                if len(messages) == 1:
+                    self.dropped += 1
+                    logger.error("Dropping message %s rejected by the database: %s", messages[0].id, exc)
+                    return {messages[0].id: exc}
+                # find the offending rows: write them one by one
+                rejected: Dict[str, Exception] = {}
+                for message in messages:
+                    rejected.update(await self._write_with_retry([message]))
+                return rejected
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                self.failures += 1
+                logger.warning("Writing %d messages failed, retrying in %.1fs: %s", len(messages), delay, exc)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_retry_delay)
+
+    async def flush(self) -> None:
+        """Wait until every message queued so far has been written."""
+        if self._queue is not None and self._task is not None and not self._task.done():
+            await self._queue.join()
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Write what is queued (up to `timeout`), then stop; leftovers stay in the journal."""
+        if self._task is not None:
+            try:
+                await asyncio.wait_for(self.flush(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning("Stopping with %d messages unwritten (kept in the journal)", len(self._pending))
+            self._task.cancel()
+            try:
+                await self._task
+            except BaseException:
+                pass
+            self._task = None
+        self._pending.clear()
+        if self.journal is not None:
+            self.journal.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue_depth": self.max_queue_depth,
+            "pending": len(self._pending),
+            "submitted": self.submitted,
+            "replayed": self.replayed,
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+            "avg_batch": round(self.rows_written / self.flushes, 2) if self.flushes else 0.0,
+            "max_batch": self.max_batch,
+            "avg_flush_ms": round(self.flush_seconds * 1000 / self.flushes, 2) if self.flushes else 0.0,
+            "max_flush_ms": round(self.max_flush_seconds * 1000, 2),
+            "failures": self.failures,
+            "dropped": self.dropped,
+            "journal_bytes": self.journal.bytes if self.journal is not None else 0,
+        }
+
+
+message_persister = MessagePersister.from_settings()
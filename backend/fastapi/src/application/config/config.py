@@ -11,16 +11,156 @@ class Settings(BaseSettings): # type: ignore
     DB_DATABASE: str = "gemini_proxy_db"
     DB_USERNAME: str = "root"
     DB_PASSWORD: str = ""
+    # In-process LRU of each conversation's newest messages, kept up to date on every save
+    # so a warm chat turn reads no history rows. Bounded by total bytes across conversations.
+    HISTORY_CACHE_ENABLED: bool = True
+    HISTORY_CACHE_MAX_BYTES: int = 32 * 1024 * 1024
+    HISTORY_CACHE_MAX_MESSAGES: int = 200
+    # chat turns check the cached run against the conversation's stats; other reads pick up
+    # writes made by other workers once their entry is this old
+    HISTORY_CACHE_TTL_SECONDS: float = 300.0
+    # Write-behind persistence: chat messages go onto a bounded queue and a background task
+    # inserts them in multi-row batches (every FLUSH_MS or BATCH_SIZE rows, whichever first)
+    MESSAGE_WRITE_BEHIND_ENABLED: bool = False
+    MESSAGE_WRITE_BEHIND_MAX_QUEUE: int = 10000
+    MESSAGE_WRITE_BEHIND_BATCH_SIZE: int = 200
+    MESSAGE_WRITE_BEHIND_FLUSH_MS: float = 20.0
+    # wait for the batch holding the message to commit before answering (group commit)
+    MESSAGE_WRITE_BEHIND_AWAIT_DURABLE: bool = False
+    MESSAGE_WRITE_BEHIND_DURABLE_TIMEOUT_SECONDS: float = 5.0
+    # Append-only journal of queued messages, replayed at startup (None disables it)
+    MESSAGE_JOURNAL_PATH: str | None = "./message_journal.jsonl"
+    # fsync the journal once per batch (survives power loss, not only a process crash)
+    MESSAGE_JOURNAL_FSYNC: bool = False
 
     # App
     APP_PORT: int = 6789
     API_PREFIX: str = "/api/v1"
     JWT_SECRET: str | None = None
+    # Key signing the opaque pagination cursors (falls back to JWT_SECRET, then to a per-process key)
+    PAGINATION_CURSOR_SECRET: str | None = None
+    # NDJSON export/import (/conversations/export, /conversations/import): rows fetched per
+    # server-side cursor batch on export, rows per bulk INSERT on import
+    TRANSFER_BATCH_SIZE: int = 1000
     
     # Gemini API
     GEMINI_URL: str | None = None
     GEMINI_API_KEY: str | None = None
+    # Optional key pool: comma-separated keys, each with an optional ":weight" (e.g. "k1,k2:2").
+    # Takes precedence over GEMINI_API_KEY when set.
+    GEMINI_API_KEYS: str | None = None
+    # Per-key quotas used for client-side token buckets (0 disables the bucket)
+    GEMINI_API_KEY_RPM_LIMIT: int = 0
+    GEMINI_API_KEY_TPM_LIMIT: int = 0
+    # How long a key that received HTTP 429 is skipped when no Retry-After is given
+    GEMINI_API_KEY_QUARANTINE_SECONDS: float = 60.0
     GEMINI_TIMEOUT_SECONDS: int = 300
+    # Per-request deadline: the client's REQUEST_DEADLINE_HEADER (seconds, or "2500ms"), else the
+    # route's default by path prefix below API_PREFIX (e.g. "/gemini/query=60,/conversations=10"),
+    # else DEFAULT; capped at MAX. DB pool checkout, queries, upstream calls and retries only get
+    # the time left, and a request past its deadline is shed (504) before reaching the upstream.
+    # A streamed answer is bound until its first chunk; after that disconnect polling applies.
+    REQUEST_DEADLINE_ENABLED: bool = True
+    REQUEST_DEADLINE_HEADER: str = "X-Request-Timeout"
+    REQUEST_DEADLINE_ROUTE_SECONDS: str | None = "/gemini/query=300,/gemini/stream=300"
+    REQUEST_DEADLINE_DEFAULT_SECONDS: float | None = 30.0
+    REQUEST_DEADLINE_MAX_SECONDS: float = 600.0
+    # Shared upstream connection pool (one AsyncClient for the whole app lifetime)
+    GEMINI_HTTP2: bool = True
+    GEMINI_MAX_CONNECTIONS: int = 100
+    GEMINI_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    GEMINI_KEEPALIVE_EXPIRY_SECONDS: float = 60.0
+    # Retries for 408/429/5xx and transport errors (full-jitter backoff, Retry-After honoured)
+    GEMINI_RETRY_MAX_ATTEMPTS: int = 3
+    GEMINI_RETRY_BASE_DELAY_SECONDS: float = 0.5
+    GEMINI_RETRY_MAX_DELAY_SECONDS: float = 10.0
+    # Process-wide retry budget: retries <= ratio * requests over the window (with a small floor)
+    GEMINI_RETRY_BUDGET_RATIO: float = 0.1
+    GEMINI_RETRY_BUDGET_MIN_RETRIES: int = 10
+    GEMINI_RETRY_BUDGET_WINDOW_SECONDS: float = 10.0
+    # Fallback chain: a failing/open model degrades to the models listed after it (empty disables)
+    GEMINI_FALLBACK_CHAIN: str = "gemini-2.5-pro,gemini-2.5-flash,gemini-2.5-flash-lite"
+    # Per-model circuit breaker (error rate and slow-call rate over the last N calls)
+    GEMINI_BREAKER_WINDOW_SIZE: int = 20
+    GEMINI_BREAKER_MIN_CALLS: int = 5
+    GEMINI_BREAKER_FAILURE_RATE: float = 0.5
+    GEMINI_BREAKER_SLOW_CALL_SECONDS: float = 30.0
+    GEMINI_BREAKER_SLOW_CALL_RATE: float = 0.8
+    GEMINI_BREAKER_OPEN_SECONDS: float = 30.0
+    # Adaptive (AIMD) limit on concurrent upstream calls; excess requests wait in a bounded queue
+    GEMINI_LIMITER_ENABLED: bool = True
+    GEMINI_LIMITER_INITIAL_LIMIT: int = 20
+    GEMINI_LIMITER_MIN_LIMIT: int = 2
+    GEMINI_LIMITER_MAX_LIMIT: int = 200
+    # Multiplicative decrease factor applied on overload (slow sample or 429/5xx)
+    GEMINI_LIMITER_BACKOFF_RATIO: float = 0.9
+    # Overload when recent time-to-first-byte exceeds tolerance * its long-term average
+    GEMINI_LIMITER_LATENCY_TOLERANCE: float = 2.0
+    GEMINI_LIMITER_MAX_QUEUE: int = 100
+    GEMINI_LIMITER_QUEUE_TIMEOUT_SECONDS: float = 10.0
+    # Opt-in cache of answers for identical model + contents + config (clients bypass with Cache-Control)
+    GEMINI_CACHE_ENABLED: bool = False
+    GEMINI_CACHE_TTL_SECONDS: float = 3600.0
+    GEMINI_CACHE_MAX_ENTRIES: int = 1024
+    GEMINI_CACHE_MAX_BYTES: int = 16 * 1024 * 1024
+    # Optional SQLite file shared by the workers on one host (e.g. "./gemini_cache.sqlite3")
+    GEMINI_CACHE_SQLITE_PATH: str | None = None
+    # Identical concurrent requests share one upstream call (streams share a replay buffer)
+    GEMINI_SINGLE_FLIGHT_ENABLED: bool = True
+    # Opt-in hedging: send a second identical call when the first is slower than this latency percentile
+    GEMINI_HEDGE_ENABLED: bool = False
+    GEMINI_HEDGE_PERCENTILE: float = 0.95
+    GEMINI_HEDGE_MIN_DELAY_SECONDS: float = 0.5
+    # samples per model needed before hedging starts
+    GEMINI_HEDGE_MIN_SAMPLES: int = 20
+    GEMINI_HEDGE_WINDOW_SIZE: int = 200
+    # hedges <= ratio * requests over GEMINI_RETRY_BUDGET_WINDOW_SECONDS (with a small floor)
+    GEMINI_HEDGE_BUDGET_RATIO: float = 0.05
+    GEMINI_HEDGE_BUDGET_MIN_HEDGES: int = 2
+    # Allow /gemini/stream?passthrough=true (upstream SSE bytes relayed without re-encoding)
+    GEMINI_STREAM_PASSTHROUGH_ENABLED: bool = True
+    # Streamed answers are written to their messages row (status in_progress) every INTERVAL
+    # seconds or CHARS characters, so a broken stream can be resumed from what was stored
+    GEMINI_STREAM_CHECKPOINT_ENABLED: bool = True
+    GEMINI_STREAM_CHECKPOINT_INTERVAL_SECONDS: float = 2.0
+    GEMINI_STREAM_CHECKPOINT_CHARS: int = 2000
+    # an in_progress row not checkpointed for this long is orphaned; resuming it generates the rest
+    GEMINI_STREAM_CHECKPOINT_STALE_SECONDS: int = 30
+    # How often a streaming response checks whether its client is still connected; the
+    # upstream stream is closed as soon as it is not
+    GEMINI_STREAM_DISCONNECT_POLL_SECONDS: float = 0.5
+    # Streamed answers run once in their own task and are shared: more clients (or a client
+    # reconnecting with Last-Event-ID) follow the same generation. Finished buffers are kept
+    # TTL seconds, all buffers together at most MAX_BYTES; a generation with no clients left
+    # is cancelled after ORPHAN_GRACE seconds
+    GEMINI_STREAM_REGISTRY_ENABLED: bool = True
+    GEMINI_STREAM_REGISTRY_MAX_BYTES: int = 16 * 1024 * 1024
+    GEMINI_STREAM_REGISTRY_TTL_SECONDS: float = 60.0
+    GEMINI_STREAM_ORPHAN_GRACE_SECONDS: float = 5.0
+    # History sent upstream is cut to a per-model token budget (estimated), newest turns first.
+    # Overrides per model, e.g. "gemini-2.5-pro=64000,gemini-2.5-flash-lite=8000"
+    GEMINI_CONTEXT_TOKEN_BUDGETS: str | None = None
+    GEMINI_CONTEXT_DEFAULT_TOKEN_BUDGET: int = 32000
+    GEMINI_CONTEXT_MAX_MESSAGES: int = 100
+    # messages fetched per round trip while filling the budget
+    GEMINI_CONTEXT_FETCH_BATCH: int = 20
+    # Rolling summaries: once a conversation's un-summarized history passes the threshold, a
+    # background worker folds its oldest turns into a stored summary using a cheap model
+    GEMINI_COMPACTION_ENABLED: bool = False
+    GEMINI_COMPACTION_MODEL: str = "gemini-2.5-flash-lite"
+    GEMINI_COMPACTION_THRESHOLD_TOKENS: int = 8000
+    # newest turns always sent verbatim, never folded
+    GEMINI_COMPACTION_KEEP_RECENT_MESSAGES: int = 8
+    GEMINI_COMPACTION_MAX_FOLD_MESSAGES: int = 200
+    GEMINI_COMPACTION_MAX_PENDING: int = 1000
+    # Per-message JSON fragments reused across turns when building request bodies
+    GEMINI_PROMPT_FRAGMENT_CACHE_ENABLED: bool = True
+    GEMINI_PROMPT_FRAGMENT_CACHE_MAX_ENTRIES: int = 50000
+    GEMINI_PROMPT_FRAGMENT_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    # Open a first connection at startup so the first chat turn skips TLS/HTTP2 setup
+    GEMINI_WARMUP_ON_STARTUP: bool = True
+    # Per turn, open an upstream connection (if none is ready) while the DB work runs
+    GEMINI_TURN_PREWARM_ENABLED: bool = True
     # CORS
     # Comma-separated list of allowed origins, or '*' to allow all origins.
     # Example: "http://localhost:5173,http://127.0.0.1:5173"
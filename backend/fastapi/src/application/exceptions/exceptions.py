@@ -42,6 +42,20 @@ class BadGatewayError(AppException):
         super().__init__(message=message, status_code=502, code="bad_gateway", payload=payload)
 
 
+class ServiceUnavailableError(AppException):
+    def __init__(self, message: str = "Service unavailable", payload: Any = None, retry_after: float | None = None):
+        super().__init__(message=message, status_code=503, code="service_unavailable", payload=payload)
+        # seconds until the client may retry; sent as the Retry-After header
+        self.retry_after = retry_after
+
+
 class GatewayTimeoutError(AppException):
     def __init__(self, message: str = "Gateway timeout", payload: Any = None):
         super().__init__(message=message, status_code=504, code="gateway_timeout", payload=payload)
+
+
+class DeadlineExceededError(GatewayTimeoutError):
+    """The request's deadline passed; the work left for it was not started."""
+
+    def __init__(self, message: str = "Request deadline exceeded", payload: Any = None):
+        AppException.__init__(self, message=message, status_code=504, code="deadline_exceeded", payload=payload)
@@ -12,7 +12,7 @@ class ConversationInputPort(ABC):
         pass
 
     @abstractmethod
-    async def get_conversation_list(self, after: Optional[str] = None, limit: int = 10, order: Optional[str] = "desc") -> ListResponse[ConversationResponse]:
+    async def get_conversation_list(self, after: Optional[str] = None, limit: int = 10, order: Optional[str] = "desc", sort: str = "created_at") -> ListResponse[ConversationResponse]:
         pass
 
     @abstractmethod
@@ -1,6 +1,7 @@
 from __future__ import annotations
 from abc import ABC, abstractmethod
 from collections.abc import AsyncIterator
+from typing import Awaitable, Callable, Dict, Optional
 
 from src.domain.vo.message_request import MessageRequest
 
@@ -15,5 +16,68 @@ class GeminiInputPort(ABC):
         pass
     
     @abstractmethod
-    async def query_stream(self, message_request: MessageRequest) -> AsyncIterator[str]:
-        yield ""
\ No newline at end of file
+    async def query_stream(
+        self, message_request: MessageRequest, is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None
+    ) -> AsyncIterator[str]:
+        """`is_disconnected`: hàm kiểm tra client còn kết nối; khi client rời đi thì dừng gọi upstream."""
+        yield ""
+
+    async def open_stream(
+        self,
+        message_request: MessageRequest,
+        is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+        passthrough: bool = False,
+    ) -> AsyncIterator:
+        """Nhận turn (deadline, lưu message người dùng, dựng history) rồi trả iterator của stream.
+
+        Lỗi từ chối request (504/503...) được raise ngay tại đây, trước khi response bắt đầu;
+        `passthrough` trả byte SSE nguyên bản như query_stream_raw.
+        """
+        if passthrough:
+            return self.query_stream_raw(message_request, is_disconnected)
+        return self.query_stream(message_request, is_disconnected)
+
+    def get_answered_model(self) -> Optional[str]:
+        """Model đã trả lời request gần nhất (sau fallback), nếu biết."""
+        return None
+
+    def get_context_report(self) -> Optional[Dict[str, int]]:
+        """Số message/token đã giữ và đã bỏ khi dựng history cho request gần nhất."""
+        return None
+
+    def get_turn_report(self) -> Optional[Dict[str, float]]:
+        """Số round trip DB và thời gian (ms) trước khi gọi upstream của request gần nhất."""
+        return None
+
+    def get_stream_message_id(self) -> Optional[str]:
+        """Id của message trả lời đang/đã stream gần nhất (dùng để resume)."""
+        return None
+
+    def get_stream_status(self) -> Optional[str]:
+        """Trạng thái cuối (in_progress/complete/aborted) của stream gần nhất, nếu biết."""
+        return None
+
+    @abstractmethod
+    async def resume_stream(
+        self,
+        message_id: str,
+        model: Optional[str] = None,
+        is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+        offset: int = 0,
+    ) -> AsyncIterator[str]:
+        """Phát lại text của một câu trả lời stream từ ký tự thứ `offset`, rồi theo dõi hoặc sinh tiếp nếu còn dang dở."""
+        pass
+
+    @abstractmethod
+    async def follow_conversation(
+        self, conversation_id: str, is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None
+    ) -> AsyncIterator[str]:
+        """Theo dõi câu trả lời đang (hoặc vừa) stream trong conversation, từ đầu."""
+        pass
+
+    @abstractmethod
+    async def query_stream_raw(
+        self, message_request: MessageRequest, is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None
+    ) -> AsyncIterator[memoryview]:
+        """Stream nguyên byte SSE của upstream (pass-through)."""
+        yield memoryview(b"")
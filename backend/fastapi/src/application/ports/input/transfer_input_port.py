@@ -0,0 +1,21 @@
+from __future__ import annotations
+from abc import ABC, abstractmethod
+from collections.abc import AsyncIterator
+from typing import Any, Dict, List, Optional
+
+
+class TransferInputPort(ABC):
+    """
+    Input port cho export/import hội thoại dạng NDJSON — mỗi dòng một conversation
+    (header) rồi tới các message của nó.
+    """
+
+    @abstractmethod
+    async def export_ndjson(self, conversation_ids: Optional[List[str]] = None) -> AsyncIterator[bytes]:
+        """Stream toàn bộ (hoặc các conversation được chọn) thành các khối byte NDJSON."""
+        yield b""
+
+    @abstractmethod
+    async def import_ndjson(self, chunks: AsyncIterator[bytes], ignore_duplicates: bool = True) -> Dict[str, Any]:
+        """Đọc NDJSON theo từng khối, ghi bằng bulk insert theo lô; trả về thống kê (số dòng, thời gian, throughput)."""
+        pass
@@ -1,6 +1,7 @@
 from abc import ABC, abstractmethod
-from typing import List, Optional, Tuple
+from typing import AsyncIterator, List, Optional, Tuple
 from src.domain.models.conversation_domain import ConversationDomain as Conversation
+from src.domain.vo.page_cursor import PageCursor
 
 
 
@@ -10,12 +11,15 @@ class ConversationOutputPort(ABC):
         pass
 
     @abstractmethod
-    async def get_all(self, limit: int, after: Optional[str], order: str) -> Tuple[List[Conversation], bool]:
+    async def get_all(
+        self, limit: int, after: Optional[str], order: str, cursor: Optional[PageCursor] = None, sort: str = "created_at"
+    ) -> Tuple[List[Conversation], bool]:
         """Return a tuple (List[Conversation], has_more: bool).
 
-        - order: 'asc' or 'desc' (by created_at)
-        - after: conversation id cursor (optional)
-        - offset: number of records to skip after the 'after' cursor
+        - sort: 'created_at' or 'last_message_at' (recent activity)
+        - order: 'asc' or 'desc' (by the sort column, then id)
+        - cursor: keyset cursor to continue from (its order and direction win)
+        - after: (legacy) conversation id of the anchor, used when there is no cursor
         - limit: max items to return
         """
         pass
@@ -28,4 +32,36 @@ class ConversationOutputPort(ABC):
     async def delete(self, conversation: Conversation) -> bool:
         pass
 
+    async def stream_all(self, conversation_ids: Optional[List[str]] = None, batch_size: int = 500) -> AsyncIterator[Conversation]:
+        """Every conversation (or those in `conversation_ids`), oldest first, `batch_size` at a time.
 
+        Each batch is read completely before it is yielded, so the caller may query the
+        same session between items. This default pages through get_all() / get_by_id().
+        """
+        if conversation_ids is not None:
+            for conversation_id in conversation_ids:
+                conversation = await self.get_by_id(conversation_id)
+                if conversation is not None:
+                    yield conversation
+            return
+        after: Optional[str] = None
+        while True:
+            page, has_more = await self.get_all(limit=batch_size, after=after, order="asc")
+            for conversation in page:
+                yield conversation
+            if not has_more or not page:
+                return
+            after = page[-1].id
+
+    async def insert_many(self, conversations: List[Conversation], ignore_duplicates: bool = False) -> int:
+        """Insert new conversations (with their ids) in bulk; returns how many were added.
+
+        `ignore_duplicates` skips ids that already exist. This default saves them one by one.
+        """
+        added = 0
+        for conversation in conversations:
+            if ignore_duplicates and await self.get_by_id(conversation.id) is not None:
+                continue
+            await self.save(conversation)
+            added += 1
+        return added
@@ -44,4 +44,47 @@ class GeminiOutputPort(ABC):
         Kiểm tra trạng thái kết nối/availability của Gemini adapter.
         Trả về True nếu healthy, False nếu không.
         """
-        pass
\ No newline at end of file
+        pass
+
+    async def warm_up(self) -> None:
+        """
+        Chuẩn bị sẵn kết nối tới upstream (nếu adapter hỗ trợ), chạy song song với phần
+        chuẩn bị request (ghi/đọc DB) để không phải chờ TCP/TLS khi gọi model.
+        """
+        return None
+
+    async def reserve_stream(self) -> None:
+        """
+        Giữ trước suất gọi upstream (limiter) cho lần stream kế tiếp, để request quá tải bị
+        từ chối (503) trước khi response bắt đầu. Mặc định không làm gì.
+        """
+        return None
+
+    def release_stream(self) -> None:
+        """
+        Trả lại suất đã giữ bằng reserve_stream() nếu chưa stream nào dùng tới.
+        """
+        return None
+
+    def get_answered_model(self) -> Optional[str]:
+        """
+        Model thực sự đã trả lời lần gọi gần nhất (có thể khác model yêu cầu khi fallback).
+        Trả về None nếu chưa có hoặc adapter không hỗ trợ.
+        """
+        return None
+
+    @abstractmethod
+    async def stream_raw(
+        self, model: str, history: List[MessageDomain]
+    ) -> AsyncIterator[memoryview]:
+        """
+        Chế độ pass-through: trả nguyên các byte SSE từ upstream (không decode/encode lại).
+        Text dùng để lưu lịch sử lấy sau khi stream kết thúc qua get_streamed_text().
+        """
+        yield memoryview(b"")
+
+    def get_streamed_text(self) -> str:
+        """
+        Text của lần stream_raw gần nhất (decode sau khi stream kết thúc).
+        """
+        return ""
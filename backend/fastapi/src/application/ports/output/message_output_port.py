@@ -1,12 +1,16 @@
 from abc import ABC, abstractmethod
-from typing import List, Optional
+from typing import AsyncIterator, List, Optional
 
 from src.domain.models.message_domain import MessageDomain
+from src.domain.vo.page_cursor import PageCursor
 
 
 class MessageOutputPort(ABC):
     @abstractmethod
-    async def get_list_by_conversation(self, conversation_id: str, after: Optional[str], limit: int, order: str) -> tuple[List[MessageDomain], bool]:
+    async def get_list_by_conversation(
+        self, conversation_id: str, after: Optional[str], limit: int, order: str, cursor: Optional[PageCursor] = None
+    ) -> tuple[List[MessageDomain], bool]:
+        """(page, has_more) after `cursor` (one range query) or after the message with id `after`."""
         pass
     
     @abstractmethod
@@ -30,9 +34,78 @@ class MessageOutputPort(ABC):
         pass
     
     @abstractmethod
-    async def get_latest_by_conversation(self, conversation_id: str, count: int) -> List[MessageDomain]:
+    async def get_latest_by_conversation(self, conversation_id: str, count: int, before: Optional[MessageDomain] = None) -> List[MessageDomain]:
+        """Newest-first page of `count` messages, optionally strictly older than `before`."""
+        pass
+
+    @abstractmethod
+    async def get_oldest_by_conversation(self, conversation_id: str, count: int, after: Optional[MessageDomain] = None) -> List[MessageDomain]:
+        """Oldest-first page of `count` messages, optionally strictly newer than `after`."""
         pass
     
+    async def insert_and_get_latest(self, message: MessageDomain, count: int) -> List[MessageDomain]:
+        """Insert a new message and return the newest `count` messages (including it), newest first.
+
+        Implementations should do both in one transaction without reading the row back;
+        this default chains save() and get_latest_by_conversation().
+        """
+        await self.save(message)
+        return await self.get_latest_by_conversation(message.conversation_id, count)
+
+    async def insert_many(self, messages: List[MessageDomain], ignore_duplicates: bool = False) -> int:
+        """Insert new messages (ids set by the caller) in bulk; returns how many were added.
+
+        Implementations should use multi-row INSERTs in one transaction, without reading
+        anything back; `ignore_duplicates` skips ids that already exist. This default
+        saves them one by one.
+        """
+        added = 0
+        for message in messages:
+            if ignore_duplicates and await self.get_checkpoint(message.id) is not None:
+                continue
+            await self.save(message)
+            added += 1
+        return added
+
+    async def stream_by_conversation(self, conversation_id: str, batch_size: int = 1000) -> AsyncIterator[MessageDomain]:
+        """All messages of a conversation, oldest first, without holding them all in memory.
+
+        Implementations should read them through a server-side cursor; this default pages
+        through get_oldest_by_conversation().
+        """
+        after: Optional[MessageDomain] = None
+        while True:
+            page = await self.get_oldest_by_conversation(conversation_id, batch_size, after)
+            for message in page:
+                yield message
+            if len(page) < batch_size:
+                return
+            after = page[-1]
+
+    async def checkpoint(self, message: MessageDomain, expected_updated_at: Optional[int] = None) -> bool:
+        """Write the text, status and updated_at of a streamed answer, inserting it on first use.
+
+        With `expected_updated_at` the row is only written if it still has that updated_at
+        (used to take over an orphaned stream); returns whether it was written.
+        """
+        if expected_updated_at is not None:
+            current = await self.get_checkpoint(message.id)
+            if current is None or current.updated_at != expected_updated_at:
+                return False
+        await self.save(message)
+        return True
+
+    async def get_checkpoint(self, message_id: str) -> Optional[MessageDomain]:
+        """Current stored state of a message, read fresh (never from a cache), or None."""
+        try:
+            return await self.get_by_id(message_id)
+        except ValueError:
+            return None
+
+    def round_trips(self) -> Optional[int]:
+        """DB round trips made through this port so far, or None if not tracked."""
+        return None
+
     @abstractmethod
     async def get_by_id(self, message_id: str) -> MessageDomain:
         """Fetch a message by id. Implementations may accept numeric or string PKs; pass the raw id as string."""
@@ -0,0 +1,19 @@
+from abc import ABC, abstractmethod
+from typing import Optional
+
+from src.domain.models.summary_domain import ConversationSummaryDomain
+
+
+class SummaryOutputPort(ABC):
+    @abstractmethod
+    async def get_by_conversation(self, conversation_id: str) -> Optional[ConversationSummaryDomain]:
+        pass
+
+    @abstractmethod
+    async def save(self, summary: ConversationSummaryDomain) -> ConversationSummaryDomain:
+        """Insert or replace the summary of `summary.conversation_id`."""
+        pass
+
+    @abstractmethod
+    async def delete_by_conversation(self, conversation_id: str) -> bool:
+        pass
@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import logging
+from typing import Any, Dict, List, Optional
+
+from src.application.config.config import settings
+from src.application.ports.output.gemini_output_port import GeminiOutputPort
+from src.application.ports.output.message_output_port import MessageOutputPort
+from src.application.ports.output.summary_output_port import SummaryOutputPort
+from src.domain.enums.enums import ERole
+from src.domain.models.message_domain import MessageDomain
+from src.domain.models.summary_domain import ConversationSummaryDomain
+from src.domain.utils.context_window import message_tokens
+from src.domain.utils.utils import generate_unique_id, get_current_timestamp
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_INSTRUCTIONS = (
+    "You maintain a running summary of a chat between a user and an assistant. "
+    "Update the current summary with the new turns below. Keep facts, decisions, names, numbers, "
+    "code identifiers, open questions and the user's stated preferences; drop greetings and filler. "
+    "Write in the language of the conversation and reply with the updated summary only."
+)
+
+
+class CompactionMetrics:
+    """Process-wide counters for background compaction and the prompt bytes it saves."""
+
+    def __init__(self) -> None:
+        self.scheduled = 0
+        self.coalesced = 0
+        self.queue_full = 0
+        self.compactions = 0
+        self.skipped = 0
+        self.failures = 0
+        self.messages_folded = 0
+        self.prompts_with_summary = 0
+        self.prompt_bytes_saved = 0
+
+    def record_prompt(self, summary: ConversationSummaryDomain) -> int:
+        """Count one prompt that carried `summary` instead of the raw turns it covers."""
+        saved = max(0, summary.covered_bytes - len(summary.as_message().content.encode("utf-8")))
+        self.prompts_with_summary += 1
+        self.prompt_bytes_saved += saved
+        return saved
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": settings.GEMINI_COMPACTION_ENABLED,
+            "model": settings.GEMINI_COMPACTION_MODEL,
+            "scheduled": self.scheduled,
+            "coalesced": self.coalesced,
+            "queue_full": self.queue_full,
+            "compactions": self.compactions,
+            "skipped": self.skipped,
+            "failures": self.failures,
+            "messages_folded": self.messages_folded,
+            "prompts_with_summary": self.prompts_with_summary,
+            "prompt_bytes_saved": self.prompt_bytes_saved,
+        }
+
+
+compaction_metrics = CompactionMetrics()
+
+
+def _format_turns(messages: List[MessageDomain]) -> str:
+    lines = []
+    for m in messages:
+        speaker = "User" if m.role == ERole.USER else "Assistant"
+        lines.append(f"{speaker}: {m.content}")
+    return "\n\n".join(lines)
+
+
+class CompactionUseCase:
+    """Fold the oldest un-summarized turns of a conversation into its rolling summary.
+
+    The newest `keep_recent` messages are never folded, so the prompt always keeps
+    the latest turns verbatim. Each run extends the previous summary with the turns
+    that aged out since, instead of re-reading the whole conversation.
+    """
+
+    def __init__(
+        self,
+        gemini_output_port: GeminiOutputPort,
+        message_output_port: MessageOutputPort,
+        summary_output_port: SummaryOutputPort,
+        model: Optional[str] = None,
+        threshold_tokens: Optional[int] = None,
+        keep_recent: Optional[int] = None,
+        max_fold: Optional[int] = None,
+        metrics: Optional[CompactionMetrics] = None,
+    ):
+        self.gemini_output_port = gemini_output_port
+        self.message_output_port = message_output_port
+        self.summary_output_port = summary_output_port
+        self.model = model or settings.GEMINI_COMPACTION_MODEL
+        self.threshold_tokens = threshold_tokens if threshold_tokens is not None else settings.GEMINI_COMPACTION_THRESHOLD_TOKENS
+        self.keep_recent = max(1, keep_recent if keep_recent is not None else settings.GEMINI_COMPACTION_KEEP_RECENT_MESSAGES)
+        self.max_fold = max(1, max_fold if max_fold is not None else settings.GEMINI_COMPACTION_MAX_FOLD_MESSAGES)
+        self.metrics = metrics or compaction_metrics
+
+    async def compact(self, conversation_id: str) -> Optional[ConversationSummaryDomain]:
+        """Returns the new summary, or None when there was nothing worth folding."""
+        summary = await self.summary_output_port.get_by_conversation(conversation_id)
+        recent = await self.message_output_port.get_latest_by_conversation(conversation_id, self.keep_recent)
+        if len(recent) < self.keep_recent:
+            self.metrics.skipped += 1
+            return None
+        boundary = recent[-1]
+
+        after = None
+        if summary is not None:
+            after = MessageDomain(
+                id=summary.last_message_id,
+                conversation_id=conversation_id,
+                role=ERole.USER,
+                content="",
+                created_at=summary.last_message_created_at,
+            )
+        page = await self.message_output_port.get_oldest_by_conversation(conversation_id, self.max_fold, after)
+        fold = [m for m in page if (m.created_at, m.id) < (boundary.created_at, boundary.id)]
+        raw_tokens = sum(message_tokens(m) for m in fold) + sum(message_tokens(m) for m in recent)
+        if not fold or raw_tokens < self.threshold_tokens:
+            self.metrics.skipped += 1
+            return None
+
+        prompt = MessageDomain(
+            id=generate_unique_id("msg"),
+            conversation_id=conversation_id,
+            role=ERole.USER,
+            content=(
+                f"{SUMMARY_INSTRUCTIONS}\n\nCurrent summary:\n{summary.content if summary else '(none yet)'}"
+                f"\n\nNew turns:\n{_format_turns(fold)}"
+            ),
+            created_at=get_current_timestamp(),
+        )
+        text = (await self.gemini_output_port.generate(self.model, [prompt]) or "").strip()
+        if not text:
+            self.metrics.failures += 1
+            logger.warning("Compaction of %s returned an empty summary; keeping the previous one", conversation_id)
+            return summary
+
+        last = fold[-1]
+        updated = await self.summary_output_port.save(
+            ConversationSummaryDomain(
+                conversation_id=conversation_id,
+                content=text,
+                last_message_id=last.id,
+                last_message_created_at=last.created_at,
+                covered_messages=(summary.covered_messages if summary else 0) + len(fold),
+                covered_bytes=(summary.covered_bytes if summary else 0) + sum(len(m.content.encode("utf-8")) for m in fold),
+                version=(summary.version + 1) if summary else 1,
+                updated_at=get_current_timestamp(),
+            )
+        )
+        self.metrics.compactions += 1
+        self.metrics.messages_folded += len(fold)
+        logger.info(
+            "Compacted %d messages of %s into summary v%d (%d bytes covered)",
+            len(fold), conversation_id, updated.version, updated.covered_bytes,
+        )
+        return updated
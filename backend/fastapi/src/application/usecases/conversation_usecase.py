@@ -11,6 +11,9 @@ from src.domain.vo.conversation_response import ConversationResponse
 from src.domain.vo.list_response import ListResponse
 from src.domain.models.conversation_domain import ConversationDomain
 from src.application.exceptions.exceptions import NotFoundError
+from src.application.usecases.pagination import (
+    CONVERSATIONS_SCOPE, RECENT_CONVERSATIONS_SCOPE, messages_scope, page_response, parse_after,
+)
 
 
 class ConversationUseCase(ConversationInputPort):
@@ -35,7 +38,9 @@ class ConversationUseCase(ConversationInputPort):
             raise NotFoundError("Conversation not found")
 
         messages, _ = await self.message_repo.get_list_by_conversation(conversation_id, limit=self.LATEST_MESSAGE_COUNT, after=None, order="desc")
-        total_count = await self.message_repo.count_by_conversation(conversation_id)
+        total_count = conv.messages_count
+        if total_count is None:
+            total_count = await self.message_repo.count_by_conversation(conversation_id)
 
         truncated_msgs = [
             MessageResponse(
@@ -55,25 +60,30 @@ class ConversationUseCase(ConversationInputPort):
             updated_at=conv.updated_at,
             messages=truncated_msgs,
             messages_count=total_count,
+            last_message_at=conv.last_message_at,
+            last_message_preview=conv.last_message_preview,
         )
 
     async def get_conversation_list(self, 
                                     after: Optional[str] = None, 
                                     limit: int = 10, 
-                                    order: Optional[str] = "desc") -> ListResponse[ConversationResponse]:
+                                    order: Optional[str] = "desc",
+                                    sort: str = "created_at") -> ListResponse[ConversationResponse]:
         """Return a paginated ListResponse of conversations.
 
-        - order: 'asc' or 'desc' (by created_at)
-        - after: id cursor (optional)
-        - offset: number of items to skip after the cursor
+        - sort: 'created_at', or 'last_message_at' for recently active conversations
+        - order: 'asc' or 'desc' (by the sort column); a cursor keeps the order it was issued for
+        - after: `next_cursor` / `prev_cursor` of a previous page, or (legacy) a conversation id
         - limit: max items to return
         """
-        items, has_more = await self.conversation_repo.get_all(limit=limit, after=after, order=order if order else "desc")
+        sort = "last_message_at" if sort == "last_message_at" else "created_at"
+        scope = RECENT_CONVERSATIONS_SCOPE if sort == "last_message_at" else CONVERSATIONS_SCOPE
+        after_id, cursor = parse_after(after, scope)
+        order = cursor.order if cursor is not None else (order or "desc")
+        items, has_more = await self.conversation_repo.get_all(limit=limit, after=after_id, order=order, cursor=cursor, sort=sort)
         # convert to response VO list
         data = [ConversationResponse.from_domain(c) for c in items]
-        first_id = data[0].id if data else None
-        last_id = data[-1].id if data else None
-        return ListResponse[ConversationResponse](data=data, first_id=first_id, last_id=last_id, has_more=has_more)
+        return page_response(data, has_more, order, scope, cursor, paged=after_id is not None, sort=sort)
 
     async def get_conversation_messages(self, 
                                         conversation_id: str, 
@@ -83,17 +93,13 @@ class ConversationUseCase(ConversationInputPort):
         conv = await self.conversation_repo.get_by_id(conversation_id)
         if conv is None:
             raise NotFoundError("Conversation not found")
+        scope = messages_scope(conversation_id)
+        after_id, cursor = parse_after(after, scope)
+        order = cursor.order if cursor is not None else (order or "desc")
         messageList, has_more = await self.message_repo\
-            .get_list_by_conversation(conversation_id, after=after, limit=limit, order=order if order else "desc")
+            .get_list_by_conversation(conversation_id, after=after_id, limit=limit, order=order, cursor=cursor)
         data = [MessageResponse.from_domain(m) for m in messageList]
-        first_id = data[0].id if data else None
-        last_id = data[-1].id if data else None
-        return ListResponse[MessageResponse](
-            data=data, 
-            first_id=first_id, 
-            last_id=last_id, 
-            has_more=has_more
-        )
+        return page_response(data, has_more, order, scope, cursor, paged=after_id is not None)
 
     async def get_recent_messages(self, conversation_id: str, k: int = 5) -> List[MessageResponse]:
         conv = await self.conversation_repo.get_by_id(conversation_id)
@@ -127,6 +133,8 @@ class ConversationUseCase(ConversationInputPort):
         conv = await self.conversation_repo.get_by_id(conversation_id)
         if conv is None:
             raise NotFoundError("Conversation not found")
+        # through the message port, so queued writes are flushed and cached history is dropped
+        await self.message_repo.delete_by_conversation(conversation_id)
         await self.conversation_repo.delete(conv)
         return True
 
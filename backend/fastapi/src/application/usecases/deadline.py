@@ -0,0 +1,129 @@
+"""Per-request deadline, visible to every stage that works for the request.
+
+The deadline middleware sets an absolute deadline from the client's
+`X-Request-Timeout` header (seconds, or milliseconds with an "ms" suffix) or
+the route's default. Each stage bounds its own wait by what is left (DB pool
+checkout, queries, the upstream call and its retries) instead of a fixed
+timeout, and `ensure_time_left(stage)` sheds a request whose deadline already
+passed before any more work is done for it.
+
+The deadline lives in a context variable, so tasks started while handling the
+request inherit it. Background workers start theirs in `detached_context()`.
+"""
+from __future__ import annotations
+
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+from src.application.exceptions.exceptions import DeadlineExceededError
+
+# absolute time.monotonic() by which the request must be answered; None: no deadline
+request_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("request_deadline", default=None)
+
+
+def parse_timeout(value: Optional[str]) -> Optional[float]:
+    """Seconds from "2.5" or "2500ms"; None when missing or unreadable."""
+    text = (value or "").strip().lower()
+    scale = 1.0
+    if text.endswith("ms"):
+        text, scale = text[:-2], 0.001
+    elif text.endswith("s"):
+        text = text[:-1]
+    try:
+        return float(text) * scale
+    except ValueError:
+        return None
+
+
+def parse_route_timeouts(raw: Optional[str]) -> Dict[str, float]:
+    """Parse "/gemini/query=60,/conversations=10" (path prefix -> seconds; invalid entries are ignored)."""
+    timeouts: Dict[str, float] = {}
+    for item in (raw or "").split(","):
+        prefix, _, value = item.partition("=")
+        seconds = parse_timeout(value)
+        if prefix.strip().startswith("/") and seconds is not None:
+            timeouts[prefix.strip()] = seconds
+    return timeouts
+
+
+def route_timeout(path: str, timeouts: Dict[str, float], default: Optional[float] = None) -> Optional[float]:
+    """The timeout of the longest matching path prefix, else `default`."""
+    best: Optional[str] = None
+    for prefix in timeouts:
+        if path.startswith(prefix) and (best is None or len(prefix) > len(best)):
+            best = prefix
+    return timeouts[best] if best is not None else default
+
+
+def remaining_time() -> Optional[float]:
+    """Seconds left before the request's deadline (0 once it passed), or None without one."""
+    deadline = request_deadline.get()
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.monotonic())
+
+
+def bounded_timeout(timeout: Optional[float]) -> Optional[float]:
+    """`timeout` cut to the time left for the request."""
+    left = remaining_time()
+    if left is None:
+        return timeout
+    return left if timeout is None else min(timeout, left)
+
+
+def deadline_expired() -> bool:
+    left = remaining_time()
+    return left is not None and left <= 0
+
+
+def ensure_time_left(stage: str) -> None:
+    """Shed the request (DeadlineExceededError) if its deadline passed before `stage`."""
+    if deadline_expired():
+        deadline_metrics.record_shed(stage)
+        raise DeadlineExceededError(f"Request deadline exceeded before {stage}")
+
+
+def clear_request_deadline() -> None:
+    """Drop the deadline for the rest of the current context (a stream that has started)."""
+    request_deadline.set(None)
+
+
+@contextmanager
+def no_deadline() -> Iterator[None]:
+    """Run a block without the request's deadline (work that must finish once started)."""
+    token = request_deadline.set(None)
+    try:
+        yield
+    finally:
+        request_deadline.reset(token)
+
+
+def detached_context() -> contextvars.Context:
+    """A copy of the current context without the request's deadline, for background tasks."""
+    context = contextvars.copy_context()
+    context.run(request_deadline.set, None)
+    return context
+
+
+class DeadlineMetrics:
+    def __init__(self):
+        self.requests = 0
+        self.shed: Dict[str, int] = {}
+
+    def record_request(self) -> None:
+        self.requests += 1
+
+    def record_shed(self, stage: str) -> None:
+        self.shed[stage] = self.shed.get(stage, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests_with_deadline": self.requests,
+            "shed": sum(self.shed.values()),
+            "shed_by_stage": dict(self.shed),
+        }
+
+
+deadline_metrics = DeadlineMetrics()
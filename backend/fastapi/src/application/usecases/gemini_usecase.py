@@ -2,25 +2,162 @@ from __future__ import annotations
 
 import asyncio
 import logging
-from typing import AsyncIterator, List, Optional
+import time
+from contextlib import aclosing, nullcontext
+from typing import Any, AsyncContextManager, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
 from io import StringIO
 from fastapi import HTTPException
-from src.application.exceptions.exceptions import BadGatewayError, GatewayTimeoutError
+from src.application.exceptions.exceptions import AppException, BadGatewayError, DeadlineExceededError, GatewayTimeoutError, NotFoundError
 
 from src.application.ports.output.conversation_output_port import ConversationOutputPort
 from src.application.ports.output.gemini_output_port import GeminiOutputPort
 from src.application.ports.output.message_output_port import MessageOutputPort
+from src.application.ports.output.summary_output_port import SummaryOutputPort
+from src.application.usecases.compaction_usecase import compaction_metrics
+from src.application.usecases.deadline import bounded_timeout, deadline_expired, deadline_metrics, ensure_time_left, no_deadline
+from src.application.usecases.stream_registry import Broadcast, StreamRegistry
 from src.domain.vo.message_request import MessageRequest
 from src.application.ports.input.gemini_input_port import GeminiInputPort
-from src.domain.utils.validators import validate_message_content, validate_model_name
+from src.domain.utils.validators import estimate_tokens, validate_message_content, validate_model_name
+from src.domain.utils.context_window import ContextWindow, parse_token_budgets, token_budget_for
 from src.domain.utils.utils import generate_unique_id, get_current_timestamp
 from src.application.config.config import settings
 from src.domain.models.message_domain import MessageDomain
-from src.domain.enums.enums import EModel, ERole
+from src.domain.enums.enums import EMessageStatus, EModel, ERole
 
 logger = logging.getLogger(__name__)
 
 
+class TurnMetrics:
+    """Process-wide DB round trips and time spent before the upstream call, per chat turn."""
+
+    def __init__(self) -> None:
+        self.turns = 0
+        self.db_round_trips = 0
+        self.pre_upstream_ms = 0.0
+        self.max_pre_upstream_ms = 0.0
+
+    def record(self, round_trips: Optional[int], pre_upstream_ms: float) -> None:
+        self.turns += 1
+        self.db_round_trips += round_trips or 0
+        self.pre_upstream_ms += pre_upstream_ms
+        self.max_pre_upstream_ms = max(self.max_pre_upstream_ms, pre_upstream_ms)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "turns": self.turns,
+            "avg_db_round_trips": round(self.db_round_trips / self.turns, 2) if self.turns else 0.0,
+            "avg_pre_upstream_ms": round(self.pre_upstream_ms / self.turns, 2) if self.turns else 0.0,
+            "max_pre_upstream_ms": round(self.max_pre_upstream_ms, 2),
+        }
+
+
+turn_metrics = TurnMetrics()
+
+
+class StreamMetrics:
+    """Process-wide outcomes of streamed answers, and the upstream tokens saved by cancelling.
+
+    Savings are estimated: the average length of completed answers minus what a cancelled
+    stream had already received.
+    """
+
+    def __init__(self) -> None:
+        self.completed = 0
+        self.aborted = 0
+        self.cancelled = 0
+        self.completed_tokens = 0
+        self.tokens_before_cancel = 0
+        self.tokens_saved = 0
+
+    def record_complete(self, text: str) -> None:
+        self.completed += 1
+        self.completed_tokens += estimate_tokens(text)
+
+    def record_aborted(self) -> None:
+        self.aborted += 1
+
+    def record_cancelled(self, text: str) -> int:
+        received = estimate_tokens(text)
+        saved = max(0, self.average_tokens() - received)
+        self.cancelled += 1
+        self.tokens_before_cancel += received
+        self.tokens_saved += saved
+        return saved
+
+    def average_tokens(self) -> int:
+        return self.completed_tokens // self.completed if self.completed else 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "completed": self.completed,
+            "aborted": self.aborted,
+            "cancelled": self.cancelled,
+            "avg_completed_tokens": self.average_tokens(),
+            "tokens_before_cancel": self.tokens_before_cancel,
+            "estimated_tokens_saved": self.tokens_saved,
+        }
+
+
+stream_metrics = StreamMetrics()
+
+T = TypeVar("T")
+
+
+class _ClientGone(Exception):
+    """The client of a stream disconnected."""
+
+
+async def _until_disconnected(
+    parts: AsyncIterator[T], is_disconnected: Callable[[], Awaitable[bool]], poll: float
+) -> AsyncIterator[T]:
+    """Relay `parts` until `is_disconnected()` reports the client gone, then raise _ClientGone.
+
+    The pending read is cancelled right away, so the chain of upstream generators unwinds
+    and closes the HTTP stream instead of waiting for the next token.
+    """
+
+    async def watch() -> None:
+        try:
+            while not await is_disconnected():
+                await asyncio.sleep(poll)
+        except Exception as exc:
+            logger.debug("Disconnect watcher stopped: %s", exc)
+            await asyncio.Future()
+
+    watcher = asyncio.ensure_future(watch())
+    iterator = parts.__aiter__()
+    step: Optional[asyncio.Future] = None
+    try:
+        while True:
+            step = asyncio.ensure_future(iterator.__anext__())
+            await asyncio.wait({step, watcher}, return_when=asyncio.FIRST_COMPLETED)
+            if not step.done():
+                step.cancel()
+                await asyncio.wait({step})
+                raise _ClientGone()
+            try:
+                part = step.result()
+            except StopAsyncIteration:
+                return
+            yield part
+    finally:
+        watcher.cancel()
+        if step is not None and not step.done():
+            step.cancel()
+
+
+async def _finish_despite_cancel(work: Awaitable[Any]) -> None:
+    """Run `work` to completion even while the calling task is being cancelled."""
+    task = asyncio.ensure_future(work)
+    while not task.done():
+        try:
+            await asyncio.shield(task)
+        except asyncio.CancelledError:
+            # cancel scopes re-deliver the cancellation on every await; keep waiting
+            continue
+
+
 class GeminiUseCase(GeminiInputPort):
     """Use case coordinating Gemini calls, persistence and conversation updates.
 
@@ -36,18 +173,87 @@ class GeminiUseCase(GeminiInputPort):
         gemini_output_port: GeminiOutputPort,
         message_output_port: MessageOutputPort,
         conversation_output_port: ConversationOutputPort,
+        summary_output_port: Optional[SummaryOutputPort] = None,
+        schedule_compaction: Optional[Callable[[str], bool]] = None,
+        stream_registry: Optional[StreamRegistry] = None,
+        open_stream_port: Optional[Callable[[], AsyncContextManager[MessageOutputPort]]] = None,
     ):
         self.gemini_output_port = gemini_output_port
         self.message_output_port = message_output_port
         self.conversation_output_port = conversation_output_port
+        # rolling summaries (optional): read when building history, refreshed in the background
+        self.summary_output_port = summary_output_port
+        self.schedule_compaction = schedule_compaction
+        # shared streams (optional): generations run in their own task with their own
+        # message port, so they outlive the request that started them
+        self.stream_registry = stream_registry
+        self.open_stream_port = open_stream_port
+        self._token_budgets = parse_token_budgets(settings.GEMINI_CONTEXT_TOKEN_BUDGETS)
+        # what the last history window kept/dropped (reported to the caller)
+        self.last_context_report: Optional[Dict[str, int]] = None
+        # DB round trips and time before the upstream call for the last turn
+        self.last_turn_report: Optional[Dict[str, float]] = None
+        self._warm_up_task: Optional[asyncio.Future] = None
+        # the assistant message of the last stream (checkpointed while it runs)
+        self.last_stream_message_id: Optional[str] = None
+        self.last_stream_status: Optional[EMessageStatus] = None
 
-    async def _persist_user_message(self, message_domain: MessageDomain) -> None:
+    def _resolve_model(self, model_hint: Optional[str]) -> str:
         try:
-            await self.message_output_port.save(message_domain)
+            model = validate_model_name(model_hint or settings.GEMINI_URL or EModel.GEMINI_2_5_PRO)
+            return model.value if isinstance(model, EModel) else str(model)
+        except Exception:
+            return str(model_hint or EModel.GEMINI_2_5_PRO)
+
+    def _warm_up(self) -> None:
+        """Start opening the upstream connection in the background (never awaited)."""
+        if not settings.GEMINI_TURN_PREWARM_ENABLED or self.gemini_output_port is None:
+            return
+        task = asyncio.ensure_future(self.gemini_output_port.warm_up())
+        # retrieve the outcome so a failed warmup is never reported as unhandled
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._warm_up_task = task
+
+    async def _prepare_turn(self, message_request: MessageRequest) -> Tuple[MessageDomain, str, List[MessageDomain]]:
+        """Validate the request, persist the user turn and build the history window.
+
+        The insert and the first history page share one transaction (no pre-read, no
+        refresh), while the upstream connection is being opened concurrently. A request
+        whose deadline passed is shed before this work and again before the upstream call.
+        """
+        ensure_time_left("admission")
+        user_msg, model_hint = message_request.to_domain()
+        user_msg.content = validate_message_content(user_msg.content)
+        started = time.perf_counter()
+        round_trips_before = self.message_output_port.round_trips()
+        self._warm_up()
+        model_name = self._resolve_model(model_hint)
+
+        first_page: Optional[List[MessageDomain]] = None
+        try:
+            first_page = await self.message_output_port.insert_and_get_latest(
+                user_msg, max(1, settings.GEMINI_CONTEXT_FETCH_BATCH)
+            )
+        except DeadlineExceededError:
+            raise
         except Exception as exc:  # pragma: no cover - persistence should not break core flow
             logger.exception("Failed to persist user message: %s", exc)
+        history = await self._load_history(user_msg, model_name, first_page)
+
+        round_trips_after = self.message_output_port.round_trips()
+        round_trips = None
+        if round_trips_before is not None and round_trips_after is not None:
+            round_trips = round_trips_after - round_trips_before
+        pre_upstream_ms = (time.perf_counter() - started) * 1000
+        self.last_turn_report = {"db_round_trips": round_trips, "pre_upstream_ms": round(pre_upstream_ms, 2)}
+        turn_metrics.record(round_trips, pre_upstream_ms)
+        logger.debug("Turn prepared for %s: %s DB round trips, %.1f ms", user_msg.conversation_id, round_trips, pre_upstream_ms)
+        ensure_time_left("upstream")
+        return user_msg, model_name, history
 
-    async def _persist_assistant_message(self, conversation_id: Optional[str], text: str) -> Optional[MessageDomain]:
+    async def _persist_assistant_message(
+        self, conversation_id: Optional[str], text: str, status: EMessageStatus = EMessageStatus.COMPLETE
+    ) -> Optional[MessageDomain]:
         if conversation_id is None:
             return None
         msg = MessageDomain(
@@ -56,47 +262,221 @@ class GeminiUseCase(GeminiInputPort):
             role=ERole.MODEL,
             content=text,
             created_at=get_current_timestamp(),
+            status=status,
         )
         try:
-            saved = await self.message_output_port.save(msg)
+            # the answer was paid for: it is stored even if the caller's deadline just passed
+            with no_deadline():
+                saved = await self.message_output_port.save(msg)
             return saved
         except Exception:
             logger.exception("Failed to persist assistant message for conversation %s", conversation_id)
             return None
+        finally:
+            self._maybe_schedule_compaction(conversation_id)
 
-    async def query(self, message_request: MessageRequest) -> str:
-        # convert to domain object and validate
-        user_msg, model_hint = message_request.to_domain()
-        # sanitize/validate content
-        user_msg.content = validate_message_content(user_msg.content)
+    async def _checkpoint(
+        self,
+        message: MessageDomain,
+        status: EMessageStatus,
+        expected_updated_at: Optional[int] = None,
+        port: Optional[MessageOutputPort] = None,
+    ) -> bool:
+        message.status = status
+        # strictly increasing, so a takeover (compare on updated_at) can never match twice
+        message.updated_at = max(get_current_timestamp(), (message.updated_at or 0) + 1)
+        self.last_stream_status = status
+        try:
+            # a started answer is checkpointed whatever is left of the request's deadline
+            with no_deadline():
+                return await (port or self.message_output_port).checkpoint(message, expected_updated_at)
+        except Exception:
+            logger.exception("Failed to checkpoint assistant message %s", message.id)
+            return False
 
-        # persist user message (best-effort)
-        await self._persist_user_message(user_msg)
+    async def _stream_with_checkpoints(
+        self,
+        assistant: MessageDomain,
+        parts: AsyncIterator[str],
+        is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+        port: Optional[MessageOutputPort] = None,
+    ) -> AsyncIterator[str]:
+        """Relay `parts`, writing the text so far to the assistant row as it grows.
 
-        # determine model
+        The row is written when the first part arrives, then every checkpoint interval or
+        chars, with status in_progress; it ends complete, or aborted if the upstream fails
+        or the client goes away (the upstream stream is then closed at once).
+        """
+        if is_disconnected is not None:
+            parts = _until_disconnected(parts, is_disconnected, settings.GEMINI_STREAM_DISCONNECT_POLL_SECONDS)
+        buffer = StringIO()
+        buffer.write(assistant.content)
+        checkpoints = settings.GEMINI_STREAM_CHECKPOINT_ENABLED
+        interval = settings.GEMINI_STREAM_CHECKPOINT_INTERVAL_SECONDS
+        every_chars = max(1, settings.GEMINI_STREAM_CHECKPOINT_CHARS)
+        unsaved = 0
+        last_checkpoint: Optional[float] = None
         try:
-            model = validate_model_name(model_hint or settings.GEMINI_URL or EModel.GEMINI_2_5_PRO)
-            model_name = model.value if isinstance(model, EModel) else str(model)
+            async for part in parts:
+                if part is None:
+                    continue
+                buffer.write(part)
+                unsaved += len(part)
+                yield part
+                now = time.monotonic()
+                if checkpoints and (last_checkpoint is None or unsaved >= every_chars or now - last_checkpoint >= interval):
+                    assistant.content = buffer.getvalue()
+                    await self._checkpoint(assistant, EMessageStatus.IN_PROGRESS, port=port)
+                    unsaved, last_checkpoint = 0, now
+        except _ClientGone:
+            assistant.content = buffer.getvalue()
+            self._record_cancelled(assistant.content)
+            await self._checkpoint(assistant, EMessageStatus.ABORTED, port=port)
+            return
+        except (asyncio.CancelledError, GeneratorExit):
+            # the server noticed the disconnect first and is tearing the response down
+            assistant.content = buffer.getvalue()
+            self._record_cancelled(assistant.content)
+            await _finish_despite_cancel(self._checkpoint(assistant, EMessageStatus.ABORTED, port=port))
+            raise
+        except Exception as exc:
+            logger.exception("Error while streaming from Gemini: %s", exc)
+            stream_metrics.record_aborted()
+            assistant.content = buffer.getvalue()
+            if assistant.content:
+                # keep what was generated; the client can still fetch it by id
+                await self._checkpoint(assistant, EMessageStatus.ABORTED, port=port)
+            # Stop iteration; downstream StreamingResponse will close the connection.
+            return
+
+        assistant.content = buffer.getvalue()
+        stream_metrics.record_complete(assistant.content)
+        await self._checkpoint(assistant, EMessageStatus.COMPLETE, port=port)
+        self._maybe_schedule_compaction(assistant.conversation_id)
+
+    def _record_cancelled(self, text: str) -> None:
+        saved = stream_metrics.record_cancelled(text)
+        logger.info("Client went away mid-stream; upstream closed (~%d tokens not generated)", saved)
+
+    def _maybe_schedule_compaction(self, conversation_id: str) -> None:
+        """Queue a background fold once the raw (un-summarized) history outgrows the threshold."""
+        report = self.last_context_report
+        if self.schedule_compaction is None or report is None:
+            return
+        raw_tokens = report["kept_tokens"] - report.get("summary_tokens", 0) + report["dropped_tokens"]
+        if report["dropped_messages"] or raw_tokens >= settings.GEMINI_COMPACTION_THRESHOLD_TOKENS:
+            self.schedule_compaction(conversation_id)
+
+    async def _load_summary(self, conversation_id: str):
+        if self.summary_output_port is None:
+            return None
+        try:
+            return await self.summary_output_port.get_by_conversation(conversation_id)
         except Exception:
-            model_name = str(model_hint or EModel.GEMINI_2_5_PRO)
+            logger.debug("Could not load summary for conversation %s", conversation_id)
+            return None
 
-        # build short history
-        history: List[MessageDomain] = []
-        if user_msg.conversation_id:
-            try:
-                history = await self.message_output_port.get_latest_by_conversation(user_msg.conversation_id, 100)
-            except Exception:
-                logger.debug("Could not load history for conversation %s", user_msg.conversation_id)
+    async def _load_history(
+        self, user_msg: MessageDomain, model_name: str, first_page: Optional[List[MessageDomain]] = None
+    ) -> List[MessageDomain]:
+        """Newest-first history that fits the model's token budget; the new user turn is always kept.
+
+        Turns already folded into the conversation's rolling summary are not fetched; the
+        summary is sent in their place, unless the newer turns alone fill the budget.
+        `first_page` is the newest page when the caller already has it (read in the same
+        transaction as the user-message insert).
+        """
+        window = ContextWindow(
+            token_budget_for(model_name, self._token_budgets, settings.GEMINI_CONTEXT_DEFAULT_TOKEN_BUDGET),
+            max_messages=settings.GEMINI_CONTEXT_MAX_MESSAGES,
+        )
+        window.pin(user_msg)
+        self.last_context_report = window.report()
+        if not user_msg.conversation_id:
+            return window.messages
 
-        # call Gemini with a timeout
+        summary = await self._load_summary(user_msg.conversation_id)
+        if summary is not None:
+            window.set_summary(summary.as_message())
+
+        batch = max(1, settings.GEMINI_CONTEXT_FETCH_BATCH)
+        fetched = 0
+        reached_summary = False
+        before: Optional[MessageDomain] = None
         try:
-            timeout = getattr(settings, "GEMINI_TIMEOUT_SECONDS", 30)
+            while not window.closed and not reached_summary:
+                if before is None and first_page is not None:
+                    page = first_page
+                else:
+                    page = await self.message_output_port.get_latest_by_conversation(user_msg.conversation_id, batch, before)
+                for message in page:
+                    if summary is not None and summary.covers(message):
+                        reached_summary = True
+                        break
+                    fetched += 1
+                    # after the window closes the rest of the page is only counted as dropped
+                    window.offer(message)
+                if len(page) < batch:
+                    break
+                before = page[-1]
+            if window.closed:
+                # the summary would leave a gap before the kept turns, so it goes too
+                window.drop_summary()
+                total = await self.message_output_port.count_by_conversation(user_msg.conversation_id)
+                window.drop_unseen(total - fetched)
+        except Exception:
+            logger.debug("Could not load history for conversation %s", user_msg.conversation_id)
+
+        if summary is not None and window.summary is not None:
+            saved = compaction_metrics.record_prompt(summary)
+            logger.debug("Summary v%d replaced %d messages (%d bytes saved)", summary.version, summary.covered_messages, saved)
+
+        self.last_context_report = window.report()
+        if window.dropped_messages:
+            logger.info(
+                "Context window for %s: kept %d messages (~%d tokens), dropped %d (~%d+ tokens)",
+                user_msg.conversation_id,
+                len(window.messages),
+                window.tokens,
+                window.dropped_messages,
+                window.dropped_tokens,
+            )
+        return window.messages
+
+    def get_context_report(self) -> Optional[Dict[str, int]]:
+        return self.last_context_report
+
+    def get_turn_report(self) -> Optional[Dict[str, float]]:
+        return self.last_turn_report
+
+    def get_answered_model(self) -> Optional[str]:
+        return self.gemini_output_port.get_answered_model()
+
+    def get_stream_message_id(self) -> Optional[str]:
+        return self.last_stream_message_id
+
+    def get_stream_status(self) -> Optional[str]:
+        return self.last_stream_status.value if self.last_stream_status is not None else None
+
+    async def query(self, message_request: MessageRequest) -> str:
+        # validate, persist the user message (best-effort) and build a token-budgeted history
+        user_msg, model_name, history = await self._prepare_turn(message_request)
+
+        # call Gemini with a timeout, cut to what is left of the request's deadline
+        try:
+            timeout = bounded_timeout(getattr(settings, "GEMINI_TIMEOUT_SECONDS", 30))
             resp = await asyncio.wait_for(
                 self.gemini_output_port.generate(model_name, history), timeout=timeout
             )
         except asyncio.TimeoutError:
+            if deadline_expired():
+                deadline_metrics.record_shed("upstream")
+                raise DeadlineExceededError("Request deadline exceeded waiting for Gemini")
             logger.exception("Gemini generate timed out")
             raise GatewayTimeoutError("Gemini request timed out")
+        except AppException:
+            # already mapped by the adapter (e.g. 503 when every fallback model's circuit is open)
+            raise
         except Exception as exc:
             logger.exception("Gemini generate failed: %s", exc)
             # Map adapter failures to a 502 Bad Gateway so callers know it's an upstream problem
@@ -106,24 +486,45 @@ class GeminiUseCase(GeminiInputPort):
         await self._persist_assistant_message(user_msg.conversation_id, resp)
         return resp
 
-    async def query_stream(self, message_request: MessageRequest) -> AsyncIterator[str]:
-        user_msg, model_hint = message_request.to_domain()
-        user_msg.content = validate_message_content(user_msg.content)
-        await self._persist_user_message(user_msg)
+    async def open_stream(
+        self,
+        message_request: MessageRequest,
+        is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+        passthrough: bool = False,
+    ) -> AsyncIterator:
+        """Admit the turn now and return its stream.
 
+        The deadline checks, the upstream slot, the user-message insert and the history read
+        all happen here, before the caller starts its response, so a request shed on the way
+        still gets its error status (504, or 503 with Retry-After) instead of an empty stream.
+        """
+        ensure_time_left("admission")
+        # the slot is taken before anything is written: an overflow leaves no user message behind
+        await self.gemini_output_port.reserve_stream()
         try:
-            model = validate_model_name(model_hint or settings.GEMINI_URL or EModel.GEMINI_2_5_PRO)
-            model_name = model.value if isinstance(model, EModel) else str(model)
-        except Exception:
-            model_name = str(model_hint or EModel.GEMINI_2_5_PRO)
+            user_msg, model_name, history = await self._prepare_turn(message_request)
+        except BaseException:
+            self.gemini_output_port.release_stream()
+            raise
+        if passthrough:
+            return self._relay_raw(user_msg, model_name, history, is_disconnected)
+        return self._relay(user_msg, model_name, history, is_disconnected)
 
-        history: List[MessageDomain] = []
-        if user_msg.conversation_id:
-            try:
-                history = await self.message_output_port.get_latest_by_conversation(user_msg.conversation_id, 100)
-            except Exception:
-                logger.debug("Could not load history for conversation %s", user_msg.conversation_id)
+    async def query_stream(
+        self, message_request: MessageRequest, is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None
+    ) -> AsyncIterator[str]:
+        parts = await self.open_stream(message_request, is_disconnected)
+        async with aclosing(parts) as relayed:
+            async for part in relayed:
+                yield part
 
+    async def _relay(
+        self,
+        user_msg: MessageDomain,
+        model_name: str,
+        history: List[MessageDomain],
+        is_disconnected: Optional[Callable[[], Awaitable[bool]]],
+    ) -> AsyncIterator[str]:
         # get stream iterator
         try:
             # stream_generate returns an async iterator (async generator); do not await it
@@ -132,23 +533,206 @@ class GeminiUseCase(GeminiInputPort):
             logger.exception("Gemini stream_generate not available or failed to start: %s", exc)
             raise BadGatewayError(f"Gemini stream error: {exc}")
 
-        # Accumulate in a StringIO to reduce list growth overhead
-        buffer = StringIO()
-        try:
-            async for part in stream_iter:
-                if part is None:
-                    continue
-                buffer.write(part)
+        # the answer is checkpointed under this id while it streams, so it can be resumed
+        assistant = MessageDomain(
+            id=generate_unique_id("msg"),
+            conversation_id=user_msg.conversation_id,
+            role=ERole.MODEL,
+            content="",
+            created_at=get_current_timestamp(),
+            status=EMessageStatus.IN_PROGRESS,
+        )
+        self.last_stream_message_id = assistant.id
+        self.last_stream_status = EMessageStatus.IN_PROGRESS
+        broadcast = None
+        if self.stream_registry is not None:
+            broadcast = self.stream_registry.publish(assistant.conversation_id, assistant.id)
+        if broadcast is None:
+            # closed with the caller, so a client going away reaches the upstream stream at once
+            async with aclosing(self._stream_with_checkpoints(assistant, stream_iter, is_disconnected)) as parts:
+                async for part in parts:
+                    yield part
+            return
+
+        # one generation, any number of subscribers; this request is the first of them
+        broadcast.producer = asyncio.get_running_loop().create_task(self._produce(assistant, stream_iter, broadcast))
+        async with aclosing(self._subscribe(broadcast, 0, is_disconnected)) as parts:
+            async for part in parts:
                 yield part
+
+    async def _produce(self, assistant: MessageDomain, parts: AsyncIterator[str], broadcast: Broadcast) -> None:
+        """Run a shared generation to the end (or until every subscriber has left)."""
+        error: Optional[BaseException] = None
+        try:
+            opened = self.open_stream_port() if self.open_stream_port is not None else nullcontext(self.message_output_port)
+            async with opened as port:
+                async with aclosing(self._stream_with_checkpoints(assistant, parts, port=port)) as relayed:
+                    async for part in relayed:
+                        broadcast.append(part)
         except asyncio.CancelledError:
-            logger.info("Streaming to client cancelled")
+            # orphaned: nobody is left to tell
+            pass
+        except Exception as exc:
+            logger.warning("Shared stream for message %s failed: %s", assistant.id, exc)
+            error = exc
+        finally:
+            broadcast.finish(assistant.status, error)
+
+    async def _subscribe(
+        self, broadcast: Broadcast, offset: int, is_disconnected: Optional[Callable[[], Awaitable[bool]]]
+    ) -> AsyncIterator[str]:
+        parts: AsyncIterator[str] = broadcast.subscribe(offset)
+        if is_disconnected is not None:
+            parts = _until_disconnected(parts, is_disconnected, settings.GEMINI_STREAM_DISCONNECT_POLL_SECONDS)
+        try:
+            async with aclosing(parts) as relayed:
+                async for part in relayed:
+                    yield part
+        except _ClientGone:
+            # the generation goes on for the other subscribers (or until the grace period ends)
+            return
+        finally:
+            self.last_stream_status = broadcast.status
+
+    async def follow_conversation(
+        self, conversation_id: str, is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None
+    ) -> AsyncIterator[str]:
+        """Subscribe to the answer currently (or just) streamed in a conversation, from its start."""
+        broadcast = self.stream_registry.latest(conversation_id) if self.stream_registry is not None else None
+        if broadcast is None:
+            raise NotFoundError(f"No streamed answer in conversation: {conversation_id}")
+        self.last_stream_message_id = broadcast.message_id
+        self.last_stream_status = broadcast.status
+        return self._subscribe(broadcast, 0, is_disconnected)
+
+    async def resume_stream(
+        self,
+        message_id: str,
+        model: Optional[str] = None,
+        is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+        offset: int = 0,
+    ) -> AsyncIterator[str]:
+        """Text of a streamed answer after `offset` characters, following it while in progress.
+
+        A generation running in this process is joined through the stream registry. Otherwise
+        the stored row is replayed: a row still being checkpointed (by another worker) is
+        polled for new text, and a row whose checkpoints stopped (the worker died) is taken
+        over, generating the rest after the stored prefix. Raises NotFoundError for unknown ids.
+        """
+        broadcast = self.stream_registry.get(message_id) if self.stream_registry is not None else None
+        if broadcast is not None:
+            self.last_stream_message_id = broadcast.message_id
+            self.last_stream_status = broadcast.status
+            return self._subscribe(broadcast, offset, is_disconnected)
+        message = await self.message_output_port.get_checkpoint(message_id)
+        if message is None or message.role != ERole.MODEL:
+            raise NotFoundError(f"Streamed message not found: {message_id}")
+        self.last_stream_message_id = message.id
+        self.last_stream_status = message.status
+        return self._resume(message, model, is_disconnected, offset)
+
+    async def _resume(
+        self,
+        message: MessageDomain,
+        model: Optional[str],
+        is_disconnected: Optional[Callable[[], Awaitable[bool]]],
+        offset: int = 0,
+    ) -> AsyncIterator[str]:
+        sent = offset
+        poll = max(0.05, settings.GEMINI_STREAM_CHECKPOINT_INTERVAL_SECONDS)
+        while True:
+            if len(message.content) > sent:
+                yield message.content[sent:]
+                sent = len(message.content)
+            self.last_stream_status = message.status
+            if message.status != EMessageStatus.IN_PROGRESS:
+                return
+            last_write = message.updated_at or message.created_at
+            if get_current_timestamp() - last_write > settings.GEMINI_STREAM_CHECKPOINT_STALE_SECONDS:
+                if await self._checkpoint(message, EMessageStatus.IN_PROGRESS, expected_updated_at=last_write):
+                    async with aclosing(self._continue(message, model, is_disconnected)) as parts:
+                        async for part in parts:
+                            yield part
+                    return
+                # another resumer took it over first: keep following the row
+            await asyncio.sleep(poll)
+            if is_disconnected is not None and await is_disconnected():
+                return
+            current = await self.message_output_port.get_checkpoint(message.id)
+            if current is None:
+                self.last_stream_status = EMessageStatus.ABORTED
+                return
+            message = current
+
+    async def _continue(
+        self, message: MessageDomain, model: Optional[str], is_disconnected: Optional[Callable[[], Awaitable[bool]]]
+    ) -> AsyncIterator[str]:
+        """Generate the rest of an orphaned answer: its history plus the stored prefix as a model turn."""
+        model_name = self._resolve_model(model)
+        before = await self.message_output_port.get_latest_by_conversation(message.conversation_id, 1, message)
+        history = await self._load_history(before[0], model_name) if before else []
+        # the window is read from the newest row down; keep only the turns before this answer
+        history = [m for m in history if (m.created_at, m.id) < (message.created_at, message.id)]
+        try:
+            parts = self.gemini_output_port.stream_generate(model_name, history + [message.model_copy()])
+        except Exception as exc:
+            logger.exception("Gemini stream_generate failed to start for resume: %s", exc)
+            await self._checkpoint(message, EMessageStatus.ABORTED)
+            return
+        async with aclosing(self._stream_with_checkpoints(message, parts, is_disconnected)) as relayed:
+            async for part in relayed:
+                yield part
+
+    async def query_stream_raw(
+        self, message_request: MessageRequest, is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None
+    ) -> AsyncIterator[memoryview]:
+        """Pass-through variant of query_stream: upstream SSE bytes are relayed untouched.
+
+        The assistant text is decoded from the captured chunks only after the last byte
+        has been sent, then saved once: complete, or aborted (with what was received) if
+        the client left or the upstream failed. Unlike query_stream there are no in-progress
+        checkpoints and no stream registry, so a passthrough answer cannot be resumed or
+        followed while it streams.
+        """
+        chunks = await self.open_stream(message_request, is_disconnected, passthrough=True)
+        async with aclosing(chunks) as relayed:
+            async for chunk in relayed:
+                yield chunk
+
+    async def _relay_raw(
+        self,
+        user_msg: MessageDomain,
+        model_name: str,
+        history: List[MessageDomain],
+        is_disconnected: Optional[Callable[[], Awaitable[bool]]],
+    ) -> AsyncIterator[memoryview]:
+        chunks = self.gemini_output_port.stream_raw(model_name, history)
+        if is_disconnected is not None:
+            chunks = _until_disconnected(chunks, is_disconnected, settings.GEMINI_STREAM_DISCONNECT_POLL_SECONDS)
+        try:
+            async for chunk in chunks:
+                yield chunk
+        except _ClientGone:
+            partial = self.gemini_output_port.get_streamed_text()
+            self._record_cancelled(partial)
+            await self._persist_assistant_message(user_msg.conversation_id, partial, EMessageStatus.ABORTED)
+            return
+        except (asyncio.CancelledError, GeneratorExit):
+            partial = self.gemini_output_port.get_streamed_text()
+            self._record_cancelled(partial)
+            await _finish_despite_cancel(
+                self._persist_assistant_message(user_msg.conversation_id, partial, EMessageStatus.ABORTED)
+            )
             raise
         except Exception as exc:
             logger.exception("Error while streaming from Gemini: %s", exc)
-            # Stop iteration; downstream StreamingResponse will close the connection.
+            stream_metrics.record_aborted()
+            partial = self.gemini_output_port.get_streamed_text()
+            if partial:
+                # keep what was generated, like the checkpointed streams do
+                await self._persist_assistant_message(user_msg.conversation_id, partial, EMessageStatus.ABORTED)
             return
 
-        # Stream finished successfully, persist the assistant message once
-        full_text = buffer.getvalue()
+        full_text = self.gemini_output_port.get_streamed_text()
+        stream_metrics.record_complete(full_text)
         await self._persist_assistant_message(user_msg.conversation_id, full_text)
-        
\ No newline at end of file
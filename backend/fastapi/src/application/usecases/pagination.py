@@ -0,0 +1,87 @@
+"""Keyset cursors for the list endpoints.
+
+`after` takes either a cursor from a previous page's `next_cursor` /
+`prev_cursor` or, as before, an element id. A cursor carries the sort key, so
+the page is one range query; an id still costs a lookup of the anchor row.
+Cursors are signed with PAGINATION_CURSOR_SECRET (else JWT_SECRET, else a key
+made up at startup, which is only good for a single process).
+"""
+from __future__ import annotations
+
+import logging
+import os
+from typing import List, Optional, Tuple, TypeVar
+
+from src.application.config.config import settings
+from src.application.exceptions.exceptions import BadRequestError
+from src.domain.vo.list_response import ListResponse
+from src.domain.vo.page_cursor import PageCursor, looks_like_cursor
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+CONVERSATIONS_SCOPE = "conversations"
+# sorted by last_message_at; its cursors do not page the created_at list
+RECENT_CONVERSATIONS_SCOPE = "conversations:recent"
+
+_secret: Optional[bytes] = None
+
+
+def messages_scope(conversation_id: str) -> str:
+    return f"messages:{conversation_id}"
+
+
+def cursor_secret() -> bytes:
+    global _secret
+    if _secret is None:
+        configured = settings.PAGINATION_CURSOR_SECRET or settings.JWT_SECRET
+        if configured:
+            _secret = configured.encode("utf-8")
+        else:
+            logger.warning("No PAGINATION_CURSOR_SECRET set; cursors are only valid in this process")
+            _secret = os.urandom(32)
+    return _secret
+
+
+def parse_after(after: Optional[str], scope: str) -> Tuple[Optional[str], Optional[PageCursor]]:
+    """(legacy anchor id, cursor) from an `after` parameter; a bad cursor is a 400."""
+    if not after:
+        return None, None
+    if not looks_like_cursor(after):
+        return after, None
+    try:
+        return None, PageCursor.decode(after, scope, cursor_secret())
+    except ValueError as exc:
+        raise BadRequestError(str(exc))
+
+
+def page_response(
+    data: List[T], has_more: bool, order: str, scope: str, cursor: Optional[PageCursor] = None, paged: bool = False,
+    sort: str = "created_at",
+) -> ListResponse[T]:
+    """ListResponse for a page in display order, with the cursors around it.
+
+    `has_more` is about the direction the page was read in: past its last element, or
+    before its first one for a `prev` page. `paged`: the page did not start at the
+    beginning of the list, so there is a page before it. `sort`: the attribute the
+    list is ordered by (then by id).
+    """
+    secret = cursor_secret()
+    backward = cursor is not None and cursor.backward
+    next_cursor = prev_cursor = None
+    if data:
+        first, last = data[0], data[-1]
+        # a `prev` page was reached from the page after it, so there always is one
+        if has_more or backward:
+            next_cursor = PageCursor(created_at=getattr(last, sort) or 0, id=last.id, order=order).encode(scope, secret)
+        if (has_more if backward else paged or cursor is not None):
+            prev_cursor = PageCursor(created_at=getattr(first, sort) or 0, id=first.id, order=order, backward=True).encode(scope, secret)
+    return ListResponse[T](
+        data=data,
+        first_id=data[0].id if data else None,
+        last_id=data[-1].id if data else None,
+        has_more=has_more,
+        next_cursor=next_cursor,
+        prev_cursor=prev_cursor,
+    )
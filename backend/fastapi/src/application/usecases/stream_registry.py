@@ -0,0 +1,208 @@
+"""In-process registry of streamed answers that are running or just finished.
+
+A generation runs once, in its own task, and publishes its text chunks to a
+`Broadcast`. Any number of subscribers (the original request, a second tab, an
+`EventSource` reconnecting with `Last-Event-ID`) read it from a character
+offset: chunks already produced are replayed from the buffer, newer ones
+follow live. Event ids are `<message id>:<offset>`, where the offset counts
+the characters of the answer sent so far, so a client can also resume from
+the checkpointed row when the buffer is gone.
+
+A generation left without subscribers is cancelled after a grace period.
+Finished buffers are kept for `ttl` seconds; the total size of all buffers
+is capped at `max_bytes`, evicting finished ones first (oldest first). When
+running ones alone fill the cap, new streams are simply not shared.
+"""
+from __future__ import annotations
+
+import asyncio
+import bisect
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from src.application.config.config import settings
+from src.domain.enums.enums import EMessageStatus
+
+
+def format_event_id(message_id: str, offset: int) -> str:
+    return f"{message_id}:{offset}"
+
+
+def parse_event_id(value: Optional[str]) -> Optional[Tuple[str, int]]:
+    """`<message id>:<offset>` from a Last-Event-ID header, or None if it is not one of ours."""
+    message_id, sep, offset = (value or "").strip().rpartition(":")
+    if not sep or not message_id or not offset.isdigit():
+        return None
+    return message_id, int(offset)
+
+
+class Broadcast:
+    def __init__(self, registry: "StreamRegistry", conversation_id: str, message_id: str):
+        self.registry = registry
+        self.conversation_id = conversation_id
+        self.message_id = message_id
+        self.chunks: List[str] = []
+        # character offset at the end of each chunk
+        self.ends: List[int] = []
+        self.bytes = 0
+        self.status = EMessageStatus.IN_PROGRESS
+        self.done = False
+        self.subscribers = 0
+        self.finished_at: Optional[float] = None
+        self.producer: Optional[asyncio.Task] = None
+        # raised to every subscriber once the buffered text is sent
+        self.error: Optional[BaseException] = None
+        self._changed = asyncio.Event()
+        self._stop_handle: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def length(self) -> int:
+        return self.ends[-1] if self.ends else 0
+
+    def append(self, part: str) -> None:
+        size = len(part.encode("utf-8"))
+        self.chunks.append(part)
+        self.ends.append(self.length + len(part))
+        self.bytes += size
+        self.registry._grew(size)
+        self._notify()
+
+    def finish(self, status: EMessageStatus, error: Optional[BaseException] = None) -> None:
+        self.status = status
+        self.error = error
+        self.done = True
+        self.finished_at = time.monotonic()
+        if self._stop_handle is not None:
+            self._stop_handle.cancel()
+        self._notify()
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def subscribe(self, offset: int = 0) -> AsyncIterator[str]:
+        """Text after `offset` characters: replayed from the buffer, then live until the end."""
+        self.subscribers += 1
+        if self._stop_handle is not None:
+            self._stop_handle.cancel()
+            self._stop_handle = None
+        if offset:
+            self.registry.replays += 1
+        sent = offset
+        try:
+            while True:
+                index = bisect.bisect_right(self.ends, sent)
+                while index < len(self.chunks):
+                    start = self.ends[index] - len(self.chunks[index])
+                    # an offset inside a chunk (not one of our ids) gets the rest of that chunk
+                    yield self.chunks[index][max(0, sent - start):]
+                    sent = self.ends[index]
+                    index += 1
+                if self.done:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                await self._changed.wait()
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0 and not self.done:
+                self._schedule_stop()
+
+    def _schedule_stop(self) -> None:
+        if self.producer is None:
+            return
+        self._stop_handle = asyncio.get_running_loop().call_later(self.registry.grace, self._stop)
+
+    def _stop(self) -> None:
+        self._stop_handle = None
+        if self.subscribers == 0 and not self.done and self.producer is not None:
+            self.registry.orphaned += 1
+            self.producer.cancel()
+
+
+class StreamRegistry:
+    def __init__(self, max_bytes: int = 16 * 1024 * 1024, ttl: float = 60.0, grace: float = 5.0, enabled: bool = True):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.grace = max(0.0, grace)
+        self.enabled = enabled
+        self._streams: "OrderedDict[str, Broadcast]" = OrderedDict()
+        self._latest: Dict[str, str] = {}
+        self.bytes = 0
+        self.published = 0
+        self.declined = 0
+        self.replays = 0
+        self.evicted = 0
+        self.orphaned = 0
+
+    @classmethod
+    def from_settings(cls) -> "StreamRegistry":
+        return cls(
+            max_bytes=settings.GEMINI_STREAM_REGISTRY_MAX_BYTES,
+            ttl=settings.GEMINI_STREAM_REGISTRY_TTL_SECONDS,
+            grace=settings.GEMINI_STREAM_ORPHAN_GRACE_SECONDS,
+            enabled=settings.GEMINI_STREAM_REGISTRY_ENABLED,
+        )
+
+    def publish(self, conversation_id: str, message_id: str) -> Optional[Broadcast]:
+        """A new broadcast for this turn, or None when the buffers are full (stream unshared)."""
+        if not self.enabled:
+            return None
+        self._evict()
+        if self.bytes >= self.max_bytes:
+            self.declined += 1
+            return None
+        broadcast = Broadcast(self, conversation_id, message_id)
+        self._streams[message_id] = broadcast
+        self._latest[conversation_id] = message_id
+        self.published += 1
+        return broadcast
+
+    def get(self, message_id: str) -> Optional[Broadcast]:
+        self._evict()
+        return self._streams.get(message_id)
+
+    def latest(self, conversation_id: str) -> Optional[Broadcast]:
+        """The conversation's most recent broadcast, if it is still held."""
+        message_id = self._latest.get(conversation_id)
+        return self.get(message_id) if message_id is not None else None
+
+    def _grew(self, size: int) -> None:
+        self.bytes += size
+        if self.bytes > self.max_bytes:
+            self._evict()
+
+    def _drop(self, message_id: str) -> None:
+        broadcast = self._streams.pop(message_id)
+        self.bytes -= broadcast.bytes
+        if self._latest.get(broadcast.conversation_id) == message_id:
+            del self._latest[broadcast.conversation_id]
+        self.evicted += 1
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        finished = [b for b in self._streams.values() if b.done]
+        for broadcast in finished:
+            assert broadcast.finished_at is not None
+            if now - broadcast.finished_at >= self.ttl or self.bytes >= self.max_bytes:
+                self._drop(broadcast.message_id)
+
+    def stats(self) -> Dict[str, Any]:
+        running = [b for b in self._streams.values() if not b.done]
+        return {
+            "enabled": self.enabled,
+            "streams": len(self._streams),
+            "running": len(running),
+            "subscribers": sum(b.subscribers for b in self._streams.values()),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "published": self.published,
+            "declined": self.declined,
+            "replays": self.replays,
+            "evicted": self.evicted,
+            "orphaned": self.orphaned,
+        }
+
+
+stream_registry = StreamRegistry.from_settings()
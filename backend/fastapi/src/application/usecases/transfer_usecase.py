@@ -0,0 +1,197 @@
+"""NDJSON export and import of conversations.
+
+One JSON object per line: a conversation header, then its messages, oldest
+first::
+
+    {"type":"conversation","id":"c1","name":"...","created_at":1700000000,"updated_at":null}
+    {"type":"message","id":"m1","conversation_id":"c1","role":"user","content":"...","created_at":1700000001,...}
+
+Export walks the conversations page by page and streams each one's messages
+from a server-side cursor, so memory stays flat whatever the tenant's size.
+Import parses its input as it arrives and writes it with bulk inserts of
+`batch_size` rows, conversations before their messages. Each batch commits on
+its own: after a failure the batches already written stay, and importing the
+same file again skips the ids that exist (`ignore_duplicates`).
+"""
+from __future__ import annotations
+
+import json
+import logging
+import sys
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from pydantic import ValidationError
+
+from src.application.config.config import settings
+from src.application.exceptions.exceptions import BadRequestError
+from src.application.ports.input.transfer_input_port import TransferInputPort
+from src.application.ports.output.conversation_output_port import ConversationOutputPort
+from src.application.ports.output.message_output_port import MessageOutputPort
+from src.domain.models.conversation_domain import ConversationDomain
+from src.domain.models.message_domain import MessageDomain
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# export output is handed over in blocks of about this size
+_EXPORT_CHUNK_BYTES = 64 * 1024
+_CONVERSATION_FIELDS = ("id", "name", "created_at", "updated_at")
+
+
+def peak_rss_bytes() -> Optional[int]:
+    """Peak resident set size of this process, or None where it is not available."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _line(record: Dict[str, Any]) -> bytes:
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+
+
+def conversation_line(conversation: ConversationDomain) -> bytes:
+    record: Dict[str, Any] = {"type": "conversation"}
+    record.update({name: getattr(conversation, name) for name in _CONVERSATION_FIELDS})
+    return _line(record)
+
+
+def message_line(message: MessageDomain) -> bytes:
+    record: Dict[str, Any] = {"type": "message"}
+    record.update(message.model_dump(mode="json"))
+    return _line(record)
+
+
+async def split_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, bytes]]:
+    """(line number, line) from arbitrarily cut byte chunks; blank lines are skipped."""
+    pending = b""
+    number = 0
+    async for chunk in chunks:
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            number += 1
+            if line.strip():
+                yield number, line
+    if pending.strip():
+        yield number + 1, pending
+
+
+class TransferStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.conversations = 0
+        self.messages = 0
+        self.conversations_added = 0
+        self.messages_added = 0
+        self.bytes = 0
+
+    def as_dict(self, imported: bool) -> Dict[str, Any]:
+        seconds = time.perf_counter() - self.started
+        rows = self.conversations + self.messages
+        peak = peak_rss_bytes()
+        stats: Dict[str, Any] = {
+            "conversations": self.conversations,
+            "messages": self.messages,
+            "bytes": self.bytes,
+            "seconds": round(seconds, 3),
+            "rows_per_second": round(rows / seconds, 1) if seconds else 0.0,
+            "mb_per_second": round(self.bytes / seconds / 1e6, 2) if seconds else 0.0,
+            "peak_rss_mb": round(peak / 1e6, 1) if peak is not None else None,
+        }
+        if imported:
+            stats["conversations_added"] = self.conversations_added
+            stats["messages_added"] = self.messages_added
+        return stats
+
+
+class ConversationTransferUseCase(TransferInputPort):
+    def __init__(self, conversation_repo: ConversationOutputPort, message_repo: MessageOutputPort, batch_size: Optional[int] = None):
+        self.conversation_repo = conversation_repo
+        self.message_repo = message_repo
+        self.batch_size = max(1, batch_size or settings.TRANSFER_BATCH_SIZE)
+        # stats of the last export run to completion (the stream itself only yields bytes)
+        self.last_export: Optional[Dict[str, Any]] = None
+
+    async def _export_lines(self, conversation_ids: Optional[List[str]], stats: TransferStats) -> AsyncIterator[bytes]:
+        async for conversation in self.conversation_repo.stream_all(conversation_ids, self.batch_size):
+            stats.conversations += 1
+            yield conversation_line(conversation)
+            async for message in self.message_repo.stream_by_conversation(conversation.id, self.batch_size):
+                stats.messages += 1
+                yield message_line(message)
+
+    async def export_ndjson(self, conversation_ids: Optional[List[str]] = None) -> AsyncIterator[bytes]:
+        stats = TransferStats()
+        block: List[bytes] = []
+        size = 0
+        # header lines count too: conversations without messages must not pile up
+        async for line in self._export_lines(conversation_ids, stats):
+            block.append(line)
+            size += len(line)
+            if size >= _EXPORT_CHUNK_BYTES:
+                data = b"".join(block)
+                stats.bytes += len(data)
+                block, size = [], 0
+                yield data
+        if block:
+            data = b"".join(block)
+            stats.bytes += len(data)
+            yield data
+        self.last_export = stats.as_dict(imported=False)
+        logger.info("Exported conversations: %s", self.last_export)
+
+    async def import_ndjson(self, chunks: AsyncIterator[bytes], ignore_duplicates: bool = True) -> Dict[str, Any]:
+        stats = TransferStats()
+        conversations: List[ConversationDomain] = []
+        messages: List[MessageDomain] = []
+        current: Optional[str] = None
+
+        async def flush_conversations() -> None:
+            if conversations:
+                stats.conversations_added += await self.conversation_repo.insert_many(conversations, ignore_duplicates)
+                conversations.clear()
+
+        async def flush_messages() -> None:
+            # their conversations first (foreign key)
+            await flush_conversations()
+            if messages:
+                stats.messages_added += await self.message_repo.insert_many(messages, ignore_duplicates)
+                messages.clear()
+
+        async for number, line in split_lines(chunks):
+            stats.bytes += len(line) + 1
+            try:
+                record = json.loads(line)
+                kind = record.pop("type", None)
+                if kind == "conversation":
+                    conversation = ConversationDomain(**{k: v for k, v in record.items() if k in _CONVERSATION_FIELDS})
+                elif kind == "message":
+                    message = MessageDomain(**record)
+                else:
+                    raise ValueError(f"unknown record type {kind!r}")
+            except (ValueError, TypeError, AttributeError, ValidationError) as exc:
+                raise BadRequestError(f"Line {number}: invalid record ({exc})")
+            if kind == "conversation":
+                stats.conversations += 1
+                current = conversation.id
+                conversations.append(conversation)
+                if len(conversations) >= self.batch_size:
+                    await flush_conversations()
+                continue
+            if message.conversation_id != current:
+                raise BadRequestError(f"Line {number}: message {message.id} is not preceded by its conversation header")
+            stats.messages += 1
+            messages.append(message)
+            if len(messages) >= self.batch_size:
+                await flush_messages()
+        await flush_messages()
+        result = stats.as_dict(imported=True)
+        logger.info("Imported conversations: %s", result)
+        return result
@@ -45,6 +45,16 @@ class ERole(str, Enum):
         return cast_enum(cls, value)
 
 
+class EMessageStatus(str, Enum):
+    IN_PROGRESS = "in_progress"
+    COMPLETE = "complete"
+    ABORTED = "aborted"
+
+    @classmethod
+    def from_str(cls, value: Any) -> "EMessageStatus":
+        return cast_enum(cls, value)
+
+
 class EModel(str, Enum):
     GEMINI_2_5_PRO = "gemini-2.5-pro"
     GEMINI_2_5_FLASH = "gemini-2.5-flash"
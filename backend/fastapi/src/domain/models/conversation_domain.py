@@ -12,6 +12,9 @@ class ConversationDomain(BaseModel):
     messages: List[MessageDomain] = Field(default_factory=list)
     # optional DB-backed messages count (populated by repository)
     messages_count: Optional[int] = None
+    # newest message (time and start of its text), also kept by the repository
+    last_message_at: Optional[int] = None
+    last_message_preview: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -1,5 +1,7 @@
+from typing import Optional
+
 from pydantic import BaseModel
-from src.domain.enums.enums import ERole
+from src.domain.enums.enums import EMessageStatus, ERole
 
 
 class MessageDomain(BaseModel):
@@ -8,6 +10,9 @@ class MessageDomain(BaseModel):
     role: ERole
     content: str
     created_at: int
+    # streamed answers are checkpointed while in progress
+    status: EMessageStatus = EMessageStatus.COMPLETE
+    updated_at: Optional[int] = None
 
     class Config:
         from_attributes = True
@@ -0,0 +1,40 @@
+from typing import Optional
+from pydantic import BaseModel
+from src.domain.enums.enums import ERole
+from .message_domain import MessageDomain
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+
+class ConversationSummaryDomain(BaseModel):
+    """Rolling summary of the oldest turns of a conversation.
+
+    Covers every message up to and including (last_message_created_at, last_message_id);
+    the raw messages stay in the messages table.
+    """
+
+    conversation_id: str
+    content: str
+    last_message_id: str
+    last_message_created_at: int
+    # how many raw messages / UTF-8 bytes of content have been folded in so far
+    covered_messages: int = 0
+    covered_bytes: int = 0
+    version: int = 1
+    updated_at: Optional[int] = None
+
+    class Config:
+        from_attributes = True
+
+    def covers(self, message: MessageDomain) -> bool:
+        return (message.created_at, message.id) <= (self.last_message_created_at, self.last_message_id)
+
+    def as_message(self) -> MessageDomain:
+        """The summary as a history turn, placed where the folded messages were."""
+        return MessageDomain(
+            id=f"summary-{self.conversation_id}-v{self.version}",
+            conversation_id=self.conversation_id,
+            role=ERole.USER,
+            content=SUMMARY_PREFIX + self.content,
+            created_at=self.last_message_created_at,
+        )
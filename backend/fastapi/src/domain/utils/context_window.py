@@ -0,0 +1,133 @@
+"""Token-budgeted history window for Gemini prompts.
+
+Messages are offered newest-first; each is kept while its estimated tokens
+(`estimate_tokens` plus a small per-message overhead) still fit the model's
+budget. The latest user turn is pinned and always kept, even when it alone
+exceeds the budget. Once a message does not fit, the window is closed: older
+turns are never sent without the turns that follow them.
+
+A conversation's rolling summary, when it has one, reserves room ahead of the
+kept turns and is sent first, standing in for every message it covers.
+"""
+
+from __future__ import annotations
+
+from typing import Dict, List, Mapping, Optional
+
+from src.domain.enums.enums import EModel
+from src.domain.models.message_domain import MessageDomain
+from src.domain.utils.validators import estimate_tokens
+
+# role/turn framing that every message costs on top of its text
+MESSAGE_OVERHEAD_TOKENS = 4
+
+DEFAULT_TOKEN_BUDGETS: Dict[EModel, int] = {
+    EModel.GEMINI_2_5_PRO: 32000,
+    EModel.GEMINI_2_5_FLASH: 32000,
+    EModel.GEMINI_2_5_FLASH_LITE: 16000,
+    EModel.GEMINI_2_0_FLASH: 32000,
+    EModel.GEMINI_2_0_FLASH_LITE: 16000,
+    EModel.GEMINI_FLASH_LATEST: 32000,
+}
+
+
+def parse_token_budgets(raw: Optional[str]) -> Dict[str, int]:
+    """Parse "gemini-2.5-pro=64000,gemini-2.5-flash=24000" (invalid entries are ignored)."""
+    budgets: Dict[str, int] = {}
+    for item in (raw or "").split(","):
+        name, _, value = item.partition("=")
+        try:
+            budgets[EModel.from_str(name.strip()).value] = int(value)
+        except ValueError:
+            continue
+    return budgets
+
+
+def token_budget_for(model: str, overrides: Optional[Mapping[str, int]] = None, default: int = 32000) -> int:
+    if overrides and model in overrides:
+        return overrides[model]
+    try:
+        return DEFAULT_TOKEN_BUDGETS.get(EModel.from_str(model), default)
+    except ValueError:
+        return default
+
+
+def message_tokens(message: MessageDomain) -> int:
+    return estimate_tokens(message.content) + MESSAGE_OVERHEAD_TOKENS
+
+
+class ContextWindow:
+    def __init__(self, budget: int, max_messages: Optional[int] = None):
+        self.budget = budget
+        self.max_messages = max_messages
+        self.tokens = 0
+        self.closed = False
+        self.dropped_messages = 0
+        self.dropped_tokens = 0
+        self._kept: List[MessageDomain] = []
+        self._pinned_id: Optional[str] = None
+        self._summary: Optional[MessageDomain] = None
+        self.summary_tokens = 0
+
+    def pin(self, message: MessageDomain) -> None:
+        """Keep `message` (the latest user turn) regardless of the budget."""
+        self._pinned_id = message.id
+        self._kept.append(message)
+        self.tokens += message_tokens(message)
+
+    def set_summary(self, message: MessageDomain) -> None:
+        """Reserve room for the rolling summary, sent ahead of the kept turns."""
+        self.drop_summary()
+        self._summary = message
+        self.summary_tokens = message_tokens(message)
+        self.tokens += self.summary_tokens
+
+    def drop_summary(self) -> None:
+        """Give the reserved room back (the summary no longer lines up with the kept turns)."""
+        self.tokens -= self.summary_tokens
+        self.summary_tokens = 0
+        self._summary = None
+
+    @property
+    def summary(self) -> Optional[MessageDomain]:
+        return self._summary
+
+    def offer(self, message: MessageDomain) -> bool:
+        """Offer the next older message; returns False once the window is closed."""
+        if message.id == self._pinned_id:
+            return not self.closed
+        cost = message_tokens(message)
+        if self.closed:
+            self.dropped_messages += 1
+            self.dropped_tokens += cost
+            return False
+        full = self.max_messages is not None and len(self._kept) >= self.max_messages
+        if full or self.tokens + cost > self.budget:
+            self.closed = True
+            self.dropped_messages += 1
+            self.dropped_tokens += cost
+            return False
+        self._kept.append(message)
+        self.tokens += cost
+        return True
+
+    def drop_unseen(self, messages: int) -> None:
+        """Account for older messages that were never fetched (tokens unknown)."""
+        self.dropped_messages += max(0, messages)
+
+    @property
+    def messages(self) -> List[MessageDomain]:
+        """Kept messages in chronological order, after the summary if there is one."""
+        kept = list(reversed(self._kept))
+        return [self._summary] + kept if self._summary is not None else kept
+
+    def report(self) -> Dict[str, int]:
+        return {
+            "budget_tokens": self.budget,
+            "kept_messages": len(self._kept),
+            "kept_tokens": self.tokens,
+            "summary_tokens": self.summary_tokens,
+            "dropped_messages": self.dropped_messages,
+            # estimated over the dropped messages that were fetched; unfetched ones are not counted
+            "dropped_tokens": self.dropped_tokens,
+        }
@@ -11,6 +11,8 @@ class ConversationResponse(BaseModel):
     updated_at: Optional[int]
     messages: List[MessageResponse] = Field(default_factory=list)
     messages_count: int = 0
+    last_message_at: Optional[int] = None
+    last_message_preview: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -31,4 +33,6 @@ class ConversationResponse(BaseModel):
             updated_at=domain_obj.updated_at,
             messages=messages,
             messages_count=messages_count,
+            last_message_at=getattr(domain_obj, "last_message_at", None),
+            last_message_preview=getattr(domain_obj, "last_message_preview", None),
         )
@@ -8,3 +8,6 @@ class ListResponse(BaseModel, Generic[T]):
     first_id: Optional[str]
     last_id: Optional[str]
     has_more: bool
+    # opaque keyset cursors for the pages after / before this one (pass back as `after`)
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
@@ -1,7 +1,9 @@
 from pydantic import BaseModel
 
 from src.domain.models.message_domain import MessageDomain
-from src.domain.enums.enums import ERole
+from typing import Optional
+
+from src.domain.enums.enums import EMessageStatus, ERole
 
 
 class MessageResponse(BaseModel):
@@ -10,6 +12,8 @@ class MessageResponse(BaseModel):
     role: ERole
     content: str
     created_at: int
+    status: EMessageStatus = EMessageStatus.COMPLETE
+    updated_at: Optional[int] = None
 
     class Config:
         from_attributes = True
@@ -21,5 +25,7 @@ class MessageResponse(BaseModel):
             conversation_id=domain_obj.conversation_id, 
             role=domain_obj.role,
             content=domain_obj.content, 
-            created_at=domain_obj.created_at
+            created_at=domain_obj.created_at,
+            status=domain_obj.status,
+            updated_at=domain_obj.updated_at,
         )
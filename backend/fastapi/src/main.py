@@ -8,13 +8,41 @@ from src.adapter.input.controllers.response_utils import error_response
 from fastapi import HTTPException
 from src.adapter.output.mysql.db.base import init_db
 from src.application.config.config import settings
+from src.adapter.output.gemini.helper.gemini_client_registry import gemini_client_registry
+from src.adapter.output.gemini.helper.response_cache import response_cache
+from src.adapter.worker.compaction_worker import compaction_worker
+from src.adapter.worker.message_persister import message_persister
+from src.adapter.input.controllers.deadline_middleware import DeadlineMiddleware
+from contextlib import asynccontextmanager
+import math
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    try:
+        init_db()
+    except Exception:
+        pass
+    # warm the shared upstream client once; every request reuses its connection pool
+    await gemini_client_registry.start()
+    # messages journaled but not written by a previous run are queued again
+    await message_persister.start()
+    try:
+        yield
+    finally:
+        await message_persister.stop()
+        await compaction_worker.stop()
+        await gemini_client_registry.stop()
+        response_cache.close()
+
 
 app = FastAPI(
     title="gemini-proxy-fastapi",
     description="A FastAPI application for the Gemini Proxy",
     version="1.0.0",
     docs_url=f"{settings.API_PREFIX}/docs",
-    redoc_url=f"{settings.API_PREFIX}/redoc"
+    redoc_url=f"{settings.API_PREFIX}/redoc",
+    lifespan=lifespan,
 )
 
 # Add CORS middleware for frontend
@@ -33,6 +61,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# per-request deadline (client header or route default), seen by every stage of the request
+app.add_middleware(DeadlineMiddleware)
+
 # include routers under a API prefix
 app.include_router(gemini_controller.router, prefix=settings.API_PREFIX)
 app.include_router(conversation_controller.router, prefix=settings.API_PREFIX)
@@ -46,18 +77,14 @@ app.include_router(webapp_controller.router)
 app.include_router(health_controller.router)
 
 
-@app.on_event("startup")
-def startup():
-    try:
-        init_db()
-    except Exception:
-        pass
-
-
 @app.exception_handler(AppException)
 async def app_exception_handler(request: Request, exc: AppException):
     # Custom application exceptions use our unified envelope
-    return error_response(message=exc.message or "Error", status_code=exc.status_code, data=exc.payload)
+    headers = None
+    retry_after = getattr(exc, "retry_after", None)
+    if retry_after is not None:
+        headers = {"Retry-After": str(max(1, math.ceil(retry_after)))}
+    return error_response(message=exc.message or "Error", status_code=exc.status_code, data=exc.payload, headers=headers)
 
 
 @app.exception_handler(Exception)
@@ -0,0 +1,141 @@
+import asyncio
+import json
+
+from fastapi.testclient import TestClient
+
+from src.adapter.factory.service_factory import ServiceFactory
+from src.adapter.output.gemini.helper.circuit_breaker import CircuitBreakerRegistry
+from src.adapter.output.gemini.helper.concurrency_limiter import AdaptiveConcurrencyLimiter
+from src.adapter.output.gemini.helper.single_flight import SingleFlight
+from src.adapter.output.gemini.service.gemini_service import GeminiService
+from src.application.config.config import settings
+from src.application.exceptions.exceptions import NotFoundError
+from src.application.ports.input.gemini_input_port import GeminiInputPort
+from src.application.usecases.gemini_usecase import GeminiUseCase
+from src.main import app
+
+PARTS = ["Hel", "lo \"world\"\n", "data: not a field"]
+
+
+def _client_chunks(body: str):
+    """What frontend/src/services/geminiService.ts hands to onChunk for this body."""
+    events = body.split("\n\n")
+    events.pop()
+    chunks = []
+    for event in events:
+        named = False
+        data = []
+        for line in event.split("\n"):
+            if line.startswith("data:"):
+                data.append(line[6:] if line.startswith("data: ") else line[5:])
+            elif line.startswith("event:"):
+                named = True
+        if named or not data:
+            continue
+        chunks.append(json.loads("\n".join(data)))
+    return chunks
+
+
+class FakeInputPort(GeminiInputPort):
+    async def query(self, message_request):
+        return "".join(PARTS)
+
+    async def query_stream(self, message_request, is_disconnected=None):
+        for part in PARTS:
+            yield part
+
+    async def query_stream_raw(self, message_request, is_disconnected=None):
+        yield memoryview(b"")
+
+    async def follow_conversation(self, conversation_id, is_disconnected=None):
+        raise NotFoundError(conversation_id)
+
+    async def resume_stream(self, message_id, model=None, is_disconnected=None, offset=0):
+        raise NotFoundError(message_id)
+
+    def get_answered_model(self):
+        return "gemini-2.5-flash"
+
+    def get_stream_message_id(self):
+        return "msg_1"
+
+
+def test_stream_frames_carry_resume_ids_and_parse_like_the_web_client():
+    app.dependency_overrides[ServiceFactory.get_gemini_input_port] = lambda: FakeInputPort()
+    try:
+        client = TestClient(app)
+        body = {"conversation_id": "c1", "content": "hi", "model": "gemini-2.5-flash"}
+        response = client.post(f"{settings.API_PREFIX}/gemini/stream", json=body)
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 200
+    text = response.text
+    # ids let EventSource reconnects resume; the model and message id events are skipped by the client
+    assert "id: msg_1:3\n" in text and "event: model\n" in text and "event: message\n" in text
+    assert _client_chunks(text) == PARTS
+
+
+class NeverCalledGemini:
+    async def stream_generate(self, model, history):
+        raise AssertionError("upstream called for a rejected request")
+        yield ""
+
+    async def stream_raw(self, contents, capture, model=None):
+        raise AssertionError("upstream called for a rejected request")
+        yield b""
+
+
+class RecordingPort:
+    def __init__(self):
+        self.inserted = []
+
+    async def insert_and_get_latest(self, message, count):
+        self.inserted.append(message)
+        return [message]
+
+    def round_trips(self):
+        return None
+
+
+def test_expired_stream_request_gets_504_before_anything_is_stored():
+    port = RecordingPort()
+    usecase = GeminiUseCase(NeverCalledGemini(), port, None)
+    app.dependency_overrides[ServiceFactory.get_gemini_input_port] = lambda: usecase
+    try:
+        client = TestClient(app)
+        body = {"conversation_id": "c1", "content": "hi", "model": "gemini-2.5-flash"}
+        responses = [
+            client.post(f"{settings.API_PREFIX}/gemini/stream{query}", json=body, headers={"X-Request-Timeout": "0ms"})
+            for query in ("", "?passthrough=true")
+        ]
+    finally:
+        app.dependency_overrides.clear()
+
+    assert [r.status_code for r in responses] == [504, 504]
+    assert port.inserted == []
+
+
+def test_stream_overflow_gets_503_with_retry_after_before_anything_is_stored():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=1, min_limit=1, max_queue=0)
+    held = asyncio.run(limiter.acquire())
+    port = RecordingPort()
+
+    def usecase():
+        service = GeminiService(NeverCalledGemini(), breakers=CircuitBreakerRegistry(), fallback_chain=[],
+                                limiter=limiter, flights=SingleFlight(enabled=False))
+        return GeminiUseCase(service, port, None)
+
+    app.dependency_overrides[ServiceFactory.get_gemini_input_port] = usecase
+    try:
+        client = TestClient(app)
+        body = {"conversation_id": "c1", "content": "hi", "model": "gemini-2.5-flash"}
+        responses = [client.post(f"{settings.API_PREFIX}/gemini/stream{query}", json=body) for query in ("", "?passthrough=true")]
+    finally:
+        app.dependency_overrides.clear()
+        held.release()
+
+    assert [r.status_code for r in responses] == [503, 503]
+    assert all(int(r.headers["Retry-After"]) >= 1 for r in responses)
+    assert port.inserted == []
+    assert limiter.in_flight == 0
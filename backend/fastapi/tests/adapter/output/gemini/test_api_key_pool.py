@@ -0,0 +1,116 @@
+import asyncio
+
+import httpx
+import pytest
+import respx
+
+from src.adapter.output.gemini.helper.api_key_pool import ApiKeyPool, ApiKeyState, GeminiKeyPoolExhaustedError
+from src.adapter.output.gemini.helper.gemini_client import GeminiClient
+
+
+def test_parse_keys_with_weights():
+    assert ApiKeyPool.parse_keys(" k1, k2:3 ,,") == [("k1", 1.0), ("k2", 3.0)]
+
+
+def test_least_loaded_selection_spreads_concurrent_requests():
+    pool = ApiKeyPool([ApiKeyState("aaaa1"), ApiKeyState("bbbb2")])
+    first = pool.acquire()
+    second = pool.acquire()
+    assert {first.key, second.key} == {"aaaa1", "bbbb2"}
+    first.release()
+    third = pool.acquire()
+    assert third.key == first.key
+
+
+def test_rate_limited_key_is_quarantined_until_retry_after():
+    pool = ApiKeyPool([ApiKeyState("aaaa1"), ApiKeyState("bbbb2")], quarantine_seconds=30)
+    with pool.acquire() as lease:
+        lease.record_status(429, retry_after=120)
+        limited = lease.key
+    for _ in range(4):
+        with pool.acquire() as lease:
+            assert lease.key != limited
+    stats = {s["key"]: s for s in pool.stats()}
+    assert stats["..." + limited[-4:]]["quarantined"] is True
+    assert stats["..." + limited[-4:]]["rate_limited"] == 1
+
+
+def test_rpm_bucket_exhaustion_raises_with_retry_after():
+    pool = ApiKeyPool([ApiKeyState("aaaa1", rpm=1)])
+    pool.acquire().release()
+    with pytest.raises(GeminiKeyPoolExhaustedError) as info:
+        pool.acquire()
+    assert info.value.retry_after > 0
+
+
+def test_client_rotates_keys_and_records_usage():
+    url = "https://example.test/v1beta/models/gemini-2.5-flash:generateContent"
+    client = GeminiClient(url=url, api_key="key-one,key-two", timeout=5)
+    seen = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(request.headers["x-goog-api-key"])
+        if request.headers["x-goog-api-key"] == "key-one":
+            return httpx.Response(429, headers={"Retry-After": "90"}, text="quota")
+        return httpx.Response(200, json={"candidates": [], "usageMetadata": {"totalTokenCount": 12}})
+
+    async def scenario():
+        with respx.mock:
+            respx.post(url).mock(side_effect=handler)
+            # key-one's long Retry-After does not hold up the retry on key-two
+            await client.generate("hi")
+            await client.generate("hi")
+        await client.stop()
+
+    asyncio.run(scenario())
+    assert seen == ["key-one", "key-two", "key-two"]
+    stats = {s["key"]: s for s in client.key_pool.stats()}
+    assert stats["...-two"]["tokens"] == 24
+    assert stats["...-one"]["quarantined"] is True
+
+
+def test_quarantined_pool_is_a_503_that_leaves_breakers_closed(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from src.adapter.factory.service_factory import ServiceFactory
+    from src.adapter.output.gemini.helper.circuit_breaker import CircuitBreakerRegistry, CircuitState
+    from src.adapter.output.gemini.helper.single_flight import SingleFlight
+    from src.adapter.output.gemini.service.gemini_service import GeminiService
+    from src.application.config.config import settings
+    from src.application.usecases.gemini_usecase import GeminiUseCase
+    from src.main import app
+
+    class Port:
+        async def insert_and_get_latest(self, message, count):
+            return [message]
+
+        def round_trips(self):
+            return None
+
+    monkeypatch.setattr(settings, "GEMINI_TURN_PREWARM_ENABLED", False)
+    url = "https://example.test/v1beta/models/gemini-2.5-flash:generateContent"
+    client = GeminiClient(url=url, api_key="key-one", timeout=5)
+    with client.key_pool.acquire() as lease:
+        lease.record_status(429, retry_after=120)
+    breakers = CircuitBreakerRegistry()
+    chain = ["gemini-2.5-flash", "gemini-2.5-pro"]
+
+    def usecase():
+        service = GeminiService(client, breakers=breakers, fallback_chain=chain, flights=SingleFlight(enabled=False))
+        return GeminiUseCase(service, Port(), None)
+
+    app.dependency_overrides[ServiceFactory.get_gemini_input_port] = usecase
+    try:
+        body = {"conversation_id": "c1", "content": "hi", "model": "gemini-2.5-flash"}
+        with respx.mock:
+            response = TestClient(app).post(f"{settings.API_PREFIX}/gemini/query", json=body)
+    finally:
+        app.dependency_overrides.clear()
+        asyncio.run(client.stop())
+
+    assert response.status_code == 503
+    assert 100 <= int(response.headers["Retry-After"]) <= 120
+    # a local quota state is not a model failure: no breaker counted it
+    stats = breakers.stats()
+    assert "gemini-2.5-flash" in stats
+    assert all(s["state"] == CircuitState.CLOSED and s["calls_in_window"] == 0 for s in stats.values())
@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+
+from src.adapter.output.gemini.helper.circuit_breaker import CircuitBreaker, CircuitBreakerRegistry, CircuitState
+from src.adapter.output.gemini.helper.gemini_client import GeminiClientError
+from src.adapter.output.gemini.service.gemini_service import GeminiService
+from src.application.exceptions.exceptions import ServiceUnavailableError
+
+CHAIN = ["gemini-2.5-pro", "gemini-2.5-flash", "gemini-2.5-flash-lite"]
+
+
+class FakeClient:
+    """Fails with the given status for the models in `failing`, answers for the others."""
+
+    def __init__(self, failing=(), status_code=503):
+        self.failing = set(failing)
+        self.status_code = status_code
+        self.calls = []
+
+    async def generate(self, contents, model=None):
+        self.calls.append(model)
+        if model in self.failing:
+            raise GeminiClientError(f"HTTP {self.status_code}", status_code=self.status_code)
+        return {"candidates": [{"content": {"parts": [{"text": f"from {model}"}]}}]}
+
+    async def stream_generate(self, contents, model=None):
+        self.calls.append(model)
+        if model in self.failing:
+            raise GeminiClientError(f"HTTP {self.status_code}", status_code=self.status_code)
+        for part in ("a", "b"):
+            yield part
+
+
+def _registry(**kwargs):
+    registry = CircuitBreakerRegistry()
+    for model in CHAIN:
+        registry._breakers[model] = CircuitBreaker(model, window_size=4, min_calls=2, open_seconds=60, **kwargs)
+    return registry
+
+
+def test_breaker_opens_on_failure_rate_and_half_open_probe_closes_it():
+    breaker = CircuitBreaker("m", window_size=4, min_calls=2, failure_rate=0.5, open_seconds=0)
+    breaker.record(True)
+    breaker.record(False)
+    assert breaker.state == CircuitState.OPEN
+    # open_seconds=0: the next call is the single half-open probe
+    assert breaker.allow() is True
+    assert breaker.state == CircuitState.HALF_OPEN
+    assert breaker.allow() is False
+    breaker.record(True)
+    assert breaker.state == CircuitState.CLOSED
+
+
+def test_breaker_opens_on_slow_calls():
+    breaker = CircuitBreaker("m", window_size=4, min_calls=2, slow_call_seconds=1.0, slow_call_rate=1.0, open_seconds=60)
+    breaker.record(True, latency=2.0)
+    breaker.record(True, latency=3.0)
+    assert breaker.state == CircuitState.OPEN
+    assert breaker.allow() is False
+    assert breaker.retry_after() > 0
+
+
+def test_generate_falls_back_and_reports_answering_model():
+    client = FakeClient(failing={"gemini-2.5-pro"})
+    breakers = _registry()
+    service = GeminiService(client, breakers=breakers, fallback_chain=CHAIN)
+
+    text = asyncio.run(service.generate("gemini-2.5-pro", []))
+
+    assert text == "from gemini-2.5-flash"
+    assert service.get_answered_model() == "gemini-2.5-flash"
+    assert client.calls == ["gemini-2.5-pro", "gemini-2.5-flash"]
+
+
+def test_open_circuit_skips_model_and_all_open_raises_503():
+    breakers = _registry()
+    for model in CHAIN[:2]:
+        breakers.get(model)._open()
+    client = FakeClient()
+    service = GeminiService(client, breakers=breakers, fallback_chain=CHAIN)
+    parts = asyncio.run(_collect(service.stream_generate("gemini-2.5-pro", [])))
+    assert parts == ["a", "b"]
+    assert client.calls == ["gemini-2.5-flash-lite"]
+    assert service.get_answered_model() == "gemini-2.5-flash-lite"
+
+    breakers.get(CHAIN[2])._open()
+    with pytest.raises(ServiceUnavailableError) as info:
+        asyncio.run(service.generate("gemini-2.5-pro", []))
+    assert info.value.status_code == 503 and info.value.retry_after > 0
+
+
+def test_client_errors_do_not_trip_the_breaker_or_fall_back():
+    client = FakeClient(failing=set(CHAIN), status_code=400)
+    breakers = _registry()
+    service = GeminiService(client, breakers=breakers, fallback_chain=CHAIN)
+    for _ in range(3):
+        with pytest.raises(GeminiClientError):
+            asyncio.run(service.generate("gemini-2.5-pro", []))
+    assert client.calls == ["gemini-2.5-pro"] * 3
+    assert breakers.get("gemini-2.5-pro").state == CircuitState.CLOSED
+
+
+async def _collect(agen):
+    return [p async for p in agen]
@@ -0,0 +1,165 @@
+import asyncio
+import random
+
+import pytest
+
+from src.adapter.output.gemini.helper.circuit_breaker import CircuitBreakerRegistry
+from src.adapter.output.gemini.helper.concurrency_limiter import AdaptiveConcurrencyLimiter, ConcurrencyLimitExceededError
+from src.adapter.output.gemini.helper.single_flight import SingleFlight
+from src.adapter.output.gemini.service.gemini_service import GeminiService
+from src.application.exceptions.exceptions import ServiceUnavailableError
+
+
+def test_queued_call_gets_slot_when_one_is_released():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=1, min_limit=1, max_queue=1, queue_timeout=1.0)
+
+    async def scenario():
+        first = await limiter.acquire()
+        waiting = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        assert limiter.stats()["queue_depth"] == 1
+        # queue is full: the next caller is rejected immediately
+        with pytest.raises(ConcurrencyLimitExceededError) as info:
+            await limiter.acquire()
+        assert info.value.retry_after >= 1
+        first.release(0.1)
+        second = await waiting
+        second.release(0.1)
+
+    asyncio.run(scenario())
+    stats = limiter.stats()
+    assert stats["in_flight"] == 0 and stats["queue_depth"] == 0
+    assert stats["queued"] == 1 and stats["rejected"] == 1
+
+
+def test_queue_wait_times_out():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=1, min_limit=1, max_queue=5, queue_timeout=0.01)
+
+    async def scenario():
+        held = await limiter.acquire()
+        with pytest.raises(ConcurrencyLimitExceededError):
+            await limiter.acquire()
+        held.release()
+
+    asyncio.run(scenario())
+    assert limiter.stats()["timed_out"] == 1
+    assert limiter.in_flight == 0
+
+
+def test_cancelled_waiter_leaves_no_slot_behind():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=1, min_limit=1, queue_timeout=1.0)
+
+    async def scenario():
+        held = await limiter.acquire()
+        waiting = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        held.release()
+
+    asyncio.run(scenario())
+    assert limiter.in_flight == 0 and limiter.stats()["queue_depth"] == 0
+
+
+def test_aimd_grows_on_healthy_samples_and_backs_off_when_first_byte_rises():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=4, min_limit=1, backoff_ratio=0.5, latency_tolerance=2.0)
+
+    async def scenario():
+        for _ in range(30):
+            permits = [await limiter.acquire() for _ in range(4)]
+            for p in permits:
+                p.release(1.0, first_byte=0.1)
+        grown, decreases = limiter.limit, limiter.decreases
+        # the upstream slows down for good: the recent average pulls away from the long-term one
+        slow = [await limiter.acquire() for _ in range(int(grown))]
+        for p in slow:
+            p.release(5.0, first_byte=1.0)
+        return grown, decreases
+
+    grown, decreases = asyncio.run(scenario())
+    assert grown > 4 and decreases == 0
+    # every slow call started before the decrease, so the limit halves only once
+    assert grown * 0.5 <= limiter.limit < grown * 0.6
+    assert limiter.decreases == 1
+
+
+def test_limit_holds_when_latency_varies_but_load_does_not():
+    rng = random.Random(7)
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=20, min_limit=2)
+
+    async def scenario():
+        for i in range(600):
+            permits = [await limiter.acquire() for _ in range(int(limiter.limit))]
+            for p in permits:
+                if i % 2:
+                    # unary: total time follows the answer length, not the load
+                    p.release(rng.uniform(0.5, 30.0))
+                else:
+                    # streams: noisy, heavy-tailed time to first byte around a steady level
+                    p.release(10.0, first_byte=rng.lognormvariate(-0.5, 0.6))
+
+    asyncio.run(scenario())
+    assert limiter.decreases == 0
+    assert limiter.limit >= 20
+    assert limiter.stats()["queued"] == 0
+
+
+def test_upstream_failures_still_back_off_without_latency_samples():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=10, min_limit=1, backoff_ratio=0.5)
+
+    async def scenario():
+        permit = await limiter.acquire()
+        permit.release(2.0, overloaded=True)
+
+    asyncio.run(scenario())
+    assert limiter.limit == pytest.approx(5.0) and limiter.decreases == 1
+
+
+def test_service_maps_overflow_to_503():
+    class SlowClient:
+        async def generate(self, contents, model=None):
+            await asyncio.sleep(0.05)
+            return {"candidates": []}
+
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=1, min_limit=1, max_queue=0)
+    service = GeminiService(SlowClient(), breakers=CircuitBreakerRegistry(), fallback_chain=[], limiter=limiter,
+                            flights=SingleFlight(enabled=False))
+
+    async def scenario():
+        return await asyncio.gather(
+            service.generate("gemini-2.5-flash", []),
+            service.generate("gemini-2.5-flash", []),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(scenario())
+    assert results[0] == ""
+    assert isinstance(results[1], ServiceUnavailableError)
+    assert results[1].status_code == 503 and results[1].retry_after >= 1
+
+
+def test_reserved_stream_slot_is_used_by_the_stream_or_given_back():
+    class StreamClient:
+        async def stream_generate(self, contents, model=None):
+            yield "a"
+            yield "b"
+
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=1, min_limit=1, max_queue=0)
+    service = GeminiService(StreamClient(), breakers=CircuitBreakerRegistry(), fallback_chain=[], limiter=limiter,
+                            flights=SingleFlight(enabled=False))
+
+    async def scenario():
+        await service.reserve_stream()
+        in_flight = []
+        async for _ in service.stream_generate("gemini-2.5-flash", []):
+            in_flight.append(limiter.in_flight)
+        await service.reserve_stream()
+        unused = limiter.in_flight
+        service.release_stream()
+        return in_flight, unused
+
+    in_flight, unused = asyncio.run(scenario())
+    # the stream held the reserved slot, not a second one (the limit is 1)
+    assert in_flight == [1, 1]
+    assert unused == 1 and limiter.in_flight == 0
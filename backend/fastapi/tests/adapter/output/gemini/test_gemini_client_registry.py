@@ -0,0 +1,55 @@
+import asyncio
+
+from src.adapter.output.gemini.helper.gemini_client_registry import GeminiClientRegistry
+
+
+def test_registry_shares_one_client_until_stopped():
+    registry = GeminiClientRegistry()
+
+    async def scenario():
+        first = registry.get()
+        assert registry.get() is first
+        stats = registry.stats()
+        assert stats["pool"]["active_streams"] == 0
+        assert stats["pool"]["closed"] is False
+        assert len(stats["keys"]) == 1
+
+        await registry.stop()
+        assert first.is_closed
+        assert registry.stats()["pool"]["closed"] is True
+        # a new client is created lazily after shutdown
+        assert registry.get() is not first
+        await registry.stop()
+
+    asyncio.run(scenario())
+
+
+def test_stats_payload_combines_the_client_and_the_shared_helpers():
+    from src.adapter.factory.service_factory import ServiceFactory
+
+    payload = ServiceFactory.get_gemini_stats()
+    assert {"pool", "keys", "retry"} <= payload.keys()
+    assert {"breakers", "limiter", "cache", "persister", "stream_registry", "deadlines"} <= payload.keys()
+
+
+def test_concurrent_turns_share_one_warm_up_and_a_warm_pool_gets_none():
+    import httpx
+    import respx
+
+    from src.adapter.output.gemini.helper.gemini_client import GeminiClient
+
+    url = "https://example.test/v1beta/models/gemini-2.5-flash:generateContent"
+    client = GeminiClient(url=url, api_key="key-one", timeout=5)
+
+    async def scenario():
+        with respx.mock:
+            route = respx.get(url).mock(return_value=httpx.Response(405))
+            burst = await asyncio.gather(*(client.ensure_connection() for _ in range(5)))
+            again = await client.ensure_connection()
+            calls = route.call_count
+        await client.stop()
+        return burst, again, calls
+
+    burst, again, calls = asyncio.run(scenario())
+    assert burst == [True] * 5 and again is False
+    assert calls == 1 and client.warmups == 1
@@ -0,0 +1,117 @@
+import asyncio
+
+import pytest
+
+from src.adapter.output.gemini.helper.hedging import Hedger, LatencyTracker
+from src.adapter.output.gemini.helper.retry_policy import RetryBudget
+
+
+def _hedger(budget=None):
+    hedger = Hedger(enabled=True, percentile=0.5, min_delay=0.01, min_samples=3, budget=budget or RetryBudget(ratio=1.0, min_retries=10))
+    for _ in range(3):
+        hedger._tracker("m").record(0.01)
+    return hedger
+
+
+def test_percentile():
+    tracker = LatencyTracker()
+    for value in (0.1, 0.2, 0.3, 0.4, 5.0):
+        tracker.record(value)
+    assert tracker.percentile(0.5) == 0.3
+    assert tracker.percentile(0.99) == 5.0
+
+
+def test_slow_primary_is_hedged_and_cancelled():
+    hedger = _hedger()
+    cancelled = []
+    calls = []
+
+    async def call():
+        attempt = len(calls)
+        calls.append(attempt)
+        try:
+            await asyncio.sleep(1.0 if attempt == 0 else 0.0)
+        except asyncio.CancelledError:
+            cancelled.append(attempt)
+            raise
+        return attempt
+
+    assert asyncio.run(hedger.run("m", call)) == 1
+    assert cancelled == [0]
+    stats = hedger.stats()
+    assert stats["hedged"] == 1 and stats["hedge_wins"] == 1
+
+
+def test_hedge_budget_caps_extra_calls():
+    hedger = _hedger(budget=RetryBudget(ratio=0.0, min_retries=0))
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0.03)
+        return "slow"
+
+    assert asyncio.run(hedger.run("m", call)) == "slow"
+    assert len(calls) == 1 and hedger.stats()["budget_exhausted"] == 1
+
+
+def test_failure_waits_for_the_other_call():
+    hedger = _hedger()
+    calls = []
+
+    async def call():
+        attempt = len(calls)
+        calls.append(attempt)
+        if attempt == 0:
+            await asyncio.sleep(0.03)
+            raise RuntimeError("primary failed")
+        await asyncio.sleep(0.06)
+        return "hedge"
+
+    assert asyncio.run(hedger.run("m", call)) == "hedge"
+
+
+def test_stream_hedged_on_late_first_chunk_and_loser_closed():
+    hedger = _hedger()
+    started = []
+    closed = []
+
+    def factory():
+        index = len(started)
+        started.append(index)
+
+        async def stream():
+            try:
+                await asyncio.sleep(1.0 if index == 0 else 0.0)
+                yield f"{index}-a"
+                yield f"{index}-b"
+            finally:
+                closed.append(index)
+
+        return stream()
+
+    async def scenario():
+        return [chunk async for chunk in hedger.run_stream("m", factory)]
+
+    assert asyncio.run(scenario()) == ["1-a", "1-b"]
+    assert sorted(closed) == [0, 1]
+    assert hedger.stats()["hedge_wins"] == 1
+
+
+def test_disabled_hedger_passes_through_errors():
+    hedger = Hedger(enabled=False)
+
+    async def boom():
+        raise RuntimeError("nope")
+
+    async def empty():
+        return
+        yield
+
+    async def scenario():
+        with pytest.raises(RuntimeError):
+            await hedger.run("m", boom)
+        return [c async for c in hedger.run_stream("m", empty)]
+
+    assert asyncio.run(scenario()) == []
+    assert hedger.stats()["hedged"] == 0
@@ -0,0 +1,73 @@
+import asyncio
+import json
+
+import httpx
+import respx
+
+from src.adapter.output.gemini.helper.gemini_client import GeminiClient
+from src.adapter.output.gemini.helper.prompt_builder import PromptFragmentCache
+from src.adapter.output.gemini.helper.retry_policy import RetryPolicy
+from src.domain.enums.enums import ERole
+from src.domain.models.message_domain import MessageDomain
+
+
+def _msg(i, content=None):
+    return MessageDomain(
+        id=f"m{i}", conversation_id="c1", role=ERole.USER if i % 2 == 0 else ERole.MODEL,
+        content=content or f"tiếng \"Việt\" {i}\n", created_at=1000 + i,
+    )
+
+
+def test_prepared_body_matches_dict_payload_and_reuses_fragments():
+    cache = PromptFragmentCache()
+    history = [_msg(2), _msg(0), _msg(1)]
+    prepared = cache.prepare(history)
+    expected = {
+        "contents": [{"role": m.role.value, "parts": [{"text": m.content}]} for m in sorted(history, key=lambda m: m.created_at)],
+        "model": "gemini-2.5-flash",
+        "generationConfig": {"temperature": 0},
+    }
+    assert json.loads(prepared.body("gemini-2.5-flash", {"generationConfig": {"temperature": 0}})) == expected
+    assert prepared.body("gemini-2.5-flash") is prepared.body("gemini-2.5-flash")
+
+    # next turn: the three old fragments are reused, only the new message is encoded
+    cache.prepare(history + [_msg(3)])
+    assert (cache.hits, cache.misses) == (3, 4)
+
+    # an edited message is re-encoded and changes the cache key
+    edited = cache.prepare([_msg(0), _msg(1, content="edited"), _msg(2)])
+    assert json.loads(edited.contents)[1]["parts"][0]["text"] == "edited"
+    assert edited.cache_key("m") != prepared.cache_key("m")
+    assert prepared.cache_key("m") == cache.prepare([_msg(0), _msg(1), _msg(2)]).cache_key("m")
+    assert prepared.cache_key("m") != prepared.cache_key("other")
+
+
+def test_fragment_cache_is_bounded():
+    cache = PromptFragmentCache(max_entries=2)
+    cache.prepare([_msg(0), _msg(1), _msg(2)])
+    assert cache.stats()["entries"] == 2 and cache.evictions == 1
+    assert cache.bytes == sum(len(cache.fragment(m)) for m in (_msg(1), _msg(2)))
+
+
+def test_retries_send_the_same_encoded_body():
+    url = "https://example.test/v1beta/models/gemini-2.5-flash:generateContent"
+    client = GeminiClient(url=url, api_key="k1", timeout=5, retry_policy=RetryPolicy(max_attempts=3, base_delay=0, max_delay=0))
+    bodies = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        bodies.append(request.content)
+        if len(bodies) == 1:
+            return httpx.Response(503, text="busy")
+        return httpx.Response(200, json={"candidates": []})
+
+    prepared = PromptFragmentCache().prepare([_msg(0), _msg(1)])
+
+    async def scenario():
+        with respx.mock:
+            respx.post(url).mock(side_effect=handler)
+            await client.generate(prepared, model="gemini-2.5-flash")
+        await client.stop()
+
+    asyncio.run(scenario())
+    assert len(bodies) == 2
+    assert bodies[0] == bodies[1] == prepared.body("gemini-2.5-flash")
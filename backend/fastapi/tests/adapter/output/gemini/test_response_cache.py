@@ -0,0 +1,134 @@
+import asyncio
+import os
+
+os.environ.setdefault("TESTING", "1")
+
+from fastapi.testclient import TestClient
+
+from src.adapter.factory.service_factory import ServiceFactory
+from src.adapter.output.gemini.helper.circuit_breaker import CircuitBreakerRegistry
+from src.adapter.output.gemini.helper.response_cache import (
+    CachedAnswer,
+    CacheMode,
+    MemoryCacheTier,
+    ResponseCache,
+    SqliteCacheTier,
+    cache_key,
+    cache_mode,
+    parse_cache_control,
+)
+from src.adapter.output.gemini.service.gemini_service import GeminiService
+from src.application.ports.input.gemini_input_port import GeminiInputPort
+from src.application.config.config import settings
+from src.application.exceptions.exceptions import NotFoundError
+from src.main import app
+
+
+class CountingClient:
+    def __init__(self, text="cached answer"):
+        self.text = text
+        self.calls = 0
+
+    async def generate(self, contents, model=None):
+        self.calls += 1
+        return {"candidates": [{"content": {"parts": [{"text": self.text}]}}]}
+
+    async def stream_generate(self, contents, model=None):
+        self.calls += 1
+        for part in ("cached ", "answer"):
+            yield part
+
+
+def _service(client, cache):
+    return GeminiService(client, breakers=CircuitBreakerRegistry(), fallback_chain=[], cache=cache)
+
+
+def test_key_is_canonical():
+    a = cache_key("m", [{"role": "user", "parts": [{"text": "hi"}]}], {"temperature": 0, "topK": 1})
+    b = cache_key("m", [{"parts": [{"text": "hi"}], "role": "user"}], {"topK": 1, "temperature": 0})
+    assert a == b
+    assert a != cache_key("other", [{"role": "user", "parts": [{"text": "hi"}]}])
+
+
+def test_memory_tier_evicts_lru_by_bytes_and_expires():
+    tier = MemoryCacheTier(max_entries=10, max_bytes=10, ttl=60)
+    tier.set("a", CachedAnswer("aaaa"))
+    tier.set("b", CachedAnswer("bbbb"))
+    assert tier.get("a") is not None  # a is now most recently used
+    tier.set("c", CachedAnswer("cccc"))
+    assert tier.get("b") is None and tier.get("a") is not None
+    assert tier.evictions == 1 and tier.bytes == 8
+
+    expired = MemoryCacheTier(ttl=0)
+    expired.set("a", CachedAnswer("x"))
+    assert expired.get("a") is None and expired.expirations == 1
+
+
+def test_generate_and_stream_share_cache_and_honour_bypass():
+    cache = ResponseCache(MemoryCacheTier())
+    client = CountingClient()
+
+    async def scenario():
+        first = await _service(client, cache).generate("gemini-2.5-flash", [])
+        second = await _service(client, cache).generate("gemini-2.5-flash", [])
+        streamed = [p async for p in _service(client, cache).stream_generate("gemini-2.5-flash", [])]
+        cache_mode.set(CacheMode.NO_CACHE)
+        await _service(client, cache).generate("gemini-2.5-flash", [])
+        return first, second, streamed
+
+    first, second, streamed = asyncio.run(scenario())
+    assert first == second == "".join(streamed) == "cached answer"
+    assert client.calls == 2
+    stats = cache.stats()
+    assert stats["hits"] == 2 and stats["misses"] == 1 and stats["bypassed"] == 1
+
+
+def test_sqlite_tier_is_shared_between_caches(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    writer = ResponseCache(MemoryCacheTier(), SqliteCacheTier(path))
+    reader = ResponseCache(MemoryCacheTier(), SqliteCacheTier(path))
+
+    async def scenario():
+        await writer.set("k", CachedAnswer("from disk", "gemini-2.5-flash"))
+        return await reader.get("k"), await reader.get("k")
+
+    first, second = asyncio.run(scenario())
+    writer.disk.close()
+    reader.disk.close()
+    assert first.text == "from disk" and first.model == "gemini-2.5-flash"
+    assert second.text == "from disk"
+    assert reader.disk_hits == 1 and reader.memory_hits == 1
+
+
+def test_cache_control_header_reaches_the_service():
+    assert parse_cache_control("max-age=0, No-Store") == CacheMode.NO_STORE
+    seen = []
+
+    class FakeInputPort(GeminiInputPort):
+        async def query(self, message_request):
+            seen.append(cache_mode.get())
+            return "ok"
+
+        async def query_stream(self, message_request, is_disconnected=None):
+            seen.append(cache_mode.get())
+            yield "ok"
+
+        async def query_stream_raw(self, message_request, is_disconnected=None):
+            yield memoryview(b"")
+
+        async def follow_conversation(self, conversation_id, is_disconnected=None):
+            raise NotFoundError(conversation_id)
+
+        async def resume_stream(self, message_id, model=None, is_disconnected=None, offset=0):
+            raise NotFoundError(message_id)
+
+    app.dependency_overrides[ServiceFactory.get_gemini_input_port] = lambda: FakeInputPort()
+    try:
+        client = TestClient(app)
+        body = {"conversation_id": "c1", "content": "hi", "model": "gemini-2.5-flash"}
+        assert client.post(f"{settings.API_PREFIX}/gemini/query", json=body, headers={"Cache-Control": "no-cache"}).status_code == 200
+        assert client.post(f"{settings.API_PREFIX}/gemini/stream", json=body, headers={"Cache-Control": "no-store"}).status_code == 200
+        assert client.post(f"{settings.API_PREFIX}/gemini/query", json=body).status_code == 200
+    finally:
+        app.dependency_overrides.clear()
+    assert seen == [CacheMode.NO_CACHE, CacheMode.NO_STORE, CacheMode.DEFAULT]
@@ -0,0 +1,187 @@
+"""Retry engine tests against a local mock upstream (a real socket server on 127.0.0.1)."""
+import asyncio
+import json
+
+import pytest
+
+from src.adapter.output.gemini.helper.gemini_client import GeminiClient, GeminiClientError
+from src.adapter.output.gemini.helper.retry_policy import RetryBudget, RetryPolicy
+
+OK_BODY = json.dumps({"candidates": [{"content": {"parts": [{"text": "pong"}]}}]}).encode()
+
+
+def _response(status: int, body: bytes, headers: str = "") -> bytes:
+    return (
+        f"HTTP/1.1 {status} X\r\nContent-Type: application/json\r\n{headers}"
+        f"Content-Length: {len(body)}\r\n\r\n"
+    ).encode() + body
+
+
+class MockUpstream:
+    """Serves one scripted action per request: a raw response, "reset" or "truncate"."""
+
+    def __init__(self, script):
+        self.script = list(script)
+        self.requests = 0
+        self.server = None
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.split(b"\r\n"):
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":")[1])
+                await reader.readexactly(length)
+                self.requests += 1
+                action = self.script.pop(0) if self.script else _response(200, OK_BODY)
+                if action == "reset":
+                    writer.transport.abort()
+                    return
+                if action == "truncate":
+                    # headers promise more bytes than are sent, then the connection drops
+                    first = json.dumps({"candidates": [{"content": {"parts": [{"text": "par"}]}}]}).encode()
+                    writer.write(_response(200, first + b" " * 500)[: -500])
+                    await writer.drain()
+                    writer.transport.abort()
+                    return
+                writer.write(action)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def __aenter__(self):
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        port = self.server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}/v1beta/models/gemini-2.5-flash:generateContent"
+        return self
+
+    async def __aexit__(self, *exc):
+        self.server.close()
+        await self.server.wait_closed()
+
+
+def _client(url, budget=None, max_attempts=3):
+    policy = RetryPolicy(max_attempts=max_attempts, base_delay=0.01, max_delay=1.0, budget=budget or RetryBudget())
+    return GeminiClient(url=url, api_key="test-key", timeout=5, retry_policy=policy)
+
+
+def test_generate_retries_429_and_reset_then_succeeds():
+    async def scenario():
+        script = [_response(429, b"{}", "Retry-After: 0\r\n"), "reset"]
+        async with MockUpstream(script) as upstream:
+            client = _client(upstream.url)
+            raw = await client.generate("ping")
+            await client.stop()
+            return raw, upstream.requests, client.retry_policy.retries
+
+    raw, requests, retries = asyncio.run(scenario())
+    assert raw["candidates"][0]["content"]["parts"][0]["text"] == "pong"
+    assert requests == 3
+    assert retries == 2
+
+
+def test_non_retryable_status_fails_fast():
+    async def scenario():
+        async with MockUpstream([_response(400, b"bad")]) as upstream:
+            client = _client(upstream.url)
+            with pytest.raises(GeminiClientError, match="HTTP 400"):
+                await client.generate("ping")
+            await client.stop()
+            return upstream.requests
+
+    assert asyncio.run(scenario()) == 1
+
+
+def test_retry_after_longer_than_max_delay_is_not_waited_out():
+    async def scenario():
+        async with MockUpstream([_response(503, b"busy", "Retry-After: 120\r\n")]) as upstream:
+            client = _client(upstream.url)
+            with pytest.raises(GeminiClientError, match="HTTP 503"):
+                await client.generate("ping")
+            await client.stop()
+            return upstream.requests
+
+    assert asyncio.run(scenario()) == 1
+
+
+def test_budget_caps_retries():
+    budget = RetryBudget(ratio=0.0, min_retries=1)
+
+    async def scenario():
+        script = ["reset", "reset", "reset", "reset"]
+        async with MockUpstream(script) as upstream:
+            client = _client(upstream.url, budget=budget, max_attempts=5)
+            with pytest.raises(GeminiClientError):
+                await client.generate("ping")
+            await client.stop()
+            return upstream.requests
+
+    # one original attempt plus the single retry the budget allows
+    assert asyncio.run(scenario()) == 2
+    assert budget.exhausted == 1
+
+
+def test_stream_retries_before_first_chunk_only():
+    async def scenario():
+        async with MockUpstream([_response(429, b"{}", "Retry-After: 0\r\n")]) as upstream:
+            client = _client(upstream.url)
+            parts = [p async for p in client.stream_generate("ping")]
+            first_requests = upstream.requests
+        async with MockUpstream(["truncate"]) as upstream:
+            client2 = _client(upstream.url)
+            received = []
+            with pytest.raises(GeminiClientError):
+                async for p in client2.stream_generate("ping"):
+                    received.append(p)
+            await client.stop()
+            await client2.stop()
+            return parts, first_requests, received, upstream.requests
+
+    parts, first_requests, received, truncated_requests = asyncio.run(scenario())
+    assert parts == ["pong"] and first_requests == 2
+    # bytes already reached the caller, so the broken stream is not replayed
+    assert received == ["par"] and truncated_requests == 1
+
+
+def test_no_request_and_no_retry_past_the_deadline():
+    import time
+
+    from src.application.exceptions.exceptions import DeadlineExceededError
+    from src.application.usecases.deadline import request_deadline
+
+    async def scenario():
+        script = [_response(503, b"busy", "Retry-After: 1\r\n")]
+        async with MockUpstream(script) as upstream:
+            client = _client(upstream.url)
+            # 1s Retry-After, 0.3s left: the retry would start after the caller gave up
+            request_deadline.set(time.monotonic() + 0.3)
+            with pytest.raises(GeminiClientError, match="HTTP 503"):
+                await client.generate("ping")
+            request_deadline.set(time.monotonic() - 1)
+            with pytest.raises(DeadlineExceededError):
+                await client.generate("ping")
+            await client.stop()
+            return upstream.requests, client.retry_policy.deadline_gave_up
+
+    assert asyncio.run(scenario()) == (1, 1)
+
+
+def test_429_retry_after_is_skipped_while_another_key_is_free():
+    async def scenario(keys):
+        async with MockUpstream([_response(429, b"{}", "Retry-After: 120\r\n")]) as upstream:
+            policy = RetryPolicy(max_attempts=3, base_delay=0.01, max_delay=1.0, budget=RetryBudget())
+            client = GeminiClient(url=upstream.url, api_key=keys, timeout=5, retry_policy=policy)
+            try:
+                raw = await client.generate("ping")
+            except GeminiClientError:
+                raw = None
+            await client.stop()
+            return raw is not None, upstream.requests
+
+    # the other key serves the retry at once; with a single key the 120s wait is not parked
+    assert asyncio.run(scenario("key-a,key-b")) == (True, 2)
+    assert asyncio.run(scenario("key-a")) == (False, 1)
@@ -0,0 +1,146 @@
+import asyncio
+import time
+
+import pytest
+
+from src.adapter.output.gemini.helper.circuit_breaker import CircuitBreakerRegistry
+from src.adapter.output.gemini.helper.response_cache import MemoryCacheTier, ResponseCache
+from src.adapter.output.gemini.helper.single_flight import SingleFlight
+from src.adapter.output.gemini.service.gemini_service import GeminiService
+
+
+class GatedClient:
+    """Upstream fake that blocks until `gate` is set, counting calls and closed streams."""
+
+    def __init__(self):
+        self.gate = asyncio.Event()
+        self.calls = 0
+        self.closed = 0
+
+    async def generate(self, contents, model=None):
+        self.calls += 1
+        await self.gate.wait()
+        return {"candidates": [{"content": {"parts": [{"text": "shared"}]}}]}
+
+    async def stream_generate(self, contents, model=None):
+        self.calls += 1
+        try:
+            yield "one "
+            await self.gate.wait()
+            yield "two"
+        finally:
+            self.closed += 1
+
+
+def _service(client, flights):
+    return GeminiService(
+        client,
+        breakers=CircuitBreakerRegistry(),
+        fallback_chain=[],
+        cache=ResponseCache(MemoryCacheTier(), enabled=False),
+        flights=flights,
+    )
+
+
+async def _collect(agen, out=None):
+    out = [] if out is None else out
+    async for part in agen:
+        out.append(part)
+    return out
+
+
+def test_concurrent_generates_share_one_call():
+    flights = SingleFlight()
+
+    async def scenario():
+        client = GatedClient()
+        tasks = [asyncio.create_task(_service(client, flights).generate("gemini-2.5-flash", [])) for _ in range(5)]
+        await asyncio.sleep(0.01)
+        client.gate.set()
+        return await asyncio.gather(*tasks), client.calls
+
+    results, calls = asyncio.run(scenario())
+    assert results == ["shared"] * 5 and calls == 1
+    assert flights.stats()["coalesced"] == 4 and flights.stats()["in_flight_calls"] == 0
+
+
+def test_cancelled_caller_does_not_cancel_shared_call():
+    flights = SingleFlight()
+
+    async def scenario():
+        client = GatedClient()
+        first = asyncio.create_task(_service(client, flights).generate("gemini-2.5-flash", []))
+        second = asyncio.create_task(_service(client, flights).generate("gemini-2.5-flash", []))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        await asyncio.sleep(0.01)
+        client.gate.set()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(scenario()) == "shared"
+
+
+def test_late_subscriber_replays_full_stream_and_abandonment_stops_upstream():
+    flights = SingleFlight()
+
+    async def scenario():
+        client = GatedClient()
+        early = []
+        early_task = asyncio.create_task(_collect(_service(client, flights).stream_generate("gemini-2.5-flash", []), early))
+        await asyncio.sleep(0.01)
+        assert early == ["one "]
+        # joins after the first chunk was produced, still sees it
+        late_task = asyncio.create_task(_collect(_service(client, flights).stream_generate("gemini-2.5-flash", [])))
+        await asyncio.sleep(0.01)
+        early_task.cancel()
+        await asyncio.sleep(0.01)
+        client.gate.set()
+        late = await late_task
+        shared_calls = client.calls
+
+        # every subscriber leaves: the upstream stream is closed
+        lone = _service(client, flights).stream_generate("gemini-2.5-pro", [])
+        client.gate.clear()
+        assert await lone.__anext__() == "one "
+        await lone.aclose()
+        await asyncio.sleep(0.01)
+        return late, shared_calls, client.closed
+
+    late, shared_calls, closed = asyncio.run(scenario())
+    assert late == ["one ", "two"] and shared_calls == 1
+    assert closed == 2
+    assert flights.stats()["abandoned"] == 1 and flights.stats()["in_flight_streams"] == 0
+
+
+def test_shared_stream_runs_without_the_first_subscribers_deadline():
+    from src.application.exceptions.exceptions import DeadlineExceededError
+    from src.application.usecases.deadline import remaining_time, request_deadline
+
+    flights = SingleFlight()
+    seen_deadlines = []
+    gate = asyncio.Event()
+
+    async def source():
+        seen_deadlines.append(remaining_time())
+        await gate.wait()
+        yield "late"
+
+    async def subscriber(seconds):
+        request_deadline.set(time.monotonic() + seconds)
+        return await _collect(flights.stream("k", source))
+
+    async def scenario():
+        short = asyncio.create_task(subscriber(0.05))
+        await asyncio.sleep(0)
+        long = asyncio.create_task(subscriber(5.0))
+        await asyncio.sleep(0.1)
+        gate.set()
+        return await asyncio.gather(short, long, return_exceptions=True)
+
+    short, long = asyncio.run(scenario())
+    # the first subscriber gave up at its own deadline; the stream went on for the second
+    assert isinstance(short, DeadlineExceededError)
+    assert long == ["late"]
+    assert seen_deadlines == [None]
@@ -0,0 +1,68 @@
+import json
+
+from src.adapter.output.gemini.dto.response.stream_chunk import (
+    FinishReasonChunk,
+    FunctionCallDelta,
+    TextDelta,
+    UsageChunk,
+)
+from src.adapter.output.gemini.helper.stream_parser import GeminiStreamParser, iter_chunks
+
+
+EVENTS = [
+    {"candidates": [{"content": {"role": "model", "parts": [{"text": "Hel"}]}, "index": 0}]},
+    {"candidates": [{"content": {"role": "model", "parts": [{"text": "lo \"q\" {}\\n", "thought": False}]}, "index": 0}]},
+    {"candidates": [{"content": {"parts": [{"text": "thinking", "thought": True}, {"functionCall": {"name": "f", "args": {"text": "x"}}}]}}]},
+    {
+        "candidates": [{"content": {"parts": [{"text": "!"}]}, "finishReason": "STOP"}],
+        "usageMetadata": {"promptTokenCount": 3, "candidatesTokenCount": 4, "totalTokenCount": 7},
+        "modelVersion": "gemini-2.5-flash",
+    },
+]
+
+
+def _parse_in_pieces(body: bytes, size: int):
+    parser = GeminiStreamParser()
+    events = []
+    for i in range(0, len(body), size):
+        events.extend(parser.feed(body[i:i + size]))
+    events.extend(parser.close())
+    return events
+
+
+def test_json_array_framing_split_at_every_byte():
+    body = ("[" + ",\r\n".join(json.dumps(e) for e in EVENTS) + "]").encode()
+    for size in (1, 2, 7, len(body)):
+        assert _parse_in_pieces(body, size) == EVENTS
+
+
+def test_sse_framing_with_object_split_across_events():
+    first = json.dumps(EVENTS[0])
+    body = (
+        ": keepalive\n"
+        f"data: {first[:10]}\n\n"
+        f"data: {first[10:]}\n\n"
+        + "".join(f"data: {json.dumps(e)}\r\n\r\n" for e in EVENTS[1:])
+        + "data: [DONE]\n\n"
+        + "data: {\"ignored\": true}\n\n"
+    ).encode()
+    for size in (1, 5, len(body)):
+        assert _parse_in_pieces(body, size) == EVENTS
+
+
+def test_multibyte_utf8_split_across_feeds():
+    event = {"candidates": [{"content": {"parts": [{"text": "xin chào 👋"}]}}]}
+    body = json.dumps(event, ensure_ascii=False).encode("utf-8")
+    assert _parse_in_pieces(body, 1) == [event]
+
+
+def test_iter_chunks_yields_typed_chunks():
+    chunks = [c for e in EVENTS for c in iter_chunks(e)]
+    texts = [c.text for c in chunks if isinstance(c, TextDelta) and not c.thought]
+    assert "".join(texts) == "Hello \"q\" {}\\n!"
+    assert any(isinstance(c, TextDelta) and c.thought for c in chunks)
+    assert [c.name for c in chunks if isinstance(c, FunctionCallDelta)] == ["f"]
+    assert [c.reason for c in chunks if isinstance(c, FinishReasonChunk)] == ["STOP"]
+    usage = [c for c in chunks if isinstance(c, UsageChunk)]
+    assert usage[0].usage.totalTokenCount == 7
+    assert usage[0].model_version == "gemini-2.5-flash"
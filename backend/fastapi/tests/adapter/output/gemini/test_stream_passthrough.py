@@ -0,0 +1,70 @@
+import asyncio
+import json
+
+import httpx
+import respx
+
+from src.adapter.output.gemini.helper.circuit_breaker import CircuitBreakerRegistry
+from src.adapter.output.gemini.helper.gemini_client import GeminiClient
+from src.adapter.output.gemini.helper.stream_parser import RawStreamCapture
+from src.adapter.output.gemini.service.gemini_service import GeminiService
+
+URL = "https://example.test/v1beta/models/gemini-2.5-flash:generateContent"
+STREAM_URL = "https://example.test/v1beta/models/gemini-2.5-flash:streamGenerateContent"
+
+
+def _sse_body() -> bytes:
+    events = [
+        {"candidates": [{"content": {"parts": [{"text": "thinking", "thought": True}]}}]},
+        {"candidates": [{"content": {"parts": [{"text": "Xin "}]}}]},
+        {"candidates": [{"content": {"parts": [{"text": "chào"}]}, "finishReason": "STOP"}],
+         "usageMetadata": {"totalTokenCount": 7}},
+    ]
+    return "".join(f"data: {json.dumps(e, ensure_ascii=False)}\r\n\r\n" for e in events).encode("utf-8")
+
+
+def test_stream_raw_relays_bytes_and_decodes_afterwards():
+    body = _sse_body()
+    seen = {}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen["alt"] = request.url.params.get("alt")
+        seen["encoding"] = request.headers.get("accept-encoding")
+        return httpx.Response(200, stream=httpx.ByteStream(body))
+
+    client = GeminiClient(url=URL, api_key="key-1234", timeout=5)
+
+    async def scenario():
+        capture = RawStreamCapture()
+        with respx.mock:
+            respx.post(url__startswith=STREAM_URL).mock(side_effect=handler)
+            chunks = [c async for c in client.stream_raw("hi", capture)]
+        await client.stop()
+        return chunks, capture
+
+    chunks, capture = asyncio.run(scenario())
+    assert all(isinstance(c, memoryview) for c in chunks)
+    assert b"".join(chunks) == body
+    assert seen == {"alt": "sse", "encoding": "identity"}
+    assert capture.text() == "Xin chào"
+    assert client.key_pool.stats()[0]["tokens"] == 7
+
+
+def test_service_pass_through_exposes_text_after_stream():
+    body = _sse_body()
+
+    class RawClient:
+        async def stream_raw(self, contents, capture, model=None):
+            for i in range(0, len(body), 10):
+                view = memoryview(body)[i:i + 10]
+                capture.append(view)
+                yield view
+
+    service = GeminiService(RawClient(), breakers=CircuitBreakerRegistry(), fallback_chain=[])
+
+    async def scenario():
+        return [bytes(c) async for c in service.stream_raw("gemini-2.5-flash", [])]
+
+    assert b"".join(asyncio.run(scenario())) == body
+    assert service.get_streamed_text() == "Xin chào"
+    assert service.get_answered_model() == "gemini-2.5-flash"
@@ -0,0 +1,47 @@
+import asyncio
+import time
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from src.adapter.output.mysql.db.base import DeadlineQueuePool
+from src.application.exceptions.exceptions import DeadlineExceededError
+from src.application.usecases.deadline import request_deadline
+
+
+def test_pool_checkout_waits_only_for_the_time_left(tmp_path):
+    async def scenario():
+        engine = create_async_engine(
+            f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}", poolclass=DeadlineQueuePool, pool_size=1, max_overflow=0, pool_timeout=30
+        )
+        async with engine.connect() as held:
+            await held.execute(text("select 1"))
+            request_deadline.set(time.monotonic() + 0.2)
+            started = time.monotonic()
+            with pytest.raises(DeadlineExceededError):
+                async with engine.connect() as second:
+                    await second.execute(text("select 1"))
+            waited = time.monotonic() - started
+        request_deadline.set(None)
+        await engine.dispose()
+        return waited
+
+    # not the configured 30s
+    assert asyncio.run(scenario()) < 5
+
+
+def test_statements_are_refused_once_the_deadline_passed():
+    async def scenario():
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        async with engine.connect() as conn:
+            await conn.execute(text("select 1"))
+            request_deadline.set(time.monotonic() - 1)
+            try:
+                with pytest.raises(DeadlineExceededError):
+                    await conn.execute(text("select 1"))
+            finally:
+                request_deadline.set(None)
+        await engine.dispose()
+
+    asyncio.run(scenario())
@@ -0,0 +1,172 @@
+import asyncio
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from src.adapter.output.mysql.db.base import Base
+from src.adapter.output.mysql.entities import ConversationEntity, MessageEntity
+from src.adapter.output.mysql.repositories.cached_message_repository import CachedMessageRepository, HistoryCache
+from src.adapter.output.mysql.repositories.message_repository import MessageRepository
+from src.application.usecases.gemini_usecase import GeminiUseCase
+from src.domain.enums.enums import ERole
+from src.domain.models.message_domain import MessageDomain
+
+
+class CountingRepository(MessageRepository):
+    def __init__(self, db):
+        super().__init__(db)
+        self.reads = 0
+
+    async def get_latest_by_conversation(self, conversation_id, count, before=None):
+        self.reads += 1
+        return await super().get_latest_by_conversation(conversation_id, count, before)
+
+    async def count_by_conversation(self, conversation_id):
+        self.reads += 1
+        return await super().count_by_conversation(conversation_id)
+
+
+def _msg(i, content=None, conversation_id="c1"):
+    return MessageDomain(
+        id=f"m{i:03d}", conversation_id=conversation_id, role=ERole.USER if i % 2 == 0 else ERole.MODEL,
+        content=content or f"hello {i}", created_at=1000 + i,
+    )
+
+
+async def _setup(count: int):
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)()
+    session.add(ConversationEntity(id="c1", name="chat", created_at=1000, updated_at=1000))
+    for i in range(count):
+        session.add(MessageEntity.from_domain(_msg(i)))
+    await session.commit()
+    return engine, session
+
+
+def test_warm_turn_reads_no_history_rows():
+    async def scenario():
+        engine, session = await _setup(30)
+        inner = CountingRepository(session)
+        repo = CachedMessageRepository(inner, HistoryCache())
+        usecase = GeminiUseCase(None, repo, None)
+
+        user = _msg(30)
+        await repo.save(user)
+        cold = await usecase._load_history(user, "gemini-2.5-flash")
+        cold_reads = inner.reads
+
+        # next turn: assistant answer and new user message are written through
+        await repo.save(_msg(31))
+        user = _msg(32)
+        await repo.save(user)
+        inner.reads = 0
+        warm = await usecase._load_history(user, "gemini-2.5-flash")
+        warm_reads = inner.reads
+        fresh = await MessageRepository(session).get_latest_by_conversation("c1", 100)
+        await session.close()
+        await engine.dispose()
+        return cold, cold_reads, warm, warm_reads, fresh
+
+    cold, cold_reads, warm, warm_reads, fresh = asyncio.run(scenario())
+    assert cold_reads == 2 and len(cold) == 31
+    assert warm_reads == 0
+    assert [m.id for m in warm] == [m.id for m in reversed(fresh)]
+
+
+def test_update_and_delete_invalidate_the_conversation():
+    async def scenario():
+        engine, session = await _setup(5)
+        inner = CountingRepository(session)
+        cache = HistoryCache()
+        repo = CachedMessageRepository(inner, cache)
+        await repo.get_latest_by_conversation("c1", 10)
+
+        edited = _msg(3, content="edited")
+        await repo.update(edited)
+        after_edit = await repo.get_latest_by_conversation("c1", 10)
+        await repo.delete(_msg(4))
+        after_delete = await repo.get_latest_by_conversation("c1", 10)
+        await session.close()
+        await engine.dispose()
+        return inner.reads, after_edit, after_delete, cache.stats()
+
+    reads, after_edit, after_delete, stats = asyncio.run(scenario())
+    assert reads == 3
+    assert after_edit[1].content == "edited"
+    assert [m.id for m in after_delete] == ["m003", "m002", "m001", "m000"]
+    assert stats["invalidations"] == 2
+
+
+def test_cache_pages_write_through_and_byte_bound():
+    cache = HistoryCache(max_bytes=4 * (256 + 20), max_messages=3)
+    token = cache.begin_fill("c1")
+    cache.fill_latest("c1", token, [_msg(2), _msg(1), _msg(0)], 3, None)
+    assert cache.latest("c1", 2) == [_msg(2), _msg(1)]
+    # the oldest cached row is reached but the run is not known to be complete
+    assert cache.latest("c1", 2, before=_msg(1)) is None
+
+    cache.write(_msg(3))
+    assert [m.id for m in cache.latest("c1", 3)] == ["m003", "m002", "m001"]
+    assert cache.count("c1") is None
+
+    # a write during a DB read makes that read unstorable
+    token = cache.begin_fill("c2")
+    cache.write(_msg(0, conversation_id="c2"))
+    cache.fill_latest("c2", token, [_msg(0, conversation_id="c2")], 5, None)
+    assert cache.latest("c2", 1) is None and cache.stats()["stale_fills"] == 1
+
+    # a second conversation pushes the first one out of the byte budget
+    token = cache.begin_fill("c3")
+    cache.fill_latest("c3", token, [_msg(1, conversation_id="c3"), _msg(0, conversation_id="c3")], 5, None)
+    assert cache.latest("c3", 5) is not None and cache.count("c3") == 2
+    assert cache.latest("c1", 1) is None
+    assert cache.stats()["evictions"] == 1
+    assert cache.bytes == sum(len(f"hello {i}") + 256 for i in (0, 1))
+
+
+def test_turn_written_by_another_worker_is_not_missed():
+    async def scenario():
+        engine, session = await _setup(3)
+        other_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)()
+        cache = HistoryCache()
+        inner = CountingRepository(session)
+        repo = CachedMessageRepository(inner, cache)
+        # a second worker with its own cache
+        other = CachedMessageRepository(MessageRepository(other_session), HistoryCache())
+
+        await repo.insert_and_get_latest(_msg(3), 10)
+        inner.reads = 0
+        warm = await repo.insert_and_get_latest(_msg(4), 10)
+        warm_reads = inner.reads
+
+        await other.insert_and_get_latest(_msg(5), 10)
+        after_other = await repo.insert_and_get_latest(_msg(6), 10)
+        await other_session.close()
+        await session.close()
+        await engine.dispose()
+        return warm, warm_reads, after_other, cache.stats()
+
+    warm, warm_reads, after_other, stats = asyncio.run(scenario())
+    assert warm_reads == 0 and [m.id for m in warm] == ["m004", "m003", "m002", "m001", "m000"]
+    assert [m.id for m in after_other][:3] == ["m006", "m005", "m004"]
+    assert stats["stale_entries"] == 1
+
+
+def test_deleting_the_conversation_drops_its_cached_history():
+    from src.application.usecases.conversation_usecase import ConversationUseCase
+    from src.adapter.output.mysql.repositories.conversation_repository import ConversationRepository
+
+    async def scenario():
+        engine, session = await _setup(3)
+        cache = HistoryCache()
+        repo = CachedMessageRepository(MessageRepository(session), cache)
+        await repo.get_latest_by_conversation("c1", 10)
+        await ConversationUseCase(ConversationRepository(session), repo).delete_conversation("c1")
+        left = await MessageRepository(session).count_by_conversation("c1")
+        await session.close()
+        await engine.dispose()
+        return cache.latest("c1", 1), left
+
+    cached, left = asyncio.run(scenario())
+    assert cached is None and left == 0
@@ -0,0 +1,268 @@
+import asyncio
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from src.adapter.output.mysql.db.base import Base
+from src.adapter.output.mysql.entities import ConversationEntity, MessageEntity
+from src.adapter.output.mysql.repositories.message_repository import MessageRepository
+from src.domain.enums.enums import ERole
+
+
+async def _session_with_messages(count: int, same_second: bool = False):
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)()
+    session.add(ConversationEntity(id="c1", name="chat", created_at=1000, updated_at=1000))
+    for i in range(count):
+        session.add(MessageEntity(
+            id=f"m{i:03d}", conversation_id="c1", role=ERole.USER, content=f"hello {i}",
+            created_at=1000 if same_second else 1000 + i,
+        ))
+    await session.commit()
+    return engine, session
+
+
+def test_latest_pages_walk_backwards_without_overlap():
+    async def scenario():
+        engine, session = await _session_with_messages(7, same_second=True)
+        repo = MessageRepository(session)
+        seen = []
+        before = None
+        while True:
+            page = await repo.get_latest_by_conversation("c1", 3, before)
+            seen.extend(m.id for m in page)
+            if len(page) < 3:
+                break
+            before = page[-1]
+        await session.close()
+        await engine.dispose()
+        return seen
+
+    # ties on created_at are broken by id, so no row is skipped or repeated
+    assert asyncio.run(scenario()) == [f"m{i:03d}" for i in range(6, -1, -1)]
+
+
+def test_oldest_pages_walk_forward_and_summary_round_trips():
+    from src.adapter.output.mysql.repositories.summary_repository import SummaryRepository
+    from src.domain.models.summary_domain import ConversationSummaryDomain
+
+    async def scenario():
+        engine, session = await _session_with_messages(7, same_second=True)
+        repo = MessageRepository(session)
+        first = await repo.get_oldest_by_conversation("c1", 3)
+        second = await repo.get_oldest_by_conversation("c1", 3, first[-1])
+
+        summaries = SummaryRepository(session)
+        assert await summaries.get_by_conversation("c1") is None
+        base = dict(conversation_id="c1", last_message_created_at=1000, covered_messages=3, covered_bytes=21)
+        await summaries.save(ConversationSummaryDomain(content="v1", last_message_id="m002", **base))
+        await summaries.save(ConversationSummaryDomain(content="v2", last_message_id="m005", version=2, **base))
+        stored = await summaries.get_by_conversation("c1")
+        await session.close()
+        await engine.dispose()
+        return [m.id for m in first], [m.id for m in second], stored
+
+    first, second, stored = asyncio.run(scenario())
+    assert first == ["m000", "m001", "m002"]
+    assert second == ["m003", "m004", "m005"]
+    assert (stored.content, stored.last_message_id, stored.version) == ("v2", "m005", 2)
+
+
+def test_fused_insert_and_history_costs_four_round_trips():
+    from src.domain.models.message_domain import MessageDomain
+
+    def _new(i):
+        return MessageDomain(id=f"n{i}", conversation_id="c1", role=ERole.USER, content="hi", created_at=2000 + i)
+
+    async def scenario():
+        engine, session = await _session_with_messages(5)
+        repo = MessageRepository(session)
+
+        start = repo.round_trips()
+        await repo.save(_new(0))
+        await repo.get_latest_by_conversation("c1", 3)
+        separate = repo.round_trips() - start
+
+        start = repo.round_trips()
+        page = await repo.insert_and_get_latest(_new(1), 3)
+        fused = repo.round_trips() - start
+        await session.close()
+        await engine.dispose()
+        return separate, fused, [m.id for m in page]
+
+    separate, fused, page = asyncio.run(scenario())
+    # INSERT, conversation stats UPDATE, SELECT and COMMIT; the save path also pre-reads and refreshes the row
+    assert fused == 4
+    assert separate > fused
+    assert page == ["n1", "n0", "m004"]
+
+
+def test_insert_many_writes_one_batch_and_skips_replayed_ids():
+    from src.domain.models.message_domain import MessageDomain
+
+    def _new(i):
+        return MessageDomain(id=f"n{i}", conversation_id="c1", role=ERole.MODEL, content="ok", created_at=2000 + i)
+
+    async def scenario():
+        engine, session = await _session_with_messages(1)
+        repo = MessageRepository(session)
+        start = repo.round_trips()
+        await repo.insert_many([_new(0), _new(1)])
+        round_trips = repo.round_trips() - start
+        start = repo.round_trips()
+        added = await repo.insert_many([_new(1), _new(2)], ignore_duplicates=True)
+        replay_round_trips = repo.round_trips() - start
+        total = await repo.count_by_conversation("c1")
+        conversation = await session.get(ConversationEntity, "c1")
+        await session.close()
+        await engine.dispose()
+        return round_trips, added, replay_round_trips, total, conversation
+
+    round_trips, added, replay_round_trips, total, conversation = asyncio.run(scenario())
+    # one multi-row INSERT, the conversation stats UPDATE and the COMMIT
+    assert round_trips == 3
+    # the conflict clause skips n1: no SELECT of existing ids, the rowcount gives the count
+    assert added == 1 and replay_round_trips == 3
+    assert total == 4
+    # a chunk that skipped rows recounts its conversation
+    assert (conversation.messages_count, conversation.last_message_at) == (4, 2002)
+
+
+def test_checkpoint_inserts_then_updates_and_takeover_compares_updated_at():
+    from src.domain.enums.enums import EMessageStatus
+    from src.domain.models.message_domain import MessageDomain
+
+    async def scenario():
+        engine, session = await _session_with_messages(1)
+        repo = MessageRepository(session)
+        answer = MessageDomain(
+            id="a1", conversation_id="c1", role=ERole.MODEL, content="par", created_at=2000,
+            status=EMessageStatus.IN_PROGRESS, updated_at=2000,
+        )
+        assert await repo.checkpoint(answer)
+        answer.content, answer.updated_at = "partial", 2001
+        assert await repo.checkpoint(answer)
+        stale = await repo.checkpoint(answer.model_copy(update={"updated_at": 2005}), expected_updated_at=2000)
+        answer.status, answer.updated_at = EMessageStatus.COMPLETE, 2002
+        claimed = await repo.checkpoint(answer, expected_updated_at=2001)
+        stored = await repo.get_checkpoint("a1")
+        await session.close()
+        await engine.dispose()
+        return stale, claimed, stored
+
+    stale, claimed, stored = asyncio.run(scenario())
+    assert stale is False and claimed is True
+    assert (stored.content, stored.status, stored.updated_at) == ("partial", EMessageStatus.COMPLETE, 2002)
+
+
+def test_keyset_cursor_pages_both_ways_in_one_statement_each():
+    from src.domain.vo.page_cursor import PageCursor
+
+    async def scenario():
+        engine, session = await _session_with_messages(7, same_second=True)
+        repo = MessageRepository(session)
+        pages, statements = [], []
+        cursor = None
+        while True:
+            start = repo.round_trips()
+            page, has_more = await repo.get_list_by_conversation("c1", None, 3, "desc", cursor)
+            statements.append(repo.round_trips() - start)
+            pages.append([m.id for m in page])
+            if not has_more:
+                break
+            cursor = PageCursor(created_at=page[-1].created_at, id=page[-1].id, order="desc")
+        # back from the last page: the page before its first element
+        first = await repo.get_by_id(pages[-1][0])
+        back = PageCursor(created_at=first.created_at, id=first.id, order="desc", backward=True)
+        previous, more_before = await repo.get_list_by_conversation("c1", None, 3, "desc", back)
+        await session.close()
+        await engine.dispose()
+        return pages, statements, [m.id for m in previous], more_before
+
+    pages, statements, previous, more_before = asyncio.run(scenario())
+    assert pages == [["m006", "m005", "m004"], ["m003", "m002", "m001"], ["m000"]]
+    # no anchor lookup: one SELECT per page
+    assert statements == [1, 1, 1]
+    assert previous == ["m003", "m002", "m001"] and more_before is True
+
+
+def test_conversation_stats_follow_every_write_path_and_backfill_repairs_them():
+    from src.adapter.output.mysql.repositories.conversation_repository import ConversationRepository
+    from src.adapter.output.mysql.repositories.conversation_stats import backfill
+    from src.domain.enums.enums import EMessageStatus
+    from src.domain.models.message_domain import MessageDomain
+
+    def _new(i, **kw):
+        return MessageDomain(id=f"n{i}", conversation_id="c1", role=ERole.USER, content=f"new {i}", created_at=2000 + i, **kw)
+
+    async def scenario():
+        # seeded rows bypass the repository: only the backfill knows about them
+        engine, session = await _session_with_messages(5)
+        repo, conversations = MessageRepository(session), ConversationRepository(session)
+
+        async def stats():
+            # the counters are changed by UPDATE statements, not through the loaded entity
+            session.expire_all()
+            conv = await conversations.get_by_id("c1")
+            return conv.messages_count, conv.last_message_at, conv.last_message_preview
+
+        seen = [await stats()]
+        assert await backfill(session, batch_size=1) == 1
+        seen.append(await stats())
+        await repo.save(_new(0))
+        await repo.insert_and_get_latest(_new(1), 2)
+        await repo.insert_many([_new(2), _new(3)])
+        await repo.insert_many([_new(3), _new(4)], ignore_duplicates=True)
+        # an older message counts but does not become the last one
+        await repo.save(MessageDomain(id="old", conversation_id="c1", role=ERole.USER, content="old", created_at=1))
+        seen.append(await stats())
+        answer = _new(5, status=EMessageStatus.IN_PROGRESS, updated_at=2005)
+        await repo.checkpoint(answer)
+        answer.content, answer.status = "the full answer", EMessageStatus.COMPLETE
+        await repo.checkpoint(answer)
+        seen.append(await stats())
+        await repo.delete(answer)
+        seen.append(await stats())
+        await repo.delete_by_conversation("c1")
+        seen.append(await stats())
+        await session.close()
+        await engine.dispose()
+        return seen
+
+    seen = asyncio.run(scenario())
+    assert seen == [
+        (0, 1000, None),
+        (5, 1004, "hello 4"),
+        (11, 2004, "new 4"),
+        (12, 2005, "the full answer"),
+        (11, 2004, "new 4"),
+        # back to the conversation's own created_at
+        (0, 1000, None),
+    ]
+
+
+def test_insert_many_splits_large_inputs_but_commits_once(monkeypatch):
+    from src.adapter.output.mysql.repositories import message_repository
+    from src.domain.models.message_domain import MessageDomain
+
+    monkeypatch.setattr(message_repository, "INSERT_CHUNK_ROWS", 2)
+
+    async def scenario():
+        engine, session = await _session_with_messages(0)
+        repo = MessageRepository(session)
+        batch = [
+            MessageDomain(id=f"b{i}", conversation_id="c1", role=ERole.USER, content="x", created_at=3000 + i)
+            for i in range(5)
+        ]
+        start = repo.round_trips()
+        added = await repo.insert_many(batch)
+        round_trips = repo.round_trips() - start
+        total = await repo.count_by_conversation("c1")
+        await session.close()
+        await engine.dispose()
+        return added, round_trips, total
+
+    added, round_trips, total = asyncio.run(scenario())
+    # three INSERTs of at most two rows, one stats UPDATE, one COMMIT
+    assert (added, round_trips, total) == (5, 5, 5)
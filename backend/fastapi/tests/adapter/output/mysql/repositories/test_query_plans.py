@@ -0,0 +1,83 @@
+import asyncio
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from src.adapter.output.mysql.db.base import Base
+from src.adapter.output.mysql.entities import ConversationEntity, MessageEntity
+from src.adapter.output.mysql.repositories.conversation_repository import ConversationRepository
+from src.adapter.output.mysql.repositories.message_repository import MessageRepository
+from src.domain.enums.enums import ERole
+from src.domain.vo.page_cursor import PageCursor
+
+
+async def _plans(calls):
+    """EXPLAIN QUERY PLAN of every SELECT the repository calls issue, keyed by call name."""
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)()
+    for c in range(3):
+        session.add(ConversationEntity(id=f"c{c}", name="chat", created_at=1000 + c, updated_at=1000 + c))
+        for i in range(20):
+            session.add(MessageEntity(
+                id=f"c{c}m{i:03d}", conversation_id=f"c{c}", role=ERole.USER if i % 2 else ERole.MODEL,
+                content="hi", created_at=1000 + i,
+            ))
+    await session.commit()
+    async with engine.begin() as conn:
+        await conn.exec_driver_sql("ANALYZE")
+
+    statements = []
+
+    def _capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    plans = {}
+    event.listen(engine.sync_engine, "before_cursor_execute", _capture)
+    for name, call in calls.items():
+        statements.clear()
+        await call(session)
+        plans[name] = list(statements)
+    event.remove(engine.sync_engine, "before_cursor_execute", _capture)
+
+    explained = {}
+    async with engine.connect() as conn:
+        for name, issued in plans.items():
+            explained[name] = []
+            for statement, parameters in issued:
+                rows = (await conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)).all()
+                explained[name].append(" | ".join(str(r[-1]) for r in rows))
+    await session.close()
+    await engine.dispose()
+    return explained
+
+
+def test_hot_queries_use_the_composite_indexes_without_sorting():
+    cursor = PageCursor(created_at=1010, id="c1m010", order="desc")
+    calls = {
+        "latest": lambda db: MessageRepository(db).get_latest_by_conversation("c1", 5),
+        "list_page": lambda db: MessageRepository(db).get_list_by_conversation("c1", None, 5, "desc", cursor),
+        "list_asc": lambda db: MessageRepository(db).get_list_by_conversation("c1", None, 5, "asc"),
+        "count": lambda db: MessageRepository(db).count_by_conversation("c1"),
+        "by_role": lambda db: MessageRepository(db).get_by_conversation_and_role("c1", ERole.USER),
+        "conversations": lambda db: ConversationRepository(db).get_all(5, None, "desc"),
+        "recent": lambda db: ConversationRepository(db).get_all(5, None, "desc", sort="last_message_at"),
+    }
+    plans = asyncio.run(_plans(calls))
+
+    for name in ("latest", "list_page", "list_asc"):
+        (plan,) = plans[name]
+        assert "idx_messages_conversation_created_at_id" in plan, (name, plan)
+        assert "TEMP B-TREE" not in plan, (name, plan)
+    # counts only need conversation_id: either composite index covers them
+    (plan,) = plans["count"]
+    assert "USING COVERING INDEX idx_messages_conversation_" in plan, plan
+    (plan,) = plans["by_role"]
+    assert "idx_messages_conversation_role_created_at" in plan and "TEMP B-TREE" not in plan, plan
+    # message counts are columns of the page, not a second query
+    (page,) = plans["conversations"]
+    assert "idx_conversations_created_at_id" in page and "TEMP B-TREE" not in page, page
+    (page,) = plans["recent"]
+    assert "idx_conversations_last_message_at_id" in page and "TEMP B-TREE" not in page, page
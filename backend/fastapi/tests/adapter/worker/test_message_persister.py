@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from src.adapter.worker.message_persister import MessageJournal, MessagePersister
+from src.domain.enums.enums import ERole
+from src.domain.models.message_domain import MessageDomain
+
+
+def _msg(i, conversation_id="c1"):
+    return MessageDomain(id=f"m{i:03d}", conversation_id=conversation_id, role=ERole.USER, content=f"hi {i}", created_at=1000 + i)
+
+
+class RecordingWriter:
+    def __init__(self, fail_times=0, reject=()):
+        self.batches = []
+        self.fail_times = fail_times
+        self.reject = set(reject)
+
+    async def __call__(self, messages):
+        if self.fail_times:
+            self.fail_times -= 1
+            raise ConnectionError("db down")
+        if any(m.id in self.reject for m in messages):
+            raise IntegrityError("INSERT", {}, Exception("foreign key"))
+        self.batches.append([m.id for m in messages])
+
+
+def test_messages_are_grouped_into_batches():
+    writer = RecordingWriter()
+
+    async def scenario():
+        persister = MessagePersister(writer, batch_size=3, flush_interval=0.05)
+        futures = [await persister.submit(_msg(i)) for i in range(7)]
+        written = await asyncio.gather(*futures)
+        await persister.stop()
+        return persister, written
+
+    persister, written = asyncio.run(scenario())
+    assert [m.id for m in written] == [f"m{i:03d}" for i in range(7)]
+    assert [len(b) for b in writer.batches] == [3, 3, 1]
+    stats = persister.stats()
+    assert stats["flushes"] == 3 and stats["rows_written"] == 7 and stats["max_batch"] == 3
+    assert stats["pending"] == 0
+
+
+def test_outage_is_retried_and_rejected_rows_are_dropped():
+    writer = RecordingWriter(fail_times=2, reject={"m001"})
+
+    async def scenario():
+        persister = MessagePersister(writer, batch_size=10, flush_interval=0.01, retry_delay=0.001)
+        futures = [await persister.submit(_msg(i)) for i in range(3)]
+        await persister.flush()
+        await persister.stop()
+        return persister, futures
+
+    persister, futures = asyncio.run(scenario())
+    assert writer.batches == [["m000"], ["m002"]]
+    with pytest.raises(IntegrityError):
+        futures[1].result()
+    assert persister.stats()["failures"] == 2 and persister.stats()["dropped"] == 1
+
+
+def test_journal_replays_unwritten_messages_after_restart(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+
+    async def crashed_run():
+        # the DB never comes back before shutdown: nothing gets committed
+        persister = MessagePersister(RecordingWriter(fail_times=10**6), journal=MessageJournal(path), flush_interval=0.01, retry_delay=0.01)
+        for i in range(3):
+            await persister.submit(_msg(i))
+        await persister.stop(timeout=0.05)
+
+    async def next_run(writer):
+        persister = MessagePersister(writer, journal=MessageJournal(path), flush_interval=0.01)
+        replayed = await persister.start()
+        await persister.flush()
+        await persister.stop()
+        return replayed
+
+    asyncio.run(crashed_run())
+    writer = RecordingWriter()
+    assert asyncio.run(next_run(writer)) == 3
+    assert writer.batches == [["m000", "m001", "m002"]]
+    # committed batches are recorded, so a further restart has nothing to replay
+    assert MessageJournal(path).replay() == []
@@ -0,0 +1,155 @@
+import asyncio
+
+from src.adapter.worker.compaction_worker import CompactionWorker
+from src.application.usecases.compaction_usecase import CompactionMetrics, CompactionUseCase, compaction_metrics
+from src.application.usecases.gemini_usecase import GeminiUseCase
+from src.domain.enums.enums import ERole
+from src.domain.models.message_domain import MessageDomain
+from src.domain.models.summary_domain import ConversationSummaryDomain
+from src.domain.utils.context_window import message_tokens
+
+
+def _msg(i, content="word " * 10):
+    role = ERole.USER if i % 2 == 0 else ERole.MODEL
+    return MessageDomain(id=f"m{i:03d}", conversation_id="c1", role=role, content=content, created_at=1000 + i)
+
+
+class FakeMessagePort:
+    def __init__(self, messages):
+        self.messages = sorted(messages, key=lambda m: (m.created_at, m.id))
+        self.pages = 0
+
+    async def get_latest_by_conversation(self, conversation_id, count, before=None):
+        self.pages += 1
+        rows = list(reversed(self.messages))
+        if before is not None:
+            rows = [m for m in rows if (m.created_at, m.id) < (before.created_at, before.id)]
+        return rows[:count]
+
+    async def get_oldest_by_conversation(self, conversation_id, count, after=None):
+        rows = self.messages
+        if after is not None:
+            rows = [m for m in rows if (m.created_at, m.id) > (after.created_at, after.id)]
+        return rows[:count]
+
+    async def count_by_conversation(self, conversation_id):
+        return len(self.messages)
+
+
+class FakeSummaryPort:
+    def __init__(self):
+        self.summary = None
+
+    async def get_by_conversation(self, conversation_id):
+        return self.summary
+
+    async def save(self, summary):
+        self.summary = summary
+        return summary
+
+
+class FakeGemini:
+    def __init__(self):
+        self.calls = []
+
+    async def generate(self, model, history):
+        self.calls.append((model, history[0].content))
+        return f"summary #{len(self.calls)}"
+
+
+def test_compaction_folds_oldest_turns_incrementally():
+    messages = FakeMessagePort([_msg(i) for i in range(20)])
+    summaries = FakeSummaryPort()
+    gemini = FakeGemini()
+    metrics = CompactionMetrics()
+    usecase = CompactionUseCase(gemini, messages, summaries, model="gemini-2.5-flash-lite",
+                                threshold_tokens=1, keep_recent=4, metrics=metrics)
+
+    first = asyncio.run(usecase.compact("c1"))
+    assert (first.last_message_id, first.covered_messages, first.version) == ("m015", 16, 1)
+    assert gemini.calls[0][0] == "gemini-2.5-flash-lite"
+
+    # six more turns: only those that aged out past the newest four are folded into the old summary
+    messages.messages += [_msg(i) for i in range(20, 26)]
+    second = asyncio.run(usecase.compact("c1"))
+    assert (second.last_message_id, second.covered_messages, second.version) == ("m021", 22, 2)
+    assert "summary #1" in gemini.calls[1][1]
+    assert "m015" not in gemini.calls[1][1] and gemini.calls[1][1].count("User:") == 3
+    assert second.covered_bytes == 22 * len("word " * 10)
+    assert metrics.compactions == 2 and metrics.messages_folded == 22
+
+    # nothing new aged out: no upstream call
+    assert asyncio.run(usecase.compact("c1")) is None
+    assert len(gemini.calls) == 2 and metrics.skipped == 1
+
+
+def test_history_sends_summary_instead_of_covered_turns():
+    history = [_msg(i) for i in range(40)]
+    messages = FakeMessagePort(history)
+    summaries = FakeSummaryPort()
+    summaries.summary = ConversationSummaryDomain(
+        conversation_id="c1", content="they talked", last_message_id="m029", last_message_created_at=1029,
+        covered_messages=30, covered_bytes=30 * len("word " * 10),
+    )
+    scheduled = []
+    usecase = GeminiUseCase(None, messages, None, summaries, scheduled.append)
+    prompts, saved = compaction_metrics.prompts_with_summary, compaction_metrics.prompt_bytes_saved
+    kept = asyncio.run(usecase._load_history(history[-1], "gemini-2.5-flash"))
+
+    assert kept[0].content.endswith("they talked")
+    assert [m.id for m in kept[1:]] == [f"m{i:03d}" for i in range(30, 40)]
+    report = usecase.get_context_report()
+    assert report["dropped_messages"] == 0
+    assert report["summary_tokens"] == message_tokens(kept[0])
+    assert compaction_metrics.prompts_with_summary == prompts + 1
+    assert compaction_metrics.prompt_bytes_saved - saved == 30 * len("word " * 10) - len(kept[0].content)
+
+    # raw history is under the default threshold, so nothing is scheduled
+    usecase._maybe_schedule_compaction("c1")
+    assert scheduled == []
+    usecase.last_context_report = dict(report, dropped_messages=3)
+    usecase._maybe_schedule_compaction("c1")
+    assert scheduled == ["c1"]
+
+
+def test_summary_is_dropped_when_newer_turns_fill_the_budget():
+    history = [_msg(i) for i in range(40)]
+    summaries = FakeSummaryPort()
+    summaries.summary = ConversationSummaryDomain(
+        conversation_id="c1", content="old", last_message_id="m009", last_message_created_at=1009,
+    )
+    usecase = GeminiUseCase(None, FakeMessagePort(history), None, summaries)
+    usecase._token_budgets = {"gemini-2.5-flash": message_tokens(history[0]) * 6}
+    kept = asyncio.run(usecase._load_history(history[-1], "gemini-2.5-flash"))
+    # no summary followed by a gap: only the newest turns that fit
+    assert all(m.id.startswith("m") for m in kept)
+    assert usecase.get_context_report()["summary_tokens"] == 0
+
+
+def test_worker_runs_each_conversation_once_per_queue_slot():
+    ran = []
+    metrics = CompactionMetrics()
+
+    async def run(conversation_id):
+        await asyncio.sleep(0)
+        ran.append(conversation_id)
+        if conversation_id == "bad":
+            raise RuntimeError("boom")
+
+    async def scenario():
+        worker = CompactionWorker(run, max_pending=2, metrics=metrics)
+        results = [worker.schedule("c1"), worker.schedule("c1"), worker.schedule("bad"), worker.schedule("c2")]
+        await worker.join()
+        again = worker.schedule("c1")
+        await worker.join()
+        await worker.stop()
+        return results, again
+
+    results, again = asyncio.run(scenario())
+    assert results == [True, False, True, False]
+    assert again is True
+    assert ran == ["c1", "bad", "c1"]
+    assert (metrics.coalesced, metrics.queue_full, metrics.failures) == (1, 1, 1)
+
+    disabled = CompactionWorker(run, enabled=False)
+    assert disabled.schedule("c1") is False
@@ -0,0 +1,114 @@
+import asyncio
+
+from src.application.usecases.gemini_usecase import GeminiUseCase
+from src.domain.enums.enums import ERole
+from src.domain.models.message_domain import MessageDomain
+from src.domain.utils.context_window import ContextWindow, message_tokens, parse_token_budgets, token_budget_for
+
+
+def _msg(i, content="word " * 10, role=ERole.USER):
+    return MessageDomain(id=f"m{i:03d}", conversation_id="c1", role=role, content=content, created_at=1000 + i)
+
+
+class FakeMessagePort:
+    """Newest-first keyset pages over an in-memory conversation."""
+
+    def __init__(self, messages):
+        self.messages = sorted(messages, key=lambda m: (m.created_at, m.id), reverse=True)
+        self.pages = 0
+        self.counts = 0
+
+    async def get_latest_by_conversation(self, conversation_id, count, before=None):
+        self.pages += 1
+        rows = self.messages
+        if before is not None:
+            rows = [m for m in rows if (m.created_at, m.id) < (before.created_at, before.id)]
+        return rows[:count]
+
+    async def count_by_conversation(self, conversation_id):
+        self.counts += 1
+        return len(self.messages)
+
+
+def test_budget_overrides_and_defaults():
+    overrides = parse_token_budgets("gemini-2.5-pro=64000, bogus=1, gemini-2.5-flash=x")
+    assert overrides == {"gemini-2.5-pro": 64000}
+    assert token_budget_for("gemini-2.5-pro", overrides) == 64000
+    assert token_budget_for("gemini-2.5-flash-lite", overrides) == 16000
+    assert token_budget_for("unknown-model", overrides, default=1234) == 1234
+
+
+def test_window_keeps_newest_turns_and_pins_oversized_user_turn():
+    huge = _msg(99, content="x" * 4000)
+    window = ContextWindow(budget=50)
+    window.pin(huge)
+    assert window.offer(_msg(1)) is False
+    assert window.messages == [huge]
+    assert window.report()["dropped_messages"] == 1
+
+    window = ContextWindow(budget=message_tokens(_msg(0)) * 3)
+    window.pin(_msg(10))
+    kept = [window.offer(_msg(i)) for i in (9, 8, 7, 6)]
+    assert kept == [True, True, False, False]
+    assert [m.id for m in window.messages] == ["m008", "m009", "m010"]
+
+
+def test_usecase_fetches_pages_only_until_budget_is_full():
+    history = [_msg(i, role=ERole.USER if i % 2 == 0 else ERole.MODEL) for i in range(200)]
+    port = FakeMessagePort(history)
+    usecase = GeminiUseCase(None, port, None)
+    latest = history[-1]
+
+    async def scenario():
+        usecase._token_budgets = {"gemini-2.5-flash": message_tokens(latest) * 5}
+        return await usecase._load_history(latest, "gemini-2.5-flash")
+
+    kept = asyncio.run(scenario())
+    assert [m.id for m in kept] == ["m195", "m196", "m197", "m198", "m199"]
+    assert port.pages == 1 and port.counts == 1
+    report = usecase.get_context_report()
+    assert report["kept_messages"] == 5
+    assert report["dropped_messages"] == 195
+    # tokens are estimated for the fetched rows only (one page); the rest are counted, not read
+    assert report["dropped_tokens"] == 15 * message_tokens(history[0])
+
+
+def test_prepare_turn_reads_history_with_the_insert_and_warms_upstream():
+    from src.domain.vo.message_request import MessageRequest
+
+    class FusedPort(FakeMessagePort):
+        def __init__(self, messages):
+            super().__init__(messages)
+            self.fused = 0
+
+        async def insert_and_get_latest(self, message, count):
+            self.fused += 1
+            self.messages.insert(0, message)
+            return self.messages[:count]
+
+        def round_trips(self):
+            return 3 * self.fused + self.pages + self.counts
+
+    class WarmingGemini:
+        warmed = 0
+
+        async def warm_up(self):
+            WarmingGemini.warmed += 1
+
+    port = FusedPort([_msg(i) for i in range(3)])
+    usecase = GeminiUseCase(WarmingGemini(), port, None)
+
+    async def scenario():
+        result = await usecase._prepare_turn(MessageRequest(conversation_id="c1", content="hello", model="gemini-2.5-flash"))
+        await usecase._warm_up_task
+        return result
+
+    user_msg, model_name, history = asyncio.run(scenario())
+    assert model_name == "gemini-2.5-flash"
+    assert [m.id for m in history] == ["m000", "m001", "m002", user_msg.id]
+    # the first page came back with the insert: no separate history read
+    assert port.fused == 1 and port.pages == 0
+    assert WarmingGemini.warmed == 1
+    report = usecase.get_turn_report()
+    assert report["db_round_trips"] == 3
+    assert report["pre_upstream_ms"] >= 0
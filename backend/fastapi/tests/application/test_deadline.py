@@ -0,0 +1,100 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from src.adapter.input.controllers.deadline_middleware import DeadlineMiddleware
+from src.application.config.config import settings
+from src.application.exceptions.exceptions import DeadlineExceededError
+from src.application.usecases.deadline import (
+    bounded_timeout,
+    deadline_metrics,
+    parse_route_timeouts,
+    parse_timeout,
+    remaining_time,
+    request_deadline,
+    route_timeout,
+)
+from src.application.usecases.gemini_usecase import GeminiUseCase
+from src.domain.vo.message_request import MessageRequest
+
+
+def test_timeouts_are_parsed_and_routes_match_the_longest_prefix():
+    assert parse_timeout("2.5") == 2.5
+    assert parse_timeout("1500ms") == 1.5
+    assert parse_timeout("soon") is None
+    routes = parse_route_timeouts("/gemini=60, /gemini/stream=600,bad=1")
+    assert routes == {"/gemini": 60.0, "/gemini/stream": 600.0}
+    assert route_timeout("/gemini/stream/m1/resume", routes) == 600.0
+    assert route_timeout("/conversations", routes, 30.0) == 30.0
+
+
+def test_timeouts_are_cut_to_the_time_left():
+    async def scenario():
+        assert bounded_timeout(30) == 30
+        request_deadline.set(time.monotonic() + 2)
+        return bounded_timeout(30), bounded_timeout(None)
+
+    bounded, unbounded = asyncio.run(scenario())
+    assert 1 < bounded <= 2 and 1 < unbounded <= 2
+
+
+def test_expired_request_is_shed_before_the_upstream_call():
+    class CountingGemini:
+        calls = 0
+
+        async def warm_up(self):
+            return None
+
+        async def generate(self, model, history):
+            CountingGemini.calls += 1
+            return "never"
+
+    class SlowPort:
+        async def insert_and_get_latest(self, message, count):
+            # the history read eats what was left of the deadline
+            await asyncio.sleep(0.05)
+            return [message]
+
+        def round_trips(self):
+            return None
+
+    usecase = GeminiUseCase(CountingGemini(), SlowPort(), None)
+    shed_before = deadline_metrics.stats()["shed_by_stage"].get("upstream", 0)
+
+    async def scenario():
+        request_deadline.set(time.monotonic() + 0.01)
+        await usecase.query(MessageRequest(conversation_id="c1", content="hi", model="gemini-2.5-flash"))
+
+    with pytest.raises(DeadlineExceededError):
+        asyncio.run(scenario())
+    assert CountingGemini.calls == 0
+    assert deadline_metrics.stats()["shed_by_stage"]["upstream"] == shed_before + 1
+
+
+def test_middleware_takes_the_header_or_the_route_default(monkeypatch):
+    monkeypatch.setattr(settings, "REQUEST_DEADLINE_ROUTE_SECONDS", "/slow=100")
+    monkeypatch.setattr(settings, "REQUEST_DEADLINE_DEFAULT_SECONDS", 10.0)
+    monkeypatch.setattr(settings, "REQUEST_DEADLINE_MAX_SECONDS", 50.0)
+    app = FastAPI()
+
+    @app.get(settings.API_PREFIX + "/{path:path}")
+    async def left(path: str):
+        return remaining_time()
+
+    app.add_middleware(DeadlineMiddleware)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            header = (await client.get(settings.API_PREFIX + "/fast", headers={"X-Request-Timeout": "500ms"})).json()
+            capped = (await client.get(settings.API_PREFIX + "/slow/x")).json()
+            default = (await client.get(settings.API_PREFIX + "/other")).json()
+        return header, capped, default
+
+    header, capped, default = asyncio.run(scenario())
+    assert 0 < header <= 0.5
+    assert 49 < capped <= 50
+    assert 9 < default <= 10
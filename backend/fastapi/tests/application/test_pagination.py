@@ -0,0 +1,44 @@
+import pytest
+
+from src.application.exceptions.exceptions import BadRequestError
+from src.application.usecases.pagination import messages_scope, page_response, parse_after
+from src.domain.vo.page_cursor import PageCursor
+
+
+class _Item:
+    def __init__(self, id, created_at):
+        self.id = id
+        self.created_at = created_at
+
+
+def test_cursor_round_trips_and_rejects_tampered_or_foreign_tokens():
+    secret = b"s3cret"
+    token = PageCursor(created_at=1700, id="m1", order="asc", backward=True).encode("messages:c1", secret)
+    cursor = PageCursor.decode(token, "messages:c1", secret)
+    assert (cursor.key, cursor.order, cursor.backward) == ((1700, "m1"), "asc", True)
+
+    payload, _, signature = token.partition(".")
+    forged = PageCursor(created_at=1, id="m1").encode("messages:c1", b"other")
+    for bad in (f"{payload}x.{signature}", "garbage", forged.partition(".")[0] + "." + signature):
+        with pytest.raises(ValueError):
+            PageCursor.decode(bad, "messages:c1", secret)
+    # a cursor only pages the list it was issued for
+    with pytest.raises(ValueError):
+        PageCursor.decode(token, "messages:c2", secret)
+
+
+def test_after_takes_cursors_or_legacy_ids_and_pages_carry_both_cursors():
+    assert parse_after(None, messages_scope("c1")) == (None, None)
+    assert parse_after("m42", messages_scope("c1")) == ("m42", None)
+    with pytest.raises(BadRequestError):
+        parse_after("abc.def", messages_scope("c1"))
+
+    first = page_response([_Item("m9", 9), _Item("m8", 8)], True, "desc", messages_scope("c1"))
+    assert first.last_id == "m8" and first.prev_cursor is None
+    _, cursor = parse_after(first.next_cursor, messages_scope("c1"))
+    assert (cursor.key, cursor.backward) == ((8, "m8"), False)
+
+    second = page_response([_Item("m7", 7)], False, "desc", messages_scope("c1"), cursor)
+    assert second.next_cursor is None
+    _, back = parse_after(second.prev_cursor, messages_scope("c1"))
+    assert (back.key, back.backward) == ((7, "m7"), True)
@@ -0,0 +1,226 @@
+import asyncio
+
+from src.application.config.config import settings
+from src.application.usecases.gemini_usecase import GeminiUseCase
+from src.domain.enums.enums import EMessageStatus, ERole
+from src.domain.models.message_domain import MessageDomain
+from src.domain.vo.message_request import MessageRequest
+
+
+class CheckpointPort:
+    """In-memory rows with the checkpoint API of MessageOutputPort."""
+
+    def __init__(self, messages=()):
+        self.rows = {m.id: m.model_copy() for m in messages}
+        self.writes = []
+
+    async def insert_and_get_latest(self, message, count):
+        self.rows[message.id] = message.model_copy()
+        return await self.get_latest_by_conversation(message.conversation_id, count)
+
+    async def get_latest_by_conversation(self, conversation_id, count, before=None):
+        rows = sorted(self.rows.values(), key=lambda m: (m.created_at, m.id), reverse=True)
+        if before is not None:
+            rows = [m for m in rows if (m.created_at, m.id) < (before.created_at, before.id)]
+        return [m.model_copy() for m in rows[:count]]
+
+    async def count_by_conversation(self, conversation_id):
+        return len(self.rows)
+
+    async def checkpoint(self, message, expected_updated_at=None):
+        current = self.rows.get(message.id)
+        if expected_updated_at is not None and (current is None or current.updated_at != expected_updated_at):
+            return False
+        self.rows[message.id] = message.model_copy()
+        self.writes.append((message.status, message.content))
+        return True
+
+    async def get_checkpoint(self, message_id):
+        row = self.rows.get(message_id)
+        return row.model_copy() if row is not None else None
+
+    def round_trips(self):
+        return None
+
+
+class StreamingGemini:
+    def __init__(self, parts, fail_after=None):
+        self.parts = parts
+        self.fail_after = fail_after
+        self.histories = []
+
+    async def warm_up(self):
+        return None
+
+    async def reserve_stream(self):
+        return None
+
+    def release_stream(self):
+        return None
+
+    async def stream_generate(self, model, history):
+        self.histories.append(history)
+        for i, part in enumerate(self.parts):
+            if self.fail_after is not None and i == self.fail_after:
+                raise ConnectionError("upstream reset")
+            yield part
+
+
+def _request():
+    return MessageRequest(conversation_id="c1", content="tell me a story", model="gemini-2.5-flash")
+
+
+async def _collect(iterator):
+    return [part async for part in iterator]
+
+
+def test_stream_is_checkpointed_and_marked_complete(monkeypatch):
+    monkeypatch.setattr(settings, "GEMINI_STREAM_CHECKPOINT_CHARS", 4)
+    port = CheckpointPort()
+    usecase = GeminiUseCase(StreamingGemini(["once ", "upon ", "a time"]), port, None)
+
+    parts = asyncio.run(_collect(usecase.query_stream(_request())))
+
+    assert parts == ["once ", "upon ", "a time"]
+    row = port.rows[usecase.get_stream_message_id()]
+    assert (row.role, row.status, row.content) == (ERole.MODEL, EMessageStatus.COMPLETE, "once upon a time")
+    assert [s for s, _ in port.writes] == [EMessageStatus.IN_PROGRESS] * 3 + [EMessageStatus.COMPLETE]
+    assert port.writes[0][1] == "once "
+
+
+def test_upstream_failure_keeps_partial_answer_as_aborted():
+    port = CheckpointPort()
+    usecase = GeminiUseCase(StreamingGemini(["once ", "upon ", "a time"], fail_after=2), port, None)
+
+    parts = asyncio.run(_collect(usecase.query_stream(_request())))
+
+    assert parts == ["once ", "upon "]
+    row = port.rows[usecase.get_stream_message_id()]
+    assert (row.status, row.content) == (EMessageStatus.ABORTED, "once upon ")
+    assert usecase.get_stream_status() == "aborted"
+
+
+def test_resume_replays_finished_answer_and_reports_its_state():
+    answer = MessageDomain(id="a1", conversation_id="c1", role=ERole.MODEL, content="all done", created_at=1000, status=EMessageStatus.COMPLETE)
+    usecase = GeminiUseCase(StreamingGemini([]), CheckpointPort([answer]), None)
+
+    async def scenario():
+        return await _collect(await usecase.resume_stream("a1"))
+
+    assert asyncio.run(scenario()) == ["all done"]
+    assert usecase.get_stream_status() == "complete"
+
+
+def test_resume_takes_over_an_orphaned_stream_and_generates_the_rest():
+    question = MessageDomain(id="q1", conversation_id="c1", role=ERole.USER, content="count to four", created_at=1000)
+    partial = MessageDomain(
+        id="a1", conversation_id="c1", role=ERole.MODEL, content="one two", created_at=1001,
+        status=EMessageStatus.IN_PROGRESS, updated_at=1001,
+    )
+    port = CheckpointPort([question, partial])
+    gemini = StreamingGemini([" three", " four"])
+    usecase = GeminiUseCase(gemini, port, None)
+
+    async def scenario():
+        return await _collect(await usecase.resume_stream("a1", "gemini-2.5-flash"))
+
+    assert asyncio.run(scenario()) == ["one two", " three", " four"]
+    # the stored prefix is sent as the trailing model turn, after the question
+    assert [(m.id, m.content) for m in gemini.histories[0]] == [("q1", "count to four"), ("a1", "one two")]
+    row = port.rows["a1"]
+    assert (row.status, row.content) == (EMessageStatus.COMPLETE, "one two three four")
+
+
+def test_client_disconnect_closes_upstream_and_keeps_partial_as_aborted(monkeypatch):
+    from src.application.usecases.gemini_usecase import stream_metrics
+
+    monkeypatch.setattr(settings, "GEMINI_STREAM_DISCONNECT_POLL_SECONDS", 0.01)
+
+    class HangingGemini(StreamingGemini):
+        closed = False
+
+        async def stream_generate(self, model, history):
+            try:
+                yield "half "
+                yield "an answer"
+                # the model is still thinking when the client leaves
+                await asyncio.sleep(3600)
+                yield "never sent"
+            finally:
+                HangingGemini.closed = True
+
+    port = CheckpointPort()
+    usecase = GeminiUseCase(HangingGemini([]), port, None)
+    received = []
+    cancelled_before = stream_metrics.cancelled
+
+    async def is_disconnected():
+        return len(received) == 2
+
+    async def scenario():
+        async for part in usecase.query_stream(_request(), is_disconnected):
+            received.append(part)
+
+    asyncio.run(asyncio.wait_for(scenario(), 5))
+
+    assert received == ["half ", "an answer"]
+    assert HangingGemini.closed
+    row = port.rows[usecase.get_stream_message_id()]
+    assert (row.status, row.content) == (EMessageStatus.ABORTED, "half an answer")
+    assert stream_metrics.cancelled == cancelled_before + 1
+
+
+def test_shared_stream_is_generated_once_for_every_subscriber():
+    from src.application.usecases.stream_registry import StreamRegistry
+
+    registry = StreamRegistry()
+    port = CheckpointPort()
+    gemini = StreamingGemini(["once ", "upon ", "a time"])
+    usecase = GeminiUseCase(gemini, port, None, stream_registry=registry)
+    follower = GeminiUseCase(StreamingGemini([]), port, None, stream_registry=registry)
+
+    async def scenario():
+        stream = usecase.query_stream(_request())
+        first = [await stream.__anext__()]
+        # a second tab joins mid-answer and gets it from the start
+        followed = await follower.follow_conversation("c1")
+        # a reconnect after "once " gets only the rest
+        resumed = await follower.resume_stream(usecase.get_stream_message_id(), offset=len("once "))
+        first += await _collect(stream)
+        return first, await _collect(followed), await _collect(resumed)
+
+    first, followed, resumed = asyncio.run(scenario())
+
+    assert first == ["once ", "upon ", "a time"]
+    assert "".join(followed) == "once upon a time"
+    assert "".join(resumed) == "upon a time"
+    assert len(gemini.histories) == 1
+    row = port.rows[usecase.get_stream_message_id()]
+    assert (row.status, row.content) == (EMessageStatus.COMPLETE, "once upon a time")
+    assert follower.get_stream_status() == "complete"
+
+
+def test_passthrough_keeps_partial_answer_as_aborted_when_upstream_fails():
+    class RawGemini(StreamingGemini):
+        received = ""
+
+        async def stream_raw(self, model, history):
+            RawGemini.received = "half an"
+            yield memoryview(b'data: {"candidates": []}\n\n')
+            raise ConnectionError("upstream reset")
+
+        def get_streamed_text(self):
+            return RawGemini.received
+
+    class SavingPort(CheckpointPort):
+        async def save(self, message):
+            self.rows[message.id] = message.model_copy()
+            return message
+
+    port = SavingPort()
+    usecase = GeminiUseCase(RawGemini([]), port, None)
+
+    chunks = asyncio.run(_collect(usecase.query_stream_raw(_request())))
+    assert len(chunks) == 1
+    answers = [m for m in port.rows.values() if m.role == ERole.MODEL]
+    assert [(m.status, m.content) for m in answers] == [(EMessageStatus.ABORTED, "half an")]
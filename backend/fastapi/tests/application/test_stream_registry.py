@@ -0,0 +1,87 @@
+import asyncio
+
+from src.application.usecases.stream_registry import StreamRegistry, format_event_id, parse_event_id
+from src.domain.enums.enums import EMessageStatus
+
+
+async def _collect(iterator):
+    return [part async for part in iterator]
+
+
+def test_event_ids_round_trip_and_foreign_ids_are_ignored():
+    assert parse_event_id(format_event_id("msg_1:x", 42)) == ("msg_1:x", 42)
+    assert parse_event_id("42") is None
+    assert parse_event_id("msg_1:") is None
+    assert parse_event_id(None) is None
+
+
+def test_subscribers_share_one_buffer_and_replay_from_an_offset():
+    async def scenario():
+        registry = StreamRegistry()
+        broadcast = registry.publish("c1", "m1")
+        first = asyncio.ensure_future(_collect(broadcast.subscribe()))
+        broadcast.append("hello ")
+        await asyncio.sleep(0)
+        late = asyncio.ensure_future(_collect(broadcast.subscribe(6)))
+        inside = asyncio.ensure_future(_collect(broadcast.subscribe(3)))
+        await asyncio.sleep(0)
+        broadcast.append("world")
+        broadcast.finish(EMessageStatus.COMPLETE)
+        return await first, await late, await inside, registry
+
+    first, late, inside, registry = asyncio.run(scenario())
+
+    assert first == ["hello ", "world"]
+    assert late == ["world"]
+    # an offset inside a chunk gets the rest of it
+    assert inside == ["lo ", "world"]
+    assert registry.stats()["replays"] == 2
+
+
+def test_finished_buffers_are_evicted_by_ttl_and_by_size():
+    async def scenario():
+        registry = StreamRegistry(max_bytes=10, ttl=60.0)
+        old = registry.publish("c1", "m1")
+        old.append("0123456789")
+        old.finish(EMessageStatus.COMPLETE)
+        # full: the finished buffer makes room for the new stream
+        new = registry.publish("c2", "m2")
+        evicted_for_size = registry.get("m1") is None and new is not None
+
+        expiring = StreamRegistry(ttl=0.0)
+        done = expiring.publish("c1", "m1")
+        done.finish(EMessageStatus.COMPLETE)
+        return evicted_for_size, expiring.latest("c1"), registry.stats()
+
+    evicted_for_size, latest, stats = asyncio.run(scenario())
+
+    assert evicted_for_size
+    assert latest is None
+    assert stats["evicted"] == 1 and stats["bytes"] == 0
+
+
+def test_running_streams_filling_the_buffers_are_not_shared():
+    async def scenario():
+        registry = StreamRegistry(max_bytes=4)
+        registry.publish("c1", "m1").append("12345")
+        return registry.publish("c2", "m2"), registry.stats()
+
+    declined, stats = asyncio.run(scenario())
+
+    assert declined is None
+    assert stats["declined"] == 1 and stats["running"] == 1
+
+
+def test_generation_without_subscribers_is_cancelled_after_the_grace_period():
+    async def scenario():
+        registry = StreamRegistry(grace=0.0)
+        broadcast = registry.publish("c1", "m1")
+        broadcast.producer = asyncio.ensure_future(asyncio.sleep(3600))
+        reader = broadcast.subscribe()
+        broadcast.append("partial")
+        assert await reader.__anext__() == "partial"
+        await reader.aclose()
+        await asyncio.sleep(0.01)
+        return broadcast.producer.cancelled(), registry.stats()["orphaned"]
+
+    assert asyncio.run(scenario()) == (True, 1)
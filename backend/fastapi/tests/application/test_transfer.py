@@ -0,0 +1,148 @@
+import asyncio
+import json
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from src.adapter.output.mysql.db.base import Base
+from src.adapter.output.mysql.entities import ConversationEntity, MessageEntity
+from src.adapter.output.mysql.repositories.conversation_repository import ConversationRepository
+from src.adapter.output.mysql.repositories.message_repository import MessageRepository
+from src.application.exceptions.exceptions import BadRequestError
+from src.application.usecases.transfer_usecase import ConversationTransferUseCase
+from src.domain.enums.enums import ERole
+from src.domain.models.conversation_domain import ConversationDomain
+
+
+async def _empty_session():
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    return engine, async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)()
+
+
+def _usecase(session, batch_size=3):
+    return ConversationTransferUseCase(ConversationRepository(session), MessageRepository(session), batch_size)
+
+
+async def _feed(data: bytes, size: int):
+    # cut anywhere, including in the middle of a line or a UTF-8 sequence
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+async def _export(session, conversation_ids=None) -> bytes:
+    return b"".join([chunk async for chunk in _usecase(session).export_ndjson(conversation_ids)])
+
+
+def test_export_then_import_round_trips_through_cut_chunks():
+    async def scenario():
+        engine, source = await _empty_session()
+        for c in range(3):
+            source.add(ConversationEntity(id=f"c{c}", name=f"chat {c}", created_at=1000 + c, updated_at=1000 + c))
+        for i in range(7):
+            source.add(MessageEntity(
+                id=f"m{i}", conversation_id="c1", role=ERole.USER if i % 2 == 0 else ERole.MODEL,
+                content=f"xin chào {i}\nline two", created_at=2000 + i,
+            ))
+        await source.commit()
+        dump = await _export(source)
+        only_c1 = await _export(source, ["c1"])
+        await source.close()
+        await engine.dispose()
+
+        engine, target = await _empty_session()
+        stats = await _usecase(target).import_ndjson(_feed(dump, 7))
+        again = await _usecase(target).import_ndjson(_feed(dump, 50))
+        copied = await _export(target)
+        c1 = await ConversationRepository(target).get_by_id("c1")
+        await target.close()
+        await engine.dispose()
+        return dump, only_c1, stats, again, copied, c1
+
+    dump, only_c1, stats, again, copied, c1 = asyncio.run(scenario())
+    records = [json.loads(line) for line in dump.splitlines()]
+    assert [r["type"] for r in records] == ["conversation", "conversation"] + ["message"] * 7 + ["conversation"]
+    assert [r["id"] for r in records if r["type"] == "message"] == [f"m{i}" for i in range(7)]
+    assert [json.loads(line)["id"] for line in only_c1.splitlines()] == ["c1"] + [f"m{i}" for i in range(7)]
+
+    assert copied == dump
+    assert (stats["conversations"], stats["messages"]) == (3, 7)
+    assert (stats["conversations_added"], stats["messages_added"]) == (3, 7)
+    assert stats["bytes"] == len(dump)
+    assert "rows_per_second" in stats and "peak_rss_mb" in stats
+    # importing the same dump again skips what exists
+    assert (again["conversations_added"], again["messages_added"]) == (0, 0)
+    # denormalised stats follow the imported messages
+    assert (c1.messages_count, c1.last_message_at) == (7, 2006)
+
+
+def test_import_rejects_malformed_lines_and_orphan_messages():
+    message = {"type": "message", "id": "m1", "conversation_id": "c9", "role": "user", "content": "hi", "created_at": 1}
+    header = {"type": "conversation", "id": "c1", "name": "chat", "created_at": 1, "updated_at": None}
+    cases = [
+        b"not json\n",
+        json.dumps({"type": "folder", "id": "x"}).encode() + b"\n",
+        json.dumps(header).encode() + b"\n" + json.dumps(message).encode() + b"\n",
+    ]
+
+    async def scenario(data):
+        engine, session = await _empty_session()
+        try:
+            await _usecase(session).import_ndjson(_feed(data, 4))
+        finally:
+            await session.close()
+            await engine.dispose()
+
+    for data in cases:
+        with pytest.raises(BadRequestError):
+            asyncio.run(scenario(data))
+
+
+def test_export_of_conversations_without_messages_is_flushed_in_chunks(monkeypatch):
+    from src.application.usecases import transfer_usecase
+
+    monkeypatch.setattr(transfer_usecase, "_EXPORT_CHUNK_BYTES", 256)
+
+    async def scenario():
+        engine, source = await _empty_session()
+        for c in range(20):
+            source.add(ConversationEntity(id=f"c{c:02d}", name=f"chat {c}", created_at=1000 + c, updated_at=1000 + c))
+        await source.commit()
+        chunks = [chunk async for chunk in _usecase(source).export_ndjson()]
+        await source.close()
+        await engine.dispose()
+        return chunks
+
+    chunks = asyncio.run(scenario())
+    assert len(chunks) > 1
+    assert all(len(chunk) < 256 + 200 for chunk in chunks)
+    assert len(b"".join(chunks).splitlines()) == 20
+
+
+def test_conversation_insert_many_skips_existing_ids_without_a_lookup():
+    def _conversations(*ids):
+        return [ConversationDomain(id=i, name=i, created_at=1000) for i in ids]
+
+    async def scenario():
+        engine, session = await _empty_session()
+        repo = ConversationRepository(session)
+        first = await repo.insert_many(_conversations("c1", "c2"), ignore_duplicates=True)
+        statements = []
+
+        def listener(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(engine.sync_engine, "before_cursor_execute", listener)
+        again = await repo.insert_many(_conversations("c2", "c3"), ignore_duplicates=True)
+        event.remove(engine.sync_engine, "before_cursor_execute", listener)
+        ids = [c.id async for c in repo.stream_all(None, 10)]
+        await session.close()
+        await engine.dispose()
+        return first, again, statements, ids
+
+    first, again, statements, ids = asyncio.run(scenario())
+    assert (first, again) == (2, 1)
+    assert not any(s.lstrip().upper().startswith("SELECT") for s in statements)
+    assert ids == ["c1", "c2", "c3"]
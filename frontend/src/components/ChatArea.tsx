@@ -215,7 +215,7 @@ export const ChatArea: React.FC = () => {
       
       // Store the ID of the FIRST message (oldest in current view) for pagination
       if (messagesInOrder.length > 0) {
-        setNextMessageCursor(currentConversationId, messagesInOrder[0].id);
+        setNextMessageCursor(currentConversationId, result.next_cursor || messagesInOrder[0].id);
       }
       
       // Set flag to scroll to bottom after messages are rendered
@@ -265,7 +265,7 @@ export const ChatArea: React.FC = () => {
       
       // Update cursor to the oldest message in the newly loaded batch
       if (olderMessagesInOrder.length > 0) {
-        setNextMessageCursor(currentConversationId, olderMessagesInOrder[0].id);
+        setNextMessageCursor(currentConversationId, result.next_cursor || olderMessagesInOrder[0].id);
       }
     } catch (error) {
       console.error('❌ Error loading older messages:', error);
@@ -104,7 +104,7 @@ export const Sidebar: React.FC<SidebarProps> = ({ collapsed, onCollapse }) => {
       });
       addConversations(result.data);
       setHasMoreConversations(result.has_more);
-      setNextConversationCursor(result.last_id);
+      setNextConversationCursor(result.next_cursor || result.last_id);
     } catch (error) {
       showToast.error(t('errors.loadConversations'));
     } finally {
@@ -34,7 +34,7 @@ export const useLoadConversations = () => {
         console.log('📋 Loaded conversations:', result.data.length);
         setConversations(result.data);
         setHasMoreConversations(result.has_more || false);
-        setNextConversationCursor(result.last_id || null);
+        setNextConversationCursor(result.next_cursor || result.last_id || null);
       } catch (error) {
         console.error('❌ Failed to load conversations:', error);
         showToast.error(t('errors.loadConversations'));
@@ -47,20 +47,31 @@ export const geminiService = {
 
         buffer += decoder.decode(value, { stream: true });
         
-        // Split by SSE format: "data: {...}\n\n"
-        const lines = buffer.split('\n\n');
-        buffer = lines.pop() || ''; // Keep incomplete line in buffer
+        // SSE events are separated by a blank line: "data: {...}\nid: ...\n\n"
+        const events = buffer.split('\n\n');
+        buffer = events.pop() || ''; // Keep incomplete event in buffer
 
-        for (const line of lines) {
-          if (line.startsWith('data: ')) {
-            try {
-              const jsonStr = line.slice(6); // Remove "data: " prefix
-              const chunk = JSON.parse(jsonStr);
-              onChunk(chunk);
-            } catch (e) {
-              console.error('Failed to parse SSE data:', e);
+        for (const event of events) {
+          let named = false;
+          const data: string[] = [];
+          // one field per line; id:, retry: and ":" comment lines carry no text
+          for (const line of event.split('\n')) {
+            if (line.startsWith('data:')) {
+              data.push(line.slice(line.startsWith('data: ') ? 6 : 5));
+            } else if (line.startsWith('event:')) {
+              named = true;
             }
           }
+          // named events (model, message id, status) are metadata, not answer text
+          if (named || data.length === 0) {
+            continue;
+          }
+          try {
+            const chunk = JSON.parse(data.join('\n'));
+            onChunk(chunk);
+          } catch (e) {
+            console.error('Failed to parse SSE data:', e);
+          }
         }
       }
     } catch (error) {
@@ -38,6 +38,9 @@ export interface ListResponse<T> {
   first_id: string;
   last_id: string;
   has_more: boolean;
+  // opaque keyset cursors; pass one back as `after`
+  next_cursor?: string | null;
+  prev_cursor?: string | null;
 }
 
 export interface ApiResponse<T> {